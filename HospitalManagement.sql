@@ -81,6 +81,65 @@ CREATE TABLE billed_services (
     FOREIGN KEY (service_id) REFERENCES services(service_id) ON DELETE SET NULL
 );
 
+-- Next free number per ID sequence (patient, doctor, service, appointment, bill)
+CREATE TABLE id_sequences (
+    name VARCHAR(30) PRIMARY KEY,
+    next_value BIGINT NOT NULL
+);
+
+-- Trigram postings for patient/doctor name search (filled on first use;
+-- python name_index.py --rebuild to repair)
+CREATE TABLE name_trigrams (
+    entity VARCHAR(10) NOT NULL,
+    trigram VARCHAR(3) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL,
+    entity_id VARCHAR(20) NOT NULL,
+    PRIMARY KEY (entity, trigram, entity_id),
+    KEY idx_name_trigrams_entity (entity, entity_id)
+);
+
+-- Change counters for cached reference data (bumped on every catalog write)
+CREATE TABLE cache_versions (
+    name VARCHAR(30) PRIMARY KEY,
+    version BIGINT NOT NULL
+);
+
+-- Running billing totals per patient (python patient_totals.py --verify / --rebuild)
+CREATE TABLE patient_totals (
+    patient_id VARCHAR(20) PRIMARY KEY,
+    pending_services DECIMAL(12,2) NOT NULL DEFAULT 0,
+    consulting DECIMAL(12,2) NOT NULL DEFAULT 0,
+    billed DECIMAL(12,2) NOT NULL DEFAULT 0
+);
+
+-- Weekly working hours per doctor; each shift is divided into slots
+CREATE TABLE doctor_hours (
+    doctor_id VARCHAR(10) NOT NULL,
+    weekday TINYINT NOT NULL,
+    start_minute SMALLINT NOT NULL,
+    end_minute SMALLINT NOT NULL,
+    slot_minutes SMALLINT NOT NULL DEFAULT 30,
+    PRIMARY KEY (doctor_id, weekday, start_minute),
+    FOREIGN KEY (doctor_id) REFERENCES doctors(doctor_id) ON DELETE CASCADE
+);
+
+-- Booked time slots, one row per slot; the primary key prevents double-booking
+CREATE TABLE appointment_slots (
+    doctor_id VARCHAR(10) NOT NULL,
+    date DATE NOT NULL,
+    slot_start SMALLINT NOT NULL,
+    appt_id VARCHAR(10) NOT NULL,
+    PRIMARY KEY (doctor_id, date, slot_start),
+    KEY idx_appointment_slots_appt (appt_id),
+    FOREIGN KEY (doctor_id) REFERENCES doctors(doctor_id) ON DELETE CASCADE,
+    FOREIGN KEY (appt_id) REFERENCES appointments(appt_id) ON DELETE CASCADE
+);
+
+-- Service usage events already written from a write-behind journal (usage_journal.py)
+CREATE TABLE usage_journal_applied (
+    event_id VARCHAR(32) PRIMARY KEY,
+    applied_at DATETIME NOT NULL
+);
+
 select * from patients;
 select * from doctors;
 select * from services;
@@ -0,0 +1,406 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from columnar import ColumnBatch
+from db_config import connection, get_backend
+
+# Revenue and utilization analytics. Each table is read once through an
+# unbuffered cursor into numpy columns (dates as datetime64[D], amounts as
+# float64, keys as fixed-width strings); group-bys are then np.unique codes
+# plus np.bincount, with no per-row Python work after the read. Dates and
+# amounts are converted to plain numbers in SQL, so the driver never builds
+# date or Decimal objects for them.
+#
+#   python analytics.py --start 2024-01-01 --end 2024-12-31 --json report.json
+
+CHUNK_SIZE = 50_000
+AGE_BANDS = (0, 18, 35, 50, 65)     # lower bounds; the last band is open
+READMISSION_DAYS = 30
+GAP_BANDS = (0, 1, 8, 31, 91, 181, 366)     # lower bounds in days; the last band is open
+NO_KEY = "(none)"
+
+# Days since 1970-01-01, numpy's datetime64[D] epoch
+_DAY_SQL = {"mysql": "TO_DAYS({}) - 719528", "sqlite": "CAST(julianday({}) - 2440587.5 AS INTEGER)"}
+
+
+def _day(column):
+    return _DAY_SQL[get_backend().name].format(column)
+
+
+def _amount(column):
+    # DECIMAL -> double in the query, so rows arrive as floats rather than
+    # Decimal objects. Adding a float literal does this on every MySQL
+    # version (CAST ... AS DOUBLE needs 8.0.17) and on SQLite.
+    return f"({column} + 0E0)"
+
+
+# --- Loading ---
+# Query column kinds -> ColumnBatch kinds
+_BATCH_KINDS = {"date": "date", "float": "float", "str": "category"}
+
+
+def load_columns(sql, params, kinds, chunk_size=CHUNK_SIZE):
+    # Returns one numpy array per selected column; kinds is a sequence of
+    # "date" (days since 1970-01-01), "float" or "str". Rows are gathered
+    # in a ColumnBatch (typed buffers, no per-row objects kept) and turned
+    # into numpy arrays once at the end.
+    columns = [(str(i), _BATCH_KINDS[kind]) for i, kind in enumerate(kinds)]
+    with connection() as conn:
+        cursor = conn.cursor(buffered=False)
+        try:
+            cursor.execute(sql, params)
+            batch = ColumnBatch.from_cursor(cursor, columns, chunk_size)
+        finally:
+            cursor.close()
+    return [batch.to_numpy(name, NO_KEY) for name in batch.names]
+
+
+def _date_filter(column, start_date, end_date):
+    where, params = [], []
+    if start_date:
+        where.append(f"{column} >= %s")
+        params.append(start_date)
+    if end_date:
+        where.append(f"{column} <= %s")
+        params.append(end_date)
+    return (" WHERE " + " AND ".join(where) if where else ""), params
+
+
+def load(start_date=None, end_date=None):
+    # Bulk-reads every table the report needs; returns {table: {column: array}}
+    queries = {}
+    where, params = _date_filter("billing_date", start_date, end_date)
+    queries["billing"] = (("date", "amount"), ("date", "float"),
+                          f"SELECT {_day('billing_date')}, {_amount('total_amount')} FROM billing" + where, params)
+    sql = f"SELECT s.service_id, s.service_name, {_amount('s.cost')} FROM billed_services s"
+    where, params = _date_filter("b.billing_date", start_date, end_date)
+    if where:
+        sql += " JOIN billing b ON b.bill_id = s.bill_id" + where
+    queries["billed_services"] = (("service_id", "service_name", "cost"), ("str", "str", "float"), sql, params)
+    where, params = _date_filter("date", start_date, end_date)
+    queries["appointments"] = (
+        ("date", "doctor_id", "charge", "patient_id", "diagnosis"), ("date", "str", "float", "float", "str"),
+        f"SELECT {_day('date')}, doctor_id, {_amount('consulting_charge')}, patient_id, diagnosis FROM appointments"
+        + where, params)
+    queries["doctors"] = (("doctor_id", "name", "specialization"), ("str", "str", "str"),
+                          "SELECT doctor_id, name, specialization FROM doctors", ())
+    queries["patients"] = (("age", "gender"), ("float", "str"), "SELECT age, gender FROM patients", ())
+    return {table: dict(zip(names, load_columns(sql, params, kinds)))
+            for table, (names, kinds, sql, params) in queries.items()}
+
+
+# --- Group-bys ---
+def group_sum(keys, values):
+    # Returns (sorted distinct keys, sum of values per key, rows per key)
+    labels, codes = np.unique(keys, return_inverse=True)
+    sums = np.bincount(codes, weights=values, minlength=len(labels))
+    counts = np.bincount(codes, minlength=len(labels))
+    return labels, sums, counts
+
+
+def period_sum(dates, values, unit="D"):
+    # group_sum for datetime64 keys: periods are dense integers, so bincount
+    # over the offset from the earliest one replaces the sort in np.unique
+    known = ~np.isnat(dates)
+    units = dates[known].astype(f"datetime64[{unit}]").astype(np.int64)
+    if not len(units):
+        return np.empty(0, dtype=f"datetime64[{unit}]"), np.zeros(0), np.zeros(0, dtype=np.int64)
+    first = units.min()
+    sums = np.bincount(units - first, weights=_nan_to_zero(values[known]))
+    counts = np.bincount(units - first)
+    present = np.flatnonzero(counts)
+    return (present + first).astype(f"datetime64[{unit}]"), sums[present], counts[present]
+
+
+def lookup(keys, values, wanted, default=NO_KEY):
+    # values[i] for each wanted key equal to keys[i]; default where absent
+    order = np.argsort(keys, kind="stable")
+    keys, values = keys[order], values[order]
+    pos = np.clip(np.searchsorted(keys, wanted), 0, max(len(keys) - 1, 0))
+    found = (keys[pos] == wanted) if len(keys) else np.zeros(len(wanted), dtype=bool)
+    result = np.full(len(wanted), default, dtype=object)
+    if len(keys):
+        result[found] = values[pos[found]]
+    return result.astype(str)
+
+
+def group_median(codes, values, n):
+    # Median of values per code 0..n-1 (NaN for codes without values): one
+    # sort by (code, value), then the middle element(s) of each run
+    order = np.lexsort((values, codes))
+    values = values[order].astype(np.float64)
+    counts = np.bincount(codes, minlength=n)
+    starts = np.cumsum(counts) - counts
+    medians = np.full(n, np.nan)
+    present = counts > 0
+    low = starts[present] + (counts[present] - 1) // 2
+    high = starts[present] + counts[present] // 2
+    medians[present] = (values[low] + values[high]) / 2
+    return medians
+
+
+def _nan_to_zero(values):
+    return np.nan_to_num(values, nan=0.0)
+
+
+def revenue_by_period(billing, appointments, unit="D"):
+    # Billed services plus consulting charges per day ("D") or month ("M")
+    bill_days, bill_sums, bill_counts = period_sum(billing["date"], billing["amount"], unit)
+    appt_days, appt_sums, appt_counts = period_sum(appointments["date"], appointments["charge"], unit)
+    periods = np.union1d(bill_days, appt_days)
+    billed = np.zeros(len(periods))
+    consulting = np.zeros(len(periods))
+    bills = np.zeros(len(periods), dtype=np.int64)
+    appts = np.zeros(len(periods), dtype=np.int64)
+    billed[np.searchsorted(periods, bill_days)] = bill_sums
+    bills[np.searchsorted(periods, bill_days)] = bill_counts
+    consulting[np.searchsorted(periods, appt_days)] = appt_sums
+    appts[np.searchsorted(periods, appt_days)] = appt_counts
+    return [{"period": str(p), "billed": round(float(b), 2), "consulting": round(float(c), 2),
+             "total": round(float(b + c), 2), "bills": int(nb), "appointments": int(na)}
+            for p, b, c, nb, na in zip(periods, billed, consulting, bills, appts)]
+
+
+def revenue_by_service(billed_services):
+    ids, sums, counts = group_sum(billed_services["service_id"], _nan_to_zero(billed_services["cost"]))
+    # Name as billed most recently (last occurrence) for each service
+    _, last = np.unique(billed_services["service_id"][::-1], return_index=True)
+    names = billed_services["service_name"][::-1][last]
+    order = np.argsort(-sums, kind="stable")
+    return [{"service_id": str(ids[i]), "service_name": str(names[i]), "uses": int(counts[i]),
+             "revenue": round(float(sums[i]), 2)} for i in order]
+
+
+def consulting_by_doctor(appointments, doctors):
+    ids, sums, counts = group_sum(appointments["doctor_id"], _nan_to_zero(appointments["charge"]))
+    names = lookup(doctors["doctor_id"], doctors["name"], ids)
+    specializations = lookup(doctors["doctor_id"], doctors["specialization"], ids)
+    order = np.argsort(-sums, kind="stable")
+    by_doctor = [{"doctor_id": str(ids[i]), "name": str(names[i]), "specialization": str(specializations[i]),
+                  "appointments": int(counts[i]), "consulting": round(float(sums[i]), 2)} for i in order]
+    # Roll the per-doctor totals up to specializations
+    specs, spec_codes = np.unique(specializations, return_inverse=True)
+    spec_sums = np.bincount(spec_codes, weights=sums, minlength=len(specs))
+    spec_counts = np.bincount(spec_codes, weights=counts, minlength=len(specs))
+    spec_doctors = np.bincount(spec_codes, minlength=len(specs))
+    order = np.argsort(-spec_sums, kind="stable")
+    by_specialization = [{"specialization": str(specs[i]), "doctors": int(spec_doctors[i]),
+                          "appointments": int(spec_counts[i]), "consulting": round(float(spec_sums[i]), 2)}
+                         for i in order]
+    return by_doctor, by_specialization
+
+
+def age_gender_mix(patients):
+    ages = patients["age"]
+    known = ~np.isnan(ages)
+    bands = np.digitize(ages[known], AGE_BANDS) - 1
+    genders, gender_codes = np.unique(patients["gender"][known], return_inverse=True)
+    counts = np.bincount(bands * len(genders) + gender_codes,
+                         minlength=len(AGE_BANDS) * len(genders)).reshape(len(AGE_BANDS), len(genders))
+    labels = [f"{lo}-{hi - 1}" for lo, hi in zip(AGE_BANDS, AGE_BANDS[1:])] + [f"{AGE_BANDS[-1]}+"]
+    total = int(counts.sum())
+    mean_age = np.bincount(gender_codes, weights=ages[known], minlength=len(genders)) / np.maximum(
+        np.bincount(gender_codes, minlength=len(genders)), 1)
+    return {
+        "patients": int(len(ages)),
+        "unknown_age": int((~known).sum()),
+        "genders": [str(g) for g in genders],
+        "bands": [{"age": label, **{str(g): int(n) for g, n in zip(genders, row)}, "total": int(row.sum()),
+                   "share": round(float(row.sum()) / total, 4) if total else 0.0}
+                  for label, row in zip(labels, counts)],
+        "mean_age": {str(g): round(float(m), 1) for g, m in zip(genders, mean_age)},
+    }
+
+
+# --- Appointment intervals ---
+def patient_visits(appointments):
+    # Appointments with a patient and a date, ordered by (patient_id, date).
+    # The table is read in storage order and sorted here: an ORDER BY on a
+    # whole-table read is several times slower than the scan itself.
+    known = ~np.isnan(appointments["patient_id"]) & ~np.isnat(appointments["date"])
+    patients = appointments["patient_id"][known].astype(np.int64)
+    dates = appointments["date"][known]
+    order = np.lexsort((dates, patients))
+    return {"patient_id": patients[order], "date": dates[order],
+            "doctor_id": appointments["doctor_id"][known][order], "diagnosis": appointments["diagnosis"][known][order]}
+
+
+def next_visit_gaps(visits):
+    # Days from each visit to the same patient's next one; -1 for a patient's last visit
+    patients = visits["patient_id"]
+    days = visits["date"].astype(np.int64)
+    gaps = np.full(len(patients), -1, dtype=np.int64)
+    same = patients[1:] == patients[:-1]
+    gaps[:-1][same] = (days[1:] - days[:-1])[same]
+    return gaps
+
+
+def _interval_groups(keys, gaps, readmitted):
+    # Per key: visits, follow-ups, readmissions within the window and the
+    # median days to the next visit, most readmissions first
+    labels, codes = np.unique(keys, return_inverse=True)
+    followed = gaps >= 0
+    visits = np.bincount(codes, minlength=len(labels))
+    follow_ups = np.bincount(codes[followed], minlength=len(labels))
+    readmissions = np.bincount(codes[readmitted], minlength=len(labels))
+    medians = group_median(codes[followed], gaps[followed], len(labels))
+    order = np.lexsort((-visits, -readmissions))
+    return [{"key": str(labels[i]), "visits": int(visits[i]), "follow_ups": int(follow_ups[i]),
+             "readmissions": int(readmissions[i]), "readmission_rate": round(float(readmissions[i] / visits[i]), 4),
+             "median_gap_days": None if np.isnan(medians[i]) else float(medians[i])} for i in order]
+
+
+def appointment_intervals(appointments, doctors, window=READMISSION_DAYS):
+    # Gaps between consecutive appointments of every patient, in one pass
+    # over the whole table. A visit counts as a readmission for the doctor
+    # and diagnosis of the visit before it when it follows within `window`
+    # days (same-day visits are not counted). With a date range, gaps that
+    # cross its edges are not seen.
+    visits = patient_visits(appointments)
+    gaps = next_visit_gaps(visits)
+    followed = gaps >= 0
+    readmitted = followed & (gaps > 0) & (gaps <= window)
+    known = gaps[followed]
+    patients = visits["patient_id"]
+    new_patient = np.ones(len(patients), dtype=bool)
+    new_patient[1:] = patients[1:] != patients[:-1]
+    bands = np.bincount(np.digitize(known, GAP_BANDS) - 1, minlength=len(GAP_BANDS))
+    labels = [f"{lo}-{hi - 1}" if hi - lo > 1 else str(lo) for lo, hi in zip(GAP_BANDS, GAP_BANDS[1:])]
+    labels.append(f"{GAP_BANDS[-1]}+")
+    by_doctor = _interval_groups(visits["doctor_id"], gaps, readmitted)
+    names = lookup(doctors["doctor_id"], doctors["name"], np.array([d["key"] for d in by_doctor], dtype=str))
+    for entry, name in zip(by_doctor, names):
+        entry["name"] = str(name)
+    return {
+        "window_days": window,
+        "visits": int(len(patients)),
+        "patients": int(new_patient.sum()),
+        "returning_patients": int((new_patient & followed).sum()),
+        "intervals": int(len(known)),
+        "median_gap_days": float(np.median(known)) if len(known) else None,
+        "mean_gap_days": round(float(known.mean()), 1) if len(known) else None,
+        "p90_gap_days": float(np.percentile(known, 90)) if len(known) else None,
+        "same_day": int((known == 0).sum()),
+        "readmissions": int(readmitted.sum()),
+        "readmission_rate": round(float(readmitted.sum() / len(patients)), 4) if len(patients) else 0.0,
+        "gap_bands": [{"days": label, "intervals": int(n)} for label, n in zip(labels, bands)],
+        "doctors": by_doctor,
+        "diagnoses": _interval_groups(visits["diagnosis"], gaps, readmitted),
+    }
+
+
+def interval_report(start_date=None, end_date=None, window=READMISSION_DAYS):
+    # appointment_intervals on its own, reading only appointments and doctors
+    where, params = _date_filter("date", start_date, end_date)
+    appointments = dict(zip(("patient_id", "date", "doctor_id", "diagnosis"), load_columns(
+        f"SELECT patient_id, {_day('date')}, doctor_id, diagnosis FROM appointments" + where, params,
+        ("float", "date", "str", "str"))))
+    doctors = dict(zip(("doctor_id", "name"), load_columns("SELECT doctor_id, name FROM doctors", (),
+                                                          ("str", "str"))))
+    return appointment_intervals(appointments, doctors, window)
+
+
+# --- Report ---
+def build_report(start_date=None, end_date=None, window=READMISSION_DAYS):
+    started = time.perf_counter()
+    data = load(start_date, end_date)
+    loaded = time.perf_counter()
+    by_doctor, by_specialization = consulting_by_doctor(data["appointments"], data["doctors"])
+    report = {
+        "range": {"start_date": start_date, "end_date": end_date},
+        "rows": {table: len(next(iter(columns.values()))) for table, columns in data.items()},
+        "daily": revenue_by_period(data["billing"], data["appointments"], "D"),
+        "monthly": revenue_by_period(data["billing"], data["appointments"], "M"),
+        "services": revenue_by_service(data["billed_services"]),
+        "doctors": by_doctor,
+        "specializations": by_specialization,
+        "patients": age_gender_mix(data["patients"]),
+        "intervals": appointment_intervals(data["appointments"], data["doctors"], window),
+    }
+    report["seconds"] = {"load": round(loaded - started, 3), "compute": round(time.perf_counter() - loaded, 3)}
+    return report
+
+
+def print_report(report, top=10):
+    rows = report["rows"]
+    print(f"\n=== Analytics ({report['range']['start_date'] or 'start'} to {report['range']['end_date'] or 'end'}) ===")
+    print(f"Rows read: {', '.join(f'{t}={n:,}' for t, n in rows.items())} "
+          f"(load {report['seconds']['load']}s, compute {report['seconds']['compute']}s)")
+
+    print("\n--- Monthly revenue ---")
+    print(f"{'Month':<10}{'Billed':>16}{'Consulting':>16}{'Total':>16}{'Bills':>9}{'Appts':>9}")
+    for m in report["monthly"]:
+        print(f"{m['period']:<10}{m['billed']:>16,.2f}{m['consulting']:>16,.2f}{m['total']:>16,.2f}"
+              f"{m['bills']:>9}{m['appointments']:>9}")
+
+    print(f"\n--- Daily revenue (last {top} days) ---")
+    for d in report["daily"][-top:]:
+        print(f"{d['period']:<12}{d['total']:>16,.2f}  (billed {d['billed']:,.2f}, consulting {d['consulting']:,.2f})")
+
+    print(f"\n--- Top {top} services by revenue ---")
+    for s in report["services"][:top]:
+        print(f"{s['service_id']:<8}{s['service_name'][:30]:<32}{s['uses']:>8} uses{s['revenue']:>16,.2f}")
+
+    print(f"\n--- Top {top} doctors by consulting income ---")
+    for d in report["doctors"][:top]:
+        print(f"{d['doctor_id']:<8}{d['name'][:28]:<30}{d['specialization'][:20]:<22}"
+              f"{d['appointments']:>8}{d['consulting']:>16,.2f}")
+
+    print("\n--- Consulting income by specialization ---")
+    for s in report["specializations"]:
+        print(f"{s['specialization'][:28]:<30}{s['doctors']:>5} doctors{s['appointments']:>9}{s['consulting']:>16,.2f}")
+
+    mix = report["patients"]
+    print(f"\n--- Patient age/gender mix ({mix['patients']:,} patients) ---")
+    print(f"{'Age':<8}" + "".join(f"{g:>10}" for g in mix["genders"]) + f"{'Total':>10}{'Share':>8}")
+    for band in mix["bands"]:
+        print(f"{band['age']:<8}" + "".join(f"{band[g]:>10,}" for g in mix["genders"])
+              + f"{band['total']:>10,}{band['share']:>8.1%}")
+    print("Mean age: " + ", ".join(f"{g} {a}" for g, a in mix["mean_age"].items()))
+    print_intervals(report["intervals"], top)
+
+
+def print_intervals(intervals, top=10):
+    window = intervals["window_days"]
+    print(f"\n--- Days between appointments ({intervals['visits']:,} visits, {intervals['patients']:,} patients) ---")
+    print(f"Returning patients: {intervals['returning_patients']:,}  intervals: {intervals['intervals']:,}  "
+          f"median {intervals['median_gap_days']}  mean {intervals['mean_gap_days']}  p90 {intervals['p90_gap_days']}")
+    print(f"{window}-day readmissions: {intervals['readmissions']:,} ({intervals['readmission_rate']:.1%} of visits), "
+          f"same-day repeats: {intervals['same_day']:,}")
+    print("  ".join(f"{b['days']}d: {b['intervals']:,}" for b in intervals["gap_bands"]))
+    for title, rows, name in ((f"Top {top} doctors by {window}-day readmissions", intervals["doctors"], True),
+                              (f"Top {top} diagnoses by {window}-day readmissions", intervals["diagnoses"], False)):
+        print(f"\n--- {title} ---")
+        print(f"{'':<32}{'Visits':>9}{'Readmits':>10}{'Rate':>8}{'Median gap':>12}")
+        for row in rows[:top]:
+            label = f"{row['key']} {row['name']}" if name else row["key"]
+            median = "-" if row["median_gap_days"] is None else f"{row['median_gap_days']:g}"
+            print(f"{label[:30]:<32}{row['visits']:>9,}{row['readmissions']:>10,}{row['readmission_rate']:>8.1%}"
+                  f"{median:>12}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Revenue and utilization report.")
+    parser.add_argument("--start", help="first date included (YYYY-MM-DD)")
+    parser.add_argument("--end", help="last date included (YYYY-MM-DD)")
+    parser.add_argument("--top", type=int, default=10, help="rows shown per ranking")
+    parser.add_argument("--json", metavar="FILE", help="write the full report as JSON")
+    parser.add_argument("--window", type=int, default=READMISSION_DAYS, help="readmission window in days")
+    parser.add_argument("--intervals", action="store_true", help="only the appointment interval statistics")
+    args = parser.parse_args(argv)
+    if args.intervals:
+        report = interval_report(args.start, args.end, args.window)
+        print_intervals(report, args.top)
+    else:
+        report = build_report(args.start, args.end, args.window)
+        print_report(report, args.top)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,14 @@
-import re
-from db_config import get_connection
-import mysql.connector
-from mysql.connector import IntegrityError, Error
+import csv_export
+from db_config import get_connection, begin_write, IntegrityError, Error
+from id_allocator import next_id
+from pagination import PAGE_SIZE, fetch_page, iter_rows, print_rows
+from validators import validate_appointment
+import patient_totals
+import scheduling
 
 class Appointment:
+    __slots__ = ("appt_id", "patient_id", "doctor_id", "date", "diagnosis")
+
     def __init__(self, appt_id, patient_id, doctor_id, date, diagnosis):
         self.appt_id = appt_id
         self.patient_id = patient_id
@@ -11,32 +16,35 @@ class Appointment:
         self.date = date
         self.diagnosis = diagnosis
 
-    def add(self):
-        # Validate patient_id
-        if not self.patient_id or not str(self.patient_id).isdigit():
-            print("Invalid Patient ID.")
-            return False
-        # Validate doctor_id
-        if not self.doctor_id or not isinstance(self.doctor_id, str):
-            print("Invalid Doctor ID.")
-            return False
-        # Validate date
-        if not self.date or not re.match(r'^\d{4}-\d{2}-\d{2}$', self.date):
-            print("Invalid Date. Use YYYY-MM-DD format.")
-            return False
-        # Validate diagnosis
-        if not self.diagnosis or not isinstance(self.diagnosis, str):
-            print("Invalid Diagnosis.")
+    def add(self, start_time=None, slots=1):
+        # With a start time the appointment is booked by slot (see book);
+        # without one only doctors with no working hours can be booked
+        if start_time:
+            return self.book(start_time, slots)
+        # Validate patient_id, doctor_id, date and diagnosis
+        error = validate_appointment(self.patient_id, self.doctor_id, self.date, self.diagnosis)
+        if error:
+            print(error)
             return False
 
         try:
+            patient_totals.prepare()
             conn = get_connection()
+            begin_write(conn)
             cursor = conn.cursor()
+            if scheduling.has_hours(cursor, self.doctor_id):
+                conn.rollback()
+                print(scheduling.NEEDS_SLOT.format(self.doctor_id))
+                return False
             sql = "INSERT INTO appointments (appt_id, patient_id, doctor_id, date, diagnosis) VALUES (%s, %s, %s, %s, %s)"
             cursor.execute(sql, (self.appt_id, self.patient_id, self.doctor_id, self.date, self.diagnosis))
+            # The row takes the column default charge; read it back so the
+            # patient's consulting total stays exact
+            cursor.execute("SELECT consulting_charge FROM appointments WHERE appt_id=%s", (self.appt_id,))
+            patient_totals.adjust(cursor, self.patient_id, consulting=float(cursor.fetchone()[0] or 0))
             conn.commit()
             return True
-        except mysql.connector.errors.IntegrityError as e:
+        except IntegrityError as e:
             if "PRIMARY" in str(e):
                 print(f"Error: Duplicate Appointment ID '{self.appt_id}'. Please use a unique ID.")
             else:
@@ -50,30 +58,36 @@ class Appointment:
             if 'conn' in locals(): conn.close()
 
     def update(self):
-        # Validate patient_id
-        if not self.patient_id or not str(self.patient_id).isdigit():
-            print("Invalid Patient ID.")
-            return False
-        # Validate doctor_id
-        if not self.doctor_id or not isinstance(self.doctor_id, str):
-            print("Invalid Doctor ID.")
-            return False
-        # Validate date
-        if not self.date or not re.match(r'^\d{4}-\d{2}-\d{2}$', self.date):
-            print("Invalid Date. Use YYYY-MM-DD format.")
-            return False
-        # Validate diagnosis
-        if not self.diagnosis or not isinstance(self.diagnosis, str):
-            print("Invalid Diagnosis.")
+        # Validate patient_id, doctor_id, date and diagnosis
+        error = validate_appointment(self.patient_id, self.doctor_id, self.date, self.diagnosis)
+        if error:
+            print(error)
             return False
 
         try:
+            patient_totals.prepare()
             conn = get_connection()
+            begin_write(conn)
             cursor = conn.cursor()
+            old = patient_totals.locked_row(cursor, "appointments", "appt_id", self.appt_id,
+                                            "patient_id, consulting_charge, doctor_id, date")
+            slotted = scheduling.slots_of(cursor, self.appt_id)
+            if slotted and (slotted[0] != self.doctor_id or slotted[1].isoformat() != self.date):
+                conn.rollback()
+                print(scheduling.MOVE_SLOTTED)
+                return False
+            moved = old and (old[2], str(old[3])) != (self.doctor_id, self.date)
+            if not slotted and moved and scheduling.has_hours(cursor, self.doctor_id):
+                conn.rollback()
+                print(scheduling.NEEDS_SLOT.format(self.doctor_id))
+                return False
             sql = "UPDATE appointments SET patient_id=%s, doctor_id=%s, date=%s, diagnosis=%s WHERE appt_id=%s"
             cursor.execute(sql, (self.patient_id, self.doctor_id, self.date, self.diagnosis, self.appt_id))
+            if old:
+                # The charge follows the appointment if it moved to another patient
+                patient_totals.move(cursor, old[0], self.patient_id, "consulting", old[1], old[1])
             conn.commit()
-            if cursor.rowcount == 0:
+            if old is None:
                 print("Appointment ID not found.")
                 return False
             else:
@@ -89,16 +103,103 @@ class Appointment:
             if 'cursor' in locals(): cursor.close()
             if 'conn' in locals(): conn.close()
 
+    def book(self, start_time, slots=1):
+        # Adds the appointment at start_time on self.date, reserving `slots`
+        # consecutive slots of the doctor's working hours
+        error = validate_appointment(self.patient_id, self.doctor_id, self.date, self.diagnosis)
+        start = scheduling.parse_time(start_time)
+        if not error and start is None:
+            error = "Invalid time. Use HH:MM."
+        if error:
+            print(error)
+            return False
+        starts, error = scheduling.index.plan(self.doctor_id, self.date, start, slots)
+        if error:
+            print(error)
+            return False
+
+        try:
+            patient_totals.prepare()
+            conn = get_connection()
+            begin_write(conn)
+            cursor = conn.cursor()
+            sql = "INSERT INTO appointments (appt_id, patient_id, doctor_id, date, diagnosis) VALUES (%s, %s, %s, %s, %s)"
+            cursor.execute(sql, (self.appt_id, self.patient_id, self.doctor_id, self.date, self.diagnosis))
+            cursor.execute("SELECT consulting_charge FROM appointments WHERE appt_id=%s", (self.appt_id,))
+            patient_totals.adjust(cursor, self.patient_id, consulting=float(cursor.fetchone()[0] or 0))
+            try:
+                error = scheduling.reserve(cursor, self.appt_id, self.doctor_id, self.date, starts)
+            except IntegrityError:
+                # Booked by someone else since the index was loaded
+                conn.rollback()
+                scheduling.index.invalidate(self.doctor_id, self.date)
+                print(scheduling.TAKEN)
+                return False
+            if error:
+                conn.rollback()
+                scheduling.index.invalidate(self.doctor_id)
+                print(error)
+                return False
+            conn.commit()
+            scheduling.index.booked(self.appt_id, self.doctor_id, self.date, starts)
+            print(f"Booked {self.date} {scheduling.format_time(start)} with doctor {self.doctor_id}.")
+            return True
+        except IntegrityError as e:
+            print("Database integrity error: ", e)
+            return False
+        except Exception as e:
+            print("Unexpected error while booking appointment:", e)
+            return False
+        finally:
+            if 'cursor' in locals(): cursor.close()
+            if 'conn' in locals(): conn.close()
+
+    @staticmethod
+    def show_free_slots(doctor_id, date):
+        try:
+            slots = scheduling.index.free_slots(doctor_id, date)
+            if slots:
+                print(", ".join(f"{scheduling.format_time(s)}-{scheduling.format_time(e)}" for s, e in slots))
+            else:
+                print(f"No free slots for doctor '{doctor_id}' on {date}.")
+            return slots
+        except Exception as e:
+            print("Error reading free slots:", e)
+            return []
+
+    @staticmethod
+    def first_free_slot(doctor_ids, from_date, after="00:00", slots=1):
+        # Prints and returns (date, start minute, doctor_id), or None
+        if scheduling.parse_date(from_date) is None:
+            print("Invalid Date. Use YYYY-MM-DD format.")
+            return None
+        try:
+            found = scheduling.index.first_free(doctor_ids, from_date, scheduling.parse_time(after) or 0, slots)
+            if found is None:
+                print(f"No free slot in the next {scheduling.SEARCH_DAYS} days.")
+            else:
+                print(f"First free slot: {found[0]} {scheduling.format_time(found[1])} with doctor {found[2]}.")
+            return found
+        except Exception as e:
+            print("Error searching free slots:", e)
+            return None
+
     @staticmethod
     def delete(appt_id):
         # No validation for appt_id since it's system-generated
         try:
+            patient_totals.prepare()
             conn = get_connection()
+            begin_write(conn)
             cursor = conn.cursor()
+            old = patient_totals.locked_row(cursor, "appointments", "appt_id", appt_id, "patient_id, consulting_charge")
             sql = "DELETE FROM appointments WHERE appt_id=%s"
             cursor.execute(sql, (appt_id,))
+            if old:
+                patient_totals.move(cursor, old[0], None, "consulting", old[1], 0)
             conn.commit()
-            if cursor.rowcount == 0:
+            scheduling.index.released(appt_id)
+            if old is None:
                 print("Appointment ID not found.")
                 return False
             else:
@@ -116,29 +217,39 @@ class Appointment:
 
     @staticmethod
     def view():
+        # Streams the whole table in primary-key order, a chunk at a time
         try:
-            conn = get_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM appointments")
-            rows = cursor.fetchall()
             print("Appointment_ID | Patient_ID | Doctor_ID | Date | Diagnosis")
-            for row in rows:
+            for row in iter_rows("appointments", "appt_id"):
                 print(" | ".join(str(x) for x in row))
         except Error as e:
             print("Database error while viewing appointments:", e)
         except Exception as e:
             print("Unexpected error while viewing appointments:", e)
-        finally:
-            if 'cursor' in locals(): cursor.close()
-            if 'conn' in locals(): conn.close()
 
     @staticmethod
-    def filter_appointments():
+    def view_page(after=None, page_size=PAGE_SIZE):
+        # Prints one page; returns the key to continue after (None on the last page)
         try:
-            conn = get_connection()
-            cursor = conn.cursor()
+            rows, next_key = fetch_page("appointments", "appt_id", after, page_size)
+            print_rows("Appointment_ID | Patient_ID | Doctor_ID | Date | Diagnosis", rows)
+            return next_key
+        except Error as e:
+            print("Database error while viewing appointments:", e)
+        except Exception as e:
+            print("Unexpected error while viewing appointments:", e)
+        return None
+
+    @staticmethod
+    def filter_appointments(start_date=None, end_date=None):
+        # Prompts for any date that is not passed in
+        if start_date is None:
             start_date = input("Enter start date(YYYY-MM-DD): ")
+        if end_date is None:
             end_date = input("Enter end date(YYYY-MM-DD):")
+        try:
+            conn = get_connection()
+            cursor = conn.cursor()
             cursor.execute("SELECT * FROM appointments WHERE date BETWEEN %s and %s", (start_date, end_date))
             for row in cursor.fetchall():
                 print(row)
@@ -176,35 +287,24 @@ class Appointment:
             conn.close()
 
     @staticmethod
-    def export_appointment_summary_to_csv(filename="appointment_summary.csv"):
-        conn = get_connection()
-        cursor = conn.cursor()
+    def export_appointment_summary_to_csv(filename="appointment_summary.csv", columns=None, start_date=None,
+                                          end_date=None, doctor_id=None, patient_id=None, compress=None):
+        # Streams rows in chunks; a ".gz" filename (or compress=True) gzips the output
         try:
-            cursor.execute("SELECT appt_id, patient_id, doctor_id, date, diagnosis, consulting_charge FROM appointments")
-            rows = cursor.fetchall()
-            if not rows:
-                print("No appointment records to export.")
-                return
-            with open(filename, "w", newline="") as csvfile:
-                writer = csv.writer(csvfile)
-                writer.writerow(["Appointment ID", "Patient ID", "Doctor ID", "Date", "Diagnosis", "Consulting Charge"])
-                for row in rows:
-                    writer.writerow(row)
-            print(f"Appointment summary exported to {filename}")
+            count = csv_export.export(csv_export.APPOINTMENT_EXPORT, filename, columns, start_date, end_date,
+                                      compress, doctor_id=doctor_id, patient_id=patient_id)
+        except ValueError as e:
+            print(e)
+            return 0
         except Exception as e:
             print("Error exporting appointment summary:", e)
-        finally:
-            cursor.close()
-            conn.close()
+            return 0
+        if not count:
+            print("No appointment records to export.")
+        else:
+            print(f"Appointment summary exported to {filename} ({count} rows)")
+        return count
 
 def generate_next_appointment_id():
-    from db_config import get_connection
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT appt_id FROM appointments WHERE appt_id LIKE 'A%'")
-    ids = [int(row[0][1:]) for row in cursor.fetchall() if row[0][1:].isdigit()]
-    cursor.close()
-    conn.close()
-    next_num = max(ids) + 1 if ids else 1
-    return f"A{next_num:03d}"  # A001, A002, ..., A999, etc.
+    return next_id("appointment")  # A001, A002, ..., A999, etc.
 
@@ -0,0 +1,81 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from db_config import ConnectionPool, get_backend, POOL_SIZE, POOL_TIMEOUT, HEALTH_CHECK_INTERVAL, PoolTimeoutError
+import operations
+from operations import Result
+
+# Asyncio access to the entity operations. Coroutines wait for a connection
+# slot on an asyncio semaphore (so thousands of pending requests cost no
+# threads); each operation then runs on a dedicated thread per connection,
+# in its own transaction, through the same code as the batch and HTTP
+# front ends (operations.py). Results are operations.Result objects.
+# The storage engine is the process-wide one (db_config.get_backend, or
+# configure_backend to switch it): the ID allocator, name index and caches
+# the operations use connect through it as well.
+#
+#     async with AsyncHospital() as api:
+#         result = await api.add_patient(name="Ann Lee", age=30, gender="F",
+#                                        admission_date="2024-05-01", contact_no="9876543210")
+#         if result.ok: print(result.data["patient_id"])
+
+
+class AsyncPool:
+    def __init__(self, size=POOL_SIZE, timeout=POOL_TIMEOUT, health_check_interval=HEALTH_CHECK_INTERVAL):
+        self.size = size
+        self.timeout = timeout
+        self._pool = ConnectionPool(get_backend().connect, size, timeout, health_check_interval)
+        self._slots = asyncio.Semaphore(size)
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="hms-async-db")
+
+    def _call(self, fn, args, kwargs):
+        with self._pool.acquire() as conn:
+            return fn(conn, *args, **kwargs)
+
+    async def run(self, fn, *args, **kwargs):
+        # Runs fn(conn, *args, **kwargs) on a pool thread with a connection
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            raise PoolTimeoutError(f"No database connection available within {self.timeout:.1f}s "
+                                   f"(pool size {self.size}).") from None
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(self._call, fn, args, kwargs))
+        finally:
+            self._slots.release()
+
+    def stats(self):
+        return self._pool.stats()
+
+    async def close(self):
+        self._executor.shutdown(wait=True)
+        self._pool.close_all()
+
+
+class AsyncHospital:
+    # One coroutine method per registered operation, e.g. add_patient,
+    # book via add_appointment, add_service_usage, add_bill, search_patients
+    def __init__(self, pool=None, **pool_options):
+        self.pool = pool or AsyncPool(**pool_options)
+
+    async def call(self, operation, /, **params):
+        if operation not in operations.OPERATIONS:
+            return Result.failure("bad_request", f"Unknown operation '{operation}'.")
+        return await self.pool.run(operations.execute, operation, params)
+
+    def __getattr__(self, name):
+        if name not in operations.OPERATIONS:
+            raise AttributeError(name)
+        return functools.partial(self.call, name)
+
+    async def close(self):
+        await self.pool.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+        return False
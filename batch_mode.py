@@ -0,0 +1,162 @@
+import json
+import sys
+import time
+
+from db_config import connection, begin_write, ensure_schema, Error
+from id_allocator import allocator, format_id, parse_id
+import name_index
+import operations
+from operations import Result, Transaction
+import patient_totals
+import usage_journal
+
+# Non-interactive command mode: one JSON object per input line, e.g.
+#   {"op": "add_patient", "name": "Ann Lee", "age": 30, "gender": "F",
+#    "admission_date": "2024-05-01", "contact_no": "9876543210", "ref": "row-17"}
+# Commands run through operations.py on one shared connection, GROUP_SIZE per
+# transaction. Each command has its own savepoint, so a rejected command
+# does not undo the rest of its group. One JSON result line is written per
+# command, in input order, once its group has committed. Reads and searches
+# see the group's earlier commands; slot and service catalog lookups go
+# through caches that only see committed groups.
+
+GROUP_SIZE = 100
+
+ALIASES = {
+    "book_appointment": "add_appointment",
+    "create_bill": "add_bill",
+    "add_usage": "add_service_usage",
+}
+
+# Operations that generate an ID when none is given -> (parameter, sequence)
+GENERATED_IDS = {
+    "add_patient": ("patient_id", "patient"),
+    "add_doctor": ("doctor_id", "doctor"),
+    "add_service": ("service_id", "service"),
+    "add_appointment": ("appt_id", "appointment"),
+    "add_bill": ("bill_id", "bill"),
+}
+
+
+def parse_command(line):
+    # Returns (op, params, ref) or raises ValueError
+    try:
+        command = json.loads(line)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON: {e}") from None
+    if not isinstance(command, dict):
+        raise ValueError("Each line must be a JSON object.")
+    op = str(command.pop("op", command.pop("command", ""))).strip().lower().replace(" ", "_").replace("-", "_")
+    if not op:
+        raise ValueError("Missing 'op'.")
+    ref = command.pop("ref", None)
+    params = command.pop("args", None) or command
+    return ALIASES.get(op, op), params, ref
+
+
+def _assign_ids(commands):
+    # Reserve IDs for the whole group up front (one UPDATE per sequence).
+    # The allocator works on its own connection, which must not queue
+    # behind this group's write lock. Returns {sequence: highest explicit
+    # value} for IDs the commands supplied themselves.
+    wanted = {}
+    explicit = {}
+    for command in commands:
+        op, params = command[1], command[2]
+        if op in GENERATED_IDS and isinstance(params, dict):
+            param, sequence = GENERATED_IDS[op]
+            if not params.get(param):
+                wanted.setdefault(sequence, []).append((params, param))
+            else:
+                value = parse_id(sequence, params[param])
+                if value is not None and value > explicit.get(sequence, -1):
+                    explicit[sequence] = value
+    for sequence, targets in wanted.items():
+        start, _ = allocator.reserve_block(sequence, len(targets))
+        for offset, (params, param) in enumerate(targets):
+            params[param] = format_id(sequence, start + offset)
+    return explicit
+
+
+def _run_group(conn, commands):
+    # commands: [(line_no, op, params, ref, parse_error)]; returns result dicts
+    explicit_ids = _assign_ids([c for c in commands if c[4] is None])
+    results = []
+    tx = Transaction(conn)
+    try:
+        if any(c[1] in operations.READS_USAGE for c in commands):
+            # Before the group takes the write lock the flush needs
+            usage_journal.sync()
+        begin_write(conn)
+        for line_no, op, params, ref, parse_error in commands:
+            if parse_error:
+                result = Result.failure("bad_request", parse_error)
+            else:
+                tx.savepoint("cmd")
+                result = operations.run(tx, op, params)
+                if not result.ok:
+                    tx.rollback_to("cmd")
+                tx.release("cmd")
+            results.append(dict(result.to_dict(), line=line_no, op=op, ref=ref))
+        # Keep generated IDs clear of the ones the feed supplied
+        for sequence, value in explicit_ids.items():
+            allocator.ensure_at_least(conn, sequence, value + 1)
+        tx.commit()
+    except Error as e:
+        # The whole group is lost (e.g. deadlock or lost connection)
+        try:
+            tx.rollback()
+        except Error:
+            pass
+        results = [{"ok": False, "code": "db_error", "error": f"Group rolled back: {e}", "line": line_no,
+                    "op": op, "ref": ref} for line_no, op, params, ref, _ in commands]
+    finally:
+        tx.close()
+    return results
+
+
+def run_batch(lines, out=sys.stdout, group_size=GROUP_SIZE):
+    # Returns summary counts
+    ensure_schema()
+    patient_totals.prepare()
+    name_index.prepare()
+    started = time.perf_counter()
+    summary = {"commands": 0, "ok": 0, "failed": 0}
+    with connection() as conn:
+        group = []
+
+        def flush():
+            for result in _run_group(conn, group):
+                summary["ok" if result["ok"] else "failed"] += 1
+                out.write(json.dumps(result) + "\n")
+            out.flush()
+            group.clear()
+
+        for line_no, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            summary["commands"] += 1
+            try:
+                op, params, ref = parse_command(line)
+                group.append((line_no, op, params, ref, None))
+            except ValueError as e:
+                group.append((line_no, None, None, None, str(e)))
+            if len(group) >= group_size:
+                flush()
+        if group:
+            flush()
+    summary["elapsed"] = time.perf_counter() - started
+    summary["commands_per_sec"] = summary["commands"] / summary["elapsed"] if summary["elapsed"] else 0.0
+    return summary
+
+
+def main(path, group_size=None):
+    group_size = group_size or GROUP_SIZE
+    if path == "-":
+        summary = run_batch(sys.stdin, group_size=group_size)
+    else:
+        with open(path, encoding="utf-8") as f:
+            summary = run_batch(f, group_size=group_size)
+    print(f"{summary['commands']} commands: {summary['ok']} ok, {summary['failed']} failed in "
+          f"{summary['elapsed']:.2f}s ({summary['commands_per_sec']:,.0f}/s)", file=sys.stderr)
+    return 0 if summary["failed"] == 0 else 1
@@ -0,0 +1,443 @@
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+from db_config import configure_backend, connection, create_backend, get_backend
+from db_backends import MySQLBackend, SQLiteBackend
+from id_allocator import allocator, SEQUENCES
+import entity_cache
+import instrumentation
+import name_index
+import patient_totals
+from service_catalog import catalog
+
+from patient import Patient, generate_next_patient_id
+from doctor import Doctor, generate_next_doctor_id
+from service import Service, generate_next_service_id
+from appointment import Appointment, generate_next_appointment_id
+from billing import Bill, compute_total_billing, generate_next_bill_id
+
+# Benchmark suite. Seeds a database per scale (reused across runs), times
+# each public operation and writes ops/sec with p50/p95/p99 latencies as
+# JSON. --backend sqlite (default) keeps SQLite files in --data-dir;
+# --backend mysql creates hms_bench_<scale> databases on the HMS_MYSQL_*
+# server. --compare reports operations that got slower than a previous
+# results file from the same backend.
+
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+DATA_DIR = "bench_data"
+ITERATIONS = 200
+MAX_SECONDS = 10.0       # per operation, at least one iteration always runs
+SEED = 42
+SEED_CHUNK = 5000
+BACKENDS = ("sqlite", "mysql")
+
+FIRST_NAMES = ["Aarav", "Ananya", "Arjun", "Diya", "Ishaan", "Kavya", "Meera", "Nikhil", "Priya", "Rahul",
+               "Rohan", "Saanvi", "Sneha", "Tanvi", "Vihaan", "Aditi", "Karan", "Neha", "Pooja", "Vikram",
+               "John", "Mary", "James", "Linda", "David", "Sarah", "Ahmed", "Fatima", "Chen", "Maria"]
+LAST_NAMES = ["Sharma", "Verma", "Patel", "Gupta", "Reddy", "Iyer", "Nair", "Das", "Singh", "Khan",
+              "Mehta", "Joshi", "Kapoor", "Rao", "Bose", "Smith", "Brown", "Wilson", "Garcia", "Lee"]
+SPECIALIZATIONS = ["Cardiology", "Neurology", "Orthopedics", "Pediatrics", "Dermatology", "General Medicine",
+                   "Oncology", "Radiology", "Psychiatry", "ENT"]
+DIAGNOSES = ["Fever", "Hypertension", "Diabetes", "Fracture", "Migraine", "Asthma", "Allergy", "Infection"]
+SERVICE_NAMES = ["X-Ray", "MRI", "CT Scan", "Blood Test", "ECG", "Ultrasound", "Physiotherapy", "Dialysis",
+                 "Vaccination", "Dressing"]
+FIRST_DAY = datetime.date(2023, 1, 1)
+DAYS = 3 * 365
+
+
+# --- Seeding ---
+def proportions(patients):
+    return {
+        "patients": patients,
+        "doctors": max(20, patients // 200),
+        "services": 60,
+        "appointments": patients * 2,
+        "bills": patients // 2,
+    }
+
+
+def _day(rng):
+    return (FIRST_DAY + datetime.timedelta(days=rng.randrange(DAYS))).isoformat()
+
+
+def _phone(rng):
+    return str(rng.randrange(6_000_000_000, 9_999_999_999))
+
+
+def _person_name(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def _insert_rows(conn, table, columns, rows, after_insert=None):
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+    cursor = conn.cursor()
+    try:
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= SEED_CHUNK:
+                cursor.executemany(sql, chunk)
+                if after_insert:
+                    after_insert(cursor, chunk)
+                conn.commit()
+                chunk = []
+        if chunk:
+            cursor.executemany(sql, chunk)
+            if after_insert:
+                after_insert(cursor, chunk)
+            conn.commit()
+    finally:
+        cursor.close()
+
+
+def seed(counts, rng):
+    first_patient = SEQUENCES["patient"][4]
+    patient_ids = range(first_patient, first_patient + counts["patients"])
+    doctor_ids = [f"D{i:02d}" for i in range(1, counts["doctors"] + 1)]
+    service_ids = [f"S{i:02d}" for i in range(1, counts["services"] + 1)]
+    with connection() as conn:
+        _insert_rows(conn, "patients", ("patient_id", "name", "age", "gender", "admission_date", "contact_no"),
+                     ((pid, _person_name(rng), rng.randint(1, 99), rng.choice(("M", "F", "Other")), _day(rng),
+                       _phone(rng)) for pid in patient_ids),
+                     lambda cursor, chunk: name_index.index_many(cursor, "patient", ((r[0], r[1]) for r in chunk)))
+        _insert_rows(conn, "doctors", ("doctor_id", "name", "specialization", "contact_no"),
+                     ((did, "Dr. " + _person_name(rng), rng.choice(SPECIALIZATIONS), _phone(rng))
+                      for did in doctor_ids),
+                     lambda cursor, chunk: name_index.index_many(cursor, "doctor", ((r[0], r[1]) for r in chunk)))
+        _insert_rows(conn, "services", ("service_id", "service_name", "cost"),
+                     ((sid, f"{SERVICE_NAMES[i % len(SERVICE_NAMES)]} {i + 1}", rng.randint(100, 5000))
+                      for i, sid in enumerate(service_ids)))
+        _insert_rows(conn, "appointments",
+                     ("appt_id", "patient_id", "doctor_id", "date", "diagnosis", "consulting_charge"),
+                     ((f"A{i:03d}", rng.choice(patient_ids), rng.choice(doctor_ids), _day(rng),
+                       rng.choice(DIAGNOSES), rng.randint(200, 2000)) for i in range(1, counts["appointments"] + 1)))
+        bills = [(f"B{i:03d}", rng.choice(patient_ids), _day(rng)) for i in range(1, counts["bills"] + 1)]
+        _insert_rows(conn, "billing", ("bill_id", "patient_id", "total_amount", "billing_date"),
+                     ((bill_id, pid, 0, day) for bill_id, pid, day in bills))
+        _insert_rows(conn, "billed_services", ("bill_id", "patient_id", "service_id", "service_name", "cost"),
+                     ((bill_id, pid, sid, "Seeded", rng.randint(100, 5000))
+                      for bill_id, pid, _ in bills for sid in rng.sample(service_ids, 2)))
+        for name, key in (("patient", "patients"), ("doctor", "doctors"), ("service", "services"),
+                          ("appointment", "appointments"), ("bill", "bills")):
+            allocator.ensure_at_least(conn, name, SEQUENCES[name][4] + counts[key])
+        conn.commit()
+    patient_totals.rebuild()
+
+
+def _mysql_database(name, fresh):
+    # A database of its own on the configured MySQL server, so the benchmark
+    # never writes to the hospital's data. It is recreated unless a previous
+    # run finished seeding it (bench_seeded is created last).
+    backend = create_backend("mysql")
+    conn = MySQLBackend(**dict(backend.params, database=None)).connect()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT COUNT(*) FROM information_schema.tables WHERE table_schema=%s "
+                       "AND table_name='bench_seeded'", (name,))
+        seeded = cursor.fetchone()[0] > 0
+        if fresh or not seeded:
+            cursor.execute(f"DROP DATABASE IF EXISTS `{name}`")
+            cursor.execute(f"CREATE DATABASE `{name}`")
+            seeded = False
+    finally:
+        cursor.close()
+        conn.close()
+    backend.params["database"] = name
+    return backend, seeded
+
+
+def _sqlite_database(path, fresh):
+    marker = path + ".seeded"
+    if fresh or not os.path.exists(marker):
+        for suffix in ("", "-wal", "-shm", ".seeded"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    return SQLiteBackend(path), os.path.exists(marker)
+
+
+def _mark_seeded(counts, data_dir, scale):
+    if get_backend().name == "mysql":
+        with connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("CREATE TABLE bench_seeded (counts VARCHAR(255))")
+            cursor.execute("INSERT INTO bench_seeded (counts) VALUES (%s)", (json.dumps(counts),))
+            conn.commit()
+            cursor.close()
+    else:
+        with open(os.path.join(data_dir, f"hms_bench_{scale}.db.seeded"), "w") as f:
+            f.write(json.dumps(counts))
+
+
+def open_database(scale, data_dir, fresh, rng, backend="sqlite"):
+    # Makes the scale's benchmark database current, seeding it if needed;
+    # returns (where it is, seconds spent seeding or None)
+    data_dir = os.path.abspath(data_dir)
+    os.makedirs(data_dir, exist_ok=True)
+    if backend == "mysql":
+        engine, seeded = _mysql_database(f"hms_bench_{scale}", fresh)
+    else:
+        engine, seeded = _sqlite_database(os.path.join(data_dir, f"hms_bench_{scale}.db"), fresh)
+    configure_backend(engine)
+    allocator.reset()
+    entity_cache.patients.clear()
+    entity_cache.doctors.clear()
+    catalog.invalidate()
+    seeded_in = None
+    if not seeded:
+        started = time.perf_counter()
+        seed(proportions(scale), rng)
+        seeded_in = time.perf_counter() - started
+        _mark_seeded(proportions(scale), data_dir, scale)
+    return repr(engine), seeded_in
+
+
+# --- Timing ---
+def percentile(sorted_values, pct):
+    # Nearest-rank percentile
+    if not sorted_values:
+        return None
+    rank = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[rank]
+
+
+def summarize(name, scale, timings):
+    timings = sorted(timings)
+    total = sum(timings)
+    ms = lambda v: round(v * 1000, 4)
+    return {
+        "op": name,
+        "scale": scale,
+        "iterations": len(timings),
+        "total_s": round(total, 6),
+        "ops_per_sec": round(len(timings) / total, 3) if total else None,
+        "min_ms": ms(timings[0]),
+        "p50_ms": ms(percentile(timings, 50)),
+        "p95_ms": ms(percentile(timings, 95)),
+        "p99_ms": ms(percentile(timings, 99)),
+        "max_ms": ms(timings[-1]),
+    }
+
+
+def run_op(fn, setup=None, iterations=ITERATIONS, max_seconds=MAX_SECONDS, warmup=1):
+    # fn(*setup()) is timed; setup runs outside the timed region
+    timings = []
+    sink = io.StringIO()
+    deadline = None
+    for i in range(warmup + iterations):
+        args = setup() if setup else ()
+        with contextlib.redirect_stdout(sink):
+            started = time.perf_counter()
+            fn(*args)
+            elapsed = time.perf_counter() - started
+        sink.seek(0)
+        sink.truncate()
+        if i < warmup:
+            deadline = time.perf_counter() + max_seconds
+            continue
+        timings.append(elapsed)
+        if time.perf_counter() >= deadline:
+            break
+    return timings
+
+
+# --- Operations ---
+def operations(counts, rng, workdir):
+    first_patient = SEQUENCES["patient"][4]
+    patient_id = lambda: str(first_patient + rng.randrange(counts["patients"]))
+    bill_no = lambda: f"B{rng.randint(1, counts['bills']):03d}"
+    service_ids = [f"S{i:02d}" for i in range(1, counts["services"] + 1)]
+
+    def new_patient():
+        return (Patient(generate_next_patient_id(), _person_name(rng), rng.randint(1, 99), "F", _day(rng),
+                        _phone(rng)),)
+
+    def pending_bill():
+        pid = patient_id()
+        with connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(
+                "INSERT INTO temp_service_usage (patient_id, service_id, service_name, cost) VALUES (%s, %s, %s, %s)",
+                [(pid, sid, "Seeded", 500) for sid in rng.sample(service_ids, 3)])
+            patient_totals.adjust(cursor, pid, pending=1500)
+            conn.commit()
+            cursor.close()
+        return (Bill(generate_next_bill_id(), pid),)
+
+    def existing_bill():
+        bill_id = bill_no()
+        with connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT bill_id, patient_id, billing_date FROM billing WHERE bill_id=%s", (bill_id,))
+            row = cursor.fetchone()
+            cursor.close()
+        return (Bill(row[0], row[1], row[2]),)
+
+    def week():
+        start = FIRST_DAY + datetime.timedelta(days=rng.randrange(DAYS - 7))
+        return start.isoformat(), (start + datetime.timedelta(days=6)).isoformat()
+
+    def search_term(names):
+        name = rng.choice(names)
+        return (name[:rng.randint(3, len(name))].lower(),)
+
+    export_path = lambda name: os.path.join(workdir, name)
+    full_table = max(1, ITERATIONS // 20)     # whole-table scans run fewer times
+
+    # name -> (callable, setup, iterations)
+    return [
+        ("Patient.add", lambda p: p.add(), new_patient, ITERATIONS),
+        ("Patient.view", Patient.view, None, full_table),
+        ("Patient.view_page", Patient.view_page, None, ITERATIONS),
+        ("Doctor.view", Doctor.view, None, full_table),
+        ("Service.view", Service.view, None, ITERATIONS),
+        ("Appointment.view", Appointment.view, None, full_table),
+        ("Bill.view", Bill.view, None, full_table),
+        ("Patient.search_by_name", Patient.search_by_name, lambda: search_term(FIRST_NAMES + LAST_NAMES),
+         ITERATIONS),
+        ("Doctor.search_by_name", Doctor.search_by_name, lambda: search_term(LAST_NAMES), ITERATIONS),
+        ("Appointment.filter_appointments", Appointment.filter_appointments, week, ITERATIONS),
+        ("Appointment.days_between_appointments", Appointment.days_between_appointments,
+         lambda: (patient_id(),), ITERATIONS),
+        ("compute_total_billing", compute_total_billing, lambda: (patient_id(),), ITERATIONS),
+        ("Bill.add", lambda b: b.add(), pending_bill, ITERATIONS),
+        ("Bill.generate_invoice", lambda b: b.generate_invoice(), existing_bill, ITERATIONS),
+        ("Bill.export_billing_summary_to_csv",
+         lambda: Bill.export_billing_summary_to_csv(export_path("billing_summary.csv")), None, full_table),
+        ("Appointment.export_appointment_summary_to_csv",
+         lambda: Appointment.export_appointment_summary_to_csv(export_path("appointment_summary.csv")), None,
+         full_table),
+        ("generate_next_patient_id", generate_next_patient_id, None, ITERATIONS),
+        ("generate_next_doctor_id", generate_next_doctor_id, None, ITERATIONS),
+        ("generate_next_service_id", generate_next_service_id, None, ITERATIONS),
+        ("generate_next_appointment_id", generate_next_appointment_id, None, ITERATIONS),
+        ("generate_next_bill_id", generate_next_bill_id, None, ITERATIONS),
+    ]
+
+
+def run_scale(scale, data_dir, fresh, only, max_seconds, iteration_factor, backend="sqlite"):
+    rng = random.Random(SEED)
+    database, seeded_in = open_database(scale, data_dir, fresh, rng, backend)
+    counts = proportions(scale)
+    workdir = os.path.join(os.path.abspath(data_dir), f"work_{scale}")
+    os.makedirs(workdir, exist_ok=True)
+    results = []
+    # Invoices are written relative to the working directory
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        for name, fn, setup, iterations in operations(counts, rng, workdir):
+            if only and not any(o.lower() in name.lower() for o in only):
+                continue
+            iterations = max(1, int(iterations * iteration_factor))
+            result = summarize(name, scale, run_op(fn, setup, iterations, max_seconds))
+            print(f"  {name:<48} {result['ops_per_sec']:>12,.1f} ops/s   p50 {result['p50_ms']:>9.3f} ms"
+                  f"   p99 {result['p99_ms']:>9.3f} ms", file=sys.stderr)
+            results.append(result)
+    finally:
+        os.chdir(cwd)
+    return {"scale": scale, "backend": get_backend().name, "counts": counts, "database": database,
+            "seed_seconds": seeded_in, "results": results}
+
+
+# --- Reporting ---
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline, threshold):
+    # Returns [(scale, op, baseline p50, current p50)] for ops whose p50 grew
+    # by more than threshold (a fraction). Raises ValueError if the two were
+    # measured on different backends.
+    if current.get("backend") != baseline.get("backend"):
+        raise ValueError(f"Cannot compare {current.get('backend')} results with {baseline.get('backend')} results.")
+    previous = {(r["scale"], r["op"]): r for run in baseline["runs"] for r in run["results"]}
+    regressions = []
+    for run in current["runs"]:
+        for r in run["results"]:
+            old = previous.get((r["scale"], r["op"]))
+            if old and old["p50_ms"] and r["p50_ms"] > old["p50_ms"] * (1 + threshold):
+                regressions.append((r["scale"], r["op"], old["p50_ms"], r["p50_ms"]))
+    return regressions
+
+
+def parse_scale(text):
+    text = text.lower()
+    if text in SCALES:
+        return SCALES[text]
+    if text.isdigit() and int(text) > 0:
+        return int(text)
+    raise argparse.ArgumentTypeError(f"Unknown scale '{text}' (use 10k, 100k, 1m or a patient count).")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the hospital management operations.")
+    parser.add_argument("--scale", type=parse_scale, action="append",
+                        help="patients to seed: 10k, 100k, 1m or a number (repeatable, default 10k)")
+    parser.add_argument("--backend", choices=BACKENDS, default="sqlite",
+                        help="database engine to benchmark (mysql uses the HMS_MYSQL_* server)")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="where seeded databases are kept")
+    parser.add_argument("--fresh", action="store_true", help="re-seed even if a database exists")
+    parser.add_argument("--only", nargs="+", help="run operations whose name contains any of these")
+    parser.add_argument("--max-seconds", type=float, default=MAX_SECONDS, help="time budget per operation")
+    parser.add_argument("--iterations", type=float, default=1.0, help="multiplier for iteration counts")
+    parser.add_argument("--output", help="write JSON results to this file (default: stdout)")
+    parser.add_argument("--compare", help="previous results file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="p50 slowdown that counts as a regression (default 0.2 = 20%%)")
+    args = parser.parse_args(argv)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("backend") != args.backend:
+            print(f"{args.compare} was measured on {baseline.get('backend')}, not {args.backend}; "
+                  f"not comparing.", file=sys.stderr)
+            return 2
+
+    report = {
+        "generated_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "backend": args.backend,
+        "query_stats": instrumentation.ENABLED,
+        "runs": [],
+    }
+    for scale in args.scale or [SCALES["10k"]]:
+        print(f"Scale {scale:,} patients", file=sys.stderr)
+        report["runs"].append(run_scale(scale, args.data_dir, args.fresh, args.only, args.max_seconds,
+                                        args.iterations, args.backend))
+    # The engine that actually ran them
+    report["backend"] = get_backend().name
+
+    text = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if baseline is not None:
+        regressions = compare(report, baseline, args.threshold)
+        for scale, op, old, new in regressions:
+            print(f"REGRESSION {op} @ {scale:,}: p50 {old:.3f} ms -> {new:.3f} ms", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,19 @@
-from db_config import get_connection
+from db_config import get_connection, begin_write, lock_clause, IntegrityError, Error
+from id_allocator import next_id
+from pagination import PAGE_SIZE, fetch_page, iter_rows, print_rows
 from service import ServiceUsageDB
-import re
+from validators import validate_bill, BILL
+import csv_export
+import entity_cache
+import patient_totals
+import usage_journal
 import datetime
-import csv
 import os
 
-import mysql.connector
-from mysql.connector import IntegrityError, Error
 
 class Bill:
+    __slots__ = ("bill_id", "patient_id", "billing_date")
+
     def __init__(self, bill_id, patient_id, billing_date=None):
         self.bill_id = bill_id
         self.patient_id = patient_id
@@ -16,88 +21,91 @@ class Bill:
 
     def add(self):
         # Data validation
-        if not self.bill_id or not isinstance(self.bill_id, str) or not re.match(r'^[A-Za-z0-9]+$', self.bill_id):
-            print("Invalid Bill ID. It must be alphanumeric (no spaces or special characters).")
-            return
-
-        if not self.patient_id or not isinstance(self.patient_id, str) or not re.match(r'^[A-Za-z0-9]+$', self.patient_id):
-            print("Invalid Patient ID. It must be alphanumeric (no spaces or special characters).")
-            return
-
+        error = validate_bill(self.bill_id, self.patient_id, self.billing_date)
+        if error:
+            print(error)
+            return False
+
+        # One transaction: lock the pending usage rows, insert the bill and
+        # its line items, then delete exactly the rows that were billed.
+        # The number of round trips does not depend on the number of services.
         try:
-            datetime.datetime.strptime(self.billing_date, "%Y-%m-%d")
-        except ValueError:
-            print("Invalid Billing Date. Use YYYY-MM-DD format.")
-            return
-
-        # Fetch all services used by this patient from temp_service_usage
-        services = ServiceUsageDB.get_services_for_patient(self.patient_id)
-        print("DEBUG: Services fetched from temp_service_usage:", services)
-        if not services:
-            print("No services to bill for this patient.")
-            return
-
-        # Calculate total amount
-        total_amount = sum(float(s[2]) for s in services)  # s[2] is cost
+            # Check patient exists (cached; the foreign key still guards
+            # against a patient deleted by another process)
+            if entity_cache.patients.get(self.patient_id) is None:
+                print("Patient ID does not exist.")
+                return False
 
-        try:
+            # Usage still queued in the write-behind journal is billed too
+            usage_journal.sync()
+            patient_totals.prepare()
             conn = get_connection()
+            begin_write(conn)
             cursor = conn.cursor()
-            # Check patient exists
-            cursor.execute("SELECT 1 FROM patients WHERE patient_id=%s", (self.patient_id,))
-            if cursor.fetchone() is None:
-                print("Patient ID does not exist.")
-                return
+            # Fetch (and lock) all services used by this patient
+            cursor.execute(
+                "SELECT id, service_id, service_name, cost FROM temp_service_usage WHERE patient_id=%s" + lock_clause(),
+                (self.patient_id,)
+            )
+            services = cursor.fetchall()
+            if not services:
+                print("No services to bill for this patient.")
+                conn.rollback()
+                return False
+
+            # Calculate total amount
+            total_amount = sum(float(s[3]) for s in services)  # s[3] is cost
 
             # Insert bill
             sql = "INSERT INTO billing (bill_id, patient_id, total_amount, billing_date) VALUES (%s, %s, %s, %s)"
             try:
                 cursor.execute(sql, (self.bill_id, self.patient_id, total_amount, self.billing_date))
-            except IntegrityError:
-                print(f"Error: Duplicate Bill ID '{self.bill_id}'. Please use a unique ID.")
-                return
-
-            # Insert service details into billed_services
-            for s in services:
-                try:
-                    cursor.execute(
-                        "INSERT INTO billed_services (bill_id, patient_id, service_id, service_name, cost) VALUES (%s, %s, %s, %s, %s)",
-                        (self.bill_id, self.patient_id, s[0], s[1], s[2])
-                    )
-                except IntegrityError:
-                    print(f"Error: Duplicate service entry for bill {self.bill_id} and service {s[0]}. Skipping.")
+            except IntegrityError as e:
+                conn.rollback()
+                if "foreign key" in str(e).lower():
+                    entity_cache.patients.invalidate(self.patient_id)
+                    print("Patient ID does not exist.")
+                else:
+                    print(f"Error: Duplicate Bill ID '{self.bill_id}'. Please use a unique ID.")
+                return False
+
+            # Insert service details into billed_services in one batch
+            cursor.executemany(
+                "INSERT INTO billed_services (bill_id, patient_id, service_id, service_name, cost) VALUES (%s, %s, %s, %s, %s)",
+                [(self.bill_id, self.patient_id, s[1], s[2], s[3]) for s in services]
+            )
+
+            # Clear the billed usage rows in the same transaction
+            usage_ids = [s[0] for s in services]
+            cursor.execute(
+                f"DELETE FROM temp_service_usage WHERE id IN ({', '.join(['%s'] * len(usage_ids))})",
+                usage_ids
+            )
+            patient_totals.adjust(cursor, self.patient_id, pending=-total_amount, billed=total_amount)
             conn.commit()
             print(f"Bill added successfully. Total amount: {total_amount}")
             print("Billed services recorded.")
+            return True
+        except IntegrityError as e:
+            if 'conn' in locals(): conn.rollback()
+            print("Database integrity error while adding bill:", e)
+            return False
         except Error as e:
             print("Database error while adding bill:", e)
+            return False
         except Exception as e:
             print("Unexpected error while adding bill:", e)
+            return False
         finally:
             if 'cursor' in locals(): cursor.close()
             if 'conn' in locals(): conn.close()
 
-        # Clear temp service usage for this patient
-        try:
-            ServiceUsageDB.clear_services_for_patient(self.patient_id)
-        except Exception as e:
-            print("Error clearing temp service usage:", e)
-
 
     def update(self):
         # Data validation (same as add)
-        if not self.bill_id or not isinstance(self.bill_id, str) or not re.match(r'^[A-Za-z0-9]+$', self.bill_id):
-            print("Invalid Bill ID. It must be alphanumeric (no spaces or special characters).")
-            return
-
-        if not self.patient_id or not isinstance(self.patient_id, str) or not re.match(r'^[A-Za-z0-9]+$', self.patient_id):
-            print("Invalid Patient ID. It must be alphanumeric (no spaces or special characters).")
-            return
-
-        try:
-            datetime.datetime.strptime(self.billing_date, "%Y-%m-%d")
-        except ValueError:
-            print("Invalid Billing Date. Use YYYY-MM-DD format.")
+        error = validate_bill(self.bill_id, self.patient_id, self.billing_date)
+        if error:
+            print(error)
             return
 
         # Fetch all services used by this patient from temp_service_usage
@@ -110,7 +118,9 @@ class Bill:
         total_amount = sum(float(s[2]) for s in services)  # s[2] is cost
 
         try:
+            patient_totals.prepare()
             conn = get_connection()
+            begin_write(conn)
             cursor = conn.cursor()
             # Check patient exists
             cursor.execute("SELECT 1 FROM patients WHERE patient_id=%s", (self.patient_id,))
@@ -118,11 +128,14 @@ class Bill:
                 print("Patient ID does not exist.")
                 return
 
-            # Update bill
+            # Update bill, moving its amount in the billed-to-date totals
+            old = patient_totals.locked_row(cursor, "billing", "bill_id", self.bill_id, "patient_id, total_amount")
             sql = "UPDATE billing SET patient_id=%s, total_amount=%s, billing_date=%s WHERE bill_id=%s"
             cursor.execute(sql, (self.patient_id, total_amount, self.billing_date, self.bill_id))
+            if old:
+                patient_totals.move(cursor, old[0], self.patient_id, "billed", old[1], total_amount)
             conn.commit()
-            if cursor.rowcount == 0:
+            if old is None:
                 print("Bill ID not found.")
             else:
                 print("Bill updated successfully. Total amount:", total_amount)
@@ -142,17 +155,23 @@ class Bill:
 
     @staticmethod
     def delete(bill_id):
-        if not bill_id or not isinstance(bill_id, str) or not re.match(r'^[A-Za-z0-9]+$', bill_id):
-            print("Invalid Bill ID. It must be alphanumeric (no spaces or special characters).")
+        error = BILL["bill_id"].check(bill_id)[1]
+        if error:
+            print(error)
             return
 
         try:
+            patient_totals.prepare()
             conn = get_connection()
+            begin_write(conn)
             cursor = conn.cursor()
+            old = patient_totals.locked_row(cursor, "billing", "bill_id", bill_id, "patient_id, total_amount")
             sql = "DELETE FROM billing WHERE bill_id=%s"
             cursor.execute(sql, (bill_id,))
+            if old:
+                patient_totals.move(cursor, old[0], None, "billed", old[1], 0)
             conn.commit()
-            if cursor.rowcount == 0:
+            if old is None:
                 print("Bill ID not found.")
             else:
                 print("Bill deleted successfully.")
@@ -166,40 +185,48 @@ class Bill:
 
     @staticmethod
     def view():
+        # Streams the whole table in primary-key order, a chunk at a time
         try:
-            conn = get_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM billing")
-            rows = cursor.fetchall()
             print("ID | Patient ID | Total Amount | Billing Date")
-            for row in rows:
+            for row in iter_rows("billing", "bill_id"):
                 print(" | ".join(str(x) for x in row))
         except Error as e:
             print("Database error while viewing bills:", e)
         except Exception as e:
             print("Unexpected error while viewing bills:", e)
-        finally:
-            if 'cursor' in locals(): cursor.close()
-            if 'conn' in locals(): conn.close()
+
+    @staticmethod
+    def view_page(after=None, page_size=PAGE_SIZE):
+        # Prints one page; returns the key to continue after (None on the last page)
+        try:
+            rows, next_key = fetch_page("billing", "bill_id", after, page_size)
+            print_rows("ID | Patient ID | Total Amount | Billing Date", rows)
+            return next_key
+        except Error as e:
+            print("Database error while viewing bills:", e)
+        except Exception as e:
+            print("Unexpected error while viewing bills:", e)
+        return None
 
 
     def generate_invoice(self):
         conn = get_connection()
         cursor = conn.cursor(dictionary=True)
         try:
-            # 1. Fetch patient details
-            cursor.execute("SELECT * FROM patients WHERE patient_id = %s", (self.patient_id,))
-            patient = cursor.fetchone()
+            # 1. Patient details (cached)
+            patient = entity_cache.patients.get(self.patient_id)
 
-            # 2. Fetch doctor and latest appointment details
+            # 2. Latest appointment, with the doctor from the cache
             cursor.execute("""
-                SELECT a.date, d.name AS doctor_name, d.specialization, a.consulting_charge
+                SELECT a.date, a.doctor_id, a.consulting_charge
                 FROM appointments a
-                JOIN doctors d ON a.doctor_id = d.doctor_id
-                WHERE a.patient_id = %s
+                WHERE a.patient_id = %s AND a.doctor_id IS NOT NULL
                 ORDER BY a.date DESC LIMIT 1
             """, (self.patient_id,))
             appt = cursor.fetchone()
+            doctor = entity_cache.doctors.get(appt['doctor_id']) if appt else None
+            appt = {'date': appt['date'], 'doctor_name': doctor[1], 'specialization': doctor[2],
+                    'consulting_charge': appt['consulting_charge']} if doctor else None
 
             # 3. Fetch services used from billed_services
             cursor.execute("""
@@ -211,52 +238,15 @@ class Bill:
             services = cursor.fetchall()
 
             # 4. Prepare invoice content
-            lines = []
-            lines.append("="*60)
-            lines.append("                        HOSPITAL INVOICE")
-            lines.append("="*60)
-            lines.append(f"Bill No.    : {self.bill_id:<15}   Date: {self.billing_date}")
-            lines.append(f"Patient ID  : {self.patient_id:<15}   Name: {patient['name'] if patient else 'N/A'}")
-            lines.append("-"*60)
-            if appt:
-                lines.append(f"Doctor      : {appt['doctor_name']} ({appt['specialization']})")
-                lines.append(f"Consultation Charge: ₹{float(appt['consulting_charge']):,.2f}")
-            else:
-                lines.append("Doctor      : N/A")
-                lines.append("Consultation Charge: ₹0.00")
-                
-            lines.append("-"*60)
-            lines.append(f"{'Service Name':30} {'Amount':>15}")
-            lines.append("-"*60)
-
-            service_total = 0
-            if services:
-                for s in services:
-                    # If you have quantity and unit price, use them; else just cost
-                    lines.append(f"{s['service_name'][:30]:30} {float(s['cost']):>15,.2f}")
-                    service_total += float(s['cost'])
-            else:
-                lines.append(f"{'No services billed.':<57}")
-
-            lines.append("-"*60)
-            lines.append(f"{'Service Total':>47} : ₹{service_total:,.2f}")
-            consulting_charge = float(appt['consulting_charge']) if appt else 0.0
-            lines.append(f"{'Consultation Charge':>47} : ₹{consulting_charge:,.2f}")
-            lines.append("-"*60)
-            total = service_total + consulting_charge
-            lines.append(f"{'TOTAL AMOUNT DUE':>47} : ₹{total:,.2f}")
-            lines.append("="*60)
-            lines.append("Payment due within 30 days. For queries, call (123) 456-7890")
-            lines.append("="*60)
-            lines.append("        Thank you for choosing our Hospital!")
-            lines.append("="*60)
-            
+            lines = render_invoice(self.bill_id, self.billing_date, self.patient_id,
+                                   patient[1] if patient else None, appt, services)
+
             # 5. Ensure output/invoices directory exists
             output_dir = os.path.join("output", "invoices")
             os.makedirs(output_dir, exist_ok=True)
 
             # 6. Write to file
-            filename = os.path.join(output_dir, f"bill_{self.patient_id}.txt")
+            filename = invoice_path(output_dir, self.bill_id)
             with open(filename, "w", encoding="utf-8") as f:
                 f.write('\n'.join(lines))
             print(f"Invoice generated and saved as {filename}")
@@ -270,49 +260,89 @@ class Bill:
             if 'conn' in locals(): conn.close()
 
     @staticmethod
-    def export_billing_summary_to_csv(filename="billing_summary.csv"):
-        conn = get_connection()
-        cursor = conn.cursor()
+    def export_billing_summary_to_csv(filename="billing_summary.csv", columns=None, start_date=None,
+                                      end_date=None, patient_id=None, compress=None):
+        # Streams rows in chunks; a ".gz" filename (or compress=True) gzips the output
         try:
-            cursor.execute("SELECT bill_id, patient_id, total_amount, billing_date FROM billing")
-            rows = cursor.fetchall()
-            if not rows:
-                print("No billing records to export.")
-                return
-            with open(filename, "w", newline="") as csvfile:
-                writer = csv.writer(csvfile)
-                writer.writerow(["Bill ID", "Patient ID", "Total Amount", "Billing Date"])
-                for row in rows:
-                    writer.writerow(row)
-            print(f"Billing summary exported to {filename}")
+            count = csv_export.export(csv_export.BILLING_EXPORT, filename, columns, start_date, end_date,
+                                      compress, patient_id=patient_id)
+        except ValueError as e:
+            print(e)
+            return 0
         except Exception as e:
             print("Error exporting billing summary:", e)
-        finally:
-            cursor.close()
-            conn.close()
+            return 0
+        if not count:
+            print("No billing records to export.")
+        else:
+            print(f"Billing summary exported to {filename} ({count} rows)")
+        return count
+
+def invoice_path(output_dir, bill_id):
+    # One file per bill, named the same by Bill.generate_invoice and invoice_batch
+    return os.path.join(output_dir, f"bill_{bill_id}.txt")
+
+
+def render_invoice(bill_id, billing_date, patient_id, patient_name, appt, services):
+    # appt: dict with doctor_name, specialization, consulting_charge (or None)
+    # services: list of dicts with service_name and cost
+    lines = []
+    lines.append("="*60)
+    lines.append("                        HOSPITAL INVOICE")
+    lines.append("="*60)
+    lines.append(f"Bill No.    : {bill_id:<15}   Date: {billing_date}")
+    lines.append(f"Patient ID  : {patient_id:<15}   Name: {patient_name or 'N/A'}")
+    lines.append("-"*60)
+    if appt:
+        lines.append(f"Doctor      : {appt['doctor_name']} ({appt['specialization']})")
+        lines.append(f"Consultation Charge: ₹{float(appt['consulting_charge']):,.2f}")
+    else:
+        lines.append("Doctor      : N/A")
+        lines.append("Consultation Charge: ₹0.00")
+
+    lines.append("-"*60)
+    lines.append(f"{'Service Name':30} {'Amount':>15}")
+    lines.append("-"*60)
+
+    service_total = 0
+    if services:
+        for s in services:
+            # If you have quantity and unit price, use them; else just cost
+            lines.append(f"{s['service_name'][:30]:30} {float(s['cost']):>15,.2f}")
+            service_total += float(s['cost'])
+    else:
+        lines.append(f"{'No services billed.':<57}")
+
+    lines.append("-"*60)
+    lines.append(f"{'Service Total':>47} : ₹{service_total:,.2f}")
+    consulting_charge = float(appt['consulting_charge']) if appt else 0.0
+    lines.append(f"{'Consultation Charge':>47} : ₹{consulting_charge:,.2f}")
+    lines.append("-"*60)
+    total = service_total + consulting_charge
+    lines.append(f"{'TOTAL AMOUNT DUE':>47} : ₹{total:,.2f}")
+    lines.append("="*60)
+    lines.append("Payment due within 30 days. For queries, call (123) 456-7890")
+    lines.append("="*60)
+    lines.append("        Thank you for choosing our Hospital!")
+    lines.append("="*60)
+    return lines
 
 def compute_total_billing(patient_id):
     try:
+        # One primary-key read of the running totals (patient_totals.py)
+        usage_journal.sync()
+        patient_totals.prepare()
         conn = get_connection()
         cursor = conn.cursor()
-        # Sum service costs
-        cursor.execute(
-            "SELECT COALESCE(SUM(cost), 0) FROM temp_service_usage WHERE patient_id=%s",
-            (patient_id,)
-        )
-        service_total = cursor.fetchone()[0] or 0
-
-        # Sum consulting charges
-        cursor.execute(
-            "SELECT COALESCE(SUM(consulting_charge), 0) FROM appointments WHERE patient_id=%s",
-            (patient_id,)
-        )
-        consulting_total = cursor.fetchone()[0] or 0
+        totals = patient_totals.read(cursor, patient_id)
+        service_total = totals["pending_services"]
+        consulting_total = totals["consulting"]
 
         total_billing = service_total + consulting_total
         print(f"Service Total: {service_total}")
         print(f"Consulting Total: {consulting_total}")
         print(f"Total Billing: {total_billing}")
+        print(f"Billed to Date: {totals['billed']}")
         return total_billing
     except Error as e:
         print("Database error while computing total billing:", e)
@@ -325,20 +355,4 @@ def compute_total_billing(patient_id):
         if 'conn' in locals(): conn.close()
 
 def generate_next_bill_id():
-    from db_config import get_connection
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT bill_id FROM billing WHERE bill_id REGEXP '^B[0-9]+$'")
-    bill_ids = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    # Extract numeric part and find max
-    max_num = 0
-    for (bill_id,) in bill_ids:
-        try:
-            num = int(bill_id[1:])  # skip 'B'
-            if num > max_num:
-                max_num = num
-        except:
-            continue
-    return f'B{max_num+1:03d}'  # e.g., B301 if max was 300
+    return next_id("bill")  # e.g., B301 if max was 300
@@ -0,0 +1,316 @@
+import argparse
+import csv
+import os
+import time
+
+from db_config import connection, IntegrityError, Error
+from id_allocator import allocator, parse_id
+import name_index
+import patient_totals
+from validators import (
+    PATIENT, DOCTOR, SERVICE, APPOINTMENT, BILL, CONSULTING_CHARGE, TOTAL_AMOUNT, Pattern, format_doctor_name,
+)
+
+# Bulk loader for the *_dataset.csv files. Files are streamed a batch at a
+# time; each batch is validated column by column against the entity schema
+# (the same rules as the entity add() methods) and written with multi-row
+# INSERTs, committing every few batches.
+
+BATCH_SIZE = 500
+COMMIT_EVERY = 10       # batches per transaction
+
+
+# --- Import schemas: the entity rules plus the CSV's key columns ---
+_NON_EMPTY = r'(?s).+'
+
+PATIENT_IMPORT = PATIENT.extend("patient_import", [Pattern("patient_id", r'\d+', "Invalid Patient ID.")])
+DOCTOR_IMPORT = DOCTOR.extend("doctor_import", [Pattern("doctor_id", _NON_EMPTY, "Invalid Doctor ID.")])
+SERVICE_IMPORT = SERVICE.extend("service_import", [Pattern("service_id", _NON_EMPTY, "Invalid Service ID.")])
+APPOINTMENT_IMPORT = APPOINTMENT.extend("appointment_import", [
+    CONSULTING_CHARGE, Pattern("appt_id", _NON_EMPTY, "Invalid Appointment ID.")])
+BILL_IMPORT = BILL.extend("bill_import", [TOTAL_AMOUNT, Pattern("patient_id", r'\d+', "Invalid Patient ID.")])
+
+
+# --- Row normalization (before validation) and conversion (after) ---
+def _normalize_doctor(row):
+    if row.get('name') is not None:
+        row['name'] = format_doctor_name(row['name'])
+
+
+def _normalize_appointment(row):
+    row['consulting_charge'] = row.get('consulting_charge') or 0
+
+
+def _patient_values(row):
+    return (int(row['patient_id']), row['name'], int(row['age']), row['gender'],
+            row['admission_date'], row['contact_no'])
+
+
+def _doctor_values(row):
+    return row['doctor_id'], row['name'], row['specialization'], row['contact_no']
+
+
+def _service_values(row):
+    return row['service_id'], row['service_name'], float(row['cost'])
+
+
+def _appointment_values(row):
+    return (row['appt_id'], int(row['patient_id']), row['doctor_id'], row['date'],
+            row['diagnosis'], float(row['consulting_charge']))
+
+
+def _bill_values(row):
+    return row['bill_id'], int(row['patient_id']), float(row['total_amount']), row['billing_date']
+
+
+class Dataset:
+    def __init__(self, name, filename, table, columns, key, schema, values, sequence, parents=(), after_insert=None,
+                 normalize=None):
+        self.name = name
+        self.filename = filename
+        self.table = table
+        self.columns = columns
+        self.key = key                  # primary key column
+        self.schema = schema            # validates a batch of CSV rows
+        self.values = values            # valid CSV row -> tuple in column order
+        self.normalize = normalize      # fixes up a CSV row in place before validation
+        self.sequence = sequence        # id_allocator sequence for the key
+        self.parents = parents          # (column, parent dataset name)
+        self.after_insert = after_insert  # called with the inserted rows, same transaction
+
+
+# Listed in foreign-key dependency order
+DATASETS = [
+    Dataset("patients", "patients_dataset.csv", "patients",
+            ("patient_id", "name", "age", "gender", "admission_date", "contact_no"),
+            "patient_id", PATIENT_IMPORT, _patient_values, "patient",
+            after_insert=lambda cursor, rows: name_index.index_many(cursor, "patient", (r[:2] for r in rows))),
+    Dataset("doctors", "doctors_dataset.csv", "doctors",
+            ("doctor_id", "name", "specialization", "contact_no"),
+            "doctor_id", DOCTOR_IMPORT, _doctor_values, "doctor",
+            after_insert=lambda cursor, rows: name_index.index_many(cursor, "doctor", (r[:2] for r in rows)),
+            normalize=_normalize_doctor),
+    Dataset("services", "services_dataset.csv", "services",
+            ("service_id", "service_name", "cost"),
+            "service_id", SERVICE_IMPORT, _service_values, "service"),
+    Dataset("appointments", "appointments_dataset.csv", "appointments",
+            ("appt_id", "patient_id", "doctor_id", "date", "diagnosis", "consulting_charge"),
+            "appt_id", APPOINTMENT_IMPORT, _appointment_values, "appointment",
+            parents=(("patient_id", "patients"), ("doctor_id", "doctors")), normalize=_normalize_appointment),
+    Dataset("billing", "billing_dataset.csv", "billing",
+            ("bill_id", "patient_id", "total_amount", "billing_date"),
+            "bill_id", BILL_IMPORT, _bill_values, "bill",
+            parents=(("patient_id", "patients"),)),
+]
+
+
+class LoadStats:
+    def __init__(self, name):
+        self.name = name
+        self.read = 0
+        self.loaded = 0
+        self.rejected = 0
+        self.elapsed = 0.0
+
+    def __str__(self):
+        rate = self.loaded / self.elapsed if self.elapsed else 0
+        return (f"{self.name:<13} read={self.read:<9} loaded={self.loaded:<9} "
+                f"rejected={self.rejected:<7} {self.elapsed:8.2f}s {rate:12,.0f} rows/s")
+
+
+class BulkLoader:
+    def __init__(self, conn, batch_size=BATCH_SIZE, commit_every=COMMIT_EVERY, rejects_writer=None):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.commit_every = commit_every
+        self.rejects_writer = rejects_writer
+        self.keys = {}          # dataset name -> set of primary keys known to exist
+
+    def _existing_keys(self, dataset):
+        if dataset.name not in self.keys:
+            keys = set()
+            cursor = self.conn.cursor()
+            cursor.execute(f"SELECT {dataset.key} FROM {dataset.table}")
+            while True:
+                rows = cursor.fetchmany(10000)
+                if not rows:
+                    break
+                keys.update(r[0] for r in rows)
+            cursor.close()
+            self.keys[dataset.name] = keys
+        return self.keys[dataset.name]
+
+    def _reject(self, dataset, line_no, reason, row):
+        if self.rejects_writer is not None:
+            self.rejects_writer.writerow([dataset.name, line_no, reason, row])
+
+    def _insert_sql(self, dataset, nrows):
+        placeholders = "(" + ", ".join(["%s"] * len(dataset.columns)) + ")"
+        return (f"INSERT INTO {dataset.table} ({', '.join(dataset.columns)}) VALUES "
+                + ", ".join([placeholders] * nrows))
+
+    def _flush(self, cursor, dataset, batch, stats):
+        if not batch:
+            return
+        params = [v for values, _, _ in batch for v in values]
+        try:
+            cursor.execute(self._insert_sql(dataset, len(batch)), params)
+            loaded = [values for values, _, _ in batch]
+        except IntegrityError:
+            # Isolate the offending rows; earlier statements of this
+            # transaction are unaffected by a failed INSERT.
+            loaded = []
+            sql = self._insert_sql(dataset, 1)
+            for values, line_no, row in batch:
+                try:
+                    cursor.execute(sql, values)
+                    loaded.append(values)
+                except IntegrityError as e:
+                    stats.rejected += 1
+                    self._reject(dataset, line_no, f"Database integrity error: {e}", row)
+                    self.keys[dataset.name].discard(values[0])
+        stats.loaded += len(loaded)
+        if dataset.after_insert and loaded:
+            dataset.after_insert(cursor, loaded)
+
+    def load(self, dataset, path):
+        stats = LoadStats(dataset.name)
+        started = time.perf_counter()
+        keys = self._existing_keys(dataset)
+        parent_keys = [(dataset.columns.index(col), self._existing_keys(_dataset_by_name(parent)), col)
+                       for col, parent in dataset.parents]
+        cursor = self.conn.cursor()
+        batch = []
+        batches = 0
+        max_id = None
+
+        def accept(pending):
+            # Validates the pending CSV rows column-wise, then checks keys
+            # row by row in file order
+            nonlocal batch, batches, max_id
+            errors = dataset.schema.validate_rows([row for _, row in pending])
+            for i, (line_no, row) in enumerate(pending):
+                error = errors[i][0].message if i in errors else None
+                values = None
+                if not error:
+                    try:
+                        values = dataset.values(row)
+                    except (KeyError, AttributeError, TypeError, ValueError) as e:
+                        error = f"Malformed row: {e}"
+                if not error and values[0] in keys:
+                    error = f"Duplicate {dataset.key} '{values[0]}'."
+                if not error:
+                    for idx, parent, col in parent_keys:
+                        if values[idx] not in parent:
+                            error = f"Unknown {col} '{values[idx]}'."
+                            break
+                if error:
+                    stats.rejected += 1
+                    self._reject(dataset, line_no, error, row)
+                    continue
+                keys.add(values[0])
+                number = parse_id(dataset.sequence, values[0])
+                if number is not None and (max_id is None or number > max_id):
+                    max_id = number
+                batch.append((values, line_no, row))
+                if len(batch) >= self.batch_size:
+                    self._flush(cursor, dataset, batch, stats)
+                    batch = []
+                    batches += 1
+                    if batches % self.commit_every == 0:
+                        self.conn.commit()
+
+        try:
+            with open(path, newline="", encoding="utf-8") as f:
+                pending = []
+                for line_no, row in enumerate(csv.DictReader(f), start=2):
+                    stats.read += 1
+                    if dataset.normalize:
+                        dataset.normalize(row)
+                    pending.append((line_no, row))
+                    if len(pending) >= self.batch_size:
+                        accept(pending)
+                        pending = []
+                accept(pending)
+            self._flush(cursor, dataset, batch, stats)
+            if max_id is not None:
+                # Keep generate_next_*_id() ahead of the imported IDs
+                allocator.ensure_at_least(self.conn, dataset.sequence, max_id + 1)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+        stats.elapsed = time.perf_counter() - started
+        return stats
+
+
+def _dataset_by_name(name):
+    for dataset in DATASETS:
+        if dataset.name == name:
+            return dataset
+    raise ValueError(f"Unknown dataset '{name}'.")
+
+
+class RejectsFile:
+    # CSV writer for rejected rows that creates the file at the first one,
+    # so an import with nothing rejected leaves an earlier run's file alone
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = None
+        self._writer = None
+
+    def writerow(self, row):
+        if self._writer is None:
+            self._file = open(self.filename, "w", newline="", encoding="utf-8")
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(["Dataset", "Line", "Reason", "Row"])
+        self._writer.writerow(row)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def import_datasets(directory=".", only=None, batch_size=BATCH_SIZE, commit_every=COMMIT_EVERY,
+                    rejects_file="import_rejects.csv"):
+    results = []
+    name_index.prepare()
+    rejects = RejectsFile(rejects_file)
+    try:
+        with connection() as conn:
+            loader = BulkLoader(conn, batch_size, commit_every, rejects)
+            for dataset in DATASETS:
+                if only and dataset.name not in only:
+                    continue
+                path = os.path.join(directory, dataset.filename)
+                if not os.path.exists(path):
+                    print(f"Skipping {dataset.name}: {path} not found.")
+                    continue
+                stats = loader.load(dataset, path)
+                print(stats)
+                results.append(stats)
+    finally:
+        rejects.close()
+    if any(s.rejected for s in results):
+        print(f"Rejected rows written to {rejects_file}")
+    # Imported appointments and bills bypass the per-row maintenance
+    if any(s.loaded for s in results):
+        print(f"Rebuilt billing totals for {patient_totals.rebuild()} patients.")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import the *_dataset.csv files.")
+    parser.add_argument("--dir", default=".", help="directory containing the dataset CSV files")
+    parser.add_argument("--only", nargs="+", choices=[d.name for d in DATASETS],
+                        help="load only these datasets")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="rows per INSERT statement")
+    parser.add_argument("--commit-every", type=int, default=COMMIT_EVERY, help="batches per commit")
+    parser.add_argument("--rejects", default="import_rejects.csv", help="where to write rejected rows")
+    args = parser.parse_args()
+    try:
+        import_datasets(args.dir, args.only, args.batch_size, args.commit_every, args.rejects)
+    except Error as e:
+        print("Database error during import:", e)
@@ -0,0 +1,395 @@
+import argparse
+import json
+import time
+
+from db_config import connection, begin_write, lock_clause, ensure_schema, Error
+from validators import PATIENT, DOCTOR, SERVICE, APPOINTMENT, BILL, CONSULTING_CHARGE
+import entity_cache
+import name_index
+import patient_totals
+import scheduling
+from service_catalog import catalog, bump_version
+
+# Bulk delete and update for cleanup and data-retention jobs. Rows are
+# chosen by an ID list or a WHERE predicate and processed in chunked
+# transactions. Each chunk:
+#   - locks its rows
+#   - counts what the foreign keys will cascade or null
+#   - keeps the derived data (name index, patient totals, slot index,
+#     caches) in step
+#   - commits
+# A chunk that holds its locks longer than MAX_CHUNK_SECONDS halves the
+# next chunk, and `pause` seconds between chunks let the desks through.
+# dry_run makes the same counts and changes nothing.
+#
+#   python bulk_ops.py delete billing --where "billing_date < %s" --param 2015-01-01 --dry-run
+#   python bulk_ops.py update appointments --where "doctor_id = %s" --param D07 --set doctor_id=D12
+
+CHUNK_SIZE = 500
+# Longest a chunk should keep its rows (on SQLite, the database) locked
+MAX_CHUNK_SECONDS = 0.5
+MIN_CHUNK_SIZE = 10
+
+
+def _marks(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def _count(cursor, sql, ids):
+    # sql uses {ids} (possibly several times) for the chunk's key list
+    cursor.execute(sql.replace("{ids}", _marks(ids)), list(ids) * sql.count("{ids}"))
+    return int(cursor.fetchone()[0] or 0)
+
+
+def _adjust_totals(cursor, table, key, column, ids, totals_column, sign=-1):
+    # Takes the rows' amounts off (or puts them back on) their patients' totals
+    cursor.execute(f"SELECT patient_id, SUM({column}) FROM {table} WHERE {key} IN ({_marks(ids)}) "
+                   "AND patient_id IS NOT NULL GROUP BY patient_id", list(ids))
+    for patient_id, amount in cursor.fetchall():
+        patient_totals.adjust(cursor, patient_id, **{totals_column: sign * float(amount or 0)})
+
+
+class Target:
+    def __init__(self, table, key, dependents, updatable, before_delete=None, after_commit=None):
+        self.table = table
+        self.key = key
+        # (label, "cascade" or "null", COUNT query over the chunk's {ids})
+        self.dependents = dependents
+        self.updatable = updatable          # column -> validators Field
+        self.before_delete = before_delete  # (cursor, ids), same transaction as the DELETE
+        self.after_commit = after_commit    # (ids, impact) once the chunk is durable
+
+
+def _fields(schema, *names):
+    return {name: schema[name] for name in names}
+
+
+def _patients_deleted(cursor, ids):
+    name_index.remove_many(cursor, "patient", ids)
+    for patient_id in ids:
+        patient_totals.remove_patient(cursor, patient_id)
+
+
+def _patients_committed(ids, impact):
+    for patient_id in ids:
+        entity_cache.patients.invalidate(patient_id)
+    if impact.get("appointment_slots"):
+        scheduling.index.invalidate()
+
+
+def _doctors_committed(ids, impact):
+    for doctor_id in ids:
+        entity_cache.doctors.invalidate(doctor_id)
+        scheduling.index.invalidate(doctor_id)
+
+
+def _appointments_committed(ids, impact):
+    for appt_id in ids:
+        scheduling.index.released(appt_id)
+
+
+TARGETS = {
+    "patients": Target(
+        "patients", "patient_id",
+        [("appointments", "cascade", "SELECT COUNT(*) FROM appointments WHERE patient_id IN ({ids})"),
+         ("appointment_slots", "cascade", "SELECT COUNT(*) FROM appointment_slots WHERE appt_id IN "
+                                          "(SELECT appt_id FROM appointments WHERE patient_id IN ({ids}))"),
+         ("billing", "cascade", "SELECT COUNT(*) FROM billing WHERE patient_id IN ({ids})"),
+         ("billed_services", "cascade", "SELECT COUNT(*) FROM billed_services WHERE patient_id IN ({ids}) "
+                                        "OR bill_id IN (SELECT bill_id FROM billing WHERE patient_id IN ({ids}))")],
+        _fields(PATIENT, "age", "gender", "admission_date", "contact_no"),
+        _patients_deleted, _patients_committed),
+    "doctors": Target(
+        "doctors", "doctor_id",
+        [("appointments.doctor_id", "null", "SELECT COUNT(*) FROM appointments WHERE doctor_id IN ({ids})"),
+         ("appointment_slots", "cascade", "SELECT COUNT(*) FROM appointment_slots WHERE doctor_id IN ({ids})"),
+         ("doctor_hours", "cascade", "SELECT COUNT(*) FROM doctor_hours WHERE doctor_id IN ({ids})")],
+        _fields(DOCTOR, "specialization", "contact_no"),
+        lambda cursor, ids: name_index.remove_many(cursor, "doctor", ids), _doctors_committed),
+    "services": Target(
+        "services", "service_id",
+        [("billed_services.service_id", "null",
+          "SELECT COUNT(*) FROM billed_services WHERE service_id IN ({ids})")],
+        _fields(SERVICE, "service_name", "cost"),
+        lambda cursor, ids: bump_version(cursor), lambda ids, impact: catalog.invalidate()),
+    "appointments": Target(
+        "appointments", "appt_id",
+        [("appointment_slots", "cascade", "SELECT COUNT(*) FROM appointment_slots WHERE appt_id IN ({ids})")],
+        dict(_fields(APPOINTMENT, "doctor_id", "diagnosis"), consulting_charge=CONSULTING_CHARGE),
+        lambda cursor, ids: _adjust_totals(cursor, "appointments", "appt_id", "consulting_charge", ids,
+                                           "consulting"),
+        _appointments_committed),
+    "billing": Target(
+        "billing", "bill_id",
+        [("billed_services", "cascade", "SELECT COUNT(*) FROM billed_services WHERE bill_id IN ({ids})")],
+        _fields(BILL, "billing_date"),
+        lambda cursor, ids: _adjust_totals(cursor, "billing", "bill_id", "total_amount", ids, "billed")),
+}
+
+
+class BulkStats:
+    def __init__(self, action, table, dry_run):
+        self.action = action
+        self.table = table
+        self.dry_run = dry_run
+        self.selected = 0       # keys named or matched up front
+        self.changed = 0        # rows deleted/updated (would be, in a dry run)
+        self.missing = 0        # gone, or no longer matching, by the time their chunk ran
+        self.skipped = 0        # left alone on purpose (e.g. slotted appointments)
+        self.impact = {}        # dependent table/column -> rows cascaded or nulled
+        self.chunks = 0
+        self.max_chunk_seconds = 0.0
+        self.elapsed = 0.0
+
+    def to_dict(self):
+        return {"action": self.action, "table": self.table, "dry_run": self.dry_run, "selected": self.selected,
+                "changed": self.changed, "missing": self.missing, "skipped": self.skipped,
+                "impact": dict(self.impact), "chunks": self.chunks,
+                "max_chunk_seconds": round(self.max_chunk_seconds, 3), "seconds": round(self.elapsed, 3)}
+
+    def __str__(self):
+        verb = {"delete": "deleted", "update": "updated"}[self.action]
+        lines = [f"{self.table}: {self.changed} {'would be ' if self.dry_run else ''}{verb} "
+                 f"({self.selected} selected, {self.missing} missing, {self.skipped} skipped) "
+                 f"in {self.chunks} chunks, {self.elapsed:.2f}s (longest chunk {self.max_chunk_seconds:.3f}s)"]
+        for label, kind, _ in TARGETS[self.table].dependents:
+            if label in self.impact:
+                effect = "cascaded" if kind == "cascade" else "set to NULL"
+                lines.append(f"  {label}: {self.impact[label]} {effect}")
+        return "\n".join(lines)
+
+
+def _target(table):
+    target = TARGETS.get(table)
+    if target is None:
+        raise ValueError(f"Unknown table '{table}'. Choose from {', '.join(TARGETS)}.")
+    return target
+
+
+def select_keys(conn, table, ids=None, where=None, params=()):
+    # Keys to process, in key order: the given IDs (deduplicated) or the
+    # rows matching where; read without locks
+    target = _target(table)
+    if ids is not None:
+        return list(dict.fromkeys(str(i) for i in ids))
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"SELECT {target.key} FROM {target.table} WHERE {where} ORDER BY {target.key}", list(params))
+        return [str(row[0]) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+def _lock_chunk(cursor, target, chunk, where, params, dry_run):
+    # The chunk's keys that still exist and still match, locked for the write
+    sql = f"SELECT {target.key} FROM {target.table} WHERE {target.key} IN ({_marks(chunk)})"
+    values = list(chunk)
+    if where:
+        sql += f" AND ({where})"
+        values += list(params)
+    cursor.execute(sql + ("" if dry_run else lock_clause()), values)
+    return [str(row[0]) for row in cursor.fetchall()]
+
+
+def _run(action, table, keys, where, params, apply, after_commit, chunk_size, max_chunk_seconds, pause, dry_run):
+    target = _target(table)
+    stats = BulkStats(action, table, dry_run)
+    stats.selected = len(keys)
+    started = time.perf_counter()
+    ensure_schema()
+    patient_totals.prepare()
+    size = max(1, chunk_size)
+    position = 0
+    with connection() as conn:
+        while position < len(keys):
+            chunk = keys[position:position + size]
+            position += len(chunk)
+            chunk_started = time.perf_counter()
+            if not dry_run:
+                begin_write(conn)
+            cursor = conn.cursor()
+            try:
+                found = _lock_chunk(cursor, target, chunk, where, params, dry_run)
+                stats.missing += len(chunk) - len(found)
+                impact = {}
+                if found:
+                    impact = apply(cursor, target, found, stats)
+                if dry_run:
+                    conn.rollback()
+                else:
+                    conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+            held = time.perf_counter() - chunk_started
+            stats.chunks += 1
+            stats.max_chunk_seconds = max(stats.max_chunk_seconds, held)
+            for label, n in impact.items():
+                stats.impact[label] = stats.impact.get(label, 0) + n
+            if found and not dry_run and after_commit:
+                after_commit(found, impact)
+            # Keep lock hold time bounded: shrink after a slow chunk, grow
+            # back towards chunk_size after fast ones
+            if held > max_chunk_seconds and size > MIN_CHUNK_SIZE:
+                size = max(MIN_CHUNK_SIZE, size // 2)
+            elif held < max_chunk_seconds / 4 and size < chunk_size:
+                size = min(chunk_size, size * 2)
+            if pause and position < len(keys):
+                time.sleep(pause)
+    stats.elapsed = time.perf_counter() - started
+    return stats
+
+
+def _delete_chunk(cursor, target, ids, stats, dry_run=False):
+    impact = {label: _count(cursor, sql, ids) for label, _, sql in target.dependents}
+    if not dry_run:
+        if target.before_delete:
+            target.before_delete(cursor, ids)
+        cursor.execute(f"DELETE FROM {target.table} WHERE {target.key} IN ({_marks(ids)})", list(ids))
+    stats.changed += len(ids)
+    return impact
+
+
+def bulk_delete(table, ids=None, where=None, params=(), chunk_size=CHUNK_SIZE, max_chunk_seconds=MAX_CHUNK_SECONDS,
+                pause=0.0, dry_run=False):
+    # Deletes the rows with the given keys, or matching where (a SQL
+    # condition with %s placeholders for params); returns BulkStats
+    if (ids is None) == (where is None):
+        raise ValueError("Give either ids or where.")
+    with connection() as conn:
+        keys = select_keys(conn, table, ids, where, params)
+    return _run("delete", table, keys, where, params,
+                lambda cursor, target, found, stats: _delete_chunk(cursor, target, found, stats, dry_run),
+                _target(table).after_commit, chunk_size, max_chunk_seconds, pause, dry_run)
+
+
+def check_changes(table, changes):
+    # Returns (checked {column: value}, error)
+    target = _target(table)
+    if not changes:
+        return None, "Nothing to set."
+    checked = {}
+    for column, value in changes.items():
+        field = target.updatable.get(column)
+        if field is None:
+            return None, (f"Column '{column}' of {table} cannot be bulk updated. "
+                          f"Allowed: {', '.join(target.updatable)}.")
+        checked[column], error = field.check(value)
+        if error:
+            return None, error
+    return checked, None
+
+
+def _update_chunk(cursor, target, ids, changes, stats, dry_run=False):
+    impact = {}
+    if target.table == "appointments" and "doctor_id" in changes:
+        # Slotted appointments keep their doctor (see scheduling.MOVE_SLOTTED)
+        cursor.execute(f"SELECT DISTINCT appt_id FROM appointment_slots WHERE appt_id IN ({_marks(ids)})", list(ids))
+        slotted = {str(row[0]) for row in cursor.fetchall()}
+        if slotted:
+            stats.skipped += len(slotted)
+            ids = [i for i in ids if i not in slotted]
+            if not ids:
+                return impact
+    if not dry_run:
+        if target.table == "appointments" and "consulting_charge" in changes:
+            _adjust_totals(cursor, "appointments", "appt_id", "consulting_charge", ids, "consulting")
+        assignments = ", ".join(f"{column}=%s" for column in changes)
+        cursor.execute(f"UPDATE {target.table} SET {assignments} WHERE {target.key} IN ({_marks(ids)})",
+                       list(changes.values()) + list(ids))
+        if target.table == "appointments" and "consulting_charge" in changes:
+            _adjust_totals(cursor, "appointments", "appt_id", "consulting_charge", ids, "consulting", sign=1)
+        if target.table == "services":
+            bump_version(cursor)
+    stats.changed += len(ids)
+    return impact
+
+
+def _after_update(table, ids):
+    if table == "patients":
+        for patient_id in ids:
+            entity_cache.patients.invalidate(patient_id)
+    elif table == "doctors":
+        # Specializations are cached by the slot index too
+        _doctors_committed(ids, {})
+    elif table == "services":
+        catalog.invalidate()
+
+
+def bulk_update(table, changes, ids=None, where=None, params=(), chunk_size=CHUNK_SIZE,
+                max_chunk_seconds=MAX_CHUNK_SECONDS, pause=0.0, dry_run=False):
+    # Sets the same column values on every selected row; returns BulkStats.
+    # Raises ValueError for columns that cannot be bulk updated or bad values.
+    if (ids is None) == (where is None):
+        raise ValueError("Give either ids or where.")
+    changes, error = check_changes(table, changes)
+    if error:
+        raise ValueError(error)
+    if "doctor_id" in changes:
+        with connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT 1 FROM doctors WHERE doctor_id=%s", (changes["doctor_id"],))
+                exists = cursor.fetchone() is not None
+            finally:
+                cursor.close()
+        if not exists:
+            raise ValueError(f"Doctor '{changes['doctor_id']}' not found.")
+    with connection() as conn:
+        keys = select_keys(conn, table, ids, where, params)
+    stats = _run("update", table, keys, where, params,
+                 lambda cursor, target, found, stats: _update_chunk(cursor, target, found, changes, stats, dry_run),
+                 lambda found, impact: _after_update(table, found), chunk_size, max_chunk_seconds, pause, dry_run)
+    return stats
+
+
+def _parse_set(items):
+    changes = {}
+    for item in items or ():
+        column, sep, value = item.partition("=")
+        if not sep:
+            raise SystemExit(f"--set expects column=value, got '{item}'.")
+        changes[column.strip()] = value
+    return changes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Delete or update many rows in chunked transactions.")
+    parser.add_argument("action", choices=("delete", "update"))
+    parser.add_argument("table", choices=sorted(TARGETS))
+    selection = parser.add_mutually_exclusive_group(required=True)
+    selection.add_argument("--ids", nargs="+", help="primary keys to process")
+    selection.add_argument("--ids-file", help="file with one primary key per line")
+    selection.add_argument("--where", help="SQL condition selecting the rows, with %%s placeholders")
+    parser.add_argument("--param", action="append", default=[], help="value for a --where placeholder (repeatable)")
+    parser.add_argument("--set", action="append", metavar="COLUMN=VALUE", help="column to update (repeatable)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="rows per transaction (upper bound)")
+    parser.add_argument("--max-chunk-seconds", type=float, default=MAX_CHUNK_SECONDS,
+                        help="shrink chunks that hold locks longer than this")
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between chunks")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change, change nothing")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    ids = args.ids
+    if args.ids_file:
+        with open(args.ids_file, encoding="utf-8") as f:
+            ids = [line.strip() for line in f if line.strip()]
+    options = dict(ids=ids, where=args.where, params=args.param, chunk_size=args.chunk_size,
+                   max_chunk_seconds=args.max_chunk_seconds, pause=args.pause, dry_run=args.dry_run)
+    try:
+        if args.action == "delete":
+            stats = bulk_delete(args.table, **options)
+        else:
+            stats = bulk_update(args.table, _parse_set(args.set), **options)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    except Error as e:
+        raise SystemExit(f"Database error: {e}")
+    print(json.dumps(stats.to_dict(), indent=2) if args.json else stats)
+
+
+if __name__ == "__main__":
+    main()
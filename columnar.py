@@ -0,0 +1,300 @@
+import datetime
+import itertools
+import math
+import operator
+from array import array
+
+# Columnar container for large row sets held by the table loads, exporters
+# and analytics. Each column is one typed buffer instead of a Python object
+# per value. (bulk_import keeps its row tuples: a batch there is a few
+# hundred rows bound straight into one INSERT, which needs them as a flat
+# parameter list, so a columnar copy would only add a conversion each way.)
+#   int       array('q'); NULL is INT_NULL
+#   float     array('d'); NULL is NaN (Decimals are converted)
+#   date      array('q') of days since 1970-01-01 (numpy's datetime64[D]
+#             epoch), so NULL (INT_NULL) reads back as NaT in numpy;
+#             accepts date/datetime objects, YYYY-MM-DD strings or day numbers
+#   category  array('I') of codes into a list of distinct values, for
+#             repetitive keys (doctor_id, gender, diagnosis)
+#   text      one UTF-8 bytearray plus an array('q') of end offsets, for
+#             unique strings (IDs, names)
+# Rows are added a chunk at a time (extend / from_cursor); each column is
+# converted with one C-level pass when its values need no fixing up.
+#
+#   python columnar.py appointments     # load a table, report bytes per row
+
+CHUNK_SIZE = 50_000
+INT_NULL = -2 ** 63
+KINDS = ("int", "float", "date", "category", "text")
+
+_EPOCH = datetime.date(1970, 1, 1).toordinal()
+
+
+class _IntColumn:
+    typecode = "q"
+    null = INT_NULL
+
+    def __init__(self):
+        self.data = array(self.typecode)
+
+    def _convert(self, value):
+        return int(value)
+
+    def extend(self, values):
+        size = len(self.data)
+        try:
+            self.data.extend(values)
+        except (TypeError, OverflowError):
+            # NULLs or values the buffer does not take as they are
+            del self.data[size:]
+            null, convert = self.null, self._convert
+            self.data.extend(null if v is None else convert(v) for v in values)
+
+    def get(self, i):
+        value = self.data[i]
+        return None if value == INT_NULL else value
+
+    def nbytes(self):
+        return self.data.itemsize * len(self.data)
+
+    def to_numpy(self, missing=None):
+        import numpy as np
+        return np.frombuffer(self.data, dtype=np.int64)
+
+
+class _FloatColumn(_IntColumn):
+    typecode = "d"
+    null = math.nan
+
+    def _convert(self, value):
+        return float(value)
+
+    def get(self, i):
+        value = self.data[i]
+        return None if math.isnan(value) else value
+
+    def to_numpy(self, missing=None):
+        import numpy as np
+        return np.frombuffer(self.data, dtype=np.float64)
+
+
+class _DateColumn(_IntColumn):
+    def extend(self, values):
+        size = len(self.data)
+        try:
+            # date/datetime objects, as the drivers return them
+            self.data.extend(map(operator.sub, map(datetime.date.toordinal, values), itertools.repeat(_EPOCH)))
+        except TypeError:
+            del self.data[size:]
+            super().extend(values)
+
+    def _convert(self, value):
+        if isinstance(value, int):
+            return value
+        if isinstance(value, str):
+            value = datetime.date.fromisoformat(value)
+        elif isinstance(value, datetime.datetime):
+            value = value.date()
+        return value.toordinal() - _EPOCH
+
+    def get(self, i):
+        value = self.data[i]
+        return None if value == INT_NULL else datetime.date.fromordinal(value + _EPOCH)
+
+    def to_numpy(self, missing=None):
+        import numpy as np
+        return np.frombuffer(self.data, dtype=np.int64).view("datetime64[D]")
+
+
+class _CategoryColumn:
+    def __init__(self):
+        self.codes = array("I")
+        self.values = []            # code -> value (None included)
+        self._lookup = {}
+
+    def extend(self, values):
+        lookup = self._lookup
+        codes = list(map(lookup.get, values))
+        if None in codes:
+            for i, code in enumerate(codes):
+                if code is None:
+                    value = values[i]
+                    code = lookup.get(value)
+                    if code is None:
+                        code = lookup[value] = len(self.values)
+                        self.values.append(value)
+                    codes[i] = code
+        self.codes.extend(codes)
+
+    def get(self, i):
+        return self.values[self.codes[i]]
+
+    def nbytes(self):
+        return self.codes.itemsize * len(self.codes)
+
+    def to_numpy(self, missing=None):
+        # Fixed-width strings, NULL as missing
+        import numpy as np
+        labels = np.array([missing if v is None else v for v in self.values] or [""], dtype=str)
+        return labels[np.frombuffer(self.codes, dtype=np.uint32)]
+
+
+class _TextColumn:
+    def __init__(self):
+        self.buffer = bytearray()
+        self.ends = array("q")
+        self.nulls = None           # bytearray flags, created at the first NULL
+
+    def extend(self, values):
+        size = len(self.ends)
+        try:
+            encoded = list(map(str.encode, values))
+        except TypeError:
+            encoded = [b"" if v is None else str(v).encode() for v in values]
+            if any(v is None for v in values):
+                if self.nulls is None:
+                    self.nulls = bytearray(size)
+                self.nulls.extend(v is None for v in values)
+        if self.nulls is not None and len(self.nulls) < size + len(values):
+            self.nulls.extend(bytes(len(values)))
+        ends = itertools.accumulate(map(len, encoded), initial=self.ends[-1] if size else 0)
+        next(ends)
+        self.ends.extend(ends)
+        self.buffer += b"".join(encoded)
+
+    def get(self, i):
+        if self.nulls is not None and self.nulls[i]:
+            return None
+        start = self.ends[i - 1] if i else 0
+        return self.buffer[start:self.ends[i]].decode()
+
+    def nbytes(self):
+        return len(self.buffer) + self.ends.itemsize * len(self.ends) + len(self.nulls or b"")
+
+    def to_numpy(self, missing=None):
+        import numpy as np
+        return np.array([missing if v is None else v for v in map(self.get, range(len(self.ends)))], dtype=str)
+
+
+_COLUMN_TYPES = {"int": _IntColumn, "float": _FloatColumn, "date": _DateColumn,
+                 "category": _CategoryColumn, "text": _TextColumn}
+
+
+class ColumnBatch:
+    def __init__(self, columns):
+        # columns: [(name, kind)] in row order
+        self.names = []
+        self.kinds = []
+        self._columns = []
+        self._index = {}
+        for name, kind in columns:
+            if kind not in _COLUMN_TYPES:
+                raise ValueError(f"Unknown column kind '{kind}'. Use one of: {', '.join(KINDS)}.")
+            if name in self._index:
+                raise ValueError(f"Duplicate column '{name}'.")
+            self._index[name] = len(self.names)
+            self.names.append(name)
+            self.kinds.append(kind)
+            self._columns.append(_COLUMN_TYPES[kind]())
+        self._length = 0
+
+    @classmethod
+    def from_cursor(cls, cursor, columns, chunk_size=CHUNK_SIZE):
+        # Drains an executed cursor a chunk at a time
+        batch = cls(columns)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return batch
+            batch.extend(rows)
+
+    def extend(self, rows):
+        # rows: sequence of tuples in column order
+        if not rows:
+            return
+        width = len(self._columns)
+        if set(map(len, rows)) != {width}:
+            raise ValueError(f"Rows must have {width} values.")
+        for column, values in zip(self._columns, zip(*rows)):
+            column.extend(values)
+        self._length += len(rows)
+
+    def append(self, row):
+        self.extend([tuple(row)])
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, i):
+        # One row as a tuple
+        if i < 0:
+            i += self._length
+        if not 0 <= i < self._length:
+            raise IndexError("row index out of range")
+        return tuple(column.get(i) for column in self._columns)
+
+    def __iter__(self):
+        return self.rows()
+
+    def rows(self, start=0, stop=None):
+        # Tuples in insertion order, decoded back to Python values
+        stop = self._length if stop is None else min(stop, self._length)
+        getters = [column.get for column in self._columns]
+        for i in range(start, stop):
+            yield tuple(get(i) for get in getters)
+
+    def column(self, name):
+        # The column's values as a Python list
+        column = self._columns[self._index[name]]
+        return [column.get(i) for i in range(self._length)]
+
+    def to_numpy(self, name, missing=""):
+        # numpy array of the column (zero-copy for int, float and date;
+        # category and text become fixed-width strings with NULL as missing)
+        return self._columns[self._index[name]].to_numpy(missing)
+
+    def nbytes(self):
+        # Bytes held by the column buffers (category value lists excluded)
+        return sum(column.nbytes() for column in self._columns)
+
+    def __repr__(self):
+        columns = ", ".join(f"{n}:{k}" for n, k in zip(self.names, self.kinds))
+        return f"ColumnBatch({self._length} rows; {columns})"
+
+
+# Column kinds for whole-table loads
+TABLES = {
+    "patients": [("patient_id", "int"), ("name", "text"), ("age", "int"), ("gender", "category"),
+                 ("admission_date", "date"), ("contact_no", "text")],
+    "doctors": [("doctor_id", "text"), ("name", "text"), ("specialization", "category"), ("contact_no", "text")],
+    "services": [("service_id", "text"), ("service_name", "text"), ("cost", "float")],
+    "appointments": [("appt_id", "text"), ("patient_id", "int"), ("doctor_id", "category"), ("date", "date"),
+                     ("diagnosis", "category"), ("consulting_charge", "float")],
+    "billing": [("bill_id", "text"), ("patient_id", "int"), ("total_amount", "float"), ("billing_date", "date")],
+}
+
+
+def load_table(table, chunk_size=CHUNK_SIZE):
+    # Whole table in a ColumnBatch, read through an unbuffered cursor
+    from db_config import connection
+    columns = TABLES[table]
+    with connection() as conn:
+        cursor = conn.cursor(buffered=False)
+        try:
+            cursor.execute(f"SELECT {', '.join(name for name, _ in columns)} FROM {table}")
+            return ColumnBatch.from_cursor(cursor, columns, chunk_size)
+        finally:
+            cursor.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(description="Load a table into a ColumnBatch and report its size.")
+    parser.add_argument("table", choices=sorted(TABLES))
+    args = parser.parse_args()
+    started = time.perf_counter()
+    batch = load_table(args.table)
+    elapsed = time.perf_counter() - started
+    per_row = batch.nbytes() / len(batch) if len(batch) else 0
+    print(f"{batch}\nloaded in {elapsed:.2f}s, {batch.nbytes():,} bytes in column buffers ({per_row:.1f} per row)")
@@ -0,0 +1,113 @@
+import csv
+import gzip
+
+from db_config import connection
+
+# Streaming CSV export: rows are pulled from an unbuffered cursor in fixed
+# size chunks and written straight out (optionally gzip-compressed), so
+# memory use does not grow with the size of the result.
+
+CHUNK_SIZE = 5000
+
+
+class ExportSpec:
+    def __init__(self, table, key, date_column, columns, filters):
+        self.table = table
+        self.key = key
+        self.date_column = date_column
+        self.columns = columns      # name -> CSV header, in default order
+        self.filters = filters      # allowed equality filters
+
+    def build_query(self, columns=None, start_date=None, end_date=None, **filters):
+        columns = list(columns or self.columns)
+        unknown = [c for c in columns if c not in self.columns]
+        if unknown:
+            raise ValueError(f"Unknown column(s) for {self.table}: {', '.join(unknown)}")
+        where = []
+        params = []
+        if start_date:
+            where.append(f"{self.date_column} >= %s")
+            params.append(start_date)
+        if end_date:
+            where.append(f"{self.date_column} <= %s")
+            params.append(end_date)
+        for name, value in filters.items():
+            if name not in self.filters:
+                raise ValueError(f"Unknown filter for {self.table}: {name}")
+            if value is not None and value != "":
+                where.append(f"{name} = %s")
+                params.append(value)
+        sql = f"SELECT {', '.join(columns)} FROM {self.table}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {self.key}"
+        return sql, params, [self.columns[c] for c in columns]
+
+
+def _open_output(filename, compress):
+    if compress:
+        return gzip.open(filename, "wt", newline="", encoding="utf-8")
+    return open(filename, "w", newline="", encoding="utf-8")
+
+
+def export_query(sql, params, header, filename, compress=None, chunk_size=CHUNK_SIZE):
+    # Returns the number of rows written; no file is created when the
+    # query returns nothing
+    if compress is None:
+        compress = filename.lower().endswith(".gz")
+    written = 0
+    out = None
+    with connection() as conn:
+        cursor = conn.cursor(buffered=False)
+        try:
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                if out is None:
+                    out = _open_output(filename, compress)
+                    writer = csv.writer(out)
+                    writer.writerow(header)
+                writer.writerows(rows)
+                written += len(rows)
+        finally:
+            cursor.close()
+            if out is not None:
+                out.close()
+    return written
+
+
+def export_batch(batch, filename, header=None, compress=None):
+    # Writes a columnar.ColumnBatch already in memory; returns the number of
+    # rows written (no file when the batch is empty)
+    if not len(batch):
+        return 0
+    if compress is None:
+        compress = filename.lower().endswith(".gz")
+    with _open_output(filename, compress) as out:
+        writer = csv.writer(out)
+        writer.writerow(header or batch.names)
+        writer.writerows(batch.rows())
+    return len(batch)
+
+
+def export(spec, filename, columns=None, start_date=None, end_date=None, compress=None,
+           chunk_size=CHUNK_SIZE, **filters):
+    sql, params, header = spec.build_query(columns, start_date, end_date, **filters)
+    return export_query(sql, params, header, filename, compress, chunk_size)
+
+
+BILLING_EXPORT = ExportSpec(
+    "billing", "bill_id", "billing_date",
+    {"bill_id": "Bill ID", "patient_id": "Patient ID", "total_amount": "Total Amount",
+     "billing_date": "Billing Date"},
+    ("patient_id",),
+)
+
+APPOINTMENT_EXPORT = ExportSpec(
+    "appointments", "appt_id", "date",
+    {"appt_id": "Appointment ID", "patient_id": "Patient ID", "doctor_id": "Doctor ID", "date": "Date",
+     "diagnosis": "Diagnosis", "consulting_charge": "Consulting Charge"},
+    ("patient_id", "doctor_id"),
+)
@@ -0,0 +1,476 @@
+import datetime
+import decimal
+import functools
+import re
+import sqlite3
+import threading
+
+
+class DatabaseError(Exception):
+    # Errors raised by the storage layer itself (pool exhaustion, misuse, ...)
+    pass
+
+
+class PoolTimeoutError(DatabaseError):
+    pass
+
+
+# Driver exceptions are exposed as tuples so that `except Error` /
+# `except IntegrityError` in the entity modules work for every backend.
+_errors = [DatabaseError, sqlite3.Error]
+_integrity_errors = [sqlite3.IntegrityError]
+try:
+    from mysql.connector import errors as _mysql_errors
+    _errors.append(_mysql_errors.Error)
+    _integrity_errors.append(_mysql_errors.IntegrityError)
+except ImportError:
+    _mysql_errors = None
+
+Error = tuple(_errors)
+IntegrityError = tuple(_integrity_errors)
+
+
+# --- Schema ---
+MYSQL_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS patients (
+        patient_id INT PRIMARY KEY AUTO_INCREMENT,
+        name VARCHAR(100) NOT NULL,
+        age INT CHECK (age>0),
+        gender ENUM('M','F','Other'),
+        admission_date DATE,
+        contact_no VARCHAR(15)
+    )""",
+    """CREATE TABLE IF NOT EXISTS doctors (
+        doctor_id VARCHAR(10) PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        specialization VARCHAR(100),
+        contact_no VARCHAR(15)
+    )""",
+    """CREATE TABLE IF NOT EXISTS services (
+        service_id VARCHAR(10) PRIMARY KEY,
+        service_name VARCHAR(100) NOT NULL,
+        cost DECIMAL(7,2)
+    )""",
+    """CREATE TABLE IF NOT EXISTS appointments (
+        appt_id VARCHAR(10) PRIMARY KEY,
+        patient_id INT,
+        doctor_id VARCHAR(10),
+        date DATE,
+        diagnosis VARCHAR(255),
+        consulting_charge DECIMAL(7,2) DEFAULT 0,
+        FOREIGN KEY (patient_id) REFERENCES patients(patient_id) ON DELETE CASCADE,
+        FOREIGN KEY (doctor_id) REFERENCES doctors(doctor_id) ON DELETE SET NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS billing (
+        bill_id VARCHAR(10) PRIMARY KEY,
+        patient_id INT,
+        total_amount DECIMAL(10,2),
+        billing_date DATE,
+        FOREIGN KEY (patient_id) REFERENCES patients(patient_id) ON DELETE CASCADE
+    )""",
+    """CREATE TABLE IF NOT EXISTS temp_service_usage (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        patient_id VARCHAR(20) NOT NULL,
+        service_id VARCHAR(20) NOT NULL,
+        service_name VARCHAR(100) NOT NULL,
+        cost DECIMAL(10,2) NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""",
+    """CREATE TABLE IF NOT EXISTS billed_services (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        bill_id VARCHAR(10),
+        patient_id INT,
+        service_id VARCHAR(10),
+        service_name VARCHAR(100),
+        cost DECIMAL(10,2),
+        billed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (bill_id) REFERENCES billing(bill_id) ON DELETE CASCADE,
+        FOREIGN KEY (patient_id) REFERENCES patients(patient_id) ON DELETE CASCADE,
+        FOREIGN KEY (service_id) REFERENCES services(service_id) ON DELETE SET NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS id_sequences (
+        name VARCHAR(30) PRIMARY KEY,
+        next_value BIGINT NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS name_trigrams (
+        entity VARCHAR(10) NOT NULL,
+        trigram VARCHAR(3) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL,
+        entity_id VARCHAR(20) NOT NULL,
+        PRIMARY KEY (entity, trigram, entity_id),
+        KEY idx_name_trigrams_entity (entity, entity_id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS cache_versions (
+        name VARCHAR(30) PRIMARY KEY,
+        version BIGINT NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS patient_totals (
+        patient_id VARCHAR(20) PRIMARY KEY,
+        pending_services DECIMAL(12,2) NOT NULL DEFAULT 0,
+        consulting DECIMAL(12,2) NOT NULL DEFAULT 0,
+        billed DECIMAL(12,2) NOT NULL DEFAULT 0
+    )""",
+    """CREATE TABLE IF NOT EXISTS doctor_hours (
+        doctor_id VARCHAR(10) NOT NULL,
+        weekday TINYINT NOT NULL,
+        start_minute SMALLINT NOT NULL,
+        end_minute SMALLINT NOT NULL,
+        slot_minutes SMALLINT NOT NULL DEFAULT 30,
+        PRIMARY KEY (doctor_id, weekday, start_minute),
+        FOREIGN KEY (doctor_id) REFERENCES doctors(doctor_id) ON DELETE CASCADE
+    )""",
+    """CREATE TABLE IF NOT EXISTS appointment_slots (
+        doctor_id VARCHAR(10) NOT NULL,
+        date DATE NOT NULL,
+        slot_start SMALLINT NOT NULL,
+        appt_id VARCHAR(10) NOT NULL,
+        PRIMARY KEY (doctor_id, date, slot_start),
+        KEY idx_appointment_slots_appt (appt_id),
+        FOREIGN KEY (doctor_id) REFERENCES doctors(doctor_id) ON DELETE CASCADE,
+        FOREIGN KEY (appt_id) REFERENCES appointments(appt_id) ON DELETE CASCADE
+    )""",
+    """CREATE TABLE IF NOT EXISTS usage_journal_applied (
+        event_id VARCHAR(32) PRIMARY KEY,
+        applied_at DATETIME NOT NULL
+    )""",
+]
+
+# Same tables for SQLite; ENUM becomes a CHECK constraint and
+# AUTO_INCREMENT columns become rowid aliases.
+SQLITE_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS patients (
+        patient_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name VARCHAR(100) NOT NULL,
+        age INT CHECK (age>0),
+        gender VARCHAR(5) CHECK (gender IN ('M','F','Other')),
+        admission_date DATE,
+        contact_no VARCHAR(15)
+    )""",
+    """CREATE TABLE IF NOT EXISTS doctors (
+        doctor_id VARCHAR(10) PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        specialization VARCHAR(100),
+        contact_no VARCHAR(15)
+    )""",
+    """CREATE TABLE IF NOT EXISTS services (
+        service_id VARCHAR(10) PRIMARY KEY,
+        service_name VARCHAR(100) NOT NULL,
+        cost DECIMAL(7,2)
+    )""",
+    """CREATE TABLE IF NOT EXISTS appointments (
+        appt_id VARCHAR(10) PRIMARY KEY,
+        patient_id INT,
+        doctor_id VARCHAR(10),
+        date DATE,
+        diagnosis VARCHAR(255),
+        consulting_charge DECIMAL(7,2) DEFAULT 0,
+        FOREIGN KEY (patient_id) REFERENCES patients(patient_id) ON DELETE CASCADE,
+        FOREIGN KEY (doctor_id) REFERENCES doctors(doctor_id) ON DELETE SET NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_appointments_patient ON appointments(patient_id)",
+    "CREATE INDEX IF NOT EXISTS idx_appointments_doctor ON appointments(doctor_id)",
+    """CREATE TABLE IF NOT EXISTS billing (
+        bill_id VARCHAR(10) PRIMARY KEY,
+        patient_id INT,
+        total_amount DECIMAL(10,2),
+        billing_date DATE,
+        FOREIGN KEY (patient_id) REFERENCES patients(patient_id) ON DELETE CASCADE
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_billing_patient ON billing(patient_id)",
+    """CREATE TABLE IF NOT EXISTS temp_service_usage (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        patient_id VARCHAR(20) NOT NULL,
+        service_id VARCHAR(20) NOT NULL,
+        service_name VARCHAR(100) NOT NULL,
+        cost DECIMAL(10,2) NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_temp_usage_patient ON temp_service_usage(patient_id)",
+    """CREATE TABLE IF NOT EXISTS billed_services (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        bill_id VARCHAR(10),
+        patient_id INT,
+        service_id VARCHAR(10),
+        service_name VARCHAR(100),
+        cost DECIMAL(10,2),
+        billed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (bill_id) REFERENCES billing(bill_id) ON DELETE CASCADE,
+        FOREIGN KEY (patient_id) REFERENCES patients(patient_id) ON DELETE CASCADE,
+        FOREIGN KEY (service_id) REFERENCES services(service_id) ON DELETE SET NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_billed_services_bill ON billed_services(bill_id)",
+    "CREATE INDEX IF NOT EXISTS idx_billed_services_patient ON billed_services(patient_id)",
+    "CREATE INDEX IF NOT EXISTS idx_billed_services_service ON billed_services(service_id)",
+    """CREATE TABLE IF NOT EXISTS id_sequences (
+        name VARCHAR(30) PRIMARY KEY,
+        next_value BIGINT NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS name_trigrams (
+        entity VARCHAR(10) NOT NULL,
+        trigram VARCHAR(3) NOT NULL,
+        entity_id VARCHAR(20) NOT NULL,
+        PRIMARY KEY (entity, trigram, entity_id)
+    ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS idx_name_trigrams_entity ON name_trigrams(entity, entity_id)",
+    """CREATE TABLE IF NOT EXISTS cache_versions (
+        name VARCHAR(30) PRIMARY KEY,
+        version BIGINT NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS patient_totals (
+        patient_id VARCHAR(20) PRIMARY KEY,
+        pending_services DECIMAL(12,2) NOT NULL DEFAULT 0,
+        consulting DECIMAL(12,2) NOT NULL DEFAULT 0,
+        billed DECIMAL(12,2) NOT NULL DEFAULT 0
+    )""",
+    """CREATE TABLE IF NOT EXISTS doctor_hours (
+        doctor_id VARCHAR(10) NOT NULL,
+        weekday INT NOT NULL,
+        start_minute INT NOT NULL,
+        end_minute INT NOT NULL,
+        slot_minutes INT NOT NULL DEFAULT 30,
+        PRIMARY KEY (doctor_id, weekday, start_minute),
+        FOREIGN KEY (doctor_id) REFERENCES doctors(doctor_id) ON DELETE CASCADE
+    )""",
+    """CREATE TABLE IF NOT EXISTS appointment_slots (
+        doctor_id VARCHAR(10) NOT NULL,
+        date DATE NOT NULL,
+        slot_start INT NOT NULL,
+        appt_id VARCHAR(10) NOT NULL,
+        PRIMARY KEY (doctor_id, date, slot_start),
+        FOREIGN KEY (doctor_id) REFERENCES doctors(doctor_id) ON DELETE CASCADE,
+        FOREIGN KEY (appt_id) REFERENCES appointments(appt_id) ON DELETE CASCADE
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_appointment_slots_appt ON appointment_slots(appt_id)",
+    """CREATE TABLE IF NOT EXISTS usage_journal_applied (
+        event_id VARCHAR(32) PRIMARY KEY,
+        applied_at DATETIME NOT NULL
+    )""",
+]
+
+
+# --- MySQL ---
+class MySQLBackend:
+    name = "mysql"
+    schema = MYSQL_SCHEMA
+
+    def __init__(self, host="localhost", user="root", password="", database="HospitalManagement", port=3306):
+        self.params = {
+            'host': host,
+            'user': user,
+            'password': password,
+            'database': database,
+            'port': port,
+        }
+
+    def connect(self):
+        import mysql.connector
+        return mysql.connector.connect(**self.params)
+
+    # InnoDB starts transactions implicitly; row locks come from FOR UPDATE
+    lock_clause = " FOR UPDATE"
+
+    def begin_write(self, conn):
+        pass
+
+    def create_schema(self, conn):
+        cursor = conn.cursor()
+        try:
+            for statement in self.schema:
+                cursor.execute(statement)
+            conn.commit()
+        finally:
+            cursor.close()
+
+    def __repr__(self):
+        return f"MySQLBackend({self.params['user']}@{self.params['host']}:{self.params['port']}/{self.params['database']})"
+
+
+# --- SQLite ---
+def _convert_date(value):
+    text = value.decode()
+    try:
+        return datetime.date.fromisoformat(text)
+    except ValueError:
+        return text
+
+
+def _convert_timestamp(value):
+    text = value.decode()
+    try:
+        return datetime.datetime.fromisoformat(text)
+    except ValueError:
+        return text
+
+
+def _convert_decimal(value):
+    try:
+        return decimal.Decimal(value.decode())
+    except decimal.InvalidOperation:
+        return value.decode()
+
+
+def _regexp(pattern, value):
+    return value is not None and re.search(pattern, str(value)) is not None
+
+
+sqlite3.register_adapter(datetime.date, lambda d: d.isoformat())
+sqlite3.register_adapter(datetime.datetime, lambda d: d.isoformat(" "))
+# Money goes in as its exact decimal text. SQLite's NUMERIC affinity keeps
+# it as the nearest REAL, which reads back through the DECIMAL converter
+# (shortest text form) as the same cent amount; code that does arithmetic
+# on money columns in SQL rounds the result to cents (patient_totals).
+sqlite3.register_adapter(decimal.Decimal, str)
+sqlite3.register_converter("DATE", _convert_date)
+sqlite3.register_converter("TIMESTAMP", _convert_timestamp)
+sqlite3.register_converter("DECIMAL", _convert_decimal)
+
+
+@functools.lru_cache(maxsize=1024)
+def _translate(sql):
+    # The entity modules use the MySQL "format" paramstyle
+    return sql.replace("%s", "?")
+
+
+class SQLiteCursor:
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(_translate(sql), params)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._cursor.executemany(_translate(sql), seq_of_params)
+        return self
+
+    def _shape(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip((d[0] for d in self._cursor.description), row))
+
+    def fetchone(self):
+        return self._shape(self._cursor.fetchone())
+
+    def fetchmany(self, size=None):
+        rows = self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany()
+        return [self._shape(r) for r in rows] if self._dictionary else rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        return [self._shape(r) for r in rows] if self._dictionary else rows
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    # Gives a sqlite3 connection the small part of the mysql.connector API
+    # that the entity modules rely on (cursor(dictionary=True), %s params,
+    # is_connected()).
+    def __init__(self, raw):
+        self._raw = raw
+
+    def cursor(self, dictionary=False, **kwargs):
+        return SQLiteCursor(self._raw.cursor(), dictionary=dictionary)
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    @property
+    def in_transaction(self):
+        return self._raw.in_transaction
+
+    def is_connected(self):
+        try:
+            self._raw.execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def close(self):
+        self._raw.close()
+
+
+class SQLiteBackend:
+    name = "sqlite"
+    schema = SQLITE_SCHEMA
+
+    def __init__(self, path="hospital.db", create_schema=True, busy_timeout=30.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._auto_schema = create_schema
+        self._schema_ready = False
+        self._lock = threading.Lock()
+        self._keeper = None
+        if path == ":memory:":
+            # A named shared-cache database so every pooled connection sees the
+            # same data; the keeper connection keeps it alive.
+            self._uri = f"file:hms_memdb_{id(self)}?mode=memory&cache=shared"
+            self._keeper = self._open()
+        else:
+            self._uri = None
+
+    def _open(self):
+        if self._uri:
+            raw = sqlite3.connect(self._uri, uri=True, timeout=self.busy_timeout,
+                                  detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        else:
+            raw = sqlite3.connect(self.path, timeout=self.busy_timeout,
+                                  detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+            raw.execute("PRAGMA journal_mode=WAL")
+            raw.execute("PRAGMA synchronous=NORMAL")
+        raw.execute("PRAGMA foreign_keys=ON")
+        raw.create_function("REGEXP", 2, _regexp, deterministic=True)
+        return raw
+
+    # SQLite locks the whole database instead of rows
+    lock_clause = ""
+
+    def begin_write(self, conn):
+        if not conn.in_transaction:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.close()
+
+    def connect(self):
+        conn = SQLiteConnection(self._open())
+        if self._auto_schema and not self._schema_ready:
+            with self._lock:
+                if not self._schema_ready:
+                    self.create_schema(conn)
+                    self._schema_ready = True
+        return conn
+
+    def create_schema(self, conn):
+        cursor = conn.cursor()
+        try:
+            for statement in self.schema:
+                cursor.execute(statement)
+            conn.commit()
+        finally:
+            cursor.close()
+
+    def __repr__(self):
+        return f"SQLiteBackend({self.path})"
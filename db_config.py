@@ -1,22 +1,309 @@
-import mysql.connector
-from mysql.connector import Error
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from db_backends import (
+    MySQLBackend, SQLiteBackend, DatabaseError, PoolTimeoutError, Error, IntegrityError,
+)
+import instrumentation
+
+DB_CONFIG = {
+    'host': os.environ.get("HMS_MYSQL_HOST", 'localhost'),
+    'user': os.environ.get("HMS_MYSQL_USER", 'root'),
+    'password': os.environ.get("HMS_MYSQL_PASSWORD", 'root@39'),
+    'database': os.environ.get("HMS_MYSQL_DATABASE", 'HospitalManagement'),
+    'port': int(os.environ.get("HMS_MYSQL_PORT", "3306")),
+}
+
+# Storage backend: "mysql" (default) or "sqlite" for the embedded engine
+DB_BACKEND = os.environ.get("HMS_DB_BACKEND", "mysql").lower()
+SQLITE_PATH = os.environ.get("HMS_SQLITE_PATH", "hospital.db")
+
+# Pool settings (can be overridden through environment variables)
+POOL_SIZE = int(os.environ.get("HMS_POOL_SIZE", "5"))
+POOL_TIMEOUT = float(os.environ.get("HMS_POOL_TIMEOUT", "30"))
+# Idle connections older than this (seconds) are pinged before being handed out
+HEALTH_CHECK_INTERVAL = float(os.environ.get("HMS_POOL_HEALTH_CHECK", "5"))
+
+
+class PooledConnection:
+    # Thin proxy around a driver connection. close() hands the connection
+    # back to the pool instead of disconnecting, so existing code that does
+    # conn = get_connection() ... conn.close() is pooled without changes.
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    def __getattr__(self, name):
+        raw = self.__dict__.get("_raw")
+        if raw is None:
+            raise DatabaseError("Connection already returned to the pool.")
+        return getattr(raw, name)
+
+    def cursor(self, *args, **kwargs):
+        # Statements are timed and aggregated (see instrumentation.py)
+        return instrumentation.wrap_cursor(self.__getattr__("cursor")(*args, **kwargs))
+
+    def close(self):
+        raw = self.__dict__.get("_raw")
+        if raw is not None:
+            self._raw = None
+            self._pool.release(raw)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and self._raw is not None:
+            try:
+                self._raw.rollback()
+            except Exception:
+                pass
+        self.close()
+        return False
+
+    def __del__(self):
+        # Safety net for code paths that forget to close the connection
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    def __init__(self, factory, size=POOL_SIZE, timeout=POOL_TIMEOUT,
+                 health_check_interval=HEALTH_CHECK_INTERVAL):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1.")
+        self._factory = factory
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._idle = []          # stack of (connection, last_used)
+        self._open = 0           # connections created and not yet discarded
+        self._cond = threading.Condition()
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time": 0.0,
+            "timeouts": 0,
+            "connections_created": 0,
+            "health_check_failures": 0,
+        }
+
+    def acquire(self):
+        raw = None
+        last_used = None
+        with self._cond:
+            wait_started = None
+            while True:
+                if self._idle:
+                    raw, last_used = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    break
+                now = time.monotonic()
+                if wait_started is None:
+                    wait_started = now
+                    self._stats["waits"] += 1
+                remaining = self.timeout - (now - wait_started)
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    self._stats["wait_time"] += now - wait_started
+                    raise PoolTimeoutError(
+                        f"Timed out after {self.timeout}s waiting for a database connection.")
+                self._cond.wait(remaining)
+            if wait_started is not None:
+                self._stats["wait_time"] += time.monotonic() - wait_started
+
+        if raw is not None and time.monotonic() - last_used > self.health_check_interval:
+            if not self._is_healthy(raw):
+                with self._cond:
+                    self._stats["health_check_failures"] += 1
+                self._disconnect(raw)
+                raw = None
+
+        if raw is None:
+            try:
+                raw = self._factory()
+            except Exception:
+                with self._cond:
+                    self._open -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._stats["connections_created"] += 1
+
+        with self._cond:
+            self._stats["checkouts"] += 1
+        return PooledConnection(self, raw)
+
+    def release(self, raw):
+        # End any open transaction so the next borrower gets a clean snapshot
+        try:
+            if getattr(raw, "in_transaction", True):
+                raw.rollback()
+            healthy = True
+        except Exception:
+            healthy = False
+        with self._cond:
+            if healthy:
+                self._idle.append((raw, time.monotonic()))
+            else:
+                self._open -= 1
+            self._cond.notify()
+        if not healthy:
+            self._disconnect(raw)
+
+    def _is_healthy(self, raw):
+        try:
+            return raw.is_connected()
+        except Exception:
+            return False
+
+    def _disconnect(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for raw, _ in idle:
+            self._disconnect(raw)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats["size"] = self.size
+            stats["open"] = self._open
+            stats["idle"] = len(self._idle)
+            stats["in_use"] = self._open - len(self._idle)
+        return stats
+
+
+def create_backend(name=None):
+    name = (name or DB_BACKEND).lower()
+    if name == "mysql":
+        return MySQLBackend(**DB_CONFIG)
+    if name == "sqlite":
+        return SQLiteBackend(SQLITE_PATH)
+    raise ValueError(f"Unknown database backend '{name}'. Use 'mysql' or 'sqlite'.")
+
+
+_backend = None
+_pool = None
+_pool_lock = threading.Lock()
+_schema_checked = False
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _pool_lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        backend = get_backend()
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(backend.connect)
+    return _pool
+
+
+def configure_pool(size=None, timeout=None, health_check_interval=None):
+    # Replace the shared pool, e.g. to resize it for a batch job
+    global _pool
+    backend = get_backend()
+    with _pool_lock:
+        old = _pool
+        _pool = ConnectionPool(
+            backend.connect,
+            size=size if size is not None else POOL_SIZE,
+            timeout=timeout if timeout is not None else POOL_TIMEOUT,
+            health_check_interval=(health_check_interval if health_check_interval is not None
+                                   else HEALTH_CHECK_INTERVAL),
+        )
+    if old is not None:
+        old.close_all()
+    return _pool
+
+
+def configure_backend(backend, **pool_options):
+    # Switch storage engine at runtime, e.g. configure_backend(SQLiteBackend(":memory:"))
+    global _backend, _pool, _schema_checked
+    with _pool_lock:
+        _backend = backend
+        _schema_checked = False
+        old, _pool = _pool, None
+    if old is not None:
+        old.close_all()
+    return configure_pool(**pool_options)
+
 
 def get_connection():
-    return mysql.connector.connect(
-        host='localhost',
-        user='root',
-        password='root@39',
-        database='HospitalManagement',
-    )
+    return get_pool().acquire()
+
+
+@contextmanager
+def connection():
+    # with connection() as conn: ... -- rolls back on error, always returns
+    # the connection to the pool
+    conn = get_connection()
+    with conn:
+        yield conn
+
+
+def begin_write(conn):
+    # Start a transaction that will write; on SQLite this takes the write
+    # lock up front so concurrent writers queue instead of deadlocking
+    get_backend().begin_write(conn)
+
+
+def lock_clause():
+    # Suffix for SELECTs whose rows are about to be modified in the same transaction
+    return get_backend().lock_clause
+
+
+def pool_stats():
+    return get_pool().stats()
+
+def init_schema():
+    with connection() as conn:
+        get_backend().create_schema(conn)
+
+
+def ensure_schema():
+    # Creates tables introduced by newer versions (once per process). Run it
+    # before opening a transaction: DDL commits implicitly on MySQL.
+    global _schema_checked
+    if not _schema_checked:
+        init_schema()
+        _schema_checked = True
 
 # Optional: Test connection when running this file directly
+# (pass --init-schema to create any missing tables)
 if __name__ == "__main__":
+    import sys
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT DATABASE()")
-        print("Connected to:", cursor.fetchone()[0])
-        cursor.close()
-        conn.close()
+        if "--init-schema" in sys.argv:
+            init_schema()
+            print("Schema created.")
+        with connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            print("Connected to:", get_backend())
+            cursor.close()
+        print("Pool stats:", pool_stats())
     except Error as e:
-        print("Error while connecting to MySQL:", e)
+        print("Error while connecting to the database:", e)
@@ -1,10 +1,15 @@
-import re
-from db_config import get_connection
+from db_config import get_connection, begin_write, lock_clause, IntegrityError, Error
+from id_allocator import next_id
+from pagination import PAGE_SIZE, fetch_page, iter_rows, print_rows
 from person import Person
-import mysql.connector
-from mysql.connector import IntegrityError, Error
+from validators import validate_doctor, format_doctor_name
+import entity_cache
+import name_index
+import scheduling
 
 class Doctor(Person):
+    __slots__ = ("doctor_id", "specialization")
+
     def __init__(self, doctor_id, name, specialization, contact_no):
         super().__init__(doctor_id, name, contact_no)
         self.doctor_id = doctor_id
@@ -12,31 +17,25 @@ class Doctor(Person):
         self.name = self._format_name(name)
 
     def _format_name(self, name):
-        name = name.strip()
-        if not name.lower().startswith("dr."):
-            return "Dr. " + name
-        return name
+        return format_doctor_name(name)
 
     def add(self):
         # Data validation (no doctor_id validation needed)
-        if not self.name or not re.match(r'^[A-Za-z. ]+$', self.name):
-            print("Invalid Name. Only letters, spaces, and periods allowed.")
-            return False
-        if not self.specialization or not all(x.isalpha() or x.isspace() for x in self.specialization):
-            print("Invalid Specialization. Only letters and spaces allowed.")
-            return False
-        if not self.contact_no.isdigit() or len(self.contact_no) < 10:
-            print("Invalid Contact Number. Only digits allowed, minimum 10 digits.")
+        error = validate_doctor(self.name, self.specialization, self.contact_no)
+        if error:
+            print(error)
             return False
 
         try:
+            name_index.prepare()
             conn = get_connection()
             cursor = conn.cursor()
             sql = "INSERT INTO doctors (doctor_id, name, specialization, contact_no) VALUES (%s, %s, %s, %s)"
             cursor.execute(sql, (self.doctor_id, self.name, self.specialization, self.contact_no))
+            name_index.index_name(cursor, "doctor", self.doctor_id, self.name)
             conn.commit()
             return True
-        except mysql.connector.errors.IntegrityError as e:
+        except IntegrityError as e:
             if "unique_contact_no" in str(e):
                 print(f"Error: Contact number '{self.contact_no}' already exists. Please use a unique contact number.")
             elif "PRIMARY" in str(e):
@@ -53,23 +52,25 @@ class Doctor(Person):
 
     def update(self):
         # Data validation (no doctor_id validation needed)
-        if not self.name or not re.match(r'^[A-Za-z. ]+$', self.name):
-            print("Invalid Name. Only letters, spaces, and periods allowed.")
-            return False
-        if not self.specialization or not all(x.isalpha() or x.isspace() for x in self.specialization):
-            print("Invalid Specialization. Only letters and spaces allowed.")
-            return False
-        if not self.contact_no.isdigit() or len(self.contact_no) < 10:
-            print("Invalid Contact Number. Only digits allowed, minimum 10 digits.")
+        error = validate_doctor(self.name, self.specialization, self.contact_no)
+        if error:
+            print(error)
             return False
 
         try:
+            name_index.prepare()
             conn = get_connection()
             cursor = conn.cursor()
             sql = "UPDATE doctors SET name=%s, specialization=%s, contact_no=%s WHERE doctor_id=%s"
             cursor.execute(sql, (self.name, self.specialization, self.contact_no, self.doctor_id))
+            updated = cursor.rowcount
+            if updated:
+                name_index.reindex(cursor, "doctor", self.doctor_id, self.name)
             conn.commit()
-            if cursor.rowcount == 0:
+            if updated:
+                entity_cache.doctors.invalidate(self.doctor_id)
+                scheduling.index.invalidate(self.doctor_id)
+            if updated == 0:
                 print(f"Doctor ID '{self.doctor_id}' not found.")
                 return False
             else:
@@ -89,12 +90,19 @@ class Doctor(Person):
     def delete(doctor_id):
         # No need to validate doctor_id if always generated by system
         try:
+            name_index.prepare()
             conn = get_connection()
             cursor = conn.cursor()
             sql = "DELETE FROM doctors WHERE doctor_id=%s"
             cursor.execute(sql, (doctor_id,))
+            deleted = cursor.rowcount
+            if deleted:
+                name_index.remove(cursor, "doctor", doctor_id)
             conn.commit()
-            if cursor.rowcount == 0:
+            if deleted:
+                entity_cache.doctors.invalidate(doctor_id)
+                scheduling.index.invalidate(doctor_id)
+            if deleted == 0:
                 print(f"Doctor ID '{doctor_id}' not found.")
                 return False
             else:
@@ -112,49 +120,90 @@ class Doctor(Person):
 
     @staticmethod
     def view():
+        # Streams the whole table in primary-key order, a chunk at a time
         try:
-            conn = get_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM doctors")
-            rows = cursor.fetchall()
             print("ID | Name | Specialization | Contact No")
-            for row in rows:
+            for row in iter_rows("doctors", "doctor_id"):
                 print(" | ".join(str(x) for x in row))
         except Error as e:
             print("Database error while viewing doctors:", e)
         except Exception as e:
             print("Unexpected error while viewing doctors:", e)
-        finally:
-            if 'cursor' in locals(): cursor.close()
-            if 'conn' in locals(): conn.close()
 
     @staticmethod
-    def search_by_name(name_substring):
-        conn = get_connection()
-        cursor = conn.cursor()
+    def view_page(after=None, page_size=PAGE_SIZE):
+        # Prints one page; returns the key to continue after (None on the last page)
+        try:
+            rows, next_key = fetch_page("doctors", "doctor_id", after, page_size)
+            print_rows("ID | Name | Specialization | Contact No", rows)
+            return next_key
+        except Error as e:
+            print("Database error while viewing doctors:", e)
+        except Exception as e:
+            print("Unexpected error while viewing doctors:", e)
+        return None
+
+    @staticmethod
+    def search_by_name(name_substring, limit=name_index.SEARCH_LIMIT):
+        # Case-insensitive prefix/substring match through the trigram index,
+        # best matches first
         try:
-            search_pattern = f"%{name_substring}%"
-            cursor.execute("SELECT * FROM doctors WHERE name LIKE %s", (search_pattern,))
-            rows = cursor.fetchall()
+            rows = name_index.search("doctor", name_substring, limit)
             if rows:
-                print("Doctor ID | Name | Specialization | Contact No")
-                for row in rows:
-                    print(" | ".join(str(x) for x in row))
+                print_rows("Doctor ID | Name | Specialization | Contact No", rows)
             else:
                 print("No doctors found matching that name.")
+            return rows
         except Exception as e:
             print("Error searching doctors:", e)
+            return []
+
+    @staticmethod
+    def set_working_hours(doctor_id, weekday, start, end, slot_minutes=scheduling.DEFAULT_SLOT_MINUTES):
+        # Adds the shift, or replaces the one starting at the same time that day
+        try:
+            conn = get_connection()
+            begin_write(conn)
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1 FROM doctors WHERE doctor_id=%s", (doctor_id,))
+            if cursor.fetchone() is None:
+                print(f"Doctor ID '{doctor_id}' not found.")
+                return False
+            cursor.execute("SELECT weekday, start_minute, end_minute, slot_minutes FROM doctor_hours "
+                           "WHERE doctor_id=%s" + lock_clause(), (doctor_id,))
+            existing = cursor.fetchall()
+            error = (scheduling.validate_hours(weekday, start, end, slot_minutes, existing)
+                     or scheduling.check_bookings(cursor, doctor_id, weekday, start, end, slot_minutes, existing))
+            if error:
+                print(error)
+                return False
+            scheduling.set_hours(cursor, doctor_id, weekday, start, end, slot_minutes)
+            conn.commit()
+            scheduling.index.invalidate(doctor_id)
+            print("Working hours saved.")
+            return True
+        except Error as e:
+            print("Database error while saving working hours:", e)
+            return False
+        except Exception as e:
+            print("Unexpected error while saving working hours:", e)
+            return False
         finally:
-            cursor.close()
-            conn.close()
+            if 'cursor' in locals(): cursor.close()
+            if 'conn' in locals(): conn.close()
+
+    @staticmethod
+    def show_working_hours(doctor_id):
+        try:
+            rows = scheduling.describe_hours(scheduling.index.hours(doctor_id))
+            if not rows:
+                print(f"No working hours set for doctor '{doctor_id}'.")
+            for row in rows:
+                print(f"{row['weekday']} {row['start']}-{row['end']} ({row['slot_minutes']} min slots)")
+            return rows
+        except Exception as e:
+            print("Error reading working hours:", e)
+            return []
 
 def generate_next_doctor_id():
-    from db_config import get_connection
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT doctor_id FROM doctors WHERE doctor_id LIKE 'D%'")
-    ids = [int(row[0][1:]) for row in cursor.fetchall() if row[0][1:].isdigit()]
-    cursor.close()
-    conn.close()
-    next_num = max(ids) + 1 if ids else 1
-    return f"D{next_num:02d}"  # D01, D02, ..., D99, D100, etc.
+    return next_id("doctor")  # D01, D02, ..., D99, D100, etc.
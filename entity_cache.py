@@ -0,0 +1,122 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from db_config import connection
+
+# Bounded read-through cache for patient and doctor rows (SELECT * order).
+# Least recently used rows are evicted beyond max_size; rows older than ttl
+# seconds are refetched, which bounds staleness from writes in other
+# processes. Writes in this process invalidate through the entity methods.
+
+CACHE_SIZE = int(os.environ.get("HMS_ENTITY_CACHE_SIZE", "10000"))
+# Seconds; 0 keeps rows until evicted or invalidated
+CACHE_TTL = float(os.environ.get("HMS_ENTITY_CACHE_TTL", "300"))
+# Keys per IN (...) query
+FETCH_CHUNK = 500
+
+
+class EntityCache:
+    def __init__(self, table, key, max_size=CACHE_SIZE, ttl=CACHE_TTL):
+        if max_size < 1:
+            raise ValueError("Cache size must be at least 1.")
+        self.table = table
+        self.key = key
+        self.max_size = max_size
+        self.ttl = ttl or None
+        self._rows = OrderedDict()     # str(id) -> (row, expires_at)
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so a fetch that raced with a write
+        # does not put the old row back
+        self._generation = 0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0, "queries": 0}
+
+    def _lookup(self, key, now):
+        entry = self._rows.get(key)
+        if entry is None:
+            return None
+        row, expires_at = entry
+        if expires_at is not None and now >= expires_at:
+            del self._rows[key]
+            self._stats["expired"] += 1
+            return None
+        self._rows.move_to_end(key)
+        return row
+
+    def _store(self, rows, generation):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if generation != self._generation:
+                return
+            for row in rows:
+                key = str(row[0])
+                self._rows[key] = (row, expires_at)
+                self._rows.move_to_end(key)
+            while len(self._rows) > self.max_size:
+                self._rows.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def _fetch(self, keys):
+        rows = []
+        with connection() as conn:
+            cursor = conn.cursor()
+            try:
+                for i in range(0, len(keys), FETCH_CHUNK):
+                    chunk = keys[i:i + FETCH_CHUNK]
+                    cursor.execute(
+                        f"SELECT * FROM {self.table} WHERE {self.key} IN ({', '.join(['%s'] * len(chunk))})", chunk)
+                    rows.extend(tuple(r) for r in cursor.fetchall())
+                    with self._lock:
+                        self._stats["queries"] += 1
+            finally:
+                cursor.close()
+        return rows
+
+    def get_many(self, ids):
+        # Returns {id: row} for the ids that exist; only keys not already
+        # cached are fetched, in one IN (...) query per FETCH_CHUNK keys
+        found = {}
+        missing = []
+        now = time.monotonic()
+        with self._lock:
+            generation = self._generation
+            for key in dict.fromkeys(str(i) for i in ids):
+                row = self._lookup(key, now)
+                if row is None:
+                    missing.append(key)
+                else:
+                    found[key] = row
+            self._stats["hits"] += len(found)
+            self._stats["misses"] += len(missing)
+        if missing:
+            rows = self._fetch(missing)
+            self._store(rows, generation)
+            found.update((str(row[0]), row) for row in rows)
+        return {i: found[str(i)] for i in ids if str(i) in found}
+
+    def get(self, entity_id):
+        # Row or None
+        return self.get_many([entity_id]).get(entity_id)
+
+    def invalidate(self, entity_id):
+        with self._lock:
+            self._generation += 1
+            self._rows.pop(str(entity_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._rows.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._rows)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+patients = EntityCache("patients", "patient_id")
+doctors = EntityCache("doctors", "doctor_id")
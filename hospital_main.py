@@ -1,12 +1,42 @@
-from db_config import get_connection
-from patient import Patient, generate_next_patient_id
-from doctor import Doctor, generate_next_doctor_id
-from service import Service, ServiceUsageDB, service_usage_menu, generate_next_service_id
-from appointment import Appointment, generate_next_appointment_id
-from billing import Bill, compute_total_billing, generate_next_bill_id
+import startup
+
+# Each menu imports its subsystem when first opened (the entity modules pull
+# in db_config and the MySQL driver), so the main menu renders straight
+# away while startup.warm_up() connects in the background.
+
+# --- Paging ---
+def browse(view_page):
+    from pagination import PAGE_SIZE
+    from instrumentation import action
+    size = input(f"Rows per page (default {PAGE_SIZE}): ").strip()
+    page_size = int(size) if size.isdigit() and int(size) > 0 else PAGE_SIZE
+    starts = [None]   # key each visited page starts after
+    while True:
+        with action(f"Browse {view_page.__qualname__}"):
+            next_key = view_page(starts[-1], page_size)
+        options = []
+        if next_key is not None:
+            options.append("[n]ext")
+        if len(starts) > 1:
+            options.append("[p]revious")
+        options.append("[f]irst")
+        options.append("[q]uit")
+        choice = input(f"Page {len(starts)} - " + " ".join(options) + ": ").strip().lower()
+        if choice == 'n' and next_key is not None:
+            starts.append(next_key)
+        elif choice == 'p' and len(starts) > 1:
+            starts.pop()
+        elif choice == 'f':
+            starts = [None]
+        elif choice == 'q':
+            break
+        else:
+            print("Invalid choice.")
 
 # --- Patient ---
 def patients_menu():
+    from patient import Patient, generate_next_patient_id
+    from instrumentation import action
     while True:
         print("\n=== Patient Management ===")
         print("1. Search Patient")
@@ -22,7 +52,8 @@ def patients_menu():
 
         if choice == '1':
             name = input("Enter part or full patient name: ")
-            Patient.search_by_name(name)
+            with action("Patients > Search"):
+                Patient.search_by_name(name)
             
         elif choice == '2':
             patient_id = generate_next_patient_id()
@@ -33,14 +64,15 @@ def patients_menu():
             admission_date = input("Enter Admission Date (YYYY-MM-DD): ")
             contact_no = input("Enter Contact No: ")
             patient = Patient(patient_id, name, age, gender, admission_date, contact_no)
-            result = patient.add()
+            with action("Patients > Add"):
+                result = patient.add()
             if result:
                 print("Patient added successfully.")
             else:
                 print("Patient was not added.")
                 
         elif choice == '3':
-            Patient.view()
+            browse(Patient.view_page)
 
         elif choice == '4':
             patient_id = int(input("Enter Patient ID to update: "))
@@ -49,19 +81,23 @@ def patients_menu():
             gender = input("Enter New Gender (M/F/Other): ")
             admission_date = input("Enter New Admission Date (YYYY-MM-DD): ")
             contact_no = input("Enter New Contact No: ")
-            Patient(patient_id, name, age, gender, admission_date, contact_no).update()
+            with action("Patients > Update"):
+                Patient(patient_id, name, age, gender, admission_date, contact_no).update()
 
         elif choice == '5':
             patient_id = input("Enter Patient ID to delete: ")
-            Patient.delete(patient_id)
+            with action("Patients > Delete"):
+                Patient.delete(patient_id)
 
         elif choice == "6":
             patient_id = input("Enter Patient ID: ")
+            from service import service_usage_menu
             service_usage_menu(patient_id)
         
         elif choice == "7":
             patient_id = input("Enter Patient ID: ")
-            Patient.days_admitted(patient_id)
+            with action("Patients > Days Admitted"):
+                Patient.days_admitted(patient_id)
 
         elif choice == '8':
             break
@@ -71,6 +107,8 @@ def patients_menu():
 
 # --- Doctor ---
 def doctors_menu():
+    from doctor import Doctor, generate_next_doctor_id
+    from instrumentation import action
     while True:
         print("\n=== Doctor Management ===")
         print("1. Search Doctor")
@@ -78,13 +116,15 @@ def doctors_menu():
         print("3. View All Doctors")
         print("4. Update Doctor")
         print("5. Delete Doctor")
-        print("6. Back to Main Menu")
+        print("6. Set Working Hours")
+        print("7. Back to Main Menu")
  
         choice = input("Select an option: ")
  
         if choice == "1":
             name = input("Enter part or full doctor name: ")
-            Doctor.search_by_name(name)
+            with action("Doctors > Search"):
+                Doctor.search_by_name(name)
         
         elif choice == '2':
             doctor_id = generate_next_doctor_id()
@@ -93,27 +133,40 @@ def doctors_menu():
             specialization = input("Enter Specialization: ")
             contact_no = input("Enter contact no: ")
             doctor = Doctor(doctor_id, name, specialization, contact_no)
-            result = doctor.add()
+            with action("Doctors > Add"):
+                result = doctor.add()
             if result:
                 print("Doctor added successfully.")
             else:
                 print("Doctor was not added.")
  
         elif choice == '3':
-            Doctor.view()
+            browse(Doctor.view_page)
  
         elif choice == '4':
             doctor_id = input("Enter Doctor ID to update: ")
             name = input("Enter New Name: ")
             specialization = input("Enter New Specialization: ")
             contact_no = input("Enter New Contact No: ")
-            Doctor(doctor_id, name, specialization, contact_no).update()
+            with action("Doctors > Update"):
+                Doctor(doctor_id, name, specialization, contact_no).update()
  
         elif choice == '5':
             doctor_id = input("Enter Doctor ID to delete: ")
-            Doctor.delete(doctor_id)
+            with action("Doctors > Delete"):
+                Doctor.delete(doctor_id)
  
         elif choice == '6':
+            doctor_id = input("Enter Doctor ID: ")
+            Doctor.show_working_hours(doctor_id)
+            weekday = input("Enter Weekday (Mon-Sun): ")
+            start = input("Enter Shift Start (HH:MM): ")
+            end = input("Enter Shift End (HH:MM): ")
+            slot_minutes = input("Enter Slot Length in Minutes [30]: ").strip() or "30"
+            with action("Doctors > Working Hours"):
+                Doctor.set_working_hours(doctor_id, weekday, start, end, slot_minutes)
+
+        elif choice == '7':
             break
  
         else:
@@ -121,6 +174,8 @@ def doctors_menu():
 
 # --- Services ---
 def services_menu():
+    from service import Service, generate_next_service_id
+    from instrumentation import action
     while True:
         print("\n=== Service Management ===")
         print("1. Add Service")
@@ -136,24 +191,27 @@ def services_menu():
             service_name = input("Enter Service Name: ")
             cost = input("Enter Cost: ")
             service = Service(service_id, service_name, cost)
-            result = service.add()
+            with action("Services > Add"):
+                result = service.add()
             if result:
                 print("Service added successfully.")
             else:
                 print("Service was not added.")
 
         elif choice == '2':
-            Service.view()
+            browse(Service.view_page)
 
         elif choice == '3':
             service_id = input("Enter Service ID to update: ")
             name = input("Enter New Service Name: ")
             cost = float(input("Enter New Cost: "))
-            Service(service_id, name, cost).update()
+            with action("Services > Update"):
+                Service(service_id, name, cost).update()
 
         elif choice == '4':
             service_id = input("Enter Service ID to delete: ")
-            Service.delete(service_id)
+            with action("Services > Delete"):
+                Service.delete(service_id)
 
         elif choice == '5':
             break
@@ -163,6 +221,8 @@ def services_menu():
           
 # --- Appointments ---
 def appointments_menu():
+    from appointment import Appointment, generate_next_appointment_id
+    from instrumentation import action
     while True:
         print("\n=== Appointments Management ===")
         print("1. Add Appointment")
@@ -171,7 +231,9 @@ def appointments_menu():
         print("4. Delete Appointment")
         print("5. Filter Appointments by Date")
         print("6. Total Days between Appointments of Patient")
-        print("7. Back to Main Menu")
+        print("7. Book Time Slot")
+        print("8. Find First Free Slot")
+        print("9. Back to Main Menu")
         
         choice = input("Select an option: ")
 
@@ -181,16 +243,23 @@ def appointments_menu():
             patient_id = input("Enter Patient ID: ")
             doctor_id = input("Enter Doctor ID: ")
             date = input("Enter Appointment Date (YYYY-MM-DD): ")
+            start = None
+            import scheduling
+            if scheduling.index.hours(doctor_id):
+                # Doctors with working hours are booked by slot
+                Appointment.show_free_slots(doctor_id, date)
+                start = input("Enter Start Time (HH:MM): ")
             diagnosis = input("Enter Diagnosis: ")
             appointment = Appointment(appointment_id, patient_id, doctor_id, date, diagnosis)
-            result = appointment.add()
+            with action("Appointments > Add"):
+                result = appointment.add(start)
             if result:
                 print("Appointment added successfully.")
             else:
                 print("Appointment was not added.")
                 
         elif choice == '2':
-            Appointment.view()
+            browse(Appointment.view_page)
 
         elif choice == '3':
             appointment_id = input("Enter Appointment ID to update: ")
@@ -198,26 +267,60 @@ def appointments_menu():
             doctor_id = input("Enter New Doctor ID: ")
             date = input("Enter New Appointment Date (YYYY-MM-DD): ")
             diagnosis = input("Enter New Diagnosis: ")
-            Appointment(appointment_id, patient_id, doctor_id, date, diagnosis).update()
+            with action("Appointments > Update"):
+                Appointment(appointment_id, patient_id, doctor_id, date, diagnosis).update()
 
         elif choice == '4':
             appointment_id = input("Enter Appointment ID to delete: ")
-            Appointment.delete(appointment_id)
+            with action("Appointments > Delete"):
+                Appointment.delete(appointment_id)
 
         elif choice == '5':
-            Appointment.filter_appointments()
+            start_date = input("Enter start date(YYYY-MM-DD): ")
+            end_date = input("Enter end date(YYYY-MM-DD):")
+            with action("Appointments > Filter by Date"):
+                Appointment.filter_appointments(start_date, end_date)
 
         elif choice == '6':
             patient_id = input("Enter Patient ID: ")
-            Appointment.days_between_appointments(patient_id)
-            
-        elif choice == "7":
+            with action("Appointments > Days Between"):
+                Appointment.days_between_appointments(patient_id)
+
+        elif choice == '7':
+            appointment_id = generate_next_appointment_id()
+            print(f"Auto-generated Appointment ID: {appointment_id}")
+            patient_id = input("Enter Patient ID: ")
+            doctor_id = input("Enter Doctor ID: ")
+            date = input("Enter Appointment Date (YYYY-MM-DD): ")
+            Appointment.show_free_slots(doctor_id, date)
+            start = input("Enter Start Time (HH:MM): ")
+            slots = input("Enter Number of Slots [1]: ").strip() or "1"
+            diagnosis = input("Enter Diagnosis: ")
+            if not slots.isdigit() or int(slots) < 1:
+                print("Number of slots must be a positive integer.")
+                continue
+            with action("Appointments > Book Slot"):
+                Appointment(appointment_id, patient_id, doctor_id, date, diagnosis).book(start, int(slots))
+
+        elif choice == '8':
+            target = input("Enter Doctor ID or Specialization: ").strip()
+            from_date = input("Enter From Date (YYYY-MM-DD): ")
+            after = input("Enter Earliest Time (HH:MM) [00:00]: ").strip() or "00:00"
+            import scheduling
+            doctor_ids = scheduling.index.specialists(target) or [target]
+            with action("Appointments > First Free Slot"):
+                Appointment.first_free_slot(doctor_ids, from_date, after)
+
+        elif choice == "9":
             break
         else:
             print("Invalid Choice. Please try again.")
 
 # --- Bill ---
 def billing_menu():
+    from billing import Bill, compute_total_billing, generate_next_bill_id
+    from db_config import connection
+    from instrumentation import action
     while True:
         print("\nBilling Management")
         print("1. Add Bill")
@@ -226,7 +329,8 @@ def billing_menu():
         print("4. Delete Bill")
         print("5. Compute Total Billing")
         print("6. Generate Invoice")
-        print("7. Back to Main Menu")
+        print("7. Batch Generate Invoices")
+        print("8. Back to Main Menu")
         
         choice = input("Select an option: ")
  
@@ -239,14 +343,15 @@ def billing_menu():
                 bill = Bill(bill_id, patient_id)
             else:
                 bill = Bill(bill_id, patient_id, billing_date)
-            result = bill.add()
-            if result:
-                bill.generate_invoice()
-            else:
+            with action("Billing > Add"):
+                result = bill.add()
+                if result:
+                    bill.generate_invoice()
+            if not result:
                 print("Bill was not added. Invoice not generated.")
  
         elif choice == "2":
-            Bill.view()
+            browse(Bill.view_page)
  
         elif choice == "3":
             bill_id = input("Enter Bill ID to update: ")
@@ -256,15 +361,18 @@ def billing_menu():
                 bill = Bill(bill_id, patient_id)
             else:
                 bill = Bill(bill_id, patient_id, billing_date)
-            bill.update()
+            with action("Billing > Update"):
+                bill.update()
  
         elif choice == "4":
             bill_id = input("Enter Bill ID to delete: ")
-            Bill.delete(bill_id)
+            with action("Billing > Delete"):
+                Bill.delete(bill_id)
  
         elif choice == "5":
             patient_id = input("Enter Patient ID to compute total billing: ")
-            total = compute_total_billing(patient_id)
+            with action("Billing > Compute Total"):
+                total = compute_total_billing(patient_id)
             if total is not None:
                 print(f"Total bill for patient {patient_id}: {total}")
  
@@ -275,35 +383,35 @@ def billing_menu():
             invoice_choice = input("Select an option: ")
             if invoice_choice == "1":
                 bill_id = input("Enter Bill ID to generate invoice: ")
-                # Fetch patient_id and billing_date from DB
-                from db_config import get_connection
-                conn = get_connection()
-                cursor = conn.cursor()
-                cursor.execute("SELECT patient_id, billing_date FROM billing WHERE bill_id=%s", (bill_id,))
-                row = cursor.fetchone()
-                cursor.close()
-                conn.close()
-                if row:
-                    patient_id, billing_date = row
-                    bill = Bill(bill_id, patient_id, billing_date)
-                    bill.generate_invoice()
-                else:
-                    print("Bill not found.")
+                with action("Billing > Invoice by Bill"):
+                    # Fetch patient_id and billing_date from DB
+                    with connection() as conn:
+                        cursor = conn.cursor()
+                        cursor.execute("SELECT patient_id, billing_date FROM billing WHERE bill_id=%s", (bill_id,))
+                        row = cursor.fetchone()
+                        cursor.close()
+                    if row:
+                        patient_id, billing_date = row
+                        bill = Bill(bill_id, patient_id, billing_date)
+                        bill.generate_invoice()
+                    else:
+                        print("Bill not found.")
                     
             elif invoice_choice == "2":
                 patient_id = input("Enter Patient ID to generate invoice: ")
-                from db_config import get_connection
-                conn = get_connection()
-                cursor = conn.cursor(dictionary=True)
-                cursor.execute("SELECT bill_id, billing_date FROM billing WHERE patient_id=%s", (patient_id,))
-                bills = cursor.fetchall()
+                with action("Billing > Find Patient Bills"), connection() as conn:
+                    cursor = conn.cursor(dictionary=True)
+                    cursor.execute("SELECT bill_id, billing_date FROM billing WHERE patient_id=%s", (patient_id,))
+                    bills = cursor.fetchall()
+                    cursor.close()
                 if not bills:
                     print("No bills found for this patient.")
                 elif len(bills) == 1:
                     bill_id = bills[0]['bill_id']
                     billing_date = bills[0]['billing_date']
                     bill = Bill(bill_id, patient_id, billing_date)
-                    bill.generate_invoice()
+                    with action("Billing > Invoice by Patient"):
+                        bill.generate_invoice()
                 else:
                     print("Multiple bills found for this patient:")
                     for idx, b in enumerate(bills):
@@ -314,25 +422,46 @@ def billing_menu():
                         if 0 <= selection < len(bills):
                             selected_bill = bills[selection]
                             bill = Bill(selected_bill['bill_id'], patient_id, selected_bill['billing_date'])
-                            bill.generate_invoice()
+                            with action("Billing > Invoice by Patient"):
+                                bill.generate_invoice()
                             # EXIT after generating invoice!
                             return  # or break if inside a loop
                         else:
                             print("Invalid selection.")
                     else:
                         print("Invalid input. Please enter a number.")
-                cursor.close()
-                conn.close()
             else:
                 print("Invalid option for invoice generation.")
  
         elif choice == "7":
+            from invoice_batch import batch_invoice_menu
+            batch_invoice_menu()
+ 
+        elif choice == "8":
             break
  
         else:
             print("Invalid Choice. Please try again.")
 
+def export_filename(default):
+    filename = input(f"Enter filename (default: {default}, add .gz to compress): ").strip() or default
+    if not filename.lower().endswith((".csv", ".csv.gz")):
+        filename += ".csv"
+    return filename
+
+def prompt_date_range():
+    start_date = input("From date (YYYY-MM-DD, blank for no limit): ").strip() or None
+    end_date = input("To date (YYYY-MM-DD, blank for no limit): ").strip() or None
+    return start_date, end_date
+
+def prompt_columns():
+    raw = input("Columns, comma separated (blank for all): ")
+    return [c.strip() for c in raw.split(",") if c.strip()] or None
+
 def export_menu():
+    from billing import Bill
+    from appointment import Appointment
+    from instrumentation import action
     while True:
         print("\n=== Export Management ===")
         print("1. Export Billing Summary to CSV")
@@ -342,22 +471,41 @@ def export_menu():
         choice = input("Select an option: ")
         
         if choice == '1':
-            filename = input("Enter filename for billing summary (default: billing_summary.csv): ").strip() or "billing_summary.csv"
-            if not filename.lower().endswith(".csv"):
-                filename += ".csv"
-            Bill.export_billing_summary_to_csv(filename)
+            filename = export_filename("billing_summary.csv")
+            start_date, end_date = prompt_date_range()
+            patient_id = input("Patient ID filter (blank for all): ").strip() or None
+            columns = prompt_columns()
+            with action("Export > Billing Summary"):
+                Bill.export_billing_summary_to_csv(filename, columns, start_date, end_date, patient_id)
             
         elif choice == '2':
-            filename = input("Enter filename for appointment summary (default: appointment_summary.csv): ").strip() or "appointment_summary.csv"
-            if not filename.lower().endswith(".csv"):
-                filename += ".csv"
-            Appointment.export_appointment_summary_to_csv(filename)
+            filename = export_filename("appointment_summary.csv")
+            start_date, end_date = prompt_date_range()
+            doctor_id = input("Doctor ID filter (blank for all): ").strip() or None
+            patient_id = input("Patient ID filter (blank for all): ").strip() or None
+            columns = prompt_columns()
+            with action("Export > Appointment Summary"):
+                Appointment.export_appointment_summary_to_csv(filename, columns, start_date, end_date,
+                                                              doctor_id, patient_id)
             
         elif choice == '3':
             break
         else:
             print("Invalid choice.")
 
+def analytics_report():
+    # numpy is only needed for this report, so import on demand
+    try:
+        import analytics
+    except ImportError as e:
+        print(f"Analytics needs numpy ({e}). Install it with: pip install numpy")
+        return
+    from instrumentation import action
+    start_date, end_date = prompt_date_range()
+    with action("Analytics > Report"):
+        report = analytics.build_report(start_date, end_date)
+    analytics.print_report(report)
+
 def main_menu():
     while True:
         print("\n=== Hospital Management CLI ===")
@@ -367,7 +515,10 @@ def main_menu():
         print("4. Appointment Management")
         print("5. Billing Management")
         print("6. Export Management")
-        print("7. Exit")
+        print("7. Performance Report")
+        print("8. Analytics Report")
+        print("9. Exit")
+        startup.mark("menu")
         
         choice = input("Select an option: ")
 
@@ -384,10 +535,39 @@ def main_menu():
         elif choice == '6':
             export_menu()
         elif choice == '7':
+            from instrumentation import dump as dump_query_stats
+            dump_query_stats()
+        elif choice == '8':
+            analytics_report()
+        elif choice == '9':
             print("Exiting Hospital Management CLI. Bye!")
             break
         else:
             print("Invalid choice. Please try again.")
 
 if __name__ == "__main__":
+    import sys
+    # argparse takes longer to import than the menu takes to draw, so a
+    # plain start skips it
+    if len(sys.argv) > 1:
+        import argparse
+        parser = argparse.ArgumentParser(description="Hospital Management CLI.")
+        parser.add_argument("--batch", metavar="FILE",
+                            help="run JSON-lines commands from FILE ('-' for stdin) instead of the menus")
+        parser.add_argument("--group-size", type=int, help="commands per transaction in batch mode (default 100)")
+        parser.add_argument("--startup-time", action="store_true",
+                            help="measure cold start (time until the main menu is shown) and exit")
+        parser.add_argument("--runs", type=int, default=startup.RUNS, help="cold starts to measure (default 5)")
+        parser.add_argument("--budget", type=float, metavar="MS",
+                            help="with --startup-time, exit with status 1 if the menu takes longer")
+        args = parser.parse_args()
+        if args.startup_time:
+            result = startup.measure(__file__, args.runs)
+            startup.print_report(result, args.runs, args.budget)
+            sys.exit(1 if args.budget is not None and result["menu"] > args.budget else 0)
+        if args.batch:
+            from batch_mode import main as run_batch
+            sys.exit(run_batch(args.batch, args.group_size))
+    startup.warm_up()
     main_menu()
+    startup.finish()
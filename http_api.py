@@ -0,0 +1,232 @@
+import json
+import re
+import socketserver
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl
+
+from db_config import connection, configure_pool, pool_stats, ensure_schema, PoolTimeoutError
+import instrumentation
+import operations
+from operations import Result
+
+# JSON over HTTP for other hospital systems. Requests are served by a fixed
+# pool of worker threads sharing the database connection pool and run
+# through operations.py (same validation as the entity classes). Every
+# response carries X-Response-Time and a Server-Timing header splitting
+# database time from the rest.
+#
+#   python http_api.py --port 8080 --workers 16
+
+HOST = "127.0.0.1"
+PORT = 8080
+WORKERS = 16
+MAX_BODY = 1 << 20
+# Seconds a keep-alive connection may sit idle before its worker is freed
+IDLE_TIMEOUT = 5
+
+STATUS = {"validation": 422, "bad_request": 400, "not_found": 404, "conflict": 409, "db_error": 500,
+          "unavailable": 503}
+
+# (method, path pattern, operation); path groups and the query string or
+# JSON body become the operation's parameters
+ROUTES = [
+    ("GET", r"/patients", "list_patients"),
+    ("GET", r"/patients/search", "search_patients"),
+    ("POST", r"/patients", "add_patient"),
+    ("GET", r"/patients/(?P<patient_id>\d+)", "get_patient"),
+    ("PUT", r"/patients/(?P<patient_id>\d+)", "update_patient"),
+    ("DELETE", r"/patients/(?P<patient_id>\d+)", "delete_patient"),
+    ("GET", r"/patients/(?P<patient_id>\d+)/days-admitted", "days_admitted"),
+    ("GET", r"/patients/(?P<patient_id>\d+)/appointment-gaps", "days_between_appointments"),
+    ("GET", r"/patients/(?P<patient_id>\d+)/services", "list_service_usage"),
+    ("POST", r"/patients/(?P<patient_id>\d+)/services", "add_service_usage"),
+    ("DELETE", r"/patients/(?P<patient_id>\d+)/services", "clear_service_usage"),
+    ("GET", r"/patients/(?P<patient_id>\d+)/total-billing", "compute_total_billing"),
+    ("GET", r"/doctors", "list_doctors"),
+    ("GET", r"/doctors/search", "search_doctors"),
+    ("POST", r"/doctors", "add_doctor"),
+    ("GET", r"/doctors/(?P<doctor_id>\w+)", "get_doctor"),
+    ("PUT", r"/doctors/(?P<doctor_id>\w+)", "update_doctor"),
+    ("DELETE", r"/doctors/(?P<doctor_id>\w+)", "delete_doctor"),
+    ("GET", r"/doctors/(?P<doctor_id>\w+)/hours", "get_doctor_hours"),
+    ("PUT", r"/doctors/(?P<doctor_id>\w+)/hours", "set_doctor_hours"),
+    ("DELETE", r"/doctors/(?P<doctor_id>\w+)/hours", "clear_doctor_hours"),
+    ("GET", r"/doctors/(?P<doctor_id>\w+)/slots", "free_slots"),
+    ("GET", r"/doctors/(?P<doctor_id>\w+)/slots/check", "is_slot_free"),
+    ("GET", r"/slots/first-free", "first_free_slot"),
+    ("GET", r"/slots/free-doctors", "free_doctors"),
+    ("GET", r"/services", "list_services"),
+    ("POST", r"/services", "add_service"),
+    ("GET", r"/services/(?P<service_id>\w+)", "get_service"),
+    ("PUT", r"/services/(?P<service_id>\w+)", "update_service"),
+    ("DELETE", r"/services/(?P<service_id>\w+)", "delete_service"),
+    ("GET", r"/appointments", "list_appointments"),
+    ("GET", r"/appointments/by-date", "filter_appointments"),
+    ("POST", r"/appointments", "add_appointment"),
+    ("POST", r"/appointments/book", "book_slot"),
+    ("GET", r"/appointments/(?P<appt_id>\w+)", "get_appointment"),
+    ("PUT", r"/appointments/(?P<appt_id>\w+)", "update_appointment"),
+    ("DELETE", r"/appointments/(?P<appt_id>\w+)", "delete_appointment"),
+    ("GET", r"/bills", "list_bills"),
+    ("POST", r"/bills", "add_bill"),
+    ("GET", r"/bills/(?P<bill_id>\w+)", "get_bill"),
+    ("DELETE", r"/bills/(?P<bill_id>\w+)", "delete_bill"),
+]
+_ROUTES = [(method, re.compile(pattern + r"/?$"), pattern, op) for method, pattern, op in ROUTES]
+
+
+def resolve(method, path):
+    # Returns (operation, path params, route pattern); operation is None
+    # when nothing matches
+    for route_method, regex, pattern, op in _ROUTES:
+        if route_method == method:
+            match = regex.match(path)
+            if match:
+                return op, match.groupdict(), pattern
+    return None, {}, None
+
+
+class PooledHTTPServer(socketserver.TCPServer):
+    # Hands accepted connections to a fixed pool of worker threads instead of
+    # one new thread per connection
+    allow_reuse_address = True
+
+    def __init__(self, address, handler, workers=WORKERS):
+        super().__init__(address, handler)
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hms-http")
+
+    def process_request(self, request, client_address):
+        self._executor.submit(self._work, request, client_address)
+
+    def _work(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    timeout = IDLE_TIMEOUT
+    # Headers and body go out in separate writes; without TCP_NODELAY the
+    # second one waits for the client's delayed ACK (~40ms per request)
+    disable_nagle_algorithm = True
+    server_version = "HospitalManagementAPI/1.0"
+
+    def log_message(self, format, *args):
+        # Per-request logging is left to the instrumentation layer
+        pass
+
+    def _params(self, path_params, query):
+        params = dict(parse_qsl(query))
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY:
+            raise ValueError("Request body too large.")
+        if length:
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(body, dict):
+                raise ValueError("Request body must be a JSON object.")
+            params.update(body)
+        params.update(path_params)
+        return params
+
+    def _dispatch(self, method):
+        started = time.perf_counter()
+        url = urlsplit(self.path)
+        path = url.path.rstrip("/") or "/"
+        timing = {"queries": 0, "query_ms": 0.0}
+        status = 200
+        if path == "/health":
+            payload = {"ok": True, "data": {"status": "up"}}
+        elif path == "/stats" and method == "GET":
+            payload = {"ok": True, "data": {"pool": pool_stats(), "queries": instrumentation.stats.report(10)}}
+        else:
+            op, path_params, pattern = resolve(method, path)
+            if op is None:
+                status, payload = 404, {"ok": False, "code": "not_found", "error": f"No route for {method} {path}"}
+            else:
+                try:
+                    params = self._params(path_params, url.query)
+                except ValueError as e:
+                    result = Result.failure("bad_request", str(e))
+                else:
+                    with instrumentation.action(f"HTTP {method} {pattern}") as timing:
+                        try:
+                            with connection() as conn:
+                                result = operations.execute(conn, op, params)
+                        except PoolTimeoutError as e:
+                            result = Result.failure("unavailable", str(e))
+                payload = result.to_dict()
+                if result.ok:
+                    status = 201 if method == "POST" else 200
+                else:
+                    status = STATUS.get(result.code, 500)
+        self._send(status, payload, started, timing)
+
+    def _send(self, status, payload, started, timing):
+        body = json.dumps(payload).encode("utf-8")
+        total_ms = (time.perf_counter() - started) * 1000
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-Response-Time", f"{total_ms:.3f}ms")
+        self.send_header("X-DB-Queries", str(timing["queries"]))
+        self.send_header("Server-Timing",
+                         f"db;dur={timing['query_ms']:.3f}, app;dur={max(total_ms - timing['query_ms'], 0):.3f}, "
+                         f"total;dur={total_ms:.3f}")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+
+def make_server(host=HOST, port=PORT, workers=WORKERS, pool_size=None):
+    # A request holds one connection and cache misses or name searches may
+    # briefly take a second, so the default is two connections per worker
+    pool_size = pool_size or workers * 2
+    configure_pool(size=pool_size)
+    ensure_schema()
+    return PooledHTTPServer((host, port), Handler, workers), pool_size
+
+
+def serve(host=HOST, port=PORT, workers=WORKERS, pool_size=None):
+    server, pool_size = make_server(host, port, workers, pool_size)
+    print(f"Serving on http://{host}:{server.server_address[1]} with {workers} workers "
+          f"and {pool_size} database connections", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return server
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Serve the hospital operations as a JSON HTTP API.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=WORKERS, help="request worker threads")
+    parser.add_argument("--pool-size", type=int, help="database connections (default: two per worker)")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, args.pool_size)
@@ -0,0 +1,151 @@
+import os
+import threading
+
+from db_config import connection, IntegrityError
+
+# Hi/lo ID allocation backed by the id_sequences table. Each process reserves
+# a block of numbers with one short UPDATE (the row lock serialises concurrent
+# desks) and hands IDs out of that block from memory.
+
+BLOCK_SIZE = int(os.environ.get("HMS_ID_BLOCK_SIZE", "10"))
+
+# name -> (table, id column, prefix, zero-padded width, first value)
+SEQUENCES = {
+    "patient": ("patients", "patient_id", "", 0, 1001),
+    "doctor": ("doctors", "doctor_id", "D", 2, 1),
+    "service": ("services", "service_id", "S", 2, 1),
+    "appointment": ("appointments", "appt_id", "A", 3, 1),
+    "bill": ("billing", "bill_id", "B", 3, 1),
+}
+
+CREATE_TABLE_SQL = """CREATE TABLE IF NOT EXISTS id_sequences (
+    name VARCHAR(30) PRIMARY KEY,
+    next_value BIGINT NOT NULL
+)"""
+
+
+def format_id(name, value):
+    _, _, prefix, width, _ = SEQUENCES[name]
+    if not prefix:
+        return value
+    return f"{prefix}{value:0{width}d}"   # e.g. D01, S01, A001, B001
+
+
+def parse_id(name, value):
+    # Numeric part of an ID in this sequence's format, or None
+    _, _, prefix, _, _ = SEQUENCES[name]
+    text = str(value)
+    if prefix:
+        if not text.startswith(prefix):
+            return None
+        text = text[len(prefix):]
+    return int(text) if text.isdigit() else None
+
+
+def _current_max(cursor, name):
+    # One-off scan used only when a sequence row is first created
+    table, column, prefix, _, _ = SEQUENCES[name]
+    if not prefix:
+        cursor.execute(f"SELECT MAX({column}) FROM {table}")
+        row = cursor.fetchone()
+        return int(row[0]) if row and row[0] is not None else None
+    cursor.execute(f"SELECT {column} FROM {table} WHERE {column} LIKE %s", (prefix + "%",))
+    values = [parse_id(name, r[0]) for r in cursor.fetchall()]
+    values = [v for v in values if v is not None]
+    return max(values) if values else None
+
+
+def _seed(conn, cursor, name):
+    current = _current_max(cursor, name)
+    first = SEQUENCES[name][4] if current is None else current + 1
+    try:
+        cursor.execute("INSERT INTO id_sequences (name, next_value) VALUES (%s, %s)", (name, first))
+        conn.commit()
+    except IntegrityError:
+        # Another process seeded it first
+        conn.rollback()
+
+
+class IdAllocator:
+    def __init__(self, block_size=BLOCK_SIZE):
+        if block_size < 1:
+            raise ValueError("Block size must be at least 1.")
+        self.block_size = block_size
+        self._blocks = {}       # name -> [next value, end of block]
+        self._lock = threading.Lock()
+        self._table_ready = False
+
+    def _ensure_table(self, conn):
+        if not self._table_ready:
+            cursor = conn.cursor()
+            cursor.execute(CREATE_TABLE_SQL)
+            conn.commit()
+            cursor.close()
+            self._table_ready = True
+
+    def reserve_block(self, name, size=None):
+        # Returns [start, end) reserved exclusively for this process
+        if name not in SEQUENCES:
+            raise ValueError(f"Unknown ID sequence '{name}'.")
+        size = size or self.block_size
+        with connection() as conn:
+            self._ensure_table(conn)
+            cursor = conn.cursor()
+            try:
+                for _ in range(2):
+                    cursor.execute("UPDATE id_sequences SET next_value = next_value + %s WHERE name=%s",
+                                   (size, name))
+                    if cursor.rowcount:
+                        break
+                    conn.rollback()
+                    _seed(conn, cursor, name)
+                cursor.execute("SELECT next_value FROM id_sequences WHERE name=%s", (name,))
+                end = int(cursor.fetchone()[0])
+                conn.commit()
+            finally:
+                cursor.close()
+        return end - size, end
+
+    def next_value(self, name):
+        with self._lock:
+            block = self._blocks.get(name)
+            if block is None or block[0] >= block[1]:
+                block = list(self.reserve_block(name))
+                self._blocks[name] = block
+            value = block[0]
+            block[0] += 1
+            return value
+
+    def next_id(self, name):
+        return format_id(name, self.next_value(name))
+
+    def reset(self):
+        # Forget reserved blocks, e.g. after switching to another database
+        with self._lock:
+            self._blocks.clear()
+            self._table_ready = False
+
+    def ensure_at_least(self, conn, name, value):
+        # Move the sequence past IDs inserted outside the allocator (e.g. bulk
+        # imports). Runs in the caller's transaction.
+        self._ensure_table(conn)
+        cursor = conn.cursor()
+        try:
+            cursor.execute("UPDATE id_sequences SET next_value=%s WHERE name=%s AND next_value<%s",
+                           (value, name, value))
+            if cursor.rowcount == 0:
+                cursor.execute("SELECT 1 FROM id_sequences WHERE name=%s", (name,))
+                if cursor.fetchone() is None:
+                    cursor.execute("INSERT INTO id_sequences (name, next_value) VALUES (%s, %s)",
+                                   (name, value))
+        finally:
+            cursor.close()
+        with self._lock:
+            self._blocks.pop(name, None)
+
+
+allocator = IdAllocator()
+
+
+def next_id(name):
+    return allocator.next_id(name)
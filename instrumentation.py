@@ -0,0 +1,320 @@
+import atexit
+import bisect
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
+
+# Query instrumentation. Pooled connections hand out InstrumentedCursor
+# objects, which record per statement: fingerprint (SQL with literals and
+# placeholder lists collapsed), duration including fetches, rows and the
+# calling function. Statements slower than SLOW_QUERY_MS also go to the slow
+# query log. Menu actions wrapped in action() get latency histograms and the
+# queries they issued.
+
+ENABLED = os.environ.get("HMS_QUERY_STATS", "1") != "0"
+SLOW_QUERY_MS = float(os.environ.get("HMS_SLOW_QUERY_MS", "100"))
+# Optional file the slow query log is appended to (one JSON object per line)
+SLOW_QUERY_FILE = os.environ.get("HMS_SLOW_QUERY_LOG")
+# Optional file the full report is written to when the process exits
+REPORT_FILE = os.environ.get("HMS_QUERY_REPORT")
+SLOW_LOG_SIZE = 500
+
+# Histogram bucket upper bounds in milliseconds (last bucket is open)
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+# Frames from these modules are skipped when looking for the caller
+_INFRASTRUCTURE = {__name__, "db_config", "db_backends", "pagination", "contextlib"}
+
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.)*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_LIST_RE = re.compile(r"\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)")
+_VALUES_RE = re.compile(r"(\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql):
+    text = _SPACE_RE.sub(" ", sql).strip()
+    text = _STRING_RE.sub("?", text)
+    text = _NUMBER_RE.sub("?", text)
+    text = _LIST_RE.sub("(...)", text)
+    text = _VALUES_RE.sub(r"\1", text)
+    return text.replace("%s", "?")
+
+
+def _caller():
+    frame = sys._getframe(2)
+    while frame is not None:
+        module = frame.f_globals.get("__name__")
+        if module not in _INFRASTRUCTURE:
+            code = frame.f_code
+            return f"{module}.{getattr(code, 'co_qualname', code.co_name)}"
+        frame = frame.f_back
+    return "?"
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, pct):
+        # Upper bound of the bucket holding the pct-th sample
+        if not self.count:
+            return None
+        target = pct / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return BUCKETS_MS[i] if i < len(BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self):
+        labels = [f"<={b}ms" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"]
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else None,
+            "max_ms": round(self.max_ms, 3),
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "buckets": {label: n for label, n in zip(labels, self.counts) if n},
+        }
+
+
+class QueryStats:
+    def __init__(self, slow_query_ms=SLOW_QUERY_MS, slow_query_file=SLOW_QUERY_FILE):
+        self.slow_query_ms = slow_query_ms
+        self.slow_query_file = slow_query_file
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.queries = {}        # fingerprint -> aggregate dict
+            self.actions = {}        # action -> Histogram
+            self.action_queries = {}  # action -> {fingerprint: [count, total_ms]}
+            self.slow_log = deque(maxlen=SLOW_LOG_SIZE)
+
+    def current_action(self):
+        return getattr(self._local, "action", None)
+
+    # --- Statements ---
+    def record_query(self, sql, caller, ms, rows):
+        fp = fingerprint(sql)
+        action = self.current_action()
+        if action is not None:
+            timing = self._local.timing
+            timing["queries"] += 1
+            timing["query_ms"] += ms
+        with self._lock:
+            agg = self.queries.get(fp)
+            if agg is None:
+                agg = self.queries[fp] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0, "callers": {}}
+            agg["count"] += 1
+            agg["total_ms"] += ms
+            agg["max_ms"] = max(agg["max_ms"], ms)
+            agg["rows"] += max(rows, 0)
+            agg["callers"][caller] = agg["callers"].get(caller, 0) + 1
+            if action is not None:
+                per_action = self.action_queries.setdefault(action, {})
+                entry = per_action.setdefault(fp, [0, 0.0])
+                entry[0] += 1
+                entry[1] += ms
+            if ms >= self.slow_query_ms:
+                slow = {"at": time.strftime("%Y-%m-%d %H:%M:%S"), "ms": round(ms, 3), "rows": rows,
+                        "caller": caller, "action": action, "fingerprint": fp}
+                self.slow_log.append(slow)
+                if self.slow_query_file:
+                    with open(self.slow_query_file, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(slow) + "\n")
+
+    # --- Menu actions ---
+    @contextmanager
+    def action(self, name):
+        # Yields {"queries": n, "query_ms": t} for the statements run so far.
+        # Nested actions are attributed to the outermost one.
+        if self.current_action() is not None:
+            yield self._local.timing
+            return
+        self._local.action = name
+        self._local.timing = {"queries": 0, "query_ms": 0.0}
+        started = time.perf_counter()
+        try:
+            yield self._local.timing
+        finally:
+            ms = (time.perf_counter() - started) * 1000
+            self._local.action = None
+            with self._lock:
+                self.actions.setdefault(name, Histogram()).add(ms)
+
+    # --- Reporting ---
+    def report(self, top=20):
+        with self._lock:
+            queries = sorted(self.queries.items(), key=lambda item: item[1]["total_ms"], reverse=True)
+            return {
+                "slow_query_ms": self.slow_query_ms,
+                "queries": [
+                    {"fingerprint": fp, "count": a["count"], "total_ms": round(a["total_ms"], 3),
+                     "mean_ms": round(a["total_ms"] / a["count"], 3), "max_ms": round(a["max_ms"], 3),
+                     "rows": a["rows"],
+                     "callers": dict(sorted(a["callers"].items(), key=lambda c: c[1], reverse=True))}
+                    for fp, a in queries[:top]
+                ],
+                "actions": {
+                    name: dict(hist.to_dict(), queries=[
+                        {"fingerprint": fp, "count": n, "total_ms": round(total, 3)}
+                        for fp, (n, total) in sorted(self.action_queries.get(name, {}).items(),
+                                                     key=lambda q: q[1][1], reverse=True)[:5]])
+                    for name, hist in sorted(self.actions.items())
+                },
+                "slow_queries": list(self.slow_log),
+            }
+
+    def dump(self, file=None, top=20):
+        # Human-readable summary; file defaults to stdout
+        out = file or sys.stdout
+        report = self.report(top)
+        print("=== Menu actions ===", file=out)
+        if not report["actions"]:
+            print("(none recorded)", file=out)
+        for name, a in report["actions"].items():
+            print(f"{name}: n={a['count']} mean={a['mean_ms']}ms p50<={a['p50_ms']}ms "
+                  f"p95<={a['p95_ms']}ms max={a['max_ms']}ms", file=out)
+            for q in a["queries"]:
+                print(f"    {q['count']:>5} x {q['total_ms']:>10.3f}ms  {q['fingerprint'][:100]}", file=out)
+        print("\n=== Top queries by total time ===", file=out)
+        for q in report["queries"]:
+            caller = next(iter(q["callers"]), "?")
+            print(f"{q['count']:>6} x mean {q['mean_ms']:>8.3f}ms max {q['max_ms']:>8.3f}ms rows {q['rows']:>8}  "
+                  f"{caller}: {q['fingerprint'][:100]}", file=out)
+        print(f"\n=== Slow queries (>= {self.slow_query_ms}ms) ===", file=out)
+        if not report["slow_queries"]:
+            print("(none)", file=out)
+        for s in report["slow_queries"]:
+            print(f"{s['at']} {s['ms']:>9.3f}ms rows={s['rows']} {s['caller']} [{s['action']}]: "
+                  f"{s['fingerprint'][:100]}", file=out)
+
+    def write_json(self, path, top=100):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(top), f, indent=2)
+
+
+class InstrumentedCursor:
+    # Wraps a driver cursor; a statement's record is completed when the next
+    # statement runs or the cursor is closed, so time spent fetching counts
+    def __init__(self, cursor, stats):
+        self._cursor = cursor
+        self._stats = stats
+        self._sql = None
+        self._caller = None
+        self._ms = 0.0
+        self._rows = 0
+
+    def _finish(self):
+        if self._sql is not None:
+            self._stats.record_query(self._sql, self._caller, self._ms, self._rows)
+            self._sql = None
+
+    def _run(self, method, sql, params):
+        self._finish()
+        caller = _caller()
+        started = time.perf_counter()
+        try:
+            result = method(sql, params)
+        finally:
+            self._sql = sql
+            self._caller = caller
+            self._ms = (time.perf_counter() - started) * 1000
+            self._rows = 0
+        if sql.lstrip()[:6].upper() != "SELECT":
+            self._rows = max(self._cursor.rowcount, 0)
+        return result
+
+    def execute(self, sql, params=()):
+        return self._run(self._cursor.execute, sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self._run(self._cursor.executemany, sql, seq_of_params)
+
+    def _timed_fetch(self, method, *args):
+        started = time.perf_counter()
+        result = method(*args)
+        self._ms += (time.perf_counter() - started) * 1000
+        return result
+
+    def fetchone(self):
+        row = self._timed_fetch(self._cursor.fetchone)
+        if row is not None:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._timed_fetch(self._cursor.fetchmany, *args)
+        self._rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._timed_fetch(self._cursor.fetchall)
+        self._rows += len(rows)
+        return rows
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def close(self):
+        self._finish()
+        return self._cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+
+stats = QueryStats()
+
+
+def wrap_cursor(cursor):
+    return InstrumentedCursor(cursor, stats) if ENABLED else cursor
+
+
+def action(name):
+    return stats.action(name)
+
+
+def dump(file=None, top=20):
+    stats.dump(file, top)
+
+
+def _write_report_at_exit():
+    if REPORT_FILE and (stats.queries or stats.actions):
+        stats.write_json(REPORT_FILE)
+
+
+atexit.register(_write_report_at_exit)
@@ -0,0 +1,175 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import entity_cache
+from db_config import connection, Error
+from instrumentation import action
+from billing import invoice_path, render_invoice
+
+# Month-end invoice runs. Bills are selected by date range or ID list and
+# processed in chunks; each chunk needs three set-based queries (bills with
+# patients, latest appointment per patient, billed services) instead of
+# three queries per bill. Rendering and file writes fan out to a process pool.
+
+CHUNK_SIZE = 1000
+OUTPUT_DIR = os.path.join("output", "invoices")
+
+
+def _placeholders(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def _select_bill_ids(cursor, start_date, end_date, bill_ids):
+    if bill_ids is not None:
+        return list(dict.fromkeys(bill_ids))
+    cursor.execute("SELECT bill_id FROM billing WHERE billing_date BETWEEN %s AND %s ORDER BY bill_id",
+                   (start_date, end_date))
+    return [r[0] for r in cursor.fetchall()]
+
+
+def _fetch_chunk(cursor, bill_ids):
+    marks = _placeholders(bill_ids)
+    cursor.execute(f"""
+        SELECT bill_id, billing_date, patient_id
+        FROM billing
+        WHERE bill_id IN ({marks})
+    """, bill_ids)
+    bills = cursor.fetchall()
+    if not bills:
+        return []
+
+    # Patients and doctors come from the entity cache, so each record is
+    # fetched at most once per run however many bills refer to it
+    patient_ids = list({b[2] for b in bills})
+    patients = entity_cache.patients.get_many(patient_ids)
+
+    # Latest appointment per patient; rows arrive in date order
+    cursor.execute(f"""
+        SELECT patient_id, date, doctor_id, consulting_charge
+        FROM appointments
+        WHERE patient_id IN ({_placeholders(patient_ids)}) AND doctor_id IS NOT NULL
+        ORDER BY patient_id, date
+    """, patient_ids)
+    appointments = {}
+    for patient_id, _, doctor_id, charge in cursor.fetchall():
+        appointments[patient_id] = (doctor_id, charge)
+    doctors = entity_cache.doctors.get_many({d for d, _ in appointments.values()})
+    latest = {}
+    for patient_id, (doctor_id, charge) in appointments.items():
+        doctor = doctors.get(doctor_id)
+        if doctor:
+            latest[patient_id] = {'doctor_name': doctor[1], 'specialization': doctor[2],
+                                  'consulting_charge': charge}
+
+    cursor.execute(f"""
+        SELECT bs.bill_id, s.service_name, bs.cost
+        FROM billed_services bs
+        JOIN services s ON bs.service_id = s.service_id
+        WHERE bs.bill_id IN ({marks})
+    """, bill_ids)
+    services = {}
+    for bill_id, service_name, cost in cursor.fetchall():
+        services.setdefault(bill_id, []).append({'service_name': service_name, 'cost': cost})
+
+    return [(bill_id, billing_date, patient_id, patients[patient_id][1] if patient_id in patients else None,
+             latest.get(patient_id), services.get(bill_id, []))
+            for bill_id, billing_date, patient_id in bills]
+
+
+def _write_invoice(task):
+    output_dir, (bill_id, billing_date, patient_id, name, appt, services) = task
+    lines = render_invoice(bill_id, billing_date, patient_id, name, appt, services)
+    # One file per bill; a patient can have several bills in one run
+    filename = invoice_path(output_dir, bill_id)
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write('\n'.join(lines))
+    return filename
+
+
+def generate_invoices(start_date=None, end_date=None, bill_ids=None, workers=None,
+                      output_dir=OUTPUT_DIR, chunk_size=CHUNK_SIZE):
+    if bill_ids is None and (start_date is None or end_date is None):
+        raise ValueError("Give either a date range or a list of bill IDs.")
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    generated = 0
+    # Spawned (not forked) workers so no open database socket is inherited
+    executor = (ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+                if workers > 1 else None)
+    try:
+        with connection() as conn:
+            cursor = conn.cursor()
+            try:
+                ids = _select_bill_ids(cursor, start_date, end_date, bill_ids)
+                for i in range(0, len(ids), chunk_size):
+                    tasks = [(output_dir, inv) for inv in _fetch_chunk(cursor, ids[i:i + chunk_size])]
+                    if executor is not None:
+                        results = executor.map(_write_invoice, tasks, chunksize=max(1, len(tasks) // (workers * 4)))
+                    else:
+                        results = map(_write_invoice, tasks)
+                    generated += sum(1 for _ in results)
+            finally:
+                cursor.close()
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    elapsed = time.perf_counter() - started
+    return {
+        "requested": len(ids),
+        "generated": generated,
+        "elapsed": elapsed,
+        "invoices_per_sec": generated / elapsed if elapsed else 0.0,
+        "workers": workers,
+        "output_dir": output_dir,
+    }
+
+
+def print_stats(stats):
+    print(f"Generated {stats['generated']} of {stats['requested']} invoices in {stats['elapsed']:.2f}s "
+          f"({stats['invoices_per_sec']:,.0f} invoices/s, {stats['workers']} workers) into {stats['output_dir']}")
+
+
+def batch_invoice_menu():
+    print("Batch Invoice Options:")
+    print("1. By Billing Date Range")
+    print("2. By List of Bill IDs")
+    choice = input("Select an option: ")
+    try:
+        if choice == "1":
+            start_date = input("Enter start date (YYYY-MM-DD): ").strip()
+            end_date = input("Enter end date (YYYY-MM-DD): ").strip()
+            with action("Billing > Batch Invoices"):
+                stats = generate_invoices(start_date=start_date, end_date=end_date)
+        elif choice == "2":
+            raw = input("Enter Bill IDs separated by commas: ")
+            bill_ids = [b.strip() for b in raw.split(",") if b.strip()]
+            if not bill_ids:
+                print("No Bill IDs given.")
+                return
+            with action("Billing > Batch Invoices"):
+                stats = generate_invoices(bill_ids=bill_ids)
+        else:
+            print("Invalid option for batch invoice generation.")
+            return
+    except Error as e:
+        print("Database error while generating invoices:", e)
+        return
+    except Exception as e:
+        print("Unexpected error while generating invoices:", e)
+        return
+    print_stats(stats)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Generate invoices for many bills at once.")
+    parser.add_argument("--from", dest="start_date", help="first billing date (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="end_date", help="last billing date (YYYY-MM-DD)")
+    parser.add_argument("--ids", nargs="+", help="bill IDs to generate")
+    parser.add_argument("--workers", type=int, help="render processes (default: CPU count)")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    args = parser.parse_args()
+    print_stats(generate_invoices(args.start_date, args.end_date, args.ids, args.workers, args.output_dir))
@@ -0,0 +1,242 @@
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit, urlencode
+
+from benchmark import percentile
+
+# Load test for http_api.py: N client threads, each on its own keep-alive
+# connection, send a weighted mix of reads and writes for a fixed duration.
+# Prints per-endpoint and overall throughput, latency percentiles and
+# status counts as JSON.
+#
+#   python load_test.py --spawn --clients 32 --duration 20
+
+# (weight, label); see Client.request_for
+MIX = [
+    (30, "GET /patients/{id}"),
+    (15, "GET /patients/search"),
+    (10, "POST /patients"),
+    (15, "POST /patients/{id}/services"),
+    (5, "POST /bills"),
+    (10, "GET /appointments/by-date"),
+    (10, "POST /appointments"),
+    (5, "GET /patients/{id}/total-billing"),
+]
+FIRST_NAMES = ["Ann", "Ravi", "Maria", "John", "Priya", "Chen", "Fatima", "Omar", "Lena", "Kofi"]
+LAST_NAMES = ["Lee", "Sharma", "Garcia", "Smith", "Patel", "Wang", "Khan", "Ali", "Novak", "Mensah"]
+
+
+def _name(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def _date(rng):
+    return f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+
+
+class Client:
+    def __init__(self, url, timeout=30):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.conn = None
+
+    def request(self, method, path, body=None):
+        # Returns (status, payload, elapsed ms); reconnects once if the
+        # server closed an idle keep-alive connection
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        headers = {"Content-Type": "application/json"} if data is not None else {}
+        for attempt in (1, 2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            started = time.perf_counter()
+            try:
+                self.conn.request(method, path, body=data, headers=headers)
+                response = self.conn.getresponse()
+                raw = response.read()
+            except (http.client.HTTPException, OSError):
+                self.conn.close()
+                self.conn = None
+                if attempt == 2:
+                    raise
+                continue
+            ms = (time.perf_counter() - started) * 1000
+            return response.status, json.loads(raw or b"{}"), ms
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+
+
+def setup(url, patients):
+    # Creates the rows the mix refers to; returns (patient ids, doctor id, service id)
+    client = Client(url)
+    rng = random.Random(1)
+    try:
+        status, payload, _ = client.request("POST", "/services", {"service_name": "Load Test X-Ray", "cost": 250})
+        if status != 201:
+            raise SystemExit(f"Setup failed: {payload}")
+        service_id = payload["data"]["service_id"]
+        status, payload, _ = client.request("POST", "/doctors", {"name": "Load Tester", "specialization": "General",
+                                                                 "contact_no": "9000000000"})
+        if status != 201:
+            raise SystemExit(f"Setup failed: {payload}")
+        doctor_id = payload["data"]["doctor_id"]
+        patient_ids = []
+        for i in range(patients):
+            status, payload, _ = client.request("POST", "/patients", {
+                "name": _name(rng), "age": rng.randint(1, 90), "gender": rng.choice(["M", "F"]),
+                "admission_date": _date(rng), "contact_no": f"98{i:08d}"})
+            if status != 201:
+                raise SystemExit(f"Setup failed: {payload}")
+            patient_ids.append(payload["data"]["patient_id"])
+    finally:
+        client.close()
+    return patient_ids, doctor_id, service_id
+
+
+def request_for(label, rng, patient_ids, doctor_id, service_id):
+    patient_id = rng.choice(patient_ids)
+    if label == "GET /patients/{id}":
+        return "GET", f"/patients/{patient_id}", None
+    if label == "GET /patients/search":
+        return "GET", "/patients/search?" + urlencode({"name": rng.choice(LAST_NAMES)[:4]}), None
+    if label == "POST /patients":
+        return "POST", "/patients", {"name": _name(rng), "age": rng.randint(1, 90), "gender": rng.choice(["M", "F"]),
+                                     "admission_date": _date(rng), "contact_no": f"97{rng.randrange(10 ** 8):08d}"}
+    if label == "POST /patients/{id}/services":
+        return "POST", f"/patients/{patient_id}/services", {"service_id": service_id}
+    if label == "POST /bills":
+        return "POST", "/bills", {"patient_id": patient_id}
+    if label == "GET /appointments/by-date":
+        month = rng.randint(1, 12)
+        return "GET", "/appointments/by-date?" + urlencode(
+            {"start_date": f"2024-{month:02d}-01", "end_date": f"2024-{month:02d}-28", "limit": 50}), None
+    if label == "POST /appointments":
+        return "POST", "/appointments", {"patient_id": patient_id, "doctor_id": doctor_id, "date": _date(rng),
+                                         "diagnosis": "Checkup"}
+    return "GET", f"/patients/{patient_id}/total-billing", None
+
+
+def worker(url, seed, deadline, patient_ids, doctor_id, service_id, results, lock):
+    rng = random.Random(seed)
+    labels = [label for _, label in MIX]
+    weights = [weight for weight, _ in MIX]
+    client = Client(url)
+    local = {}
+    try:
+        while time.perf_counter() < deadline:
+            label = rng.choices(labels, weights)[0]
+            method, path, body = request_for(label, rng, patient_ids, doctor_id, service_id)
+            try:
+                status, _, ms = client.request(method, path, body)
+            except (http.client.HTTPException, OSError):
+                status, ms = "error", None
+            entry = local.setdefault(label, {"latencies": [], "status": {}})
+            if ms is not None:
+                entry["latencies"].append(ms)
+            entry["status"][str(status)] = entry["status"].get(str(status), 0) + 1
+    finally:
+        client.close()
+    with lock:
+        for label, entry in local.items():
+            merged = results.setdefault(label, {"latencies": [], "status": {}})
+            merged["latencies"].extend(entry["latencies"])
+            for status, n in entry["status"].items():
+                merged["status"][status] = merged["status"].get(status, 0) + n
+
+
+def summarize(latencies, status, elapsed):
+    latencies = sorted(latencies)
+    count = sum(status.values())
+    return {
+        "requests": count,
+        "req_per_sec": round(count / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 3) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95), 3) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99), 3) if latencies else None,
+        "max_ms": round(latencies[-1], 3) if latencies else None,
+        "status": dict(sorted(status.items())),
+    }
+
+
+def run(url, clients, duration, patients):
+    patient_ids, doctor_id, service_id = setup(url, patients)
+    results = {}
+    lock = threading.Lock()
+    started = time.perf_counter()
+    deadline = started + duration
+    threads = [threading.Thread(target=worker, args=(url, seed, deadline, patient_ids, doctor_id, service_id,
+                                                     results, lock))
+               for seed in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    all_latencies, all_status = [], {}
+    for entry in results.values():
+        all_latencies.extend(entry["latencies"])
+        for status, n in entry["status"].items():
+            all_status[status] = all_status.get(status, 0) + n
+    return {
+        "url": url,
+        "clients": clients,
+        "duration_s": round(elapsed, 2),
+        "overall": summarize(all_latencies, all_status, elapsed),
+        "endpoints": {label: summarize(entry["latencies"], entry["status"], elapsed)
+                      for label, entry in sorted(results.items())},
+    }
+
+
+def spawn_server(port, workers):
+    # Starts http_api.py next to this file and waits for /health
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "http_api.py")
+    process = subprocess.Popen([sys.executable, script, "--port", str(port), "--workers", str(workers)])
+    client = Client(f"http://127.0.0.1:{port}", timeout=1)
+    for _ in range(100):
+        try:
+            if client.request("GET", "/health")[0] == 200:
+                client.close()
+                return process
+        except (http.client.HTTPException, OSError):
+            time.sleep(0.1)
+    process.terminate()
+    raise SystemExit("Server did not start.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the hospital HTTP API.")
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent client connections")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run")
+    parser.add_argument("--patients", type=int, default=200, help="patients created before the run")
+    parser.add_argument("--spawn", action="store_true", help="start http_api.py on the --url port for the run")
+    parser.add_argument("--workers", type=int, default=16, help="server workers when using --spawn")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    process = spawn_server(urlsplit(args.url).port or 80, args.workers) if args.spawn else None
+    try:
+        report = run(args.url, args.clients, args.duration, args.patients)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
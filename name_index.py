@@ -0,0 +1,241 @@
+import os
+import threading
+
+from db_config import connection, begin_write, ensure_schema, get_backend
+from pagination import iter_rows
+
+# Trigram index over patient and doctor names. Each name is lower-cased and
+# padded as "^name$$"; every 3-character window becomes a posting
+# (entity, trigram, entity_id) in name_trigrams. A substring query is the
+# intersection of its trigram posting lists; shorter queries use a prefix
+# range over the trigrams. Candidates are verified and ranked in Python.
+# The first prepare() or search on a database from before the index fills
+# it from the entity tables (recorded in cache_versions).
+
+SEARCH_LIMIT = int(os.environ.get("HMS_SEARCH_LIMIT", "50"))
+# Upper bound on candidate rows fetched and ranked per query; candidates
+# sharing more of the query's trigrams are kept first
+CANDIDATE_CAP = 2000
+# Candidates for a long query must share at least this many of its trigrams
+MAX_QUERY_GRAMS = 8
+INSERT_CHUNK = 500
+# Row in cache_versions recording that the postings have been built
+BUILT_KEY = "name_trigrams"
+
+ENTITIES = {
+    # entity -> (table, id column)
+    "patient": ("patients", "patient_id"),
+    "doctor": ("doctors", "doctor_id"),
+}
+
+_lock = threading.Lock()
+_prepared_for = None
+
+
+def normalize(text):
+    return " ".join(str(text).lower().split())
+
+
+def trigrams(name):
+    padded = "^" + normalize(name) + "$$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _insert_postings(cursor, postings):
+    for i in range(0, len(postings), INSERT_CHUNK):
+        chunk = postings[i:i + INSERT_CHUNK]
+        cursor.execute(
+            "INSERT INTO name_trigrams (entity, trigram, entity_id) VALUES "
+            + ", ".join(["(%s, %s, %s)"] * len(chunk)),
+            [v for posting in chunk for v in posting])
+
+
+# --- Maintenance (called inside the caller's transaction) ---
+def index_name(cursor, entity, entity_id, name):
+    entity_id = str(entity_id)
+    _insert_postings(cursor, [(entity, g, entity_id) for g in sorted(trigrams(name))])
+
+
+def index_many(cursor, entity, rows):
+    # rows: iterable of (entity_id, name)
+    postings = [(entity, g, str(entity_id)) for entity_id, name in rows for g in sorted(trigrams(name))]
+    _insert_postings(cursor, postings)
+
+
+def remove(cursor, entity, entity_id):
+    cursor.execute("DELETE FROM name_trigrams WHERE entity=%s AND entity_id=%s", (entity, str(entity_id)))
+
+
+def remove_many(cursor, entity, entity_ids):
+    entity_ids = [str(i) for i in entity_ids]
+    for i in range(0, len(entity_ids), INSERT_CHUNK):
+        chunk = entity_ids[i:i + INSERT_CHUNK]
+        cursor.execute("DELETE FROM name_trigrams WHERE entity=%s AND entity_id IN (" + ", ".join(["%s"] * len(chunk))
+                       + ")", [entity] + chunk)
+
+
+def reindex(cursor, entity, entity_id, name):
+    remove(cursor, entity, entity_id)
+    index_name(cursor, entity, entity_id, name)
+
+
+def prepare():
+    # Make sure name_trigrams exists and is filled before the first write or
+    # search in this process. Call before opening a transaction.
+    global _prepared_for
+    backend = get_backend()
+    if _prepared_for is backend:
+        return
+    with _lock:
+        if _prepared_for is backend:
+            return
+        ensure_schema()
+        with connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT 1 FROM cache_versions WHERE name=%s", (BUILT_KEY,))
+                built = cursor.fetchone() is not None
+            finally:
+                cursor.close()
+        if not built:
+            rebuild()
+        _prepared_for = backend
+
+
+# --- Search ---
+def _query_grams(term):
+    return sorted({term[i:i + 3] for i in range(len(term) - 2)})
+
+
+def _intersect(cursor, entity, grams, required, cap):
+    # Entities with at least `required` of the trigrams, most shared first
+    placeholders = ", ".join(["%s"] * len(grams))
+    cursor.execute(
+        f"SELECT entity_id FROM name_trigrams WHERE entity=%s AND trigram IN ({placeholders}) "
+        "GROUP BY entity_id HAVING COUNT(*) >= %s ORDER BY COUNT(*) DESC, entity_id LIMIT %s",
+        [entity, *grams, required, cap])
+    return [r[0] for r in cursor.fetchall()]
+
+
+def _with_prefix(cursor, entity, prefix, cap):
+    # Index range scan over trigrams starting with prefix
+    cursor.execute(
+        "SELECT DISTINCT entity_id FROM name_trigrams "
+        "WHERE entity=%s AND trigram >= %s AND trigram < %s ORDER BY entity_id LIMIT %s",
+        (entity, prefix, prefix + "\x7f", cap))
+    return [r[0] for r in cursor.fetchall()]
+
+
+def _rank(name, term):
+    lowered = normalize(name)
+    pos = lowered.find(term)
+    if pos < 0:
+        return None
+    if pos == 0:
+        tier = 0                       # whole-name prefix
+    elif lowered[pos - 1] in " .":
+        tier = 1                       # word prefix
+    else:
+        tier = 2                       # substring
+    return (tier, pos, len(lowered), lowered)
+
+
+def _candidates(cursor, entity, term):
+    # Name-prefix matches are collected first so they survive the cap; a
+    # name containing the term has all its trigrams, so ranking by shared
+    # trigrams keeps true matches ahead of partial ones
+    if len(term) >= 3:
+        grams = _query_grams(term)
+        prefix = sorted(set(grams) | {"^" + term[:2]})
+        phases = [lambda cap: _intersect(cursor, entity, prefix, len(prefix), cap),
+                  lambda cap: _intersect(cursor, entity, grams, min(len(grams), MAX_QUERY_GRAMS), cap)]
+    else:
+        phases = [lambda cap: _with_prefix(cursor, entity, "^" + term, cap),
+                  lambda cap: _with_prefix(cursor, entity, term, cap)]
+    ids = []
+    seen = set()
+    for phase in phases:
+        for entity_id in phase(CANDIDATE_CAP):
+            if entity_id not in seen:
+                seen.add(entity_id)
+                ids.append(entity_id)
+        if len(ids) >= CANDIDATE_CAP:
+            break
+    return ids[:CANDIDATE_CAP]
+
+
+def search(entity, term, limit=SEARCH_LIMIT, cursor=None):
+    # Returns matching rows (SELECT * order) ranked: name prefix, word
+    # prefix, then other substrings; ties by position and name length.
+    # With a cursor the search runs in that transaction and sees its
+    # uncommitted rows (the caller has run prepare()).
+    term = normalize(term)
+    if not term:
+        return []
+    if cursor is not None:
+        return _search(cursor, entity, term, limit)
+    prepare()
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            return _search(cursor, entity, term, limit)
+        finally:
+            cursor.close()
+
+
+def _search(cursor, entity, term, limit):
+    table, id_column = ENTITIES[entity]
+    ids = _candidates(cursor, entity, term)
+    rows = []
+    for i in range(0, len(ids), INSERT_CHUNK):
+        chunk = ids[i:i + INSERT_CHUNK]
+        cursor.execute(f"SELECT * FROM {table} WHERE {id_column} IN ({', '.join(['%s'] * len(chunk))})", chunk)
+        rows.extend(cursor.fetchall())
+    ranked = []
+    for row in rows:
+        key = _rank(row[1], term)      # name is the second column in both tables
+        if key is not None:
+            ranked.append((key, row))
+    ranked.sort(key=lambda item: item[0])
+    return [row for _, row in ranked[:limit]]
+
+
+def rebuild(entities=None):
+    # Re-creates the postings from the entity tables (first use / repair)
+    ensure_schema()
+    counts = {}
+    with connection() as conn:
+        begin_write(conn)
+        cursor = conn.cursor()
+        try:
+            for entity in entities or ENTITIES:
+                table, id_column = ENTITIES[entity]
+                cursor.execute("DELETE FROM name_trigrams WHERE entity=%s", (entity,))
+                counts[entity] = 0
+                chunk = []
+                # Read on the connection holding the write lock; a second
+                # pooled connection could wait on it forever
+                for row in iter_rows(table, id_column, columns=f"{id_column}, name", conn=conn):
+                    chunk.append(row)
+                    if len(chunk) >= INSERT_CHUNK:
+                        index_many(cursor, entity, chunk)
+                        counts[entity] += len(chunk)
+                        chunk = []
+                index_many(cursor, entity, chunk)
+                counts[entity] += len(chunk)
+            cursor.execute("UPDATE cache_versions SET version=version+1 WHERE name=%s", (BUILT_KEY,))
+            if cursor.rowcount == 0:
+                cursor.execute("INSERT INTO cache_versions (name, version) VALUES (%s, 1)", (BUILT_KEY,))
+            conn.commit()
+        finally:
+            cursor.close()
+    return counts
+
+
+if __name__ == "__main__":
+    import sys
+    if "--rebuild" in sys.argv:
+        for entity, count in rebuild().items():
+            print(f"Indexed {count} {entity} names.")
+    else:
+        print("Usage: python name_index.py --rebuild")
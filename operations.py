@@ -0,0 +1,777 @@
+import datetime
+import inspect
+
+from db_config import begin_write, lock_clause, ensure_schema, IntegrityError, Error
+from id_allocator import next_id
+from validators import (
+    PATIENT, DOCTOR, SERVICE, APPOINTMENT, BILL, SERVICE_USAGE, format_doctor_name, DATE_RE,
+)
+import entity_cache
+import name_index
+import patient_totals
+import scheduling
+import usage_journal
+from pagination import PAGE_SIZE
+from service_catalog import catalog, bump_version
+
+# Non-interactive counterparts of the entity methods for programmatic callers
+# (async API, batch mode, HTTP). Each operation takes a Transaction, applies
+# the same validation and side effects as the entity classes (name index,
+# caches, catalog version, patient totals) and returns a Result instead of
+# printing. The caller decides when to commit, so several operations can
+# share one transaction.
+
+OPERATIONS = {}     # name -> (function, writes)
+# Operations that read pending service usage; usage still queued in this
+# process's write-behind journal is written out first (see usage_journal.py)
+READS_USAGE = {"add_bill", "compute_total_billing", "list_service_usage", "clear_service_usage"}
+
+
+class Result:
+    def __init__(self, ok, data=None, error=None, code=None, fields=None):
+        self.ok = ok
+        self.data = data
+        self.error = error
+        self.code = code        # validation, not_found, conflict, db_error, bad_request
+        self.fields = fields    # [FieldError] for validation failures
+
+    @classmethod
+    def success(cls, data=None):
+        return cls(True, data)
+
+    @classmethod
+    def failure(cls, code, error):
+        return cls(False, error=error, code=code)
+
+    @classmethod
+    def invalid(cls, errors):
+        # A validation failure from schema FieldErrors; error is the first message
+        return cls(False, error=errors[0].message, code="validation", fields=errors)
+
+    def to_dict(self):
+        if self.ok:
+            return {"ok": True, "data": _jsonable(self.data)}
+        result = {"ok": False, "code": self.code, "error": self.error}
+        if self.fields:
+            result["fields"] = [e.to_dict() for e in self.fields]
+        return result
+
+    def __repr__(self):
+        return f"Result({self.to_dict()})"
+
+
+def _jsonable(value):
+    if isinstance(value, dict):
+        return {k: _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return float(value) if hasattr(value, "as_integer_ratio") else str(value)   # Decimal
+
+
+class Transaction:
+    # One pooled connection and cursor; callbacks registered with
+    # after_commit run only once the changes are durable (cache invalidation).
+    # IDs are allocated before an operation's first write: the allocator uses
+    # its own connection, which must not wait on this transaction's locks.
+    def __init__(self, conn):
+        self.conn = conn
+        self.cursor = conn.cursor()
+        self._after_commit = []
+
+    def begin_write(self):
+        begin_write(self.conn)
+
+    def after_commit(self, callback):
+        self._after_commit.append(callback)
+
+    def commit(self):
+        self.conn.commit()
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            callback()
+
+    def rollback(self):
+        self._after_commit = []
+        self.conn.rollback()
+
+    def savepoint(self, name):
+        self.cursor.execute(f"SAVEPOINT {name}")
+
+    def rollback_to(self, name):
+        self.cursor.execute(f"ROLLBACK TO SAVEPOINT {name}")
+
+    def release(self, name):
+        self.cursor.execute(f"RELEASE SAVEPOINT {name}")
+
+    def close(self):
+        self.cursor.close()
+
+    def rows(self):
+        names = [d[0] for d in self.cursor.description]
+        return [dict(zip(names, row)) for row in self.cursor.fetchall()]
+
+    def row(self):
+        row = self.cursor.fetchone()
+        if row is None:
+            return None
+        return dict(zip((d[0] for d in self.cursor.description), row))
+
+
+def operation(writes):
+    def register(fn):
+        OPERATIONS[fn.__name__] = (fn, writes)
+        return fn
+    return register
+
+
+def run(tx, name, params):
+    # Runs one registered operation; database errors become failed Results
+    entry = OPERATIONS.get(name)
+    if entry is None:
+        return Result.failure("bad_request", f"Unknown operation '{name}'.")
+    fn, _ = entry
+    try:
+        inspect.signature(fn).bind(tx, **params)
+    except TypeError as e:
+        return Result.failure("bad_request", f"Bad parameters for '{name}': {e}")
+    try:
+        return fn(tx, **params)
+    except IntegrityError as e:
+        return Result.failure("conflict", str(e))
+    except Error as e:
+        return Result.failure("db_error", str(e))
+    except (TypeError, ValueError) as e:
+        # Parameters of the wrong type that slipped past validation
+        return Result.failure("bad_request", f"Bad parameters for '{name}': {e}")
+
+
+def prepare(writes=True, reads_usage=False):
+    # Schema and derived tables an operation relies on, and the usage
+    # journal if it reads pending usage; run before opening the transaction
+    # (DDL commits implicitly on MySQL, and the journal flush takes the
+    # write lock). Returns a failed Result if the database cannot be
+    # prepared, else None.
+    try:
+        if writes:
+            ensure_schema()
+        patient_totals.prepare()
+        name_index.prepare()
+        if reads_usage:
+            usage_journal.sync()
+    except Error as e:
+        return Result.failure("db_error", str(e))
+    return None
+
+
+def execute(conn, name, params):
+    # Runs one operation in its own transaction on conn
+    entry = OPERATIONS.get(name)
+    writes = entry[1] if entry else False
+    failed = prepare(writes, name in READS_USAGE)
+    if failed:
+        return failed
+    tx = Transaction(conn)
+    try:
+        result = run(tx, name, params)
+        if result.ok and writes:
+            tx.commit()
+        else:
+            tx.rollback()
+        return result
+    finally:
+        tx.close()
+
+
+def _s(value):
+    return None if value is None else str(value)
+
+
+def _not_found(what, key):
+    return Result.failure("not_found", f"{what} '{key}' not found.")
+
+
+def _limit(limit, high=1000):
+    # (limit capped at high, error message); limits arrive as JSON numbers
+    # or query-string text
+    try:
+        limit = None if isinstance(limit, bool) else int(limit)
+    except (TypeError, ValueError):
+        limit = None
+    if limit is None or limit < 1:
+        return None, "Invalid limit. Must be a positive integer."
+    return limit if high is None else min(limit, high), None
+
+
+def _service(tx, service_id):
+    # Catalog first; rows written earlier in this (uncommitted) transaction
+    # are only visible through tx itself
+    row = catalog.get(service_id)
+    if row is None:
+        tx.cursor.execute("SELECT service_id, service_name, cost FROM services WHERE service_id=%s", (service_id,))
+        row = tx.cursor.fetchone()
+    return row
+
+
+def _patient_exists(tx, patient_id):
+    if entity_cache.patients.get(patient_id) is not None:
+        return True
+    tx.cursor.execute("SELECT 1 FROM patients WHERE patient_id=%s", (patient_id,))
+    return tx.cursor.fetchone() is not None
+
+
+# --- Patients ---
+@operation(writes=True)
+def add_patient(tx, name, age, gender, admission_date, contact_no, patient_id=None):
+    contact_no = _s(contact_no)
+    errors = PATIENT.validate({"name": name, "age": age, "gender": gender, "admission_date": admission_date,
+                               "contact_no": contact_no})
+    if errors:
+        return Result.invalid(errors)
+    patient_id = patient_id or next_id("patient")
+    tx.cursor.execute(
+        "INSERT INTO patients (patient_id, name, age, gender, admission_date, contact_no) VALUES (%s, %s, %s, %s, %s, %s)",
+        (patient_id, name, int(age), gender, admission_date, contact_no))
+    name_index.index_name(tx.cursor, "patient", patient_id, name)
+    return Result.success({"patient_id": patient_id})
+
+
+@operation(writes=True)
+def update_patient(tx, patient_id, name, age, gender, admission_date, contact_no):
+    contact_no = _s(contact_no)
+    errors = PATIENT.validate({"name": name, "age": age, "gender": gender, "admission_date": admission_date,
+                               "contact_no": contact_no})
+    if errors:
+        return Result.invalid(errors)
+    tx.cursor.execute(
+        "UPDATE patients SET name=%s, age=%s, gender=%s, admission_date=%s, contact_no=%s WHERE patient_id=%s",
+        (name, int(age), gender, admission_date, contact_no, patient_id))
+    if tx.cursor.rowcount == 0:
+        return _not_found("Patient", patient_id)
+    name_index.reindex(tx.cursor, "patient", patient_id, name)
+    tx.after_commit(lambda: entity_cache.patients.invalidate(patient_id))
+    return Result.success({"patient_id": patient_id})
+
+
+@operation(writes=True)
+def delete_patient(tx, patient_id):
+    tx.cursor.execute("DELETE FROM patients WHERE patient_id=%s", (patient_id,))
+    if tx.cursor.rowcount == 0:
+        return _not_found("Patient", patient_id)
+    name_index.remove(tx.cursor, "patient", patient_id)
+    patient_totals.remove_patient(tx.cursor, patient_id)
+    tx.after_commit(lambda: entity_cache.patients.invalidate(patient_id))
+    return Result.success({"patient_id": patient_id})
+
+
+@operation(writes=False)
+def get_patient(tx, patient_id):
+    tx.cursor.execute("SELECT * FROM patients WHERE patient_id=%s", (patient_id,))
+    row = tx.row()
+    return Result.success(row) if row else _not_found("Patient", patient_id)
+
+
+@operation(writes=False)
+def list_patients(tx, after=None, limit=PAGE_SIZE):
+    return _page(tx, "patients", "patient_id", after, limit)
+
+
+@operation(writes=False)
+def search_patients(tx, name, limit=name_index.SEARCH_LIMIT):
+    limit, error = _limit(limit)
+    if error:
+        return Result.failure("bad_request", error)
+    rows = name_index.search("patient", name, limit, cursor=tx.cursor)
+    keys = ("patient_id", "name", "age", "gender", "admission_date", "contact_no")
+    return Result.success([dict(zip(keys, row)) for row in rows])
+
+
+@operation(writes=False)
+def days_admitted(tx, patient_id):
+    tx.cursor.execute("SELECT admission_date FROM patients WHERE patient_id=%s", (patient_id,))
+    row = tx.cursor.fetchone()
+    if not row or not row[0]:
+        return _not_found("Patient", patient_id)
+    return Result.success({"patient_id": patient_id, "days": (datetime.date.today() - row[0]).days})
+
+
+# --- Doctors ---
+def _doctor_changed(doctor_id):
+    # Specialization and working hours are cached by the slot index too
+    entity_cache.doctors.invalidate(doctor_id)
+    scheduling.index.invalidate(doctor_id)
+
+
+@operation(writes=True)
+def add_doctor(tx, name, specialization, contact_no, doctor_id=None):
+    name = format_doctor_name(name or "")
+    contact_no = _s(contact_no)
+    errors = DOCTOR.validate({"name": name, "specialization": specialization, "contact_no": contact_no})
+    if errors:
+        return Result.invalid(errors)
+    doctor_id = doctor_id or next_id("doctor")
+    tx.cursor.execute("INSERT INTO doctors (doctor_id, name, specialization, contact_no) VALUES (%s, %s, %s, %s)",
+                      (doctor_id, name, specialization, contact_no))
+    name_index.index_name(tx.cursor, "doctor", doctor_id, name)
+    return Result.success({"doctor_id": doctor_id})
+
+
+@operation(writes=True)
+def update_doctor(tx, doctor_id, name, specialization, contact_no):
+    name = format_doctor_name(name or "")
+    contact_no = _s(contact_no)
+    errors = DOCTOR.validate({"name": name, "specialization": specialization, "contact_no": contact_no})
+    if errors:
+        return Result.invalid(errors)
+    tx.cursor.execute("UPDATE doctors SET name=%s, specialization=%s, contact_no=%s WHERE doctor_id=%s",
+                      (name, specialization, contact_no, doctor_id))
+    if tx.cursor.rowcount == 0:
+        return _not_found("Doctor", doctor_id)
+    name_index.reindex(tx.cursor, "doctor", doctor_id, name)
+    tx.after_commit(lambda: _doctor_changed(doctor_id))
+    return Result.success({"doctor_id": doctor_id})
+
+
+@operation(writes=True)
+def delete_doctor(tx, doctor_id):
+    tx.cursor.execute("DELETE FROM doctors WHERE doctor_id=%s", (doctor_id,))
+    if tx.cursor.rowcount == 0:
+        return _not_found("Doctor", doctor_id)
+    name_index.remove(tx.cursor, "doctor", doctor_id)
+    tx.after_commit(lambda: _doctor_changed(doctor_id))
+    return Result.success({"doctor_id": doctor_id})
+
+
+@operation(writes=False)
+def get_doctor(tx, doctor_id):
+    tx.cursor.execute("SELECT * FROM doctors WHERE doctor_id=%s", (doctor_id,))
+    row = tx.row()
+    return Result.success(row) if row else _not_found("Doctor", doctor_id)
+
+
+@operation(writes=False)
+def list_doctors(tx, after=None, limit=PAGE_SIZE):
+    return _page(tx, "doctors", "doctor_id", after, limit)
+
+
+@operation(writes=False)
+def search_doctors(tx, name, limit=name_index.SEARCH_LIMIT):
+    limit, error = _limit(limit)
+    if error:
+        return Result.failure("bad_request", error)
+    rows = name_index.search("doctor", name, limit, cursor=tx.cursor)
+    keys = ("doctor_id", "name", "specialization", "contact_no")
+    return Result.success([dict(zip(keys, row)) for row in rows])
+
+
+# --- Services ---
+@operation(writes=True)
+def add_service(tx, service_name, cost, service_id=None):
+    errors = SERVICE.validate({"service_name": service_name, "cost": cost})
+    if errors:
+        return Result.invalid(errors)
+    service_id = service_id or next_id("service")
+    tx.cursor.execute("INSERT INTO services (service_id, service_name, cost) VALUES (%s, %s, %s)",
+                      (service_id, service_name, float(cost)))
+    bump_version(tx.cursor)
+    tx.after_commit(catalog.invalidate)
+    return Result.success({"service_id": service_id})
+
+
+@operation(writes=True)
+def update_service(tx, service_id, service_name, cost):
+    errors = SERVICE.validate({"service_name": service_name, "cost": cost})
+    if errors:
+        return Result.invalid(errors)
+    tx.cursor.execute("UPDATE services SET service_name=%s, cost=%s WHERE service_id=%s",
+                      (service_name, float(cost), service_id))
+    if tx.cursor.rowcount == 0:
+        return _not_found("Service", service_id)
+    bump_version(tx.cursor)
+    tx.after_commit(catalog.invalidate)
+    return Result.success({"service_id": service_id})
+
+
+@operation(writes=True)
+def delete_service(tx, service_id):
+    tx.cursor.execute("DELETE FROM services WHERE service_id=%s", (service_id,))
+    if tx.cursor.rowcount == 0:
+        return _not_found("Service", service_id)
+    bump_version(tx.cursor)
+    tx.after_commit(catalog.invalidate)
+    return Result.success({"service_id": service_id})
+
+
+@operation(writes=False)
+def get_service(tx, service_id):
+    row = catalog.get(service_id)
+    if row is None:
+        return _not_found("Service", service_id)
+    return Result.success(dict(zip(("service_id", "service_name", "cost"), row)))
+
+
+@operation(writes=False)
+def list_services(tx):
+    return Result.success([dict(zip(("service_id", "service_name", "cost"), row)) for row in catalog.all()])
+
+
+# --- Service usage ---
+@operation(writes=True)
+def add_service_usage(tx, patient_id, service_id):
+    patient_id = _s(patient_id)
+    errors = SERVICE_USAGE.validate({"patient_id": patient_id, "service_id": service_id},
+                                    only=("patient_id", "service_id"))
+    if errors:
+        return Result.invalid(errors)
+    row = _service(tx, service_id)
+    if row is None:
+        return _not_found("Service", service_id)
+    _, service_name, cost = row
+    usage, errors = SERVICE_USAGE.clean({"patient_id": patient_id, "service_id": service_id,
+                                         "service_name": service_name, "cost": cost})
+    if errors:
+        return Result.invalid(errors)
+    cost = usage["cost"]
+    tx.cursor.execute(
+        "INSERT INTO temp_service_usage (patient_id, service_id, service_name, cost) VALUES (%s, %s, %s, %s)",
+        (patient_id, service_id, service_name, cost))
+    patient_totals.adjust(tx.cursor, patient_id, pending=cost)
+    return Result.success({"patient_id": patient_id, "service_id": service_id, "service_name": service_name,
+                           "cost": cost})
+
+
+@operation(writes=False)
+def list_service_usage(tx, patient_id):
+    tx.cursor.execute("SELECT service_id, service_name, cost FROM temp_service_usage WHERE patient_id=%s",
+                      (_s(patient_id),))
+    return Result.success(tx.rows())
+
+
+@operation(writes=True)
+def clear_service_usage(tx, patient_id):
+    tx.cursor.execute("DELETE FROM temp_service_usage WHERE patient_id=%s", (_s(patient_id),))
+    cleared = tx.cursor.rowcount
+    patient_totals.clear_pending(tx.cursor, patient_id)
+    return Result.success({"patient_id": patient_id, "cleared": cleared})
+
+
+# --- Appointments ---
+@operation(writes=True)
+def add_appointment(tx, patient_id, doctor_id, date, diagnosis, appt_id=None, start=None, slots=1):
+    # With a start time this is a slot booking (book_slot); without one it
+    # is only allowed for doctors who have no working hours
+    if start is not None:
+        return book_slot(tx, patient_id, doctor_id, date, start, diagnosis, slots, appt_id)
+    errors = APPOINTMENT.validate({"patient_id": patient_id, "doctor_id": doctor_id, "date": date,
+                                   "diagnosis": diagnosis})
+    if errors:
+        return Result.invalid(errors)
+    appt_id = appt_id or next_id("appointment")
+    tx.begin_write()
+    if scheduling.has_hours(tx.cursor, doctor_id):
+        return Result.failure("validation", scheduling.NEEDS_SLOT.format(doctor_id))
+    return _insert_appointment(tx, patient_id, doctor_id, date, diagnosis, appt_id)
+
+
+def _insert_appointment(tx, patient_id, doctor_id, date, diagnosis, appt_id):
+    tx.cursor.execute(
+        "INSERT INTO appointments (appt_id, patient_id, doctor_id, date, diagnosis) VALUES (%s, %s, %s, %s, %s)",
+        (appt_id, patient_id, doctor_id, date, diagnosis))
+    tx.cursor.execute("SELECT consulting_charge FROM appointments WHERE appt_id=%s", (appt_id,))
+    patient_totals.adjust(tx.cursor, patient_id, consulting=float(tx.cursor.fetchone()[0] or 0))
+    return Result.success({"appt_id": appt_id})
+
+
+@operation(writes=True)
+def update_appointment(tx, appt_id, patient_id, doctor_id, date, diagnosis):
+    errors = APPOINTMENT.validate({"patient_id": patient_id, "doctor_id": doctor_id, "date": date,
+                                   "diagnosis": diagnosis})
+    if errors:
+        return Result.invalid(errors)
+    tx.begin_write()
+    old = patient_totals.locked_row(tx.cursor, "appointments", "appt_id", appt_id,
+                                    "patient_id, consulting_charge, doctor_id, date")
+    if old is None:
+        return _not_found("Appointment", appt_id)
+    slotted = scheduling.slots_of(tx.cursor, appt_id)
+    if slotted and (slotted[0] != doctor_id or slotted[1].isoformat() != date):
+        return Result.failure("validation", scheduling.MOVE_SLOTTED)
+    moved = (old[2], str(old[3])) != (doctor_id, date)
+    if not slotted and moved and scheduling.has_hours(tx.cursor, doctor_id):
+        return Result.failure("validation", scheduling.NEEDS_SLOT.format(doctor_id))
+    tx.cursor.execute("UPDATE appointments SET patient_id=%s, doctor_id=%s, date=%s, diagnosis=%s WHERE appt_id=%s",
+                      (patient_id, doctor_id, date, diagnosis, appt_id))
+    patient_totals.move(tx.cursor, old[0], patient_id, "consulting", old[1], old[1])
+    return Result.success({"appt_id": appt_id})
+
+
+@operation(writes=True)
+def delete_appointment(tx, appt_id):
+    tx.begin_write()
+    old = patient_totals.locked_row(tx.cursor, "appointments", "appt_id", appt_id, "patient_id, consulting_charge")
+    if old is None:
+        return _not_found("Appointment", appt_id)
+    tx.cursor.execute("DELETE FROM appointments WHERE appt_id=%s", (appt_id,))
+    patient_totals.move(tx.cursor, old[0], None, "consulting", old[1], 0)
+    tx.after_commit(lambda: scheduling.index.released(appt_id))
+    return Result.success({"appt_id": appt_id})
+
+
+@operation(writes=False)
+def get_appointment(tx, appt_id):
+    tx.cursor.execute("SELECT * FROM appointments WHERE appt_id=%s", (appt_id,))
+    row = tx.row()
+    return Result.success(row) if row else _not_found("Appointment", appt_id)
+
+
+@operation(writes=False)
+def list_appointments(tx, after=None, limit=PAGE_SIZE):
+    return _page(tx, "appointments", "appt_id", after, limit)
+
+
+@operation(writes=False)
+def filter_appointments(tx, start_date, end_date, limit=1000):
+    if not DATE_RE.match(start_date or "") or not DATE_RE.match(end_date or ""):
+        return Result.failure("validation", "Invalid Date. Use YYYY-MM-DD format.")
+    limit, error = _limit(limit, high=None)
+    if error:
+        return Result.failure("bad_request", error)
+    tx.cursor.execute("SELECT * FROM appointments WHERE date BETWEEN %s AND %s ORDER BY date, appt_id LIMIT %s",
+                      (start_date, end_date, limit))
+    return Result.success(tx.rows())
+
+
+@operation(writes=False)
+def days_between_appointments(tx, patient_id):
+    tx.cursor.execute("SELECT date FROM appointments WHERE patient_id=%s ORDER BY date", (patient_id,))
+    dates = [row[0] for row in tx.cursor.fetchall() if row[0]]
+    return Result.success([(dates[i] - dates[i - 1]).days for i in range(1, len(dates))])
+
+
+# --- Scheduling ---
+def _slot(doctor_id, date, start, end):
+    return {"doctor_id": doctor_id, "date": date, "start": scheduling.format_time(start),
+            "end": scheduling.format_time(end)}
+
+
+def _slot_params(date, start, slots):
+    # (date, start minute, slots, error)
+    if not DATE_RE.match(str(date or "")):
+        return None, None, None, "Invalid Date. Use YYYY-MM-DD format."
+    minute = scheduling.parse_time(start) if start is not None else 0
+    if minute is None:
+        return None, None, None, "Invalid time. Use HH:MM."
+    try:
+        slots = int(slots)
+    except (TypeError, ValueError):
+        slots = 0
+    if slots < 1:
+        return None, None, None, "Number of slots must be a positive integer."
+    return datetime.date.fromisoformat(date), minute, slots, None
+
+
+@operation(writes=True)
+def set_doctor_hours(tx, doctor_id, weekday, start, end, slot_minutes=scheduling.DEFAULT_SLOT_MINUTES):
+    tx.begin_write()
+    tx.cursor.execute("SELECT 1 FROM doctors WHERE doctor_id=%s", (doctor_id,))
+    if tx.cursor.fetchone() is None:
+        return _not_found("Doctor", doctor_id)
+    tx.cursor.execute("SELECT weekday, start_minute, end_minute, slot_minutes FROM doctor_hours WHERE doctor_id=%s"
+                      + lock_clause(), (doctor_id,))
+    existing = tx.cursor.fetchall()
+    error = scheduling.validate_hours(weekday, start, end, slot_minutes, existing)
+    if error:
+        return Result.failure("validation", error)
+    error = scheduling.check_bookings(tx.cursor, doctor_id, weekday, start, end, slot_minutes, existing)
+    if error:
+        return Result.failure("conflict", error)
+    scheduling.set_hours(tx.cursor, doctor_id, weekday, start, end, slot_minutes)
+    tx.after_commit(lambda: scheduling.index.invalidate(doctor_id))
+    return Result.success({"doctor_id": doctor_id, "weekday": scheduling.WEEKDAYS[scheduling.parse_weekday(weekday)],
+                           "start": start, "end": end, "slot_minutes": int(slot_minutes)})
+
+
+@operation(writes=True)
+def clear_doctor_hours(tx, doctor_id, weekday=None):
+    if weekday is not None and scheduling.parse_weekday(weekday) is None:
+        return Result.failure("validation", "Invalid weekday. Use Mon-Sun or 0-6.")
+    tx.begin_write()
+    error = scheduling.check_clear(tx.cursor, doctor_id, weekday)
+    if error:
+        return Result.failure("conflict", error)
+    scheduling.clear_hours(tx.cursor, doctor_id, weekday)
+    cleared = tx.cursor.rowcount
+    tx.after_commit(lambda: scheduling.index.invalidate(doctor_id))
+    return Result.success({"doctor_id": doctor_id, "cleared": cleared})
+
+
+@operation(writes=False)
+def get_doctor_hours(tx, doctor_id):
+    tx.cursor.execute("SELECT weekday, start_minute, end_minute, slot_minutes FROM doctor_hours WHERE doctor_id=%s "
+                      "ORDER BY weekday, start_minute", (doctor_id,))
+    return Result.success(scheduling.describe_hours([tuple(int(v) for v in row) for row in tx.cursor.fetchall()]))
+
+
+@operation(writes=False)
+def free_slots(tx, doctor_id, date):
+    date, _, _, error = _slot_params(date, None, 1)
+    if error:
+        return Result.failure("validation", error)
+    return Result.success([_slot(doctor_id, date, start, end)
+                           for start, end in scheduling.index.free_slots(doctor_id, date)])
+
+
+@operation(writes=False)
+def is_slot_free(tx, doctor_id, date, start, slots=1):
+    date, minute, slots, error = _slot_params(date, start, slots)
+    if error:
+        return Result.failure("validation", error)
+    return Result.success({"doctor_id": doctor_id, "date": date, "start": start,
+                           "free": scheduling.index.is_free(doctor_id, date, minute, slots)})
+
+
+@operation(writes=False)
+def first_free_slot(tx, doctor_id=None, specialization=None, from_date=None, after="00:00", slots=1,
+                    days=scheduling.SEARCH_DAYS):
+    # Earliest free slot of one doctor, or of any doctor with the specialization
+    if not doctor_id and not specialization:
+        return Result.failure("validation", "Give a doctor ID or a specialization.")
+    from_date, minute, slots, error = _slot_params(from_date or datetime.date.today().isoformat(), after, slots)
+    if error:
+        return Result.failure("validation", error)
+    doctor_ids = [doctor_id] if doctor_id else scheduling.index.specialists(specialization)
+    days = min(int(days), 366) if str(days).isdigit() else scheduling.SEARCH_DAYS
+    found = scheduling.index.first_free(doctor_ids, from_date, minute, slots, days)
+    if found is None:
+        return Result.failure("not_found", f"No free slot in the next {days} days.")
+    date, start, doctor_id = found
+    starts, _ = scheduling.index.plan(doctor_id, date, start, slots)
+    day = scheduling.index.day(doctor_id, date)
+    return Result.success(_slot(doctor_id, date, start, day.length[starts[-1]]))
+
+
+@operation(writes=False)
+def free_doctors(tx, specialization, date, start, slots=1):
+    # Doctors with the specialization who are free at date/start
+    date, minute, slots, error = _slot_params(date, start, slots)
+    if error:
+        return Result.failure("validation", error)
+    return Result.success(scheduling.index.free_doctors(scheduling.index.specialists(specialization), date, minute,
+                                                        slots))
+
+
+@operation(writes=True)
+def book_slot(tx, patient_id, doctor_id, date, start, diagnosis, slots=1, appt_id=None):
+    # Creates the appointment and reserves its slots in one transaction; a
+    # slot taken concurrently (here or in another process) fails the
+    # reservation's primary key and the whole booking rolls back
+    errors = APPOINTMENT.validate({"patient_id": patient_id, "doctor_id": doctor_id, "date": date,
+                                   "diagnosis": diagnosis})
+    if errors:
+        return Result.invalid(errors)
+    date_value, minute, slots, error = _slot_params(date, start, slots)
+    if error:
+        return Result.failure("validation", error)
+    starts, error = scheduling.index.plan(doctor_id, date_value, minute, slots)
+    if error:
+        return Result.failure("conflict" if error == scheduling.TAKEN else "validation", error)
+    appt_id = appt_id or next_id("appointment")
+    _insert_appointment(tx, patient_id, doctor_id, date, diagnosis, appt_id)
+    try:
+        error = scheduling.reserve(tx.cursor, appt_id, doctor_id, date_value, starts)
+    except IntegrityError:
+        scheduling.index.invalidate(doctor_id, date_value)
+        return Result.failure("conflict", scheduling.TAKEN)
+    if error:
+        scheduling.index.invalidate(doctor_id)
+        return Result.failure("conflict", error)
+    tx.after_commit(lambda: scheduling.index.booked(appt_id, doctor_id, date_value, starts))
+    day = scheduling.index.day(doctor_id, date_value)
+    return Result.success(dict(_slot(doctor_id, date_value, starts[0], day.length[starts[-1]]), appt_id=appt_id))
+
+
+# --- Billing ---
+@operation(writes=True)
+def add_bill(tx, patient_id, billing_date=None, bill_id=None):
+    patient_id = _s(patient_id)
+    billing_date = billing_date or datetime.date.today().strftime("%Y-%m-%d")
+    bill_id = bill_id or next_id("bill")
+    errors = BILL.validate({"bill_id": bill_id, "patient_id": patient_id, "billing_date": billing_date})
+    if errors:
+        return Result.invalid(errors)
+    if not _patient_exists(tx, patient_id):
+        return _not_found("Patient", patient_id)
+    tx.begin_write()
+    tx.cursor.execute(
+        "SELECT id, service_id, service_name, cost FROM temp_service_usage WHERE patient_id=%s" + lock_clause(),
+        (patient_id,))
+    services = tx.cursor.fetchall()
+    if not services:
+        return Result.failure("validation", "No services to bill for this patient.")
+    total_amount = sum(float(s[3]) for s in services)
+    tx.cursor.execute("INSERT INTO billing (bill_id, patient_id, total_amount, billing_date) VALUES (%s, %s, %s, %s)",
+                      (bill_id, patient_id, total_amount, billing_date))
+    tx.cursor.executemany(
+        "INSERT INTO billed_services (bill_id, patient_id, service_id, service_name, cost) VALUES (%s, %s, %s, %s, %s)",
+        [(bill_id, patient_id, s[1], s[2], s[3]) for s in services])
+    usage_ids = [s[0] for s in services]
+    tx.cursor.execute(f"DELETE FROM temp_service_usage WHERE id IN ({', '.join(['%s'] * len(usage_ids))})",
+                      usage_ids)
+    patient_totals.adjust(tx.cursor, patient_id, pending=-total_amount, billed=total_amount)
+    return Result.success({"bill_id": bill_id, "total_amount": total_amount, "services": len(services)})
+
+
+@operation(writes=True)
+def delete_bill(tx, bill_id):
+    errors = BILL.validate({"bill_id": _s(bill_id)}, only=("bill_id",))
+    if errors:
+        return Result.invalid(errors)
+    tx.begin_write()
+    old = patient_totals.locked_row(tx.cursor, "billing", "bill_id", bill_id, "patient_id, total_amount")
+    if old is None:
+        return _not_found("Bill", bill_id)
+    tx.cursor.execute("DELETE FROM billing WHERE bill_id=%s", (bill_id,))
+    patient_totals.move(tx.cursor, old[0], None, "billed", old[1], 0)
+    return Result.success({"bill_id": bill_id})
+
+
+@operation(writes=False)
+def get_bill(tx, bill_id):
+    tx.cursor.execute("SELECT * FROM billing WHERE bill_id=%s", (bill_id,))
+    bill = tx.row()
+    if not bill:
+        return _not_found("Bill", bill_id)
+    tx.cursor.execute("SELECT service_id, service_name, cost FROM billed_services WHERE bill_id=%s", (bill_id,))
+    bill["services"] = tx.rows()
+    return Result.success(bill)
+
+
+@operation(writes=False)
+def list_bills(tx, after=None, limit=PAGE_SIZE):
+    return _page(tx, "billing", "bill_id", after, limit)
+
+
+@operation(writes=False)
+def compute_total_billing(tx, patient_id):
+    totals = patient_totals.read(tx.cursor, patient_id)
+    service_total = totals["pending_services"]
+    consulting_total = totals["consulting"]
+    return Result.success({"patient_id": patient_id, "service_total": service_total,
+                           "consulting_total": consulting_total, "total": service_total + consulting_total,
+                           "billed_to_date": totals["billed"]})
+
+
+def _page(tx, table, key, after, limit):
+    limit, error = _limit(limit)
+    if error:
+        return Result.failure("bad_request", error)
+    if after is None:
+        tx.cursor.execute(f"SELECT * FROM {table} ORDER BY {key} LIMIT %s", (limit + 1,))
+    else:
+        tx.cursor.execute(f"SELECT * FROM {table} WHERE {key} > %s ORDER BY {key} LIMIT %s", (after, limit + 1))
+    rows = tx.rows()
+    next_key = rows[limit - 1][key] if len(rows) > limit else None
+    return Result.success({"rows": rows[:limit], "next": next_key})
@@ -0,0 +1,64 @@
+import os
+
+from db_config import connection
+
+# Keyset pagination: pages are ordered by primary key and each page starts
+# after the last key of the previous one, so no query ever scans or holds
+# more than one page of rows regardless of table size. Pages are read
+# through an unbuffered cursor, so the rows come straight off the wire into
+# the page instead of being buffered by the driver first; each page is read
+# in full before it is returned, which leaves the connection free for other
+# statements between pages.
+
+PAGE_SIZE = int(os.environ.get("HMS_PAGE_SIZE", "20"))
+# Rows per query when streaming a whole table
+STREAM_CHUNK = 500
+
+
+def _page_sql(table, key, columns, after):
+    if after is None:
+        return f"SELECT {columns} FROM {table} ORDER BY {key} LIMIT %s"
+    return f"SELECT {columns} FROM {table} WHERE {key} > %s ORDER BY {key} LIMIT %s"
+
+
+def _read_page(conn, table, key, after, limit, columns="*"):
+    cursor = conn.cursor(buffered=False)
+    try:
+        params = (limit,) if after is None else (after, limit)
+        cursor.execute(_page_sql(table, key, columns, after), params)
+        return cursor.fetchall()   # bounded by LIMIT
+    finally:
+        cursor.close()
+
+
+def fetch_page(table, key, after=None, page_size=PAGE_SIZE, columns="*", key_index=0):
+    # Returns (rows, next_key); next_key is None on the last page
+    with connection() as conn:
+        rows = _read_page(conn, table, key, after, page_size + 1, columns)
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        return rows, rows[-1][key_index]
+    return rows, None
+
+
+def iter_rows(table, key, page_size=STREAM_CHUNK, columns="*", key_index=0, conn=None):
+    # Streams a whole table one keyset page at a time, on conn if given (so
+    # the rows are read inside that connection's transaction) or else on a
+    # pooled connection held until the last page
+    if conn is None:
+        with connection() as conn:
+            yield from iter_rows(table, key, page_size, columns, key_index, conn)
+        return
+    after = None
+    while True:
+        rows = _read_page(conn, table, key, after, page_size, columns)
+        yield from rows
+        if len(rows) < page_size:
+            return
+        after = rows[-1][key_index]
+
+
+def print_rows(header, rows):
+    print(header)
+    for row in rows:
+        print(" | ".join(str(x) for x in row))
@@ -1,11 +1,16 @@
-from db_config import get_connection
-from datetime import datetime, date
+from db_config import get_connection, IntegrityError, Error
+from id_allocator import next_id
+from pagination import PAGE_SIZE, fetch_page, iter_rows, print_rows
+from datetime import date
 from person import Person
-import re
-import mysql.connector
-from mysql.connector import IntegrityError, Error
+from validators import validate_patient
+import entity_cache
+import name_index
+import patient_totals
 
 class Patient(Person):
+    __slots__ = ("patient_id", "age", "gender", "admission_date")
+
     def __init__(self, patient_id, name, age, gender, admission_date, contact_no):
         super().__init__(patient_id, name, contact_no)
         self.patient_id = patient_id
@@ -15,41 +20,24 @@ class Patient(Person):
         
 
     def add(self):
-        # Name validation
-        if not self.name or not re.match(r'^[A-Za-z. ]+$', self.name):
-            print("Invalid Name. Only letters, spaces, and periods allowed.")
-            return False
-        # Age validation
-        try:
-            age = int(self.age)
-            if age < 0 or age > 120:
-                print("Invalid Age. Must be between 0 and 120.")
-                return False
-        except ValueError:
-            print("Invalid Age. Must be a number.")
-            return False
-        # Gender validation
-        if self.gender not in ['M', 'F', 'Other']:
-            print("Invalid Gender. Choose from M, F, Other.")
-            return False
-        # Admission date validation
-        if not re.match(r'^\d{4}-\d{2}-\d{2}$', self.admission_date):
-            print("Invalid Admission Date. Use YYYY-MM-DD format.")
-            return False
-        # Contact number validation
-        if not self.contact_no.isdigit() or len(self.contact_no) < 10:
-            print("Invalid Contact Number. Must be at least 10 digits.")
+        # Data validation
+        error = validate_patient(self.name, self.age, self.gender, self.admission_date, self.contact_no)
+        if error:
+            print(error)
             return False
+        age = int(self.age)
 
         # Insert into DB with exception handling
         try:
+            name_index.prepare()
             conn = get_connection()
             cursor = conn.cursor()
             sql = "INSERT INTO patients (patient_id, name, age, gender, admission_date, contact_no) VALUES (%s, %s, %s, %s, %s, %s)"
             cursor.execute(sql, (self.patient_id, self.name, age, self.gender, self.admission_date, self.contact_no))
+            name_index.index_name(cursor, "patient", self.patient_id, self.name)
             conn.commit()
             return True
-        except mysql.connector.errors.IntegrityError as e:
+        except IntegrityError as e:
             if "PRIMARY" in str(e):
                 print(f"Error: Duplicate Patient ID '{self.patient_id}'. Please use a unique ID.")
             else:
@@ -63,47 +51,32 @@ class Patient(Person):
             if 'conn' in locals(): conn.close()
 
     def update(self):
-        # Name validation
-        if not self.name or not re.match(r'^[A-Za-z. ]+$', self.name):
-            print("Invalid Name. Only letters, spaces, and periods allowed.")
-            return False
-        # Age validation
-        try:
-            age = int(self.age)
-            if age < 0 or age > 120:
-                print("Invalid Age. Must be between 0 and 120.")
-                return False
-        except ValueError:
-            print("Invalid Age. Must be a number.")
-            return False
-        # Gender validation
-        if self.gender not in ['M', 'F', 'Other']:
-            print("Invalid Gender. Choose from M, F, Other.")
-            return False
-        # Admission date validation
-        try:
-            datetime.strptime(self.admission_date, "%Y-%m-%d")
-        except ValueError:
-            print("Invalid Admission Date. Use YYYY-MM-DD format.")
-            return False
-        # Contact number validation
-        if not self.contact_no.isdigit() or len(self.contact_no) < 10:
-            print("Invalid Contact Number. Must be at least 10 digits.")
+        # Data validation
+        error = validate_patient(self.name, self.age, self.gender, self.admission_date, self.contact_no)
+        if error:
+            print(error)
             return False
+        age = int(self.age)
 
         try:
+            name_index.prepare()
             conn = get_connection()
             cursor = conn.cursor()
             sql = """UPDATE patients SET name=%s, age=%s, gender=%s, admission_date=%s, contact_no=%s WHERE patient_id=%s"""
             cursor.execute(sql, (self.name, age, self.gender, self.admission_date, self.contact_no, self.patient_id))
+            updated = cursor.rowcount
+            if updated:
+                name_index.reindex(cursor, "patient", self.patient_id, self.name)
             conn.commit()
-            if cursor.rowcount == 0:
+            if updated:
+                entity_cache.patients.invalidate(self.patient_id)
+            if updated == 0:
                 print(f"No patient found with ID '{self.patient_id}'.")
                 return False
             else:
                 print("Patient updated successfully.")
                 return True
-        except mysql.connector.errors.IntegrityError as e:
+        except IntegrityError as e:
             print("Database integrity error: ", e)
             return False
         except Exception as e:
@@ -116,12 +89,20 @@ class Patient(Person):
     @staticmethod
     def delete(patient_id):
         try:
+            name_index.prepare()
+            patient_totals.prepare()
             conn = get_connection()
             cursor = conn.cursor()
             sql = "DELETE FROM patients WHERE patient_id=%s"
             cursor.execute(sql, (patient_id,))
+            deleted = cursor.rowcount
+            if deleted:
+                name_index.remove(cursor, "patient", patient_id)
+                patient_totals.remove_patient(cursor, patient_id)
             conn.commit()
-            if cursor.rowcount == 0:
+            if deleted:
+                entity_cache.patients.invalidate(patient_id)
+            if deleted == 0:
                 print(f"No patient found with ID '{patient_id}'.")
                 return False
             else:
@@ -139,21 +120,28 @@ class Patient(Person):
 
     @staticmethod
     def view():
+        # Streams the whole table in primary-key order, a chunk at a time
         try:
-            conn = get_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM patients")
-            rows = cursor.fetchall()
             print("Patient_ID | Name | Age | Gender | Admission Date | Contact No")
-            for row in rows:
+            for row in iter_rows("patients", "patient_id"):
                 print(" | ".join(str(x) for x in row))
         except Error as e:
             print("Database error while viewing patients:", e)
         except Exception as e:
             print("Unexpected error while viewing patients:", e)
-        finally:
-            if 'cursor' in locals(): cursor.close()
-            if 'conn' in locals(): conn.close()
+
+    @staticmethod
+    def view_page(after=None, page_size=PAGE_SIZE):
+        # Prints one page; returns the key to continue after (None on the last page)
+        try:
+            rows, next_key = fetch_page("patients", "patient_id", after, page_size)
+            print_rows("Patient_ID | Name | Age | Gender | Admission Date | Contact No", rows)
+            return next_key
+        except Error as e:
+            print("Database error while viewing patients:", e)
+        except Exception as e:
+            print("Unexpected error while viewing patients:", e)
+        return None
 
     @staticmethod
     def days_admitted(patient_id):
@@ -179,34 +167,19 @@ class Patient(Person):
             conn.close()
 
     @staticmethod
-    def search_by_name(name_substring):
-        conn = get_connection()
-        cursor = conn.cursor()
+    def search_by_name(name_substring, limit=name_index.SEARCH_LIMIT):
+        # Case-insensitive prefix/substring match through the trigram index,
+        # best matches first
         try:
-            search_pattern = f"%{name_substring}%"
-            cursor.execute("SELECT * FROM patients WHERE name LIKE %s", (search_pattern,))
-            rows = cursor.fetchall()
+            rows = name_index.search("patient", name_substring, limit)
             if rows:
-                print("Patient_ID | Name | Age | Gender | Admission Date | Contact No")
-                for row in rows:
-                    print(" | ".join(str(x) for x in row))
+                print_rows("Patient_ID | Name | Age | Gender | Admission Date | Contact No", rows)
             else:
                 print("No patients found matching that name.")
+            return rows
         except Exception as e:
             print("Error searching patients:", e)
-        finally:
-            cursor.close()
-            conn.close()
+            return []
 
 def generate_next_patient_id():
-    from db_config import get_connection
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT MAX(patient_id) FROM patients")
-    row = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    max_id = row[0]
-    if max_id is None:
-        return 1001
-    return int(max_id) + 1
+    return next_id("patient")  # 1001, 1002, ...
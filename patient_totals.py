@@ -0,0 +1,198 @@
+import threading
+
+from db_config import connection, begin_write, lock_clause, ensure_schema, get_backend, IntegrityError
+
+# Running billing totals per patient: pending (not yet billed) service cost,
+# consulting charges and billed-to-date. Every write path that changes one
+# of the source tables adjusts the patient's row in the same transaction,
+# so compute_total_billing is a single primary-key read instead of SUMs
+# over temp_service_usage and appointments.
+#
+#   python patient_totals.py --verify     # compare with the source tables
+#   python patient_totals.py --rebuild    # recompute from the source tables
+
+# Row in cache_versions recording that the table has been filled from the
+# source tables (the first prepare() on an existing database backfills it)
+BUILT_KEY = "patient_totals"
+INSERT_CHUNK = 500
+# Cent-level tolerance when comparing with the source tables
+TOLERANCE = 0.005
+# Amounts are kept in whole cents: SQLite stores DECIMAL columns as binary
+# floats, so every sum is rounded before it is stored or compared
+CENTS = 2
+
+_COLUMNS = ("pending_services", "consulting", "billed")
+_lock = threading.Lock()
+_prepared_for = None
+
+
+def prepare():
+    # Make sure patient_totals exists and is filled before the first write
+    # or lookup in this process. Call before opening a transaction.
+    global _prepared_for
+    backend = get_backend()
+    if _prepared_for is backend:
+        return
+    with _lock:
+        if _prepared_for is backend:
+            return
+        ensure_schema()
+        with connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT 1 FROM cache_versions WHERE name=%s", (BUILT_KEY,))
+                built = cursor.fetchone() is not None
+            finally:
+                cursor.close()
+        if not built:
+            rebuild()
+        _prepared_for = backend
+
+
+# --- Maintenance (called inside the caller's transaction) ---
+def adjust(cursor, patient_id, pending=0, consulting=0, billed=0):
+    # Adds the deltas to the patient's totals, creating the row if needed
+    pending, consulting, billed = (round(float(v), CENTS) for v in (pending, consulting, billed))
+    if not (pending or consulting or billed):
+        return
+    patient_id = str(patient_id)
+    update = (f"UPDATE patient_totals SET pending_services=ROUND(pending_services+%s, {CENTS}), "
+              f"consulting=ROUND(consulting+%s, {CENTS}), billed=ROUND(billed+%s, {CENTS}) WHERE patient_id=%s")
+    params = (pending, consulting, billed, patient_id)
+    cursor.execute(update, params)
+    if cursor.rowcount == 0:
+        try:
+            cursor.execute("INSERT INTO patient_totals (patient_id, pending_services, consulting, billed) "
+                           "VALUES (%s, %s, %s, %s)", (patient_id, pending, consulting, billed))
+        except IntegrityError:
+            # Another transaction created the row in between
+            cursor.execute(update, params)
+
+
+def clear_pending(cursor, patient_id):
+    # All of the patient's pending usage was deleted
+    cursor.execute("UPDATE patient_totals SET pending_services=0 WHERE patient_id=%s", (str(patient_id),))
+
+
+def remove_patient(cursor, patient_id):
+    # Appointments and bills cascade with the patient; pending usage (no
+    # foreign key) stays, so the row is kept only while it has any
+    patient_id = str(patient_id)
+    cursor.execute("UPDATE patient_totals SET consulting=0, billed=0 WHERE patient_id=%s", (patient_id,))
+    cursor.execute("DELETE FROM patient_totals WHERE patient_id=%s AND pending_services=0", (patient_id,))
+
+
+def locked_row(cursor, table, key_column, key, columns):
+    # Reads (and locks) the row about to be updated or deleted, so its old
+    # values can be taken off the totals; None if it does not exist
+    cursor.execute(f"SELECT {columns} FROM {table} WHERE {key_column}=%s" + lock_clause(), (key,))
+    return cursor.fetchone()
+
+
+def move(cursor, old_patient_id, new_patient_id, column, old_amount, new_amount):
+    # An appointment or bill changed amount and/or patient
+    old_amount = float(old_amount or 0)
+    new_amount = float(new_amount or 0)
+    if old_patient_id is not None and str(old_patient_id) == str(new_patient_id):
+        adjust(cursor, new_patient_id, **{column: new_amount - old_amount})
+        return
+    if old_patient_id is not None:
+        adjust(cursor, old_patient_id, **{column: -old_amount})
+    if new_patient_id is not None:
+        adjust(cursor, new_patient_id, **{column: new_amount})
+
+
+# --- Lookup ---
+def read(cursor, patient_id):
+    # Returns {"pending_services", "consulting", "billed"} (zeros when the
+    # patient has no row)
+    cursor.execute("SELECT pending_services, consulting, billed FROM patient_totals WHERE patient_id=%s",
+                   (str(patient_id),))
+    row = cursor.fetchone()
+    return dict(zip(_COLUMNS, (float(v or 0) for v in row) if row else (0.0, 0.0, 0.0)))
+
+
+def get(patient_id):
+    prepare()
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            return read(cursor, patient_id)
+        finally:
+            cursor.close()
+
+
+# --- Rebuild / verify ---
+def compute(cursor, lock=False):
+    # Totals from the source tables: {patient_id: [pending, consulting, billed]}
+    suffix = lock_clause() if lock else ""
+    totals = {}
+    for index, sql in enumerate((
+            "SELECT patient_id, SUM(cost) FROM temp_service_usage GROUP BY patient_id",
+            "SELECT patient_id, SUM(consulting_charge) FROM appointments WHERE patient_id IS NOT NULL "
+            "GROUP BY patient_id",
+            "SELECT patient_id, SUM(total_amount) FROM billing WHERE patient_id IS NOT NULL GROUP BY patient_id")):
+        cursor.execute(sql + suffix)
+        for patient_id, amount in cursor.fetchall():
+            totals.setdefault(str(patient_id), [0.0, 0.0, 0.0])[index] += float(amount or 0)
+    totals = {pid: [round(v, CENTS) for v in values] for pid, values in totals.items()}
+    return {pid: values for pid, values in totals.items() if any(values)}
+
+
+def rebuild():
+    # Recomputes the whole table in one transaction; returns the row count
+    ensure_schema()
+    with connection() as conn:
+        begin_write(conn)
+        cursor = conn.cursor()
+        try:
+            totals = compute(cursor, lock=True)
+            cursor.execute("DELETE FROM patient_totals")
+            rows = [(pid, round(p, 2), round(c, 2), round(b, 2)) for pid, (p, c, b) in sorted(totals.items())]
+            for i in range(0, len(rows), INSERT_CHUNK):
+                cursor.executemany("INSERT INTO patient_totals (patient_id, pending_services, consulting, billed) "
+                                   "VALUES (%s, %s, %s, %s)", rows[i:i + INSERT_CHUNK])
+            cursor.execute("UPDATE cache_versions SET version=version+1 WHERE name=%s", (BUILT_KEY,))
+            if cursor.rowcount == 0:
+                cursor.execute("INSERT INTO cache_versions (name, version) VALUES (%s, 1)", (BUILT_KEY,))
+            conn.commit()
+        finally:
+            cursor.close()
+    return len(rows)
+
+
+def verify():
+    # Returns [(patient_id, column, stored, expected)] for every difference
+    ensure_schema()
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            expected = compute(cursor)
+            cursor.execute("SELECT patient_id, pending_services, consulting, billed FROM patient_totals")
+            stored = {str(row[0]): [float(v or 0) for v in row[1:]] for row in cursor.fetchall()}
+        finally:
+            cursor.close()
+    mismatches = []
+    for patient_id in sorted(set(expected) | set(stored)):
+        want = expected.get(patient_id, [0.0, 0.0, 0.0])
+        have = stored.get(patient_id, [0.0, 0.0, 0.0])
+        for column, h, w in zip(_COLUMNS, have, want):
+            if abs(h - w) > TOLERANCE:
+                mismatches.append((patient_id, column, round(h, 2), round(w, 2)))
+    return mismatches
+
+
+if __name__ == "__main__":
+    import sys
+    if "--rebuild" in sys.argv:
+        print(f"Rebuilt totals for {rebuild()} patients.")
+    elif "--verify" in sys.argv:
+        mismatches = verify()
+        for patient_id, column, have, want in mismatches[:50]:
+            print(f"Patient {patient_id}: {column} is {have}, expected {want}")
+        if mismatches:
+            print(f"{len(mismatches)} mismatches. Run: python patient_totals.py --rebuild")
+            sys.exit(1)
+        print("Patient totals match the source tables.")
+    else:
+        print("Usage: python patient_totals.py --verify | --rebuild")
@@ -1,4 +1,7 @@
 class Person:
+    # Slotted (no per-instance __dict__): bulk paths may hold many records
+    __slots__ = ("person_id", "name", "contact_no")
+
     def __init__(self, person_id, name, contact_no):
         self.person_id = person_id
         self.name = name
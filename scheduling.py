@@ -0,0 +1,414 @@
+import bisect
+import datetime
+import os
+import re
+import threading
+import time
+
+from db_config import connection, ensure_schema, lock_clause
+
+# Doctor working hours and time-slot booking. Each doctor has weekly shifts
+# in doctor_hours (weekday, start/end minute, slot length) which divide the
+# day into a grid of slots. A booked appointment owns one row per grid slot
+# in appointment_slots; its primary key (doctor_id, date, slot_start) is what
+# makes booking conflict-safe: two desks inserting the same slot cannot
+# both commit, whichever process they run in. Appointments without a time
+# are refused for doctors with hours (has_hours), so each of theirs holds
+# its slots. That only holds while every booking sits on the current grid, so hour changes that would move the
+# grid under future bookings are rejected (check_bookings), and reserve()
+# re-reads the day's shifts under a lock in case the index is stale.
+#
+# SlotIndex keeps, per doctor and day, the sorted list of free slot starts,
+# so "is this slot free" and "first free slot" are bisect lookups. Days are
+# loaded on first use and reloaded after INDEX_TTL seconds to pick up
+# bookings made by other processes; bookings made here update it directly.
+
+DEFAULT_SLOT_MINUTES = 30
+# Seconds a loaded day is trusted before it is re-read
+INDEX_TTL = float(os.environ.get("HMS_SLOT_INDEX_TTL", "60"))
+# Days searched by first_free when no end date is given
+SEARCH_DAYS = 14
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+TAKEN = "Slot is already booked."
+HOURS_CHANGED = "The doctor's working hours have changed; check the free slots again."
+MOVE_SLOTTED = "Appointment has a booked time slot; cancel it and book a new slot to change doctor or date."
+NEEDS_SLOT = "Doctor {} has working hours; book the appointment by time slot."
+
+_TIME_RE = re.compile(r'^([01]?\d|2[0-3]):([0-5]\d)$')
+
+
+def parse_time(text):
+    # "09:30" -> minutes since midnight; None if invalid
+    match = _TIME_RE.match(str(text).strip())
+    return int(match.group(1)) * 60 + int(match.group(2)) if match else None
+
+
+def format_time(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def parse_weekday(value):
+    # 0-6 (Monday first) or a day name like "Tue"; None if invalid
+    text = str(value).strip()
+    if text.isdigit():
+        return int(text) if int(text) < 7 else None
+    for i, name in enumerate(WEEKDAYS):
+        if text[:3].lower() == name.lower():
+            return i
+    return None
+
+
+def parse_date(value):
+    # date or "YYYY-MM-DD" -> date; None if invalid
+    if isinstance(value, datetime.date):
+        return value
+    try:
+        return datetime.date.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def validate_hours(weekday, start, end, slot_minutes, existing=()):
+    # existing: the doctor's current (weekday, start, end, slot) rows; a
+    # shift may only overlap the one it replaces (same weekday and start)
+    if parse_weekday(weekday) is None:
+        return "Invalid weekday. Use Mon-Sun or 0-6."
+    start, end = parse_time(start), parse_time(end)
+    if start is None or end is None:
+        return "Invalid time. Use HH:MM."
+    try:
+        slot_minutes = int(slot_minutes)
+    except (TypeError, ValueError):
+        return "Invalid slot length."
+    if slot_minutes < 5 or slot_minutes > 240:
+        return "Slot length must be between 5 and 240 minutes."
+    if end - start < slot_minutes:
+        return "Shift must be at least one slot long."
+    weekday = parse_weekday(weekday)
+    for w, s, e, _ in existing:
+        if w == weekday and s != start and s < end and start < e:
+            return f"Overlaps the {format_time(s)}-{format_time(e)} shift on {WEEKDAYS[w]}."
+    return None
+
+
+def slot_grid(shifts):
+    # {slot start: slot end} for every grid slot of one day's (start, end, slot) shifts
+    grid = {}
+    for start, end, slot in shifts:
+        for s in range(start, end - slot + 1, slot):
+            grid[s] = s + slot
+    return grid
+
+
+class Day:
+    # Free grid slots of one doctor on one date
+    def __init__(self, shifts, booked, loaded_at):
+        self.loaded_at = loaded_at
+        self.length = slot_grid(shifts)     # slot start -> slot end, for every grid slot
+        self.free = sorted(s for s in self.length if s not in booked)
+
+    def is_free(self, start, slots=1):
+        # The slot at start and the slots-1 after it must be free and back to back
+        i = bisect.bisect_left(self.free, start)
+        for k in range(slots):
+            if i + k >= len(self.free) or self.free[i + k] != start:
+                return False
+            start = self.length[start]
+        return True
+
+    def first_free(self, after=0, slots=1):
+        i = bisect.bisect_left(self.free, after)
+        while i < len(self.free):
+            if self.is_free(self.free[i], slots):
+                return self.free[i]
+            i += 1
+        return None
+
+    def book(self, starts):
+        for s in starts:
+            i = bisect.bisect_left(self.free, s)
+            if i < len(self.free) and self.free[i] == s:
+                del self.free[i]
+
+    def release(self, starts):
+        for s in starts:
+            if s in self.length:
+                i = bisect.bisect_left(self.free, s)
+                if i == len(self.free) or self.free[i] != s:
+                    self.free.insert(i, s)
+
+
+class SlotIndex:
+    def __init__(self, ttl=INDEX_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._days = {}             # (doctor_id, date) -> Day
+        self._hours = {}            # doctor_id -> ([(weekday, start, end, slot)], loaded_at)
+        self._specialists = {}      # specialization -> ([doctor_id], loaded_at)
+        self._appointments = {}     # appt_id -> (doctor_id, date, [slot starts])
+        # Bumped on invalidation so a load that raced with a write is dropped
+        self._generation = 0
+        self._stats = {"hits": 0, "loads": 0}
+
+    def _fresh(self, loaded_at, now):
+        return not self.ttl or now - loaded_at < self.ttl
+
+    # --- Loading ---
+    def hours(self, doctor_id):
+        # [(weekday, start_minute, end_minute, slot_minutes)] sorted by day and time
+        now = time.monotonic()
+        with self._lock:
+            entry = self._hours.get(doctor_id)
+            if entry and self._fresh(entry[1], now):
+                return entry[0]
+        ensure_schema()
+        with connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT weekday, start_minute, end_minute, slot_minutes FROM doctor_hours "
+                               "WHERE doctor_id=%s ORDER BY weekday, start_minute", (doctor_id,))
+                rows = [tuple(int(v) for v in row) for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+        with self._lock:
+            self._hours[doctor_id] = (rows, now)
+        return rows
+
+    def specialists(self, specialization):
+        now = time.monotonic()
+        key = specialization.strip().lower()
+        with self._lock:
+            entry = self._specialists.get(key)
+            if entry and self._fresh(entry[1], now):
+                return entry[0]
+        with connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT doctor_id FROM doctors WHERE LOWER(specialization)=%s ORDER BY doctor_id",
+                               (key,))
+                doctor_ids = [row[0] for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+        with self._lock:
+            self._specialists[key] = (doctor_ids, now)
+        return doctor_ids
+
+    def day(self, doctor_id, date):
+        date = parse_date(date)
+        key = (doctor_id, date)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._days.get(key)
+            if entry and self._fresh(entry.loaded_at, now):
+                self._stats["hits"] += 1
+                return entry
+            generation = self._generation
+        shifts = [(start, end, slot) for weekday, start, end, slot in self.hours(doctor_id)
+                  if weekday == date.weekday()]
+        booked = {}
+        if shifts:
+            with connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute("SELECT slot_start, appt_id FROM appointment_slots WHERE doctor_id=%s AND date=%s",
+                                   (doctor_id, date.isoformat()))
+                    for slot_start, appt_id in cursor.fetchall():
+                        booked.setdefault(appt_id, []).append(int(slot_start))
+                finally:
+                    cursor.close()
+        entry = Day(shifts, {s for starts in booked.values() for s in starts}, now)
+        with self._lock:
+            self._stats["loads"] += 1
+            if generation == self._generation:
+                self._days[key] = entry
+                for appt_id, starts in booked.items():
+                    self._appointments[appt_id] = (doctor_id, date, starts)
+        return entry
+
+    # --- Queries ---
+    def is_free(self, doctor_id, date, start, slots=1):
+        day = self.day(doctor_id, date)
+        with self._lock:
+            return day.is_free(start, slots)
+
+    def free_slots(self, doctor_id, date):
+        day = self.day(doctor_id, date)
+        with self._lock:
+            return [(s, day.length[s]) for s in day.free]
+
+    def first_free(self, doctor_ids, from_date, after=0, slots=1, days=SEARCH_DAYS):
+        # Earliest (date, start, doctor_id) with slots consecutive free slots
+        # among doctor_ids, on or after from_date at minute `after`
+        from_date = parse_date(from_date)
+        for offset in range(days):
+            date = from_date + datetime.timedelta(days=offset)
+            best = None
+            for doctor_id in doctor_ids:
+                day = self.day(doctor_id, date)
+                with self._lock:
+                    start = day.first_free(after if offset == 0 else 0, slots)
+                if start is not None and (best is None or start < best[1]):
+                    best = (date, start, doctor_id)
+            if best:
+                return best
+        return None
+
+    def free_doctors(self, doctor_ids, date, start, slots=1):
+        return [doctor_id for doctor_id in doctor_ids if self.is_free(doctor_id, date, start, slots)]
+
+    def plan(self, doctor_id, date, start, slots=1):
+        # Grid slot starts an appointment would occupy, or an error message
+        date = parse_date(date)
+        if date is None:
+            return None, "Invalid Date. Use YYYY-MM-DD format."
+        day = self.day(doctor_id, date)
+        with self._lock:
+            if not day.length:
+                return None, f"Doctor {doctor_id} does not work on {WEEKDAYS[date.weekday()]}."
+            if start not in day.length:
+                return None, f"{format_time(start)} is not a slot start within doctor {doctor_id}'s working hours."
+            starts = [start]
+            while len(starts) < slots:
+                if day.length[starts[-1]] not in day.length:
+                    return None, "Appointment runs past the end of the shift."
+                starts.append(day.length[starts[-1]])
+            if not day.is_free(start, slots):
+                return None, TAKEN
+        return starts, None
+
+    # --- Changes made in this process (after commit) ---
+    def booked(self, appt_id, doctor_id, date, starts):
+        date = parse_date(date)
+        with self._lock:
+            day = self._days.get((doctor_id, date))
+            if day is not None:
+                day.book(starts)
+            self._appointments[appt_id] = (doctor_id, date, list(starts))
+
+    def released(self, appt_id):
+        with self._lock:
+            entry = self._appointments.pop(appt_id, None)
+            if entry is None:
+                return
+            doctor_id, date, starts = entry
+            day = self._days.get((doctor_id, date))
+            if day is not None:
+                day.release(starts)
+
+    def invalidate(self, doctor_id=None, date=None):
+        # Drops loaded days (all, one doctor's, or one doctor-day) and hours
+        date = parse_date(date) if date is not None else None
+        with self._lock:
+            self._generation += 1
+            if doctor_id is None:
+                self._days.clear()
+                self._hours.clear()
+                self._specialists.clear()
+                self._appointments.clear()
+                return
+            self._hours.pop(doctor_id, None)
+            self._specialists.clear()
+            for key in [k for k in self._days if k[0] == doctor_id and (date is None or k[1] == date)]:
+                del self._days[key]
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, days=len(self._days), doctors=len(self._hours))
+
+
+index = SlotIndex()
+
+
+# --- Writes (called inside the caller's transaction) ---
+def reserve(cursor, appt_id, doctor_id, date, starts):
+    # Returns HOURS_CHANGED if starts are no longer back-to-back slots of
+    # the doctor's shifts that day (the index was loaded before an hours
+    # change), else None. Raises IntegrityError if any slot was taken in
+    # the meantime.
+    date = parse_date(date)
+    cursor.execute("SELECT start_minute, end_minute, slot_minutes FROM doctor_hours WHERE doctor_id=%s AND weekday=%s"
+                   + lock_clause(), (doctor_id, date.weekday()))
+    grid = slot_grid([tuple(int(v) for v in row) for row in cursor.fetchall()])
+    for previous, start in zip(starts, starts[1:]):
+        if grid.get(previous) != start:
+            return HOURS_CHANGED
+    if starts[-1] not in grid:
+        return HOURS_CHANGED
+    cursor.execute("INSERT INTO appointment_slots (doctor_id, date, slot_start, appt_id) VALUES "
+                   + ", ".join(["(%s, %s, %s, %s)"] * len(starts)),
+                   [v for s in starts for v in (doctor_id, str(date), s, appt_id)])
+    return None
+
+
+def has_hours(cursor, doctor_id):
+    # Whether the doctor has working hours, in which case every appointment
+    # must hold slots; read under a lock so hours set meanwhile wait for us
+    cursor.execute("SELECT 1 FROM doctor_hours WHERE doctor_id=%s LIMIT 1" + lock_clause(), (doctor_id,))
+    return cursor.fetchone() is not None
+
+
+def slots_of(cursor, appt_id):
+    # (doctor_id, date, [slot starts]) of a booked appointment, or None
+    cursor.execute("SELECT doctor_id, date, slot_start FROM appointment_slots WHERE appt_id=%s ORDER BY slot_start",
+                   (appt_id,))
+    rows = cursor.fetchall()
+    if not rows:
+        return None
+    return rows[0][0], parse_date(rows[0][1]), [int(r[2]) for r in rows]
+
+
+def check_bookings(cursor, doctor_id, weekday, start, end, slot_minutes, existing=(), today=None):
+    # Error message if setting the shift would change a booked slot from
+    # today on (its start or end is not a slot of the new grid, so it could
+    # overlap the new slots), else None. existing as for validate_hours.
+    weekday, start, end = parse_weekday(weekday), parse_time(start), parse_time(end)
+    shifts = [(int(s), int(e), int(m)) for w, s, e, m in existing if int(w) == weekday]
+    old = slot_grid(shifts)
+    grid = slot_grid([shift for shift in shifts if shift[0] != start] + [(start, end, int(slot_minutes))])
+    for date, slot_start in _future_bookings(cursor, doctor_id, today):
+        if date.weekday() == weekday and (old.get(slot_start) is None or grid.get(slot_start) != old[slot_start]):
+            return (f"Doctor {doctor_id} has a booking on {date} at {format_time(slot_start)} that the new "
+                    f"hours would move off the slot grid; cancel or rebook it first.")
+    return None
+
+
+def check_clear(cursor, doctor_id, weekday=None, today=None):
+    # Error message if clearing the hours (one weekday or all) would leave
+    # bookings from today on outside any shift, else None
+    weekday = parse_weekday(weekday) if weekday is not None else None
+    for date, slot_start in _future_bookings(cursor, doctor_id, today):
+        if weekday is None or date.weekday() == weekday:
+            return (f"Doctor {doctor_id} has a booking on {date} at {format_time(slot_start)}; "
+                    f"cancel or rebook it before clearing those hours.")
+    return None
+
+
+def _future_bookings(cursor, doctor_id, today=None):
+    # [(date, slot start)] of the doctor's booked slots from today on, locked
+    today = today or datetime.date.today()
+    cursor.execute("SELECT date, slot_start FROM appointment_slots WHERE doctor_id=%s AND date>=%s "
+                   "ORDER BY date, slot_start" + lock_clause(), (doctor_id, today.isoformat()))
+    return [(parse_date(date), int(slot_start)) for date, slot_start in cursor.fetchall()]
+
+
+def set_hours(cursor, doctor_id, weekday, start, end, slot_minutes=DEFAULT_SLOT_MINUTES):
+    # Adds or replaces the shift starting at `start` on `weekday`
+    cursor.execute("DELETE FROM doctor_hours WHERE doctor_id=%s AND weekday=%s AND start_minute=%s",
+                   (doctor_id, parse_weekday(weekday), parse_time(start)))
+    cursor.execute("INSERT INTO doctor_hours (doctor_id, weekday, start_minute, end_minute, slot_minutes) "
+                   "VALUES (%s, %s, %s, %s, %s)",
+                   (doctor_id, parse_weekday(weekday), parse_time(start), parse_time(end), int(slot_minutes)))
+
+
+def clear_hours(cursor, doctor_id, weekday=None):
+    if weekday is None:
+        cursor.execute("DELETE FROM doctor_hours WHERE doctor_id=%s", (doctor_id,))
+    else:
+        cursor.execute("DELETE FROM doctor_hours WHERE doctor_id=%s AND weekday=%s",
+                       (doctor_id, parse_weekday(weekday)))
+
+
+def describe_hours(rows):
+    return [{"weekday": WEEKDAYS[w], "start": format_time(s), "end": format_time(e), "slot_minutes": m}
+            for w, s, e, m in rows]
@@ -1,35 +1,37 @@
-import re
-from db_config import get_connection
-import mysql.connector
-from mysql.connector import IntegrityError, Error
+from db_config import get_connection, ensure_schema, IntegrityError, Error
+from id_allocator import next_id
+from instrumentation import action
+from pagination import PAGE_SIZE, fetch_page, iter_rows, print_rows
+import patient_totals
+import usage_journal
+from service_catalog import catalog, bump_version
+from validators import validate_service, SERVICE_USAGE
 
 class Service:
+    __slots__ = ("service_id", "service_name", "cost")
+
     def __init__(self, service_id, service_name, cost):
         self.service_id = service_id
         self.service_name = service_name
         self.cost = cost
 
     def add(self):
-        # Validate service name
-        if not self.service_name or not re.match(r'^[A-Za-z0-9\s\-_]+$', self.service_name):
-            print("Invalid Service Name. Only letters, numbers, spaces, hyphens, and underscores allowed.")
-            return False
-        # Validate cost
-        try:
-            cost_val = float(self.cost)
-            if cost_val < 0 or cost_val > 5000:
-                print("Cost must be between 0 and 5000.")
-                return False
-        except ValueError:
-            print("Invalid Cost. Enter a valid number.")
+        # Validate service name and cost
+        error = validate_service(self.service_name, self.cost)
+        if error:
+            print(error)
             return False
+        cost_val = float(self.cost)
 
         try:
+            ensure_schema()
             conn = get_connection()
             cursor = conn.cursor()
             sql = "INSERT INTO services (service_id, service_name, cost) VALUES (%s, %s, %s)"
             cursor.execute(sql, (self.service_id, self.service_name, cost_val))
+            bump_version(cursor)
             conn.commit()
+            catalog.invalidate()
             return True
         except IntegrityError:
             print(f"Error: Duplicate Service ID '{self.service_id}'. Please use a unique ID.")
@@ -45,27 +47,25 @@ class Service:
             if 'conn' in locals(): conn.close()
 
     def update(self):
-        # Validate service name
-        if not self.service_name or not re.match(r'^[A-Za-z0-9\s\-_]+$', self.service_name):
-            print("Invalid Service Name. Only letters, numbers, spaces, hyphens, and underscores allowed.")
-            return False
-        # Validate cost
-        try:
-            cost_val = float(self.cost)
-            if cost_val < 0 or cost_val > 5000:
-                print("Cost must be between 0 and 5000.")
-                return False
-        except ValueError:
-            print("Invalid Cost. Enter a valid number.")
+        # Validate service name and cost
+        error = validate_service(self.service_name, self.cost)
+        if error:
+            print(error)
             return False
+        cost_val = float(self.cost)
 
         try:
+            ensure_schema()
             conn = get_connection()
             cursor = conn.cursor()
             sql = "UPDATE services SET service_name=%s, cost=%s WHERE service_id=%s"
             cursor.execute(sql, (self.service_name, cost_val, self.service_id))
+            updated = cursor.rowcount
+            if updated:
+                bump_version(cursor)
             conn.commit()
-            if cursor.rowcount == 0:
+            catalog.invalidate()
+            if updated == 0:
                 print("Service ID not found.")
                 return False
             else:
@@ -85,12 +85,17 @@ class Service:
     def delete(service_id):
         # No validation for service_id since it's system-generated
         try:
+            ensure_schema()
             conn = get_connection()
             cursor = conn.cursor()
             sql = "DELETE FROM services WHERE service_id=%s"
             cursor.execute(sql, (service_id,))
+            deleted = cursor.rowcount
+            if deleted:
+                bump_version(cursor)
             conn.commit()
-            if cursor.rowcount == 0:
+            catalog.invalidate()
+            if deleted == 0:
                 print("Service ID not found.")
                 return False
             else:
@@ -108,49 +113,54 @@ class Service:
 
     @staticmethod
     def view():
+        # Streams the whole table in primary-key order, a chunk at a time
         try:
-            conn = get_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM services")
-            rows = cursor.fetchall()
             print("Service_ID | Service Name | Cost")
-            for row in rows:
+            for row in iter_rows("services", "service_id"):
                 print(" | ".join(str(x) for x in row))
         except Error as e:
             print("Database error while viewing services:", e)
         except Exception as e:
             print("Unexpected error while viewing services:", e)
-        finally:
-            if 'cursor' in locals(): cursor.close()
-            if 'conn' in locals(): conn.close()
+
+    @staticmethod
+    def view_page(after=None, page_size=PAGE_SIZE):
+        # Prints one page; returns the key to continue after (None on the last page)
+        try:
+            rows, next_key = fetch_page("services", "service_id", after, page_size)
+            print_rows("Service_ID | Service Name | Cost", rows)
+            return next_key
+        except Error as e:
+            print("Database error while viewing services:", e)
+        except Exception as e:
+            print("Unexpected error while viewing services:", e)
+        return None
 
 class ServiceUsageDB:
     @staticmethod
     def add_service_for_patient(patient_id, service):
         # Data validation
-        if not re.match(r'^[A-Za-z0-9]+$', patient_id):
-            print("Invalid Patient ID.")
-            return
-        if not re.match(r'^[A-Za-z0-9]+$', service.service_id):
-            print("Invalid Service ID.")
-            return
-        if not re.match(r'^[A-Za-z0-9\s\-_]+$', service.service_name):
-            print("Invalid Service Name.")
+        error = SERVICE_USAGE.first_error((patient_id, service.service_id, service.service_name, service.cost))
+        if error:
+            print(error)
             return
+        cost = float(service.cost)
+
         try:
-            cost = float(service.cost)
-            if cost < 0 or cost > 5000:
-                print("Invalid Cost.")
+            journal = usage_journal.get()
+            if journal is not None:
+                # Write-behind: durable in the local journal now, in the
+                # database at the next group commit
+                journal.record(patient_id, service.service_id, service.service_name, cost)
+                print(f"Added {service.service_name} (ID: {service.service_id}, Cost: {cost}) for patient {patient_id}")
                 return
-        except ValueError:
-            print("Invalid Cost.")
-            return
 
-        try:
+            patient_totals.prepare()
             conn = get_connection()
             cursor = conn.cursor()
             sql = "INSERT INTO temp_service_usage (patient_id, service_id, service_name, cost) VALUES (%s, %s, %s, %s)"
             cursor.execute(sql, (patient_id, service.service_id, service.service_name, cost))
+            patient_totals.adjust(cursor, patient_id, pending=cost)
             conn.commit()
             print(f"Added {service.service_name} (ID: {service.service_id}, Cost: {cost}) for patient {patient_id}")
         except IntegrityError:
@@ -163,9 +173,24 @@ class ServiceUsageDB:
             if 'cursor' in locals(): cursor.close()
             if 'conn' in locals(): conn.close()
 
+    @staticmethod
+    def add_service_by_id(patient_id, service_id):
+        # Looks the service up in the cached catalog; no query unless the
+        # catalog changed since it was loaded
+        try:
+            row = catalog.get(service_id)
+        except Error as e:
+            print("Database error while fetching service:", e)
+            return
+        if not row:
+            print("Service ID not found.")
+            return
+        ServiceUsageDB.add_service_for_patient(patient_id, Service(*row))
+
     @staticmethod
     def get_services_for_patient(patient_id):
         try:
+            usage_journal.sync()
             conn = get_connection()
             cursor = conn.cursor()
             sql = "SELECT service_id, service_name, cost FROM temp_service_usage WHERE patient_id=%s"
@@ -185,10 +210,13 @@ class ServiceUsageDB:
     @staticmethod
     def clear_services_for_patient(patient_id):
         try:
+            usage_journal.sync()
+            patient_totals.prepare()
             conn = get_connection()
             cursor = conn.cursor()
             sql = "DELETE FROM temp_service_usage WHERE patient_id=%s"
             cursor.execute(sql, (patient_id,))
+            patient_totals.clear_pending(cursor, patient_id)
             conn.commit()
             print(f"Cleared services for patient {patient_id}")
         except Error as e:
@@ -211,21 +239,12 @@ def service_usage_menu(patient_id):
  
         if choice == '1':
             service_id = input("Enter Service ID: ")
-            # Fetch service details from DB
-            conn = get_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT service_id, service_name, cost FROM services WHERE service_id=%s", (service_id,))
-            row = cursor.fetchone()
-            cursor.close()
-            conn.close()
-            if not row:
-                print("Service ID not found.")
-            else:
-                service = Service(*row)
-                ServiceUsageDB.add_service_for_patient(patient_id, service)
+            with action("Service Usage > Add"):
+                ServiceUsageDB.add_service_by_id(patient_id, service_id)
  
         elif choice == '2':
-            rows = ServiceUsageDB.get_services_for_patient(patient_id)
+            with action("Service Usage > View"):
+                rows = ServiceUsageDB.get_services_for_patient(patient_id)
             if rows:
                 print(f"Services used by {patient_id}:")
                 for r in rows:
@@ -234,7 +253,8 @@ def service_usage_menu(patient_id):
                 print("No services recorded for this patient.")
  
         elif choice == '3':
-            ServiceUsageDB.clear_services_for_patient(patient_id)
+            with action("Service Usage > Clear"):
+                ServiceUsageDB.clear_services_for_patient(patient_id)
  
         elif choice == '4':
             break
@@ -243,12 +263,4 @@ def service_usage_menu(patient_id):
             print("Invalid choice. Please try again.")
 
 def generate_next_service_id():
-    from db_config import get_connection
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT service_id FROM services WHERE service_id LIKE 'S%'")
-    ids = [int(row[0][1:]) for row in cursor.fetchall() if row[0][1:].isdigit()]
-    cursor.close()
-    conn.close()
-    next_num = max(ids) + 1 if ids else 1
-    return f"S{next_num:02d}"  # S01, S02, ..., S99, S100, etc.
+    return next_id("service")  # S01, S02, ..., S99, S100, etc.
@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+
+from db_config import connection, ensure_schema, IntegrityError
+
+# In-process cache of the services catalog. The whole table is loaded on first
+# use and served from memory; every catalog write bumps a row in
+# cache_versions, and readers compare against it (at most once per
+# CHECK_INTERVAL seconds) so other processes pick up price changes.
+
+CHECK_INTERVAL = float(os.environ.get("HMS_CATALOG_CHECK_INTERVAL", "1.0"))
+VERSION_KEY = "services"
+
+
+def _read_version(cursor):
+    cursor.execute("SELECT version FROM cache_versions WHERE name=%s", (VERSION_KEY,))
+    row = cursor.fetchone()
+    return int(row[0]) if row else 0
+
+
+def bump_version(cursor):
+    # Call inside the transaction that changes the services table
+    cursor.execute("UPDATE cache_versions SET version = version + 1 WHERE name=%s", (VERSION_KEY,))
+    if cursor.rowcount == 0:
+        try:
+            cursor.execute("INSERT INTO cache_versions (name, version) VALUES (%s, 1)", (VERSION_KEY,))
+        except IntegrityError:
+            # Another writer created the row first
+            cursor.execute("UPDATE cache_versions SET version = version + 1 WHERE name=%s", (VERSION_KEY,))
+
+
+class ServiceCatalog:
+    def __init__(self, check_interval=CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._services = None       # service_id -> (service_id, service_name, cost)
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "loads": 0, "version_checks": 0}
+
+    def _load(self, cursor):
+        version = _read_version(cursor)
+        cursor.execute("SELECT service_id, service_name, cost FROM services")
+        self._services = {row[0]: tuple(row) for row in cursor.fetchall()}
+        self._version = version
+        self._stats["loads"] += 1
+
+    def _refresh(self):
+        # Returns True when the in-memory copy was already current
+        now = time.monotonic()
+        if self._services is not None and now - self._checked_at < self.check_interval:
+            return True
+        ensure_schema()
+        with connection() as conn:
+            cursor = conn.cursor()
+            try:
+                fresh = False
+                if self._services is not None:
+                    self._stats["version_checks"] += 1
+                    fresh = _read_version(cursor) == self._version
+                if not fresh:
+                    self._load(cursor)
+            finally:
+                cursor.close()
+        self._checked_at = now
+        return fresh
+
+    def get(self, service_id):
+        # (service_id, service_name, cost) or None
+        with self._lock:
+            self._stats["hits" if self._refresh() else "misses"] += 1
+            return self._services.get(service_id)
+
+    def all(self):
+        with self._lock:
+            self._stats["hits" if self._refresh() else "misses"] += 1
+            return sorted(self._services.values())
+
+    def invalidate(self):
+        with self._lock:
+            self._services = None
+            self._version = None
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["version"] = self._version
+            stats["size"] = len(self._services) if self._services is not None else 0
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+catalog = ServiceCatalog()
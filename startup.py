@@ -0,0 +1,123 @@
+import os
+import sys
+import threading
+import time
+
+# Cold start of the interactive CLI. hospital_main imports the entity
+# modules (and through them db_config and the MySQL driver) only when a
+# menu first needs them. Meanwhile warm_up() imports the database layer and
+# opens the pool's first connection on a background thread, so the main
+# menu appears at once and the first action finds a connection waiting.
+#
+#   python hospital_main.py --startup-time               # median of 5 cold starts
+#   python hospital_main.py --startup-time --budget 100  # exit 1 if the menu takes longer
+
+RUNS = 5
+# Set in the child processes that --startup-time measures
+REPORT_ENV = "HMS_STARTUP_REPORT"
+REPORT_PREFIX = "startup-report: "
+# How long a measured child waits for the warm-up before reporting
+WARM_UP_WAIT = 30.0
+
+_started = time.perf_counter()
+_marks = {}
+_warm_up = {}
+_thread = None
+
+
+def warm_up():
+    # Starts the background warm-up (once); returns the thread
+    global _thread
+    if _thread is None:
+        _thread = threading.Thread(target=_run_warm_up, name="db-warm-up", daemon=True)
+        _thread.start()
+    return _thread
+
+
+def _run_warm_up():
+    began = time.perf_counter()
+    try:
+        import db_config
+        _warm_up["import"] = time.perf_counter() - began
+        connected = time.perf_counter()
+        db_config.get_connection().close()      # stays idle in the pool
+        _warm_up["connect"] = time.perf_counter() - connected
+        # With write-behind on, opening the journal replays what an
+        # earlier run left queued
+        import usage_journal
+        usage_journal.get()
+    except Exception as e:
+        # Not fatal: the first real action connects again and reports it
+        _warm_up["error"] = str(e)
+
+
+def mark(name):
+    # Records when a startup milestone (e.g. "menu") was first reached
+    if name not in _marks:
+        _marks[name] = (time.perf_counter() - _started, time.time())
+
+
+def finish():
+    # Called as the CLI exits. In a child measured by --startup-time, waits
+    # for the warm-up and writes the timings to stderr.
+    if not os.environ.get(REPORT_ENV):
+        return
+    import json
+    if _thread is not None:
+        _thread.join(WARM_UP_WAIT)
+    report = {"marks": _marks, "warm_up": _warm_up}
+    sys.stderr.write(REPORT_PREFIX + json.dumps(report) + "\n")
+
+
+# --- Measurement ---
+def measure_once(script, keys="9\n"):
+    # Runs the CLI in a fresh interpreter, typing keys (default: Exit at
+    # the main menu). Returns timings in milliseconds.
+    import json
+    import subprocess
+    env = dict(os.environ)
+    env[REPORT_ENV] = "1"
+    spawned = time.time()
+    proc = subprocess.run([sys.executable, script], input=keys, capture_output=True, text=True, env=env)
+    exited = time.time()
+    report = None
+    for line in proc.stderr.splitlines():
+        if line.startswith(REPORT_PREFIX):
+            report = json.loads(line[len(REPORT_PREFIX):])
+    if proc.returncode != 0 or report is None or "menu" not in report["marks"]:
+        raise RuntimeError(f"CLI did not start cleanly (exit code {proc.returncode}):\n{proc.stderr.strip()}")
+    in_process, menu_at = report["marks"]["menu"]
+    warm = report["warm_up"]
+    return {
+        "menu": (menu_at - spawned) * 1000,
+        "to_menu": in_process * 1000,
+        "warm_up_import": warm.get("import", 0) * 1000,
+        "warm_up_connect": warm.get("connect", 0) * 1000,
+        "total": (exited - spawned) * 1000,
+        "error": warm.get("error"),
+    }
+
+
+def measure(script, runs=RUNS):
+    # Median of each timing over runs cold starts
+    samples = [measure_once(script) for _ in range(runs)]
+    result = {}
+    for key in ("menu", "to_menu", "warm_up_import", "warm_up_connect", "total"):
+        values = sorted(sample[key] for sample in samples)
+        result[key] = values[len(values) // 2]
+    result["error"] = next((s["error"] for s in samples if s["error"]), None)
+    return result
+
+
+def print_report(result, runs, budget=None):
+    print(f"Cold start, median of {runs} runs:")
+    print(f"  main menu shown after      {result['menu']:8.1f} ms  (interpreter start included)")
+    print(f"  of which in hospital_main  {result['to_menu']:8.1f} ms")
+    print(f"  background: database layer {result['warm_up_import']:8.1f} ms")
+    print(f"  background: first connect  {result['warm_up_connect']:8.1f} ms")
+    print(f"  process total              {result['total']:8.1f} ms")
+    if result["error"]:
+        print(f"  warm-up failed: {result['error']}")
+    if budget is not None:
+        status = "within" if result["menu"] <= budget else "OVER"
+        print(f"Menu time {result['menu']:.1f} ms is {status} the {budget:g} ms budget.")
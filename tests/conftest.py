@@ -0,0 +1,77 @@
+import os
+import sys
+
+import pytest
+
+# Tests run against a fresh embedded SQLite database each (no MySQL server
+# needed). The modules read their settings at import, so the environment
+# is set before any of them is imported.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("HMS_DB_BACKEND", "sqlite")
+os.environ.pop("HMS_USAGE_WRITE_BEHIND", None)
+os.environ.pop("HMS_QUERY_REPORT", None)
+
+import db_config
+import entity_cache
+import scheduling
+from db_backends import SQLiteBackend
+from id_allocator import allocator
+from service_catalog import catalog
+
+
+@pytest.fixture
+def db(tmp_path):
+    # A new database file and a clean slate for every in-process cache
+    backend = SQLiteBackend(str(tmp_path / "hospital.db"))
+    db_config.configure_backend(backend)
+    allocator.reset()
+    entity_cache.patients.clear()
+    entity_cache.doctors.clear()
+    catalog.invalidate()
+    scheduling.index.invalidate()
+    yield backend
+    db_config.get_pool().close_all()
+
+
+@pytest.fixture
+def run(db):
+    # run("add_patient", name=...) -> operations.Result, in its own transaction
+    import operations
+
+    def run_operation(_name, **params):
+        with db_config.connection() as conn:
+            return operations.execute(conn, _name, params)
+    return run_operation
+
+
+@pytest.fixture
+def patient(run):
+    return run("add_patient", name="Ann Lee", age=34, gender="F", admission_date="2024-05-01",
+               contact_no="9876543210").data["patient_id"]
+
+
+@pytest.fixture
+def doctor(run):
+    return run("add_doctor", name="Gregory House", specialization="Diagnostics",
+               contact_no="9876500000").data["doctor_id"]
+
+
+@pytest.fixture
+def service(run):
+    return run("add_service", service_name="X Ray", cost=120.5).data["service_id"]
+
+
+@pytest.fixture
+def sql(db):
+    # sql("SELECT ...", params) -> all rows, on a pooled connection
+    def query(statement, params=()):
+        with db_config.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(statement, params)
+                rows = cursor.fetchall()
+                conn.commit()
+                return rows
+            finally:
+                cursor.close()
+    return query
@@ -0,0 +1,60 @@
+import os
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+import analytics
+import bulk_import
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def imported(db, tmp_path, capsys):
+    bulk_import.import_datasets(ROOT, rejects_file=str(tmp_path / "rejects.csv"))
+
+
+def test_group_sum_and_lookup():
+    labels, sums, counts = analytics.group_sum(np.array(["b", "a", "b"]), np.array([1.0, 2.0, 3.5]))
+    assert (labels.tolist(), sums.tolist(), counts.tolist()) == (["a", "b"], [2.0, 4.5], [1, 2])
+    names = analytics.lookup(np.array(["D2", "D1"]), np.array(["Two", "One"]), np.array(["D1", "D9", "D2"]))
+    assert names.tolist() == ["One", analytics.NO_KEY, "Two"]
+
+
+def test_period_sum_skips_missing_dates():
+    dates = np.array(["2024-01-31", "NaT", "2024-03-01", "2024-01-02"], dtype="datetime64[D]")
+    periods, sums, counts = analytics.period_sum(dates, np.array([1.0, 5.0, np.nan, 2.0]), "M")
+    assert [str(p) for p in periods] == ["2024-01", "2024-03"]
+    assert (sums.tolist(), counts.tolist()) == ([3.0, 0.0], [2, 1])
+
+
+def test_group_median():
+    medians = analytics.group_median(np.array([0, 0, 0, 2, 2]), np.array([5, 1, 3, 4, 2]), 3)
+    assert medians[0] == 3 and np.isnan(medians[1]) and medians[2] == 3
+
+
+def test_report_matches_row_by_row_sums(imported, sql):
+    report = analytics.build_report()
+    monthly = defaultdict(float)
+    for day, amount in sql("SELECT billing_date, total_amount FROM billing"):
+        monthly[str(day)[:7]] += float(amount)
+    for day, charge in sql("SELECT date, consulting_charge FROM appointments WHERE date IS NOT NULL"):
+        monthly[str(day)[:7]] += float(charge or 0)
+    assert {m["period"]: m["total"] for m in report["monthly"]} == \
+        {period: round(total, 2) for period, total in monthly.items()}
+
+    by_doctor = defaultdict(float)
+    for doctor_id, charge in sql("SELECT doctor_id, consulting_charge FROM appointments"):
+        by_doctor[doctor_id or analytics.NO_KEY] += float(charge or 0)
+    assert {d["doctor_id"]: d["consulting"] for d in report["doctors"]} == \
+        {k: round(v, 2) for k, v in by_doctor.items()}
+    assert report["patients"]["patients"] == sql("SELECT COUNT(*) FROM patients")[0][0]
+
+
+def test_date_range_limits_every_table(imported, sql):
+    report = analytics.build_report("2024-03-01", "2024-03-31")
+    assert report["rows"]["billing"] == sql(
+        "SELECT COUNT(*) FROM billing WHERE billing_date BETWEEN '2024-03-01' AND '2024-03-31'")[0][0]
+    assert report["rows"]["billing"] > 0
+    assert all(m["period"] == "2024-03" for m in report["monthly"])
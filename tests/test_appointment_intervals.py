@@ -0,0 +1,67 @@
+import datetime
+import random
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+import analytics
+
+
+@pytest.fixture
+def visits(db, sql):
+    rng = random.Random(7)
+    sql("INSERT INTO doctors (doctor_id, name, specialization, contact_no) VALUES "
+        "('D01', 'Dr. A', 'X', '9876543210'), ('D02', 'Dr. B', 'Y', '9876543210')")
+    sql("INSERT INTO patients (patient_id, name, age, gender, admission_date, contact_no) VALUES "
+        + ", ".join(f"({1000 + i}, 'P', 30, 'F', '2024-01-01', '9876543210')" for i in range(1, 41)))
+    rows = []
+    for i in range(1, 301):
+        day = datetime.date(2024, 1, 1) + datetime.timedelta(days=rng.randrange(200))
+        rows.append((f"A{i:03d}", 1000 + rng.randint(1, 40), rng.choice(["D01", "D02", None]), day.isoformat(),
+                     rng.choice(["Flu", "Cold", "Asthma"])))
+    sql("INSERT INTO appointments (appt_id, patient_id, doctor_id, date, diagnosis) VALUES "
+        + ", ".join(["(%s, %s, %s, %s, %s)"] * len(rows)), [v for row in rows for v in row])
+    return rows
+
+
+def naive(rows, window):
+    # Per patient in date order (appt_id breaks ties): the gap to the next visit
+    by_patient = defaultdict(list)
+    for appt_id, patient_id, doctor_id, day, diagnosis in rows:
+        by_patient[patient_id].append((datetime.date.fromisoformat(day), doctor_id, diagnosis))
+    gaps, readmissions = [], defaultdict(int)
+    for entries in by_patient.values():
+        entries.sort(key=lambda e: e[0])
+        for (day, doctor_id, diagnosis), (next_day, _, _) in zip(entries, entries[1:]):
+            gap = (next_day - day).days
+            gaps.append(gap)
+            if 0 < gap <= window:
+                readmissions[doctor_id or analytics.NO_KEY] += 1
+    return by_patient, gaps, readmissions
+
+
+def test_interval_report_matches_a_per_patient_loop(visits):
+    report = analytics.interval_report(window=14)
+    by_patient, gaps, readmissions = naive(visits, 14)
+    assert report["visits"] == len(visits)
+    assert report["patients"] == len(by_patient)
+    assert report["returning_patients"] == sum(1 for v in by_patient.values() if len(v) > 1)
+    assert report["intervals"] == len(gaps)
+    assert report["median_gap_days"] == float(np.median(gaps))
+    assert report["same_day"] == gaps.count(0)
+    assert report["readmissions"] == sum(readmissions.values())
+    assert {d["key"]: d["readmissions"] for d in report["doctors"]} == \
+        {key: readmissions[key] for key in ("D01", "D02", analytics.NO_KEY)}
+    assert sum(b["intervals"] for b in report["gap_bands"]) == len(gaps)
+
+
+def test_date_range_and_empty_tables(visits, db):
+    report = analytics.interval_report("2024-02-01", "2024-02-29")
+    in_range = [row for row in visits if "2024-02-01" <= row[3] <= "2024-02-29"]
+    assert report["visits"] == len(in_range)
+    empty = analytics.appointment_intervals(
+        {"patient_id": np.array([]), "date": np.array([], dtype="datetime64[D]"),
+         "doctor_id": np.array([], dtype=str), "diagnosis": np.array([], dtype=str)},
+        {"doctor_id": np.array([], dtype=str), "name": np.array([], dtype=str)})
+    assert (empty["visits"], empty["median_gap_days"], empty["doctors"]) == (0, None, [])
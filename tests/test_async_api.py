@@ -0,0 +1,59 @@
+import asyncio
+import sqlite3
+
+import operations
+from async_api import AsyncHospital
+
+
+def test_concurrent_calls_get_distinct_ids(db, sql):
+    async def main():
+        async with AsyncHospital(size=3) as api:
+            return await asyncio.gather(*[
+                api.add_patient(name=f"Pat {chr(65 + i)}", age=30, gender="F", admission_date="2024-05-01",
+                                contact_no="9876543210")
+                for i in range(12)])
+
+    results = asyncio.run(main())
+    assert all(r.ok for r in results)
+    assert len({r.data["patient_id"] for r in results}) == 12
+    assert sql("SELECT COUNT(*) FROM patients") == [(12,)]
+
+
+def test_bad_requests_become_results(patient):
+    async def main():
+        async with AsyncHospital(size=1) as api:
+            return [
+                await api.call("drop_everything"),
+                await api.get_patient(patient_id=patient, extra=1),
+                await api.list_patients(limit="ten"),
+                await api.list_patients(limit=True),
+                await api.search_patients(name="ann", limit=-1),
+                await api.add_patient(name="Ann", age="old", gender="F", admission_date="2024-05-01",
+                                      contact_no="9876543210"),
+            ]
+
+    results = asyncio.run(main())
+    assert [r.code for r in results] == ["bad_request"] * 5 + ["validation"]
+    assert results[-1].to_dict()["fields"][0]["field"] == "age"
+
+
+def test_integrity_errors_are_conflicts(patient, run, sql):
+    result = run("add_patient", patient_id=patient, name="Bo Chan", age=50, gender="M",
+                 admission_date="2024-05-02", contact_no="9876543211")
+    assert result.code == "conflict"
+    assert sql("SELECT name FROM patients") == [("Ann Lee",)]
+    assert run("search_patients", name="chan").data == []
+
+
+def test_prepare_failure_is_a_db_error(db, run, monkeypatch):
+    def broken():
+        raise sqlite3.OperationalError("disk I/O error")
+    monkeypatch.setattr(operations.patient_totals, "prepare", broken)
+    result = run("get_patient", patient_id=1001)
+    assert (result.ok, result.code, result.error) == (False, "db_error", "disk I/O error")
+
+
+def test_large_limits_are_capped(run):
+    assert operations._limit("5000") == (1000, None)
+    assert operations._limit(5000, high=None) == (5000, None)
+    assert run("list_patients", limit="25").ok
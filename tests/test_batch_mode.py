@@ -0,0 +1,65 @@
+import io
+import json
+import sqlite3
+
+import pytest
+
+import batch_mode
+from id_allocator import allocator, next_id
+
+
+def patient_line(name, **extra):
+    return json.dumps(dict({"op": "add_patient", "name": name, "age": 30, "gender": "F",
+                            "admission_date": "2024-05-01", "contact_no": "9876543210"}, **extra))
+
+
+def run_lines(lines, group_size=batch_mode.GROUP_SIZE):
+    out = io.StringIO()
+    summary = batch_mode.run_batch(lines, out, group_size)
+    return summary, [json.loads(line) for line in out.getvalue().splitlines()]
+
+
+def test_parse_command():
+    assert batch_mode.parse_command('{"command": "Create-Bill", "args": {"patient_id": 1}, "ref": 7}') == \
+        ("add_bill", {"patient_id": 1}, 7)
+    for line in ("not json", "[1, 2]", '{"name": "x"}'):
+        with pytest.raises(ValueError):
+            batch_mode.parse_command(line)
+
+
+def test_rejected_command_does_not_undo_its_group(db, sql):
+    lines = [patient_line("Ann Lee", ref="a"), patient_line("Bad 123", ref="b"), "{oops", "",
+             patient_line("Bo Chan", ref="c")]
+    summary, results = run_lines(lines)
+    assert (summary["commands"], summary["ok"], summary["failed"]) == (4, 2, 2)
+    assert [(r["line"], r["ref"], r["ok"]) for r in results] == [(1, "a", True), (2, "b", False),
+                                                                 (3, None, False), (5, "c", True)]
+    assert [r.get("code") for r in results if not r["ok"]] == ["validation", "bad_request"]
+    assert sql("SELECT name FROM patients ORDER BY patient_id") == [("Ann Lee",), ("Bo Chan",)]
+
+
+def test_reads_and_searches_see_the_group(db):
+    _, results = run_lines([patient_line("Ann Lee", patient_id=2000),
+                            json.dumps({"op": "search_patients", "name": "ann"}),
+                            json.dumps({"op": "get_patient", "patient_id": 2000})])
+    assert [row["name"] for row in results[1]["data"]] == ["Ann Lee"]
+    assert results[2]["data"]["name"] == "Ann Lee"
+
+
+def test_generated_ids_stay_clear_of_supplied_ones(db):
+    _, results = run_lines([patient_line("Ann Lee"), patient_line("Bo Chan", patient_id=5000),
+                            patient_line("Cy Dee")], group_size=2)
+    ids = [r["data"]["patient_id"] for r in results]
+    assert ids[:2] == [1001, 5000]
+    assert ids[2] > 5000
+    allocator.reset()
+    assert next_id("patient") > ids[2]
+
+
+def test_database_error_rolls_back_the_whole_group(db, sql, monkeypatch):
+    def broken(conn, name, value):
+        raise sqlite3.OperationalError("database is locked")
+    monkeypatch.setattr(allocator, "ensure_at_least", broken)
+    _, results = run_lines([patient_line("Ann Lee"), patient_line("Bo Chan", patient_id=5000)])
+    assert [r["code"] for r in results] == ["db_error", "db_error"]
+    assert sql("SELECT COUNT(*) FROM patients") == [(0,)]
@@ -0,0 +1,58 @@
+import argparse
+import json
+
+import pytest
+
+import benchmark
+import patient_totals
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+    assert benchmark.percentile(values, 50) == 50
+    assert benchmark.percentile(values, 99) == 99
+    assert benchmark.percentile([7], 95) == 7
+    assert benchmark.percentile([], 50) is None
+
+
+def test_compare_reports_p50_regressions():
+    def report(p50):
+        return {"backend": "sqlite", "runs": [{"results": [{"scale": 100, "op": "search", "p50_ms": p50}]}]}
+    assert benchmark.compare(report(1.1), report(1.0), 0.2) == []
+    assert benchmark.compare(report(1.3), report(1.0), 0.2) == [(100, "search", 1.0, 1.3)]
+
+
+def test_compare_refuses_other_backends(tmp_path, capsys):
+    report = lambda backend: {"backend": backend, "runs": []}
+    with pytest.raises(ValueError):
+        benchmark.compare(report("sqlite"), report("mysql"), 0.2)
+    baseline = tmp_path / "mysql.json"
+    baseline.write_text(json.dumps(report("mysql")))
+    # Refused before anything is seeded
+    assert benchmark.main(["--scale", "200", "--data-dir", str(tmp_path / "data"), "--compare",
+                           str(baseline)]) == 2
+    assert "measured on mysql" in capsys.readouterr().err
+    assert not (tmp_path / "data").exists()
+
+
+def test_parse_scale():
+    assert benchmark.parse_scale("100K") == 100_000
+    assert benchmark.parse_scale("250") == 250
+    with pytest.raises(argparse.ArgumentTypeError):
+        benchmark.parse_scale("0")
+
+
+def test_small_run_times_every_operation(db, sql, tmp_path, capsys):
+    output = tmp_path / "results.json"
+    assert benchmark.main(["--scale", "200", "--data-dir", str(tmp_path / "data"), "--iterations", "0.01",
+                           "--max-seconds", "0.01", "--output", str(output)]) == 0
+    report = json.loads(output.read_text())
+    assert report["backend"] == "sqlite"
+    run = report["runs"][0]
+    assert run["backend"] == "sqlite"
+    assert run["counts"]["patients"] == 200
+    assert len(run["results"]) == len(benchmark.operations(run["counts"], None, str(tmp_path)))
+    assert all(r["iterations"] >= 1 and r["p50_ms"] >= 0 for r in run["results"])
+    # The timed calls did their work on the seeded database (their output is discarded)
+    assert sql("SELECT COUNT(*) FROM billing")[0][0] > run["counts"]["bills"]
+    assert patient_totals.verify() == []
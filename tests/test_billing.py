@@ -0,0 +1,62 @@
+import pytest
+
+import patient_totals
+from billing import Bill
+from instrumentation import action, stats
+from patient import Patient
+from service import Service, ServiceUsageDB
+
+
+@pytest.fixture
+def usage(patient):
+    x_ray = Service("S01", "X Ray", 120.5)
+    x_ray.add()
+
+    def add(count, patient_id=patient):
+        for _ in range(count):
+            ServiceUsageDB.add_service_for_patient(str(patient_id), x_ray)
+    return add
+
+
+def queries(name):
+    return sum(count for count, _ in stats.action_queries.get(name, {}).values())
+
+
+def test_add_bills_pending_usage_in_one_transaction(patient, usage, sql):
+    usage(3)
+    assert Bill("B001", str(patient), "2024-05-10").add() is True
+    assert sql("SELECT total_amount FROM billing") == [(361.5,)]
+    assert sql("SELECT bill_id, service_name, cost FROM billed_services") == [("B001", "X Ray", 120.5)] * 3
+    assert sql("SELECT COUNT(*) FROM temp_service_usage") == [(0,)]
+    assert patient_totals.verify() == []
+
+
+def test_duplicate_bill_leaves_usage_pending(patient, usage, sql, capsys):
+    usage(1)
+    assert Bill("B001", str(patient)).add() is True
+    usage(2)
+    assert Bill("B001", str(patient)).add() is False
+    assert "Duplicate Bill ID 'B001'" in capsys.readouterr().out
+    # Nothing from the failed bill was kept
+    assert sql("SELECT COUNT(*) FROM billed_services") == [(1,)]
+    assert sql("SELECT COUNT(*) FROM temp_service_usage") == [(2,)]
+    assert patient_totals.verify() == []
+
+
+def test_rejects_unknown_patient_and_empty_usage(patient, db, capsys):
+    assert Bill("B001", "4242").add() is False
+    assert "Patient ID does not exist." in capsys.readouterr().out
+    assert Bill("B001", str(patient)).add() is False
+    assert "No services to bill" in capsys.readouterr().out
+
+
+def test_round_trips_do_not_grow_with_services(patient, usage):
+    assert Patient(1002, "Bo Chan", 50, "M", "2024-05-02", "9876543211").add()
+    usage(2)
+    usage(12, 1002)
+    stats.reset()
+    with action("few"):
+        assert Bill("B001", str(patient)).add()
+    with action("many"):
+        assert Bill("B002", "1002").add()
+    assert queries("few") == queries("many") > 0
@@ -0,0 +1,91 @@
+import csv
+import os
+
+import bulk_import
+import name_index
+import patient_totals
+from id_allocator import next_id
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write_csv(path, header, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def read_rejects(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def test_rows_are_validated_and_rejected_with_reasons(db, sql, tmp_path):
+    write_csv(tmp_path / "patients_dataset.csv", ["patient_id", "name", "age", "gender", "admission_date", "contact_no"], [
+        [1001, "Ann Lee", 30, "F", "2024-01-02", "9876543210"],
+        [1002, "Bob 99", 40, "M", "2024-01-02", "9876543210"],      # bad name
+        [1003, "Cy Dee", 200, "M", "2024-01-02", "9876543210"],     # bad age
+        [1001, "Dup Row", 30, "F", "2024-01-02", "9876543210"],     # duplicate key
+        [1004, "Eve Fox", 51, "Other", "2024-02-30", "9876543210"],  # not a date
+        [1005, "Gil Hay", 62, "M", "2024-03-01", "9876543210"],
+    ])
+    write_csv(tmp_path / "doctors_dataset.csv", ["doctor_id", "name", "specialization", "contact_no"],
+              [["D07", "Jane Roe", "Cardiology", "9123456789"]])
+    write_csv(tmp_path / "appointments_dataset.csv",
+              ["appt_id", "patient_id", "doctor_id", "date", "diagnosis", "consulting_charge"], [
+                  ["A001", 1001, "D07", "2024-01-03", "Flu", "150.25"],
+                  ["A002", 9999, "D07", "2024-01-03", "Flu", "10"],        # unknown patient
+                  ["A003", 1005, "D07", "2024-01-04", "Cold", ""],         # charge defaults to 0
+              ])
+    rejects = tmp_path / "rejects.csv"
+    results = bulk_import.import_datasets(str(tmp_path), batch_size=2, commit_every=1, rejects_file=str(rejects))
+
+    loaded = {s.name: (s.read, s.loaded, s.rejected) for s in results}
+    assert loaded == {"patients": (6, 2, 4), "doctors": (1, 1, 0), "appointments": (3, 2, 1)}
+    reasons = {(r["Dataset"], r["Line"]): r["Reason"] for r in read_rejects(rejects)}
+    assert reasons[("patients", "3")].startswith("Invalid Name")
+    assert reasons[("patients", "4")].startswith("Invalid Age")
+    assert reasons[("patients", "5")] == "Duplicate patient_id '1001'."
+    assert reasons[("patients", "6")].startswith("Invalid Admission Date")
+    assert reasons[("appointments", "3")] == "Unknown patient_id '9999'."
+
+    assert sql("SELECT name FROM doctors") == [("Dr. Jane Roe",)]
+    assert [r[1] for r in name_index.search("patient", "gil")] == ["Gil Hay"]
+    assert patient_totals.verify() == []
+    # New IDs continue after the imported ones
+    assert next_id("patient") == 1006
+    assert next_id("doctor") == "D08"
+
+
+def test_reimport_rejects_existing_keys(db, sql, tmp_path):
+    write_csv(tmp_path / "services_dataset.csv", ["service_id", "service_name", "cost"],
+              [["S01", "X-Ray", "100"], ["S02", "MRI", "900.5"]])
+    rejects = str(tmp_path / "rejects.csv")
+    bulk_import.import_datasets(str(tmp_path), rejects_file=rejects)
+    # Nothing rejected, so no rejects file
+    assert not os.path.exists(rejects)
+    again = bulk_import.import_datasets(str(tmp_path), rejects_file=rejects)
+    assert [(s.loaded, s.rejected) for s in again] == [(0, 2)]
+    assert len(read_rejects(rejects)) == 2
+    assert sql("SELECT COUNT(*) FROM services") == [(2,)]
+
+
+def test_clean_import_keeps_the_previous_rejects_file(db, tmp_path):
+    rejects = tmp_path / "rejects.csv"
+    rejects.write_text("Dataset,Line,Reason,Row\nservices,2,Earlier run,x\n")
+    write_csv(tmp_path / "services_dataset.csv", ["service_id", "service_name", "cost"], [["S01", "X-Ray", "100"]])
+    assert [s.loaded for s in bulk_import.import_datasets(str(tmp_path), rejects_file=str(rejects))] == [1]
+    assert [r["Reason"] for r in read_rejects(rejects)] == ["Earlier run"]
+
+
+def test_repository_datasets_load_consistently(db, sql, tmp_path):
+    rejects = str(tmp_path / "rejects.csv")
+    results = bulk_import.import_datasets(ROOT, rejects_file=rejects)
+    for stats in results:
+        assert stats.read == stats.loaded + stats.rejected
+        table = bulk_import._dataset_by_name(stats.name).table
+        assert sql(f"SELECT COUNT(*) FROM {table}") == [(stats.loaded,)]
+    rejected = sum(s.rejected for s in results)
+    assert len(read_rejects(rejects)) == rejected if rejected else not os.path.exists(rejects)
+    assert patient_totals.verify() == []
@@ -0,0 +1,88 @@
+import datetime
+import os
+
+import pytest
+
+import bulk_import
+import bulk_ops
+import name_index
+import patient_totals
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def imported(db, tmp_path, capsys):
+    bulk_import.import_datasets(ROOT, rejects_file=str(tmp_path / "rejects.csv"))
+
+
+def count(sql, table, where="1=1", params=()):
+    return sql(f"SELECT COUNT(*) FROM {table} WHERE {where}", params)[0][0]
+
+
+def test_dry_run_counts_the_cascade_and_changes_nothing(imported, sql):
+    where = "patient_id IN (SELECT patient_id FROM billing)"
+    before = {t: count(sql, t) for t in ("patients", "appointments", "billing", "billed_services")}
+    dry = bulk_ops.bulk_delete("patients", where=where, dry_run=True)
+    assert {t: count(sql, t) for t in before} == before
+    assert dry.changed == dry.selected > 0
+    assert dry.impact["billing"] == count(sql, "billing")
+
+    real = bulk_ops.bulk_delete("patients", where=where, chunk_size=7)
+    assert (real.changed, real.impact) == (dry.changed, dry.impact)
+    assert real.chunks > 1
+    assert count(sql, "billing") == 0
+    assert count(sql, "patients") == before["patients"] - real.changed
+    assert patient_totals.verify() == []
+    indexed = sql("SELECT COUNT(DISTINCT entity_id) FROM name_trigrams WHERE entity='patient'")[0][0]
+    assert indexed == count(sql, "patients")
+
+
+def test_keys_gone_before_their_chunk_are_missing(imported, sql):
+    bill_ids = [row[0] for row in sql("SELECT bill_id FROM billing ORDER BY bill_id LIMIT 5")]
+    stats = bulk_ops.bulk_delete("billing", ids=bill_ids + ["B999", bill_ids[0]], chunk_size=2)
+    assert (stats.selected, stats.changed, stats.missing) == (6, 5, 1)
+    assert patient_totals.verify() == []
+
+
+def test_update_charges_keeps_totals(imported, sql):
+    stats = bulk_ops.bulk_update("appointments", {"consulting_charge": "250"}, where="date < %s",
+                                 params=("2024-06-01",))
+    assert stats.changed == count(sql, "appointments", "date < %s", ("2024-06-01",)) > 0
+    assert patient_totals.verify() == []
+
+
+def test_slotted_appointments_keep_their_doctor(run, patient, doctor, sql):
+    other = run("add_doctor", name="Lisa Cuddy", specialization="Medicine", contact_no="9876500001").data["doctor_id"]
+    day = datetime.date.today() + datetime.timedelta(days=7 - datetime.date.today().weekday())
+    # Booked before the doctor had working hours
+    plain = run("add_appointment", patient_id=patient, doctor_id=doctor, date="2024-05-01",
+                diagnosis="Flu").data["appt_id"]
+    run("set_doctor_hours", doctor_id=doctor, weekday="Mon", start="09:00", end="10:00")
+    slotted = run("book_slot", patient_id=patient, doctor_id=doctor, date=day.isoformat(), start="09:00",
+                  diagnosis="Flu").data["appt_id"]
+    stats = bulk_ops.bulk_update("appointments", {"doctor_id": other}, ids=[slotted, plain])
+    assert (stats.changed, stats.skipped) == (1, 1)
+    assert dict(sql("SELECT appt_id, doctor_id FROM appointments")) == {slotted: doctor, plain: other}
+
+
+def test_rejects_bad_updates(db, doctor):
+    with pytest.raises(ValueError, match="cannot be bulk updated"):
+        bulk_ops.bulk_update("patients", {"name": "X"}, ids=[1001])
+    with pytest.raises(ValueError, match="Age"):
+        bulk_ops.bulk_update("patients", {"age": "-4"}, ids=[1001])
+    with pytest.raises(ValueError, match="not found"):
+        bulk_ops.bulk_update("appointments", {"doctor_id": "D99"}, ids=["A001"])
+    with pytest.raises(ValueError):
+        bulk_ops.bulk_delete("billing")
+    with pytest.raises(ValueError):
+        bulk_ops.bulk_delete("wards", ids=[1])
+
+
+def test_doctor_delete_nulls_appointments_and_drops_the_index(imported, sql):
+    doctor_id = sql("SELECT doctor_id FROM appointments WHERE doctor_id IS NOT NULL LIMIT 1")[0][0]
+    name = sql("SELECT name FROM doctors WHERE doctor_id=%s", (doctor_id,))[0][0]
+    stats = bulk_ops.bulk_delete("doctors", ids=[doctor_id])
+    assert stats.impact["appointments.doctor_id"] > 0
+    assert count(sql, "appointments", "doctor_id=%s", (doctor_id,)) == 0
+    assert doctor_id not in [row[0] for row in name_index.search("doctor", name)]
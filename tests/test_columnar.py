@@ -0,0 +1,74 @@
+import datetime
+import decimal
+import os
+
+import numpy as np
+import pytest
+
+import bulk_import
+import columnar
+from columnar import ColumnBatch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+KIND_VALUES = {
+    "int": [1, None, -5, 2 ** 40],
+    "float": [1.5, None, decimal.Decimal("2.25"), 3],
+    "date": [datetime.date(2024, 5, 1), None, "2024-02-29", datetime.datetime(1969, 12, 31, 8, 0)],
+    "category": ["M", None, "F", "M"],
+    "text": ["Ann", None, "Zoë", ""],
+}
+EXPECTED = {
+    "float": [1.5, None, 2.25, 3.0],
+    "date": [datetime.date(2024, 5, 1), None, datetime.date(2024, 2, 29), datetime.date(1969, 12, 31)],
+}
+
+
+@pytest.mark.parametrize("kind", columnar.KINDS)
+def test_round_trip_with_nulls(kind):
+    values = KIND_VALUES[kind]
+    batch = ColumnBatch([("v", kind)])
+    batch.extend([(v,) for v in values[:2]])
+    batch.extend([(v,) for v in values[2:]])
+    assert batch.column("v") == EXPECTED.get(kind, values)
+    assert len(batch) == 4 and batch[-1] == (EXPECTED.get(kind, values)[-1],)
+
+
+def test_clean_chunks_take_the_fast_path_and_match():
+    dates = [datetime.date(2024, 1, 1) + datetime.timedelta(days=i) for i in range(5)]
+    batch = ColumnBatch([("id", "int"), ("day", "date"), ("name", "text")])
+    batch.extend([(i, d, f"P{i}") for i, d in enumerate(dates)])
+    assert list(batch) == [(i, d, f"P{i}") for i, d in enumerate(dates)]
+    assert batch.nbytes() == 5 * 8 + 5 * 8 + len("P0P1P2P3P4") + 5 * 8
+
+
+def test_to_numpy():
+    batch = ColumnBatch([("n", "int"), ("x", "float"), ("d", "date"), ("g", "category"), ("t", "text")])
+    batch.extend([(1, None, None, None, "a"), (2, 0.5, "1970-01-02", "F", None)])
+    assert batch.to_numpy("n").tolist() == [1, 2]
+    assert np.isnan(batch.to_numpy("x")[0])
+    days = batch.to_numpy("d")
+    assert np.isnat(days[0]) and days[1] == np.datetime64("1970-01-02")
+    assert batch.to_numpy("g", "(none)").tolist() == ["(none)", "F"]
+    assert batch.to_numpy("t", "-").tolist() == ["a", "-"]
+
+
+def test_bad_batches_are_rejected():
+    with pytest.raises(ValueError):
+        ColumnBatch([("a", "blob")])
+    with pytest.raises(ValueError):
+        ColumnBatch([("a", "int"), ("a", "text")])
+    batch = ColumnBatch([("a", "int"), ("b", "int")])
+    with pytest.raises(ValueError):
+        batch.extend([(1, 2), (3,)])
+    with pytest.raises(IndexError):
+        batch[0]
+
+
+def test_load_table_matches_the_rows(db, sql, tmp_path, capsys):
+    bulk_import.import_datasets(ROOT, rejects_file=str(tmp_path / "rejects.csv"))
+    batch = columnar.load_table("appointments", chunk_size=64)
+    rows = sql("SELECT appt_id, patient_id, doctor_id, date, diagnosis, consulting_charge FROM appointments")
+    assert len(batch) == len(rows) > 64
+    assert [(r[0], r[1], r[2], r[3], r[4], float(r[5])) for r in batch] == \
+        [(r[0], r[1], r[2], r[3], r[4], float(r[5])) for r in rows]
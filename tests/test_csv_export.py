@@ -0,0 +1,57 @@
+import csv
+import gzip
+
+import pytest
+
+import csv_export
+from csv_export import APPOINTMENT_EXPORT, BILLING_EXPORT
+
+
+@pytest.fixture
+def bills(db, sql, patient):
+    sql("INSERT INTO billing (bill_id, patient_id, total_amount, billing_date) VALUES "
+        + ", ".join(f"('B{i:03d}', %s, {i * 10}.5, '2024-05-{i:02d}')" for i in range(1, 8)),
+        (patient,) * 7)
+
+
+def read_csv(path, opener=open):
+    with opener(path, "rt", newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+def test_exports_selected_columns_in_chunks(bills, tmp_path):
+    path = str(tmp_path / "bills.csv")
+    written = csv_export.export(BILLING_EXPORT, path, columns=["total_amount", "bill_id"], chunk_size=3)
+    rows = read_csv(path)
+    assert written == 7
+    assert rows[0] == ["Total Amount", "Bill ID"]
+    assert rows[1:3] == [["10.5", "B001"], ["20.5", "B002"]]
+    assert len(rows) == 8
+
+
+def test_date_range_and_filters(bills, patient, tmp_path):
+    path = str(tmp_path / "bills.csv")
+    assert csv_export.export(BILLING_EXPORT, path, start_date="2024-05-03", end_date="2024-05-05",
+                             patient_id=patient) == 3
+    assert [r[0] for r in read_csv(path)[1:]] == ["B003", "B004", "B005"]
+    # No matching rows: nothing is written
+    empty = tmp_path / "none.csv"
+    assert csv_export.export(BILLING_EXPORT, str(empty), patient_id=4242) == 0
+    assert not empty.exists()
+
+
+def test_gz_suffix_compresses(bills, tmp_path):
+    path = str(tmp_path / "bills.csv.gz")
+    csv_export.export(BILLING_EXPORT, path)
+    rows = read_csv(path, gzip.open)
+    assert rows[0] == ["Bill ID", "Patient ID", "Total Amount", "Billing Date"]
+    assert len(rows) == 8
+
+
+def test_rejects_unknown_columns_and_filters():
+    with pytest.raises(ValueError):
+        APPOINTMENT_EXPORT.build_query(columns=["appt_id", "password"])
+    with pytest.raises(ValueError):
+        APPOINTMENT_EXPORT.build_query(diagnosis="Flu")
+    sql, params, _ = APPOINTMENT_EXPORT.build_query(doctor_id="", patient_id=None)
+    assert "WHERE" not in sql and params == []
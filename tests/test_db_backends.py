@@ -0,0 +1,72 @@
+import datetime
+import decimal
+import random
+
+import pytest
+
+import db_config
+import patient_totals
+from db_backends import SQLiteBackend, IntegrityError
+
+
+def test_sqlite_speaks_the_mysql_paramstyle(db, sql):
+    sql("INSERT INTO doctors (doctor_id, name, specialization) VALUES (%s, %s, %s)", ("D01", "Dr. A", "ENT"))
+    assert sql("SELECT name FROM doctors WHERE doctor_id=%s", ("D01",)) == [("Dr. A",)]
+
+
+def test_dictionary_cursor(db):
+    with db_config.connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT 1 AS one, 'x' AS two")
+        assert cursor.fetchone() == {"one": 1, "two": "x"}
+
+
+def test_dates_and_decimals_round_trip(db, sql):
+    sql("INSERT INTO services (service_id, service_name, cost) VALUES (%s, %s, %s)",
+        ("S01", "Scan", decimal.Decimal("19.99")))
+    sql("INSERT INTO patients (patient_id, name, age, gender, admission_date, contact_no) "
+        "VALUES (%s, %s, %s, %s, %s, %s)", (1, "Ann", 30, "F", datetime.date(2024, 2, 29), "9876543210"))
+    assert sql("SELECT cost FROM services") == [(decimal.Decimal("19.99"),)]
+    assert sql("SELECT admission_date FROM patients") == [(datetime.date(2024, 2, 29),)]
+
+
+def test_foreign_keys_are_enforced(db, sql):
+    with pytest.raises(IntegrityError):
+        sql("INSERT INTO appointments (appt_id, patient_id, doctor_id) VALUES ('A001', 999, NULL)")
+
+
+def test_memory_database_is_shared_between_pooled_connections():
+    backend = SQLiteBackend(":memory:")
+    first, second = backend.connect(), backend.connect()
+    cursor = first.cursor()
+    cursor.execute("INSERT INTO doctors (doctor_id, name) VALUES ('D01', 'Dr. A')")
+    first.commit()
+    cursor = second.cursor()
+    cursor.execute("SELECT COUNT(*) FROM doctors")
+    assert cursor.fetchone()[0] == 1
+    first.close()
+    second.close()
+
+
+def test_begin_write_takes_the_lock_up_front(db):
+    with db_config.connection() as conn:
+        db_config.begin_write(conn)
+        assert conn.in_transaction
+    assert db_config.lock_clause() == ""
+
+
+def test_money_totals_stay_on_whole_cents(db, sql):
+    # Thousands of float adjustments must not drift off the cent on SQLite
+    patient_totals.prepare()
+    rng = random.Random(7)
+    amounts = [round(rng.uniform(0, 500), 2) for _ in range(2000)]
+    with db_config.connection() as conn:
+        cursor = conn.cursor()
+        for amount in amounts:
+            patient_totals.adjust(cursor, 7, pending=amount)
+        for amount in amounts[:1000]:
+            patient_totals.adjust(cursor, 7, pending=-amount)
+        conn.commit()
+    exact = sum(decimal.Decimal(str(a)) for a in amounts[1000:])
+    # The raw REAL (no DECIMAL converter on an expression) is the nearest double to the cent amount
+    assert sql("SELECT pending_services + 0 FROM patient_totals") == [(float(exact),)]
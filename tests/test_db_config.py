@@ -0,0 +1,124 @@
+import threading
+import time
+
+import pytest
+
+import db_config
+from db_config import ConnectionPool, PooledConnection
+from db_backends import DatabaseError, PoolTimeoutError
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.connected = True
+        self.rollbacks = 0
+        self.in_transaction = True
+
+    def is_connected(self):
+        return self.connected
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.connected = False
+
+
+def make_pool(size=2, timeout=0.2, health_check_interval=60):
+    created = []
+
+    def factory():
+        created.append(FakeConnection(len(created)))
+        return created[-1]
+    return ConnectionPool(factory, size, timeout, health_check_interval), created
+
+
+def test_connections_are_reused():
+    pool, created = make_pool()
+    first = pool.acquire()
+    raw = first._raw
+    first.close()
+    second = pool.acquire()
+    assert second._raw is raw
+    assert len(created) == 1
+    assert raw.rollbacks == 1               # released with a clean transaction
+
+
+def test_pool_never_exceeds_size_and_times_out():
+    pool, created = make_pool(size=2, timeout=0.1)
+    held = [pool.acquire(), pool.acquire()]
+    started = time.monotonic()
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+    assert time.monotonic() - started >= 0.1
+    assert len(created) == 2
+    stats = pool.stats()
+    assert stats["timeouts"] == 1 and stats["in_use"] == 2
+    for conn in held:
+        conn.close()
+
+
+def test_waiter_gets_released_connection():
+    pool, created = make_pool(size=1, timeout=5)
+    held = pool.acquire()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire()))
+    waiter.start()
+    time.sleep(0.05)
+    held.close()
+    waiter.join(2)
+    assert got and got[0]._raw is created[0]
+    assert pool.stats()["waits"] == 1
+
+
+def test_unhealthy_idle_connection_is_replaced():
+    pool, created = make_pool(health_check_interval=0)
+    conn = pool.acquire()
+    conn.close()
+    created[0].connected = False
+    time.sleep(0.01)
+    fresh = pool.acquire()
+    assert fresh._raw is created[1]
+    assert pool.stats()["health_check_failures"] == 1
+
+
+def test_failed_connect_frees_the_slot():
+    calls = []
+
+    def factory():
+        calls.append(1)
+        if len(calls) == 1:
+            raise DatabaseError("refused")
+        return FakeConnection(len(calls))
+    pool = ConnectionPool(factory, size=1, timeout=0.1)
+    with pytest.raises(DatabaseError):
+        pool.acquire()
+    assert pool.acquire() is not None
+
+
+def test_closed_proxy_refuses_use():
+    pool, _ = make_pool()
+    conn = pool.acquire()
+    conn.close()
+    conn.close()                            # idempotent
+    with pytest.raises(DatabaseError):
+        conn.commit()
+    assert pool.stats()["idle"] == 1
+
+
+def test_context_manager_rolls_back_on_error(db, sql):
+    with pytest.raises(ZeroDivisionError):
+        with db_config.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("INSERT INTO doctors (doctor_id, name) VALUES ('D99', 'Dr. Who')")
+            1 / 0
+    assert sql("SELECT doctor_id FROM doctors") == []
+    assert db_config.pool_stats()["in_use"] == 0
+
+
+def test_get_connection_is_pooled(db):
+    conn = db_config.get_connection()
+    assert isinstance(conn, PooledConnection)
+    conn.close()
+    assert db_config.pool_stats()["idle"] == 1
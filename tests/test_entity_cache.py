@@ -0,0 +1,74 @@
+import pytest
+
+import entity_cache
+from entity_cache import EntityCache
+from patient import Patient
+
+
+@pytest.fixture
+def patients(db, sql):
+    sql("INSERT INTO patients (patient_id, name, age, gender, admission_date, contact_no) VALUES "
+        + ", ".join(f"({1000 + i}, 'Pat {chr(64 + i)}', 30, 'F', '2024-01-01', '9876543210')" for i in range(1, 6)))
+    return [1001, 1002, 1003, 1004, 1005]
+
+
+def test_get_many_fetches_only_missing_keys_in_one_query(patients):
+    cache = EntityCache("patients", "patient_id")
+    assert set(cache.get_many([1001, 1002, 4242])) == {1001, 1002}
+    assert set(cache.get_many([1001, 1002, 1003])) == {1001, 1002, 1003}
+    stats = cache.stats()
+    assert (stats["queries"], stats["hits"], stats["misses"]) == (2, 2, 4)
+    assert cache.get(1003)[1] == "Pat C"
+
+
+def test_least_recently_used_rows_are_evicted(patients):
+    cache = EntityCache("patients", "patient_id", max_size=2)
+    cache.get(1001)
+    cache.get(1002)
+    cache.get(1001)          # 1002 is now the oldest
+    cache.get(1003)
+    assert cache.stats()["evictions"] == 1
+    queries = cache.stats()["queries"]
+    cache.get_many([1001, 1003])
+    assert cache.stats()["queries"] == queries
+    cache.get(1002)
+    assert cache.stats()["queries"] == queries + 1
+
+
+def test_rows_expire_after_ttl(patients, monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(entity_cache.time, "monotonic", lambda: clock[0])
+    cache = EntityCache("patients", "patient_id", ttl=10)
+    cache.get(1001)
+    clock[0] += 9
+    cache.get(1001)
+    clock[0] += 2
+    cache.get(1001)
+    assert (cache.stats()["queries"], cache.stats()["expired"]) == (2, 1)
+
+
+def test_fetch_racing_an_invalidation_is_not_stored(patients):
+    cache = EntityCache("patients", "patient_id")
+    fetch = cache._fetch
+
+    def fetch_then_write(keys):
+        rows = fetch(keys)
+        cache.invalidate(1001)   # a write committed while the rows were in flight
+        return rows
+
+    cache._fetch = fetch_then_write
+    assert cache.get(1001) is not None
+    assert cache.stats()["size"] == 0
+
+
+def test_updates_and_deletes_invalidate(patients):
+    assert entity_cache.patients.get(1001)[1] == "Pat A"
+    assert Patient(1001, "Ann Park", 34, "F", "2024-05-01", "9876543210").update()
+    assert entity_cache.patients.get(1001)[1] == "Ann Park"
+    Patient.delete(1001)
+    assert entity_cache.patients.get(1001) is None
+
+
+def test_rejects_empty_cache():
+    with pytest.raises(ValueError):
+        EntityCache("patients", "patient_id", max_size=0)
@@ -0,0 +1,58 @@
+import http.client
+import json
+import threading
+
+import pytest
+
+import http_api
+
+
+@pytest.fixture
+def api(db):
+    server, _ = http_api.make_server(port=0, workers=2)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=5)
+
+    def request(method, path, body=None):
+        conn.request(method, path, body=None if body is None else json.dumps(body),
+                     headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        return response.status, json.loads(response.read()), response
+    yield request
+    conn.close()
+    server.shutdown()
+    server.server_close()
+
+
+ANN = {"name": "Ann Lee", "age": 34, "gender": "F", "admission_date": "2024-05-01", "contact_no": "9876543210"}
+
+
+def test_resolve_matches_method_and_path():
+    assert http_api.resolve("GET", "/patients/1001")[:2] == ("get_patient", {"patient_id": "1001"})
+    assert http_api.resolve("GET", "/patients/search")[0] == "search_patients"
+    assert http_api.resolve("PATCH", "/patients/1001")[0] is None
+
+
+def test_create_read_and_search_over_one_connection(api):
+    status, payload, response = api("POST", "/patients", ANN)
+    assert status == 201
+    patient_id = payload["data"]["patient_id"]
+    assert response.getheader("Server-Timing").startswith("db;dur=")
+    status, payload, response = api("GET", f"/patients/{patient_id}")
+    assert (status, payload["data"]["name"]) == (200, "Ann Lee")
+    assert int(response.getheader("X-DB-Queries")) >= 1
+    status, payload, _ = api("GET", "/patients/search?name=lee&limit=5")
+    assert [p["patient_id"] for p in payload["data"]] == [patient_id]
+
+
+def test_errors_map_to_status_codes(api):
+    assert api("GET", "/patients/4242")[0] == 404
+    assert api("GET", "/nowhere")[0] == 404
+    assert api("GET", "/patients?limit=abc")[0] == 400
+    assert api("POST", "/patients", [1, 2])[0] == 400
+    status, payload, _ = api("POST", "/patients", dict(ANN, age=-3))
+    assert (status, payload["fields"][0]["field"]) == (422, "age")
+    api("POST", "/patients", dict(ANN, patient_id=2000))
+    assert api("POST", "/patients", dict(ANN, patient_id=2000))[0] == 409
+    assert api("GET", "/health")[1]["data"] == {"status": "up"}
@@ -0,0 +1,68 @@
+import threading
+
+import pytest
+
+from db_config import connection
+from id_allocator import IdAllocator, allocator, format_id, parse_id
+
+
+def test_format_and_parse_round_trip():
+    assert format_id("patient", 1001) == 1001
+    assert format_id("doctor", 7) == "D07"
+    assert format_id("bill", 12) == "B012"
+    assert parse_id("appointment", "A042") == 42
+    assert parse_id("doctor", "X07") is None
+    assert parse_id("service", "Sxx") is None
+
+
+def test_sequence_is_seeded_past_existing_rows(db, sql):
+    sql("INSERT INTO patients (patient_id, name, age, gender, admission_date, contact_no) "
+        "VALUES (1041, 'Ann Lee', 34, 'F', '2024-05-01', '9876543210')")
+    sql("INSERT INTO doctors VALUES ('D07', 'Dr. Gregory House', 'Diagnostics', '9876500000')")
+    assert allocator.next_id("patient") == 1042
+    assert allocator.next_id("doctor") == "D08"
+    assert allocator.next_id("bill") == "B001"
+
+
+def test_separate_processes_get_disjoint_blocks(db):
+    desk1, desk2 = IdAllocator(block_size=3), IdAllocator(block_size=3)
+    first = [desk1.next_value("bill") for _ in range(2)]
+    second = [desk2.next_value("bill") for _ in range(2)]
+    assert first == [1, 2]
+    # The second desk skips the rest of the first desk's block
+    assert second == [4, 5]
+    assert desk1.next_value("bill") == 3
+    assert desk1.next_value("bill") == 7
+
+
+def test_threads_never_share_an_id(db):
+    desk = IdAllocator(block_size=5)
+    seen = []
+
+    def worker():
+        values = [desk.next_value("appointment") for _ in range(50)]
+        seen.extend(values)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(seen) == list(range(1, 201))
+
+
+def test_ensure_at_least_moves_the_sequence_forward_only(db):
+    desk = IdAllocator(block_size=2)
+    assert desk.next_value("service") == 1
+    with connection() as conn:
+        desk.ensure_at_least(conn, "service", 50)
+        desk.ensure_at_least(conn, "service", 10)
+        conn.commit()
+    assert desk.next_id("service") == "S50"
+
+
+def test_rejects_bad_arguments(db):
+    with pytest.raises(ValueError):
+        IdAllocator(block_size=0)
+    with pytest.raises(ValueError):
+        allocator.reserve_block("ward")
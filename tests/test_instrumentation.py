@@ -0,0 +1,45 @@
+import json
+
+from instrumentation import Histogram, QueryStats, fingerprint, stats, action
+from patient import Patient
+
+
+def test_fingerprint_collapses_literals_and_lists():
+    assert fingerprint("SELECT *  FROM patients\n WHERE name = 'Ann' AND age > 30") == \
+        "SELECT * FROM patients WHERE name = ? AND age > ?"
+    assert fingerprint("SELECT * FROM t WHERE id IN (%s, %s, %s)") == "SELECT * FROM t WHERE id IN (...)"
+    assert fingerprint("INSERT INTO t VALUES (%s, %s), (%s, %s), (%s, %s)") == "INSERT INTO t VALUES (...)"
+
+
+def test_histogram_percentiles_use_bucket_bounds():
+    hist = Histogram()
+    for ms in [0.5] * 90 + [30] * 9 + [20000]:
+        hist.add(ms)
+    assert (hist.percentile(50), hist.percentile(95), hist.percentile(100)) == (1, 50, 20000)
+    assert hist.to_dict()["buckets"] == {"<=1ms": 90, "<=50ms": 9, ">10000ms": 1}
+
+
+def test_slow_queries_are_logged(tmp_path):
+    log = tmp_path / "slow.log"
+    qs = QueryStats(slow_query_ms=10, slow_query_file=str(log))
+    qs.record_query("SELECT 1", "tests.fast", 2, 1)
+    qs.record_query("SELECT * FROM big WHERE x = 5", "tests.slow", 25, 100)
+    entries = [json.loads(line) for line in log.read_text().splitlines()]
+    assert [(e["caller"], e["fingerprint"]) for e in entries] == [("tests.slow", "SELECT * FROM big WHERE x = ?")]
+    assert qs.report()["queries"][0]["rows"] == 100
+
+
+def test_cursors_record_statements_per_action(sql):
+    sql("INSERT INTO patients (patient_id, name, age, gender, admission_date, contact_no) "
+        "VALUES (1001, 'Ann Lee', 34, 'F', '2024-05-01', '9876543210')")
+    stats.reset()
+    with action("Patients > Days Admitted") as timing:
+        Patient.days_admitted(1001)
+        with action("nested"):
+            Patient.days_admitted(1001)
+    report = stats.report()
+    assert list(report["actions"]) == ["Patients > Days Admitted"]
+    assert report["actions"]["Patients > Days Admitted"]["count"] == 1
+    assert timing["queries"] == sum(n for n, _ in stats.action_queries["Patients > Days Admitted"].values()) > 0
+    callers = {c for q in report["queries"] for c in q["callers"]}
+    assert "patient.Patient.days_admitted" in callers
@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+import invoice_batch
+from billing import Bill
+
+
+@pytest.fixture
+def bills(sql):
+    sql("INSERT INTO patients (patient_id, name, age, gender, admission_date, contact_no) VALUES "
+        "(1001, 'Ann Lee', 34, 'F', '2024-05-01', '9876543210'), "
+        "(1002, 'Bo Chan', 50, 'M', '2024-05-02', '9876543211')")
+    sql("INSERT INTO doctors VALUES ('D01', 'Dr. Gregory House', 'Diagnostics', '9876500000')")
+    sql("INSERT INTO services VALUES ('S01', 'X Ray', 120.5)")
+    sql("INSERT INTO appointments VALUES ('A001', 1001, 'D01', '2024-05-03', 'Flu', 300)")
+    sql("INSERT INTO billing VALUES ('B001', 1001, 541, '2024-05-10'), "
+        "('B002', 1001, 120.5, '2024-06-01'), ('B100', 1002, 0, '2024-05-11')")
+    # B100 is an imported bill without billed services
+    sql("INSERT INTO billed_services (bill_id, patient_id, service_id, service_name, cost) VALUES "
+        "('B001', 1001, 'S01', 'X Ray', 120.5), ('B001', 1001, 'S01', 'X Ray', 120.5), "
+        "('B002', 1001, 'S01', 'X Ray', 120.5)")
+    return "B001", "B100", "B002"
+
+
+def read(directory, bill_id):
+    with open(os.path.join(directory, f"bill_{bill_id}.txt"), encoding="utf-8") as f:
+        return f.read()
+
+
+def test_date_range_selects_bills_and_renders_each(bills, tmp_path):
+    first, second, third = bills
+    tmp_path = tmp_path / "invoices"
+    stats = invoice_batch.generate_invoices("2024-05-01", "2024-05-31", workers=1, output_dir=str(tmp_path))
+    assert (stats["requested"], stats["generated"]) == (2, 2)
+    assert sorted(os.listdir(tmp_path)) == [f"bill_{first}.txt", f"bill_{second}.txt"]
+    invoice = read(tmp_path, first)
+    assert "Name: Ann Lee" in invoice
+    assert "Dr. Gregory House (Diagnostics)" in invoice
+    assert invoice.count("X Ray") == 2
+    other = read(tmp_path, second)
+    assert "Doctor      : N/A" in other and "No services billed." in other
+
+
+def test_bill_ids_are_deduplicated_and_chunked(bills, tmp_path):
+    first, second, third = bills
+    stats = invoice_batch.generate_invoices(bill_ids=[third, first, third, "B999"], workers=1,
+                                            output_dir=str(tmp_path), chunk_size=1)
+    # Unknown IDs are requested but produce no invoice
+    assert (stats["requested"], stats["generated"]) == (3, 2)
+    assert f"Bill No.    : {third}" in read(tmp_path, third)
+
+
+def test_worker_processes_write_the_same_invoices(bills, tmp_path):
+    serial, parallel = tmp_path / "serial", tmp_path / "parallel"
+    invoice_batch.generate_invoices(bill_ids=list(bills), workers=1, output_dir=str(serial))
+    stats = invoice_batch.generate_invoices(bill_ids=list(bills), workers=2, output_dir=str(parallel))
+    assert stats["generated"] == 3
+    for bill_id in bills:
+        assert read(serial, bill_id) == read(parallel, bill_id)
+
+
+def test_single_invoices_use_the_same_file_name(bills, tmp_path, sql, monkeypatch):
+    first = bills[0]
+    invoice_batch.generate_invoices(bill_ids=[first], workers=1, output_dir=str(tmp_path / "batch"))
+    monkeypatch.chdir(tmp_path)
+    Bill(*sql("SELECT bill_id, patient_id, billing_date FROM billing WHERE bill_id=%s", (first,))[0]).generate_invoice()
+    single = tmp_path / "output" / "invoices"
+    assert os.listdir(single) == [f"bill_{first}.txt"]
+    assert read(single, first) == read(tmp_path / "batch", first)
+
+
+def test_needs_a_range_or_ids():
+    with pytest.raises(ValueError):
+        invoice_batch.generate_invoices(start_date="2024-05-01")
@@ -0,0 +1,83 @@
+import pytest
+
+import db_config
+import name_index
+from doctor import Doctor
+from patient import Patient
+
+NAMES = ["Mary Ann Smith", "Annabel Lee", "Joanna Banner", "Ann Lee", "Bob Stone"]
+
+
+@pytest.fixture
+def patients(db):
+    ids = {}
+    for patient_id, name in enumerate(NAMES, 1001):
+        assert Patient(patient_id, name, 40, "F", "2024-01-01", "9876543210").add()
+        ids[name] = patient_id
+    return ids
+
+
+def names(entity, term, limit=name_index.SEARCH_LIMIT):
+    return [row[1] for row in name_index.search(entity, term, limit)]
+
+
+def test_trigrams_pad_and_normalize():
+    assert name_index.trigrams("  Al  ") == {"^al", "al$", "l$$"}
+    assert name_index.trigrams("AL") == name_index.trigrams("al")
+
+
+def test_matches_are_ranked_prefix_word_then_substring(patients):
+    assert names("patient", "ann") == ["Ann Lee", "Annabel Lee", "Mary Ann Smith", "Joanna Banner"]
+    assert names("patient", "ANN L") == ["Ann Lee"]
+    assert names("patient", "ann", limit=2) == ["Ann Lee", "Annabel Lee"]
+    assert names("patient", "zzz") == []
+
+
+def test_short_terms_use_the_prefix_scan(patients):
+    assert names("patient", "b") == ["Bob Stone", "Joanna Banner", "Annabel Lee"]
+    assert names("patient", "le") == ["Ann Lee", "Annabel Lee"]
+
+
+def test_updates_and_deletes_keep_the_index_current(patients):
+    patient_id = patients["Bob Stone"]
+    assert Patient(patient_id, "Robert Stone", 41, "M", "2024-01-01", "9876543210").update()
+    assert names("patient", "bob") == []
+    assert names("patient", "robert") == ["Robert Stone"]
+    Patient.delete(patient_id)
+    assert names("patient", "stone") == []
+
+
+def test_doctors_are_indexed_separately(patients):
+    assert Doctor("D01", "Gregory House", "Diagnostics", "9876500000").add()
+    assert names("doctor", "house") == ["Dr. Gregory House"]
+    assert names("patient", "house") == []
+
+
+def test_existing_database_is_backfilled_on_first_search(db, sql, monkeypatch):
+    # Rows written before the index existed: no postings, no marker
+    sql("INSERT INTO patients (patient_id, name, age, gender, admission_date, contact_no) "
+        "VALUES (1001, 'Ann Lee', 30, 'F', '2024-01-01', '9876543210')")
+    sql("DELETE FROM name_trigrams")
+    sql("DELETE FROM cache_versions WHERE name=%s", (name_index.BUILT_KEY,))
+    monkeypatch.setattr(name_index, "_prepared_for", None)
+    assert [row[1] for row in name_index.search("patient", "lee")] == ["Ann Lee"]
+    assert sql("SELECT COUNT(*) FROM cache_versions WHERE name=%s", (name_index.BUILT_KEY,)) == [(1,)]
+
+
+def test_cap_keeps_names_sharing_most_trigrams(db, sql, monkeypatch):
+    # Many names share a few of the query's trigrams; the real match must
+    # not be cut off by the candidate cap
+    monkeypatch.setattr(name_index, "CANDIDATE_CAP", 5)
+    rows = [(1000 + i, f"Chris Al{i:03d}") for i in range(30)] + [(2000, "Al Christopher")]
+    sql("INSERT INTO patients (patient_id, name, age, gender, admission_date, contact_no) VALUES "
+        + ", ".join(f"({pid}, '{name}', 30, 'M', '2024-01-01', '9876543210')" for pid, name in rows))
+    name_index.rebuild()
+    assert [row[1] for row in name_index.search("patient", "al christ")] == ["Al Christopher"]
+
+
+def test_rebuild_fits_in_a_single_connection_pool(db, sql):
+    sql("INSERT INTO patients (patient_id, name, age, gender, admission_date, contact_no) VALUES "
+        + ", ".join(f"({1000 + i}, 'Pat {i:03d}', 30, 'F', '2024-01-01', '9876543210')" for i in range(700)))
+    db_config.configure_pool(size=1, timeout=1)
+    assert name_index.rebuild(["patient"]) == {"patient": 700}
+    assert [row[1] for row in name_index.search("patient", "pat 699")] == ["Pat 699"]
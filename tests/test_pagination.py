@@ -0,0 +1,56 @@
+import pytest
+
+import db_backends
+from pagination import fetch_page, iter_rows
+
+
+@pytest.fixture
+def services(db, sql):
+    sql("INSERT INTO services (service_id, service_name, cost) VALUES "
+        + ", ".join(f"('S{i:02d}', 'Svc {i}', {i})" for i in range(1, 8)))
+
+
+def test_fetch_page_walks_the_table_by_key(services):
+    keys, after = [], None
+    while True:
+        rows, after = fetch_page("services", "service_id", after=after, page_size=3)
+        keys.append([r[0] for r in rows])
+        if after is None:
+            break
+    assert keys == [["S01", "S02", "S03"], ["S04", "S05", "S06"], ["S07"]]
+
+
+def test_exact_multiple_has_no_empty_last_page(services, sql):
+    sql("DELETE FROM services WHERE service_id='S07'")
+    rows, after = fetch_page("services", "service_id", after="S03", page_size=3)
+    assert [r[0] for r in rows] == ["S04", "S05", "S06"]
+    assert after is None
+
+
+def test_iter_rows_streams_every_row_once(services):
+    rows = list(iter_rows("services", "service_id", page_size=2, columns="service_id, cost"))
+    assert [r[0] for r in rows] == [f"S{i:02d}" for i in range(1, 8)]
+
+
+def test_pages_are_read_through_unbuffered_cursors(services, monkeypatch):
+    options = []
+    cursor = db_backends.SQLiteConnection.cursor
+    monkeypatch.setattr(db_backends.SQLiteConnection, "cursor",
+                        lambda self, *args, **kwargs: options.append(kwargs) or cursor(self, *args, **kwargs))
+    fetch_page("services", "service_id", page_size=3)
+    assert len(list(iter_rows("services", "service_id", page_size=3))) == 7
+    assert options == [{"buffered": False}] * 4
+
+
+def test_list_operations_return_the_next_key(run):
+    first = run("list_patients", limit=4)
+    assert first.ok and first.data == {"rows": [], "next": None}
+    for i in range(5):
+        run("add_patient", name=f"Pat {chr(65 + i)}", age=30, gender="F",
+            admission_date="2024-01-01", contact_no="9876543210")
+    page = run("list_patients", limit=3)
+    assert [r["name"] for r in page.data["rows"]] == ["Pat A", "Pat B", "Pat C"]
+    rest = run("list_patients", after=page.data["next"], limit=3)
+    assert [r["name"] for r in rest.data["rows"]] == ["Pat D", "Pat E"]
+    assert rest.data["next"] is None
+    assert run("list_patients", limit=0).code == "bad_request"
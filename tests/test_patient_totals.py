@@ -0,0 +1,88 @@
+import pytest
+
+import patient_totals
+from appointment import Appointment
+from billing import Bill
+from patient import Patient
+
+
+@pytest.fixture
+def two_patients(run, patient):
+    other = run("add_patient", name="Bo Chan", age=50, gender="M", admission_date="2024-05-02",
+                contact_no="9876543211").data["patient_id"]
+    return patient, other
+
+
+def totals(run, patient_id):
+    data = run("compute_total_billing", patient_id=patient_id).data
+    return data["service_total"], data["consulting_total"], data["billed_to_date"]
+
+
+def charged_appointments(sql, patient_id, doctor_id):
+    # Charges come from imports; the operations book at the default of 0
+    sql("INSERT INTO appointments (appt_id, patient_id, doctor_id, date, diagnosis, consulting_charge) VALUES "
+        "('A001', %s, %s, '2024-05-03', 'Flu', 300), ('A002', %s, %s, '2024-05-04', 'Flu', 450.75)",
+        (patient_id, doctor_id) * 2)
+    patient_totals.rebuild()
+
+
+def test_every_write_path_keeps_totals_in_step(two_patients, doctor, service, run, sql, capsys):
+    ann, bo = two_patients
+    charged_appointments(sql, ann, doctor)
+    steps = [
+        lambda: run("add_service_usage", patient_id=ann, service_id=service),
+        lambda: run("add_service_usage", patient_id=ann, service_id=service),
+        lambda: run("add_service_usage", patient_id=bo, service_id=service),
+        lambda: run("add_appointment", patient_id=bo, doctor_id=doctor, date="2024-05-04", diagnosis="Flu",
+                    appt_id="A003"),
+        lambda: run("add_bill", patient_id=ann, bill_id="B001"),
+        # Move an appointment (and its charge) to the other patient
+        lambda: run("update_appointment", appt_id="A002", patient_id=bo, doctor_id=doctor, date="2024-05-04",
+                    diagnosis="Cold"),
+        lambda: Appointment("A001", str(bo), doctor, "2024-05-05", "Cold").update(),
+        lambda: run("add_service_usage", patient_id=ann, service_id=service),
+        lambda: Bill("B001", str(bo), "2024-05-06").update(),
+        lambda: run("update_service", service_id=service, service_name="X Ray", cost=80.25),
+        lambda: run("add_service_usage", patient_id=bo, service_id=service),
+        lambda: run("add_bill", patient_id=bo, bill_id="B002"),
+        lambda: run("delete_appointment", appt_id="A002"),
+        lambda: Bill.delete("B001"),
+        lambda: run("add_service_usage", patient_id=ann, service_id=service),
+        lambda: run("clear_service_usage", patient_id=bo),
+        lambda: Patient.delete(str(ann)),
+    ]
+    for number, step in enumerate(steps, 1):
+        result = step()
+        assert getattr(result, "ok", True), (number, result)
+        assert patient_totals.verify() == [], number
+
+
+def test_compute_total_billing_reads_the_running_totals(two_patients, doctor, service, run, sql):
+    ann, _ = two_patients
+    charged_appointments(sql, ann, doctor)
+    run("add_service_usage", patient_id=ann, service_id=service)
+    assert totals(run, ann) == (120.5, 750.75, 0.0)
+    run("add_bill", patient_id=ann)
+    run("delete_appointment", appt_id="A002")
+    assert totals(run, ann) == (0.0, 300.0, 120.5)
+
+
+def test_verify_reports_drift_and_rebuild_repairs_it(two_patients, service, run, sql):
+    ann, bo = two_patients
+    run("add_service_usage", patient_id=ann, service_id=service)
+    sql("UPDATE patient_totals SET pending_services = 999")
+    sql("INSERT INTO patient_totals (patient_id, pending_services, consulting, billed) VALUES (%s, 0, 0, 5)", (bo,))
+    assert patient_totals.verify() == [(str(ann), "pending_services", 999.0, 120.5), (str(bo), "billed", 5.0, 0.0)]
+    assert patient_totals.rebuild() == 1
+    assert patient_totals.verify() == []
+
+
+def test_existing_database_is_backfilled(two_patients, service, run, sql, monkeypatch):
+    ann, _ = two_patients
+    run("add_service_usage", patient_id=ann, service_id=service)
+    # As on a database from before the table existed
+    sql("DELETE FROM patient_totals")
+    sql("DELETE FROM cache_versions WHERE name=%s", (patient_totals.BUILT_KEY,))
+    monkeypatch.setattr(patient_totals, "_prepared_for", None)
+    assert patient_totals.get(ann) == {"pending_services": 120.5, "consulting": 0.0, "billed": 0.0}
+    assert patient_totals.verify() == []
@@ -0,0 +1,174 @@
+import datetime
+import threading
+
+import pytest
+
+import scheduling
+from appointment import Appointment
+from doctor import Doctor
+from scheduling import Day, parse_time
+
+# A Monday a week or more ahead, so bookings count as future ones
+MONDAY = datetime.date.today() + datetime.timedelta(days=7 + (-datetime.date.today().weekday()) % 7)
+DATE = MONDAY.isoformat()
+
+
+@pytest.fixture
+def hours(run, doctor):
+    # Mondays 09:00-12:00 in 30-minute slots
+    assert run("set_doctor_hours", doctor_id=doctor, weekday="Mon", start="09:00", end="12:00").ok
+    return doctor
+
+
+def book(run, patient, doctor, start, slots=1, date=DATE):
+    return run("book_slot", patient_id=patient, doctor_id=doctor, date=date, start=start, diagnosis="Checkup",
+               slots=slots)
+
+
+def free(run, doctor, date=DATE):
+    return [s["start"] for s in run("free_slots", doctor_id=doctor, date=date).data]
+
+
+def test_day_lookups():
+    day = Day([(540, 600, 30), (660, 720, 30)], {570}, 0)     # 09:00-10:00 and 11:00-12:00
+    assert day.free == [540, 660, 690]
+    assert day.is_free(660, 2) and not day.is_free(540, 2)
+    # Slots either side of a gap between shifts are not back to back
+    assert not Day([(540, 600, 30), (660, 720, 30)], set(), 0).is_free(570, 2)
+    assert day.first_free(after=550) == 660
+    assert day.first_free(slots=3) is None
+
+
+def test_validate_hours():
+    assert scheduling.validate_hours("Mon", "09:00", "12:00", 30) is None
+    assert scheduling.validate_hours("Funday", "09:00", "12:00", 30).startswith("Invalid weekday")
+    assert scheduling.validate_hours("Mon", "09:00", "09:20", 30) == "Shift must be at least one slot long."
+    assert scheduling.validate_hours("Mon", "11:00", "13:00", 30, [(0, 540, 720, 30)]).startswith("Overlaps")
+    # Replacing the shift that starts at the same time is allowed
+    assert scheduling.validate_hours("Mon", "09:00", "13:00", 30, [(0, 540, 720, 30)]) is None
+
+
+def test_booking_takes_slots_and_conflicts(hours, patient, run):
+    result = book(run, patient, hours, "09:30", slots=2)
+    assert (result.data["start"], result.data["end"]) == ("09:30", "10:30")
+    assert free(run, hours) == ["09:00", "10:30", "11:00", "11:30"]
+    # Same slot, and a longer booking running into a taken slot
+    assert book(run, patient, hours, "09:30").code == "conflict"
+    assert book(run, patient, hours, "09:00", slots=2).code == "conflict"
+    assert book(run, patient, hours, "11:30", slots=2).code == "validation"
+    assert book(run, patient, hours, "09:15").code == "validation"
+    first = run("first_free_slot", doctor_id=hours, from_date=DATE, slots=2)
+    assert first.data["start"] == "10:30"
+
+
+def test_concurrent_desks_cannot_double_book(hours, patient, run, sql):
+    results = []
+
+    def desk():
+        results.append(book(run, patient, hours, "10:00"))
+
+    threads = [threading.Thread(target=desk) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(r.ok for r in results) == [False, False, False, True]
+    assert {r.code for r in results if not r.ok} == {"conflict"}
+    assert sql("SELECT COUNT(*) FROM appointments") == [(1,)]
+
+
+def test_slot_taken_by_another_process_is_a_conflict(hours, patient, run, sql):
+    assert "10:00" in free(run, hours)          # this process's index has the day loaded
+    book_elsewhere = "INSERT INTO appointment_slots (doctor_id, date, slot_start, appt_id) VALUES (%s, %s, %s, 'A900')"
+    sql("INSERT INTO appointments (appt_id, patient_id, doctor_id, date, diagnosis) VALUES ('A900', %s, %s, %s, 'X')",
+        (patient, hours, DATE))
+    sql(book_elsewhere, (hours, DATE, parse_time("10:00")))
+    result = book(run, patient, hours, "10:00")
+    assert (result.code, result.error) == ("conflict", scheduling.TAKEN)
+    assert sql("SELECT COUNT(*) FROM appointments") == [(1,)]
+    # The failed booking reloaded the day
+    assert "10:00" not in free(run, hours)
+
+
+def test_booking_on_a_stale_grid_is_rejected(hours, patient, run, sql):
+    assert "09:30" in free(run, hours)
+    # Another process moves Monday to 20-minute slots
+    sql("UPDATE doctor_hours SET slot_minutes=20 WHERE doctor_id=%s", (hours,))
+    result = book(run, patient, hours, "09:30")
+    assert (result.code, result.error) == ("conflict", scheduling.HOURS_CHANGED)
+    assert book(run, patient, hours, "09:40").ok
+
+
+def test_hours_changes_that_move_bookings_are_rejected(hours, patient, run):
+    appt_id = book(run, patient, hours, "11:00").data["appt_id"]
+    change = lambda **kw: run("set_doctor_hours", doctor_id=hours, weekday="Mon", **kw)
+    # Shorter shift dropping the slot, and a new grid splitting it
+    assert change(start="09:00", end="11:00").code == "conflict"
+    assert change(start="09:00", end="12:00", slot_minutes=15).code == "conflict"
+    assert run("clear_doctor_hours", doctor_id=hours).code == "conflict"
+    assert run("clear_doctor_hours", doctor_id=hours, weekday="Mon").code == "conflict"
+    # Growing the shift keeps every booked slot where it was
+    assert change(start="09:00", end="13:00").ok
+    assert free(run, hours)[-2:] == ["12:00", "12:30"]
+    # Other weekdays are unaffected
+    assert run("set_doctor_hours", doctor_id=hours, weekday="Tue", start="08:00", end="09:00",
+               slot_minutes=20).ok
+    assert run("clear_doctor_hours", doctor_id=hours, weekday="Tue").ok
+    run("delete_appointment", appt_id=appt_id)
+    assert change(start="09:00", end="11:00").ok
+    assert run("clear_doctor_hours", doctor_id=hours).ok
+
+
+def test_past_bookings_do_not_block_changes(hours, patient, run, sql):
+    past = (MONDAY - datetime.timedelta(days=28)).isoformat()
+    assert book(run, patient, hours, "09:00", date=past).ok
+    assert run("set_doctor_hours", doctor_id=hours, weekday="Mon", start="09:00", end="12:00",
+               slot_minutes=20).ok
+
+
+def test_entity_path_checks_bookings(hours, patient, run, capsys):
+    book(run, patient, hours, "09:30")
+    assert Doctor.set_working_hours(hours, "Mon", "09:00", "12:00", 20) is False
+    assert "would move off the slot grid" in capsys.readouterr().out
+    assert Doctor.set_working_hours(hours, "Mon", "09:00", "12:30", 30) is True
+
+
+def test_cancelling_frees_the_slot_and_slotted_appointments_stay_put(hours, patient, run):
+    appt_id = book(run, patient, hours, "09:00").data["appt_id"]
+    moved = run("update_appointment", appt_id=appt_id, patient_id=patient, doctor_id=hours,
+                date=(MONDAY + datetime.timedelta(days=7)).isoformat(), diagnosis="Checkup")
+    assert moved.error == scheduling.MOVE_SLOTTED
+    run("delete_appointment", appt_id=appt_id)
+    assert free(run, hours)[0] == "09:00"
+    assert book(run, patient, hours, "09:00").ok
+
+
+def test_plain_adds_cannot_double_book(hours, patient, run, sql):
+    add = lambda **kw: run("add_appointment", patient_id=patient, doctor_id=hours, date=DATE, diagnosis="Flu", **kw)
+    # Without a time the appointment would hold no slot
+    assert add().error == scheduling.NEEDS_SLOT.format(hours)
+    assert add(start="10:00").ok
+    assert add(start="10:00").code == "conflict"
+    assert sql("SELECT COUNT(*) FROM appointments") == [(1,)]
+
+
+def test_plain_adds_for_doctors_without_hours(run, patient, doctor, sql):
+    for _ in range(2):
+        assert run("add_appointment", patient_id=patient, doctor_id=doctor, date=DATE, diagnosis="Flu").ok
+    # Once the doctor has hours, unslotted appointments cannot be moved onto them
+    appt_id = sql("SELECT MIN(appt_id) FROM appointments")[0][0]
+    run("set_doctor_hours", doctor_id=doctor, weekday="Mon", start="09:00", end="12:00")
+    update = lambda date, diagnosis: run("update_appointment", appt_id=appt_id, patient_id=patient,
+                                         doctor_id=doctor, date=date, diagnosis=diagnosis)
+    assert update(DATE, "Cold").ok
+    assert update((MONDAY + datetime.timedelta(days=7)).isoformat(), "Cold").error == \
+        scheduling.NEEDS_SLOT.format(doctor)
+
+
+def test_entity_adds_go_through_the_slots(hours, patient, sql, capsys):
+    assert Appointment("A100", str(patient), hours, DATE, "Flu").add() is False
+    assert scheduling.NEEDS_SLOT.format(hours) in capsys.readouterr().out
+    assert Appointment("A100", str(patient), hours, DATE, "Flu").add("09:00") is True
+    assert Appointment("A101", str(patient), hours, DATE, "Flu").add("09:00") is False
+    assert scheduling.TAKEN in capsys.readouterr().out
+    assert sql("SELECT appt_id FROM appointments") == [("A100",)]
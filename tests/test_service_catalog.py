@@ -0,0 +1,35 @@
+from service import Service
+from service_catalog import ServiceCatalog, catalog
+
+
+def test_serves_from_memory_until_the_version_changes(service):
+    # A second process's catalog: it only learns of changes via cache_versions
+    other = ServiceCatalog(check_interval=0)
+    assert other.get(service) == (service, "X Ray", 120.5)
+    assert other.get(service) == (service, "X Ray", 120.5)
+    assert (other.stats()["loads"], other.stats()["version_checks"]) == (1, 1)
+
+    Service(service, "X Ray", "99").update()
+    assert other.get(service) == (service, "X Ray", 99)
+    assert other.stats()["loads"] == 2
+
+
+def test_check_interval_bounds_version_queries(service):
+    other = ServiceCatalog(check_interval=3600)
+    other.all()
+    Service.delete(service)
+    # Still within the interval: the old copy is served without a query
+    assert other.get(service) is not None
+    assert other.stats()["version_checks"] == 0
+    other.invalidate()
+    assert other.get(service) is None
+
+
+def test_entity_writes_bump_the_version(db, sql):
+    Service("S01", "MRI", "900").add()
+    other = ServiceCatalog(check_interval=0)
+    assert [row[1] for row in other.all()] == ["MRI"]
+    Service("S01", "MRI Scan", "950").update()
+    assert other.all() == [("S01", "MRI Scan", 950)]
+    # The local catalog was invalidated by the writer itself
+    assert catalog.get("S01") == ("S01", "MRI Scan", 950)
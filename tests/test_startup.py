@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import startup
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, "hospital_main.py")
+
+
+@pytest.fixture
+def cli_env(tmp_path, monkeypatch):
+    monkeypatch.setenv("HMS_DB_BACKEND", "sqlite")
+    monkeypatch.setenv("HMS_SQLITE_PATH", str(tmp_path / "hospital.db"))
+    monkeypatch.chdir(tmp_path)
+
+
+def test_main_menu_module_does_not_import_the_database_layer(cli_env):
+    code = ("import sys, hospital_main; "
+            "print(sorted(m for m in ('db_config', 'mysql.connector', 'patient', 'billing') if m in sys.modules))")
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "[]"
+
+
+def test_cold_start_is_measured_with_a_warm_connection(cli_env):
+    result = startup.measure_once(SCRIPT)
+    assert result["error"] is None
+    assert 0 < result["to_menu"] <= result["menu"] <= result["total"]
+    assert result["warm_up_connect"] > 0
+
+
+def test_a_failing_cli_is_reported(cli_env, tmp_path):
+    broken = tmp_path / "broken.py"
+    broken.write_text("raise SystemExit(3)\n")
+    with pytest.raises(RuntimeError, match="exit code 3"):
+        startup.measure_once(str(broken))
+
+
+def test_marks_keep_the_first_time(monkeypatch):
+    monkeypatch.setattr(startup, "_marks", {})
+    startup.mark("menu")
+    first = startup._marks["menu"]
+    startup.mark("menu")
+    assert startup._marks["menu"] == first
@@ -0,0 +1,151 @@
+import json
+import os
+import sqlite3
+import uuid
+
+import pytest
+
+import patient_totals
+import usage_journal
+from billing import Bill
+from service import ServiceUsageDB
+from usage_journal import UsageJournal, apply_events, read_events
+
+
+@pytest.fixture
+def journal_dir(db, tmp_path):
+    return str(tmp_path / "journal")
+
+
+@pytest.fixture
+def journal(journal_dir, monkeypatch):
+    # This process's write-behind journal; the flusher is kept out of the
+    # way so the tests decide when events are written
+    monkeypatch.setattr(usage_journal.atexit, "register", lambda function: None)
+    journal = usage_journal.enable(journal_dir, flush_interval=60)
+    yield journal
+    journal.close()
+    usage_journal._journal = None
+
+
+def event(patient_id, cost=120.5):
+    return {"id": uuid.uuid4().hex, "patient_id": str(patient_id), "service_id": "S01", "service_name": "X Ray",
+            "cost": cost}
+
+
+def write_journal(directory, slot, events, tail=b""):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f"usage-{slot}.journal"), "wb") as f:
+        f.write(b"".join(json.dumps(e).encode("utf-8") + b"\n" for e in events) + tail)
+
+
+def usage_rows(sql, patient_id):
+    return sql("SELECT service_id, cost FROM temp_service_usage WHERE patient_id=%s", (str(patient_id),))
+
+
+def test_recorded_usage_waits_for_the_next_flush(journal, patient, service, run, sql):
+    for _ in range(3):
+        ServiceUsageDB.add_service_by_id(str(patient), service)
+    assert journal.pending() == 3
+    assert usage_rows(sql, patient) == []
+    # Reading pending usage writes out what this process queued
+    listed = run("list_service_usage", patient_id=patient)
+    assert listed.ok and len(listed.data) == 3
+    assert journal.pending() == 0
+    assert read_events(journal.path) == []
+    assert journal.flush() == 0
+    assert len(usage_rows(sql, patient)) == 3
+    assert patient_totals.verify() == []
+
+
+def test_bills_include_queued_usage(journal, patient, service, run, sql):
+    ServiceUsageDB.add_service_by_id(str(patient), service)
+    ServiceUsageDB.add_service_by_id(str(patient), service)
+    assert run("compute_total_billing", patient_id=patient).data["service_total"] == 241.0
+    ServiceUsageDB.add_service_by_id(str(patient), service)
+    Bill("B001", str(patient), "2024-05-06").add()
+    assert sql("SELECT total_amount FROM billing WHERE bill_id='B001'") == [(361.5,)]
+    assert usage_rows(sql, patient) == []
+    assert patient_totals.verify() == []
+
+
+def test_replay_skips_events_committed_before_a_crash(journal_dir, patient, sql):
+    events = [event(patient, cost) for cost in (10.0, 20.0, 30.0)]
+    write_journal(journal_dir, 0, events)
+    # The first two were committed but the process died before it rewrote
+    # the journal
+    assert apply_events(events[:2]) == (2, 0)
+    journal = UsageJournal(journal_dir, flush_interval=60).open()
+    assert journal.stats["recovered"] == 3
+    journal.close()
+    assert journal.stats["written"] == 1 and journal.stats["skipped"] == 2
+    assert sorted(cost for _, cost in usage_rows(sql, patient)) == [10.0, 20.0, 30.0]
+    assert read_events(journal.path) == []
+    assert patient_totals.verify() == []
+
+
+def test_replaying_the_same_batch_twice_writes_it_once(journal_dir, patient, sql):
+    events = [event(patient), event(patient)]
+    assert apply_events(events) == (2, 0)
+    assert apply_events(events) == (0, 2)
+    assert len(usage_rows(sql, patient)) == 2
+    assert patient_totals.verify() == []
+
+
+def test_a_torn_tail_and_repeated_lines_are_dropped(journal_dir, patient):
+    first, second = event(patient), event(patient)
+    write_journal(journal_dir, 0, [first, second, first], tail=b'{"id":"' + uuid.uuid4().hex[:10].encode())
+    assert read_events(os.path.join(journal_dir, "usage-0.journal")) == [first, second]
+    assert read_events(os.path.join(journal_dir, "usage-9.journal")) == []
+
+
+def test_orphaned_journals_are_adopted_but_live_ones_left_alone(journal_dir, patient, sql):
+    live = UsageJournal(journal_dir, flush_interval=60).open()
+    live.record(patient, "S01", "X Ray", 5.0)
+    orphan = [event(patient, 7.0), event(patient, 8.0)]
+    write_journal(journal_dir, 2, orphan)
+    adopter = UsageJournal(journal_dir, flush_interval=60).open()
+    try:
+        assert adopter.stats["adopted"] == 2
+        assert not os.path.exists(os.path.join(journal_dir, "usage-2.journal"))
+        assert [e["id"] for e in read_events(adopter.path)] == [e["id"] for e in orphan]
+        assert sorted((os.path.basename(path), count, held)
+                      for path, count, held in usage_journal.status(journal_dir)) == \
+            [("usage-0.journal", 1, True), ("usage-1.journal", 2, True)]
+    finally:
+        adopter.close()
+        live.close()
+    assert sorted(cost for _, cost in usage_rows(sql, patient)) == [5.0, 7.0, 8.0]
+    assert [count for _, count, held in usage_journal.status(journal_dir)] == [0, 0]
+    assert patient_totals.verify() == []
+
+
+def test_a_failed_flush_keeps_the_events_queued(journal_dir, patient, sql, monkeypatch):
+    journal = UsageJournal(journal_dir, flush_interval=60).open()
+    try:
+        journal.record(patient, "S01", "X Ray", 12.0)
+
+        def fail(events):
+            raise sqlite3.OperationalError("database is locked")
+        monkeypatch.setattr(usage_journal, "apply_events", fail)
+        with pytest.raises(sqlite3.OperationalError):
+            journal.flush()
+        assert journal.pending() == 1
+        assert len(read_events(journal.path)) == 1
+        monkeypatch.undo()
+        assert journal.flush() == 1
+    finally:
+        journal.close()
+    assert usage_rows(sql, patient) == [("S01", 12.0)]
+    assert patient_totals.verify() == []
+
+
+def test_a_failed_sync_before_billing_is_reported(journal, patient, service, monkeypatch, capsys):
+    ServiceUsageDB.add_service_by_id(str(patient), service)
+
+    def fail():
+        raise sqlite3.IntegrityError("FOREIGN KEY constraint failed")
+    monkeypatch.setattr(usage_journal, "sync", fail)
+    assert Bill("B001", str(patient), "2024-05-06").add() is False
+    assert "integrity error while adding bill" in capsys.readouterr().out
+    assert journal.pending() == 1
@@ -0,0 +1,69 @@
+import random
+
+import pytest
+
+from validators import (
+    PATIENT, SERVICE, DOCTOR, Field, Pattern, validate_patient, validate_service,
+)
+
+SAMPLES = {
+    "name": ["Ann Lee", "Dr. Who", "", "Bob 2", None, 42, "  "],
+    "age": [0, 120, "35", -1, 121, "3.5", "abc", None, 1.9],
+    "gender": ["M", "F", "Other", "m", "", None, ["M"]],
+    "admission_date": ["2024-02-29", "2023-02-29", "2024-13-01", "24-01-01", None, 20240101, "2024-1-1"],
+    "contact_no": ["9876543210", 9876543210, "98765", "98765 43210", None, "+919876543210"],
+    "service_name": ["X-Ray", "MRI_2", "Scan!", "", None],
+    "cost": [0, 5000, "12.5", -0.01, 5000.5, "nan", "inf", float("nan"), None, "x"],
+}
+
+
+def per_row(schema, columns, count):
+    errors = {}
+    for row in range(count):
+        found = schema.validate({name: values[row] for name, values in columns.items()})
+        if found:
+            errors[row] = [(e.field, e.message) for e in found]
+    return errors
+
+
+@pytest.mark.parametrize("schema", [PATIENT, SERVICE])
+def test_column_checks_match_row_checks(schema):
+    rng = random.Random(3)
+    for count in (0, 1, 5, 40):
+        for clean in (True, False):
+            columns = {}
+            for field in schema.fields:
+                samples = SAMPLES[field.name]
+                # Clean batches use only valid values, so the fast path is taken
+                pool = [v for v in samples if not field.check(v)[1]] if clean else samples
+                columns[field.name] = [rng.choice(pool) for _ in range(count)]
+            by_column = schema.validate_columns(columns, count)
+            assert {row: [(e.field, e.message) for e in errs] for row, errs in by_column.items()} == \
+                per_row(schema, columns, count)
+            if clean:
+                assert by_column == {}
+
+
+def test_missing_column_counts_as_empty():
+    errors = SERVICE.validate_rows([{"service_name": "MRI"}, {"service_name": "ECG", "cost": "10"}])
+    assert [(row, [e.field for e in errs]) for row, errs in errors.items()] == [(0, ["cost"])]
+
+
+def test_clean_converts_values():
+    values, errors = PATIENT.clean({"name": "Ann", "age": "30", "gender": "F", "admission_date": "2024-01-01",
+                                    "contact_no": 9876543210})
+    assert errors == []
+    assert (values["age"], values["contact_no"]) == (30, "9876543210")
+
+
+def test_first_error_wrappers():
+    assert validate_patient("Ann", 30, "F", "2024-01-01", "9876543210") is None
+    assert validate_patient("Ann", 30, "X", "2024-02-30", "1") == "Invalid Gender. Choose from M, F, Other."
+    assert validate_service("MRI", "nan") == "Invalid Cost. Enter a valid number."
+    assert DOCTOR["specialization"].check("Médecine générale")[1] is None
+
+
+def test_field_is_abstract():
+    with pytest.raises(TypeError):
+        Field("x", "bad")
+    assert Pattern("code", r"[A-Z]+", "bad").check("ABC") == ("ABC", None)
@@ -0,0 +1,387 @@
+import atexit
+import datetime
+import json
+import os
+import threading
+import uuid
+
+try:
+    import fcntl
+except ImportError:         # Windows
+    fcntl = None
+    import msvcrt
+
+# Write-behind capture of service usage (temp_service_usage rows) for the
+# nursing station CLI. With HMS_USAGE_WRITE_BEHIND=1 each recorded service
+# is appended to a local journal file and fsynced, which is the
+# acknowledgement; a background flusher then writes everything recorded
+# in the last FLUSH_INTERVAL seconds in one transaction.
+#
+# Exactly once: every event has an id, and the transaction that inserts
+# the usage rows also inserts the ids into usage_journal_applied. Events
+# are removed from the journal only after that commit, so a crash in
+# between replays them on the next start and the ids already present are
+# skipped.
+#
+# Each process owns one journal slot (usage-N.journal, held through a lock
+# on usage-N.lock for the life of the process). A process that opens its
+# journal also adopts the journals of slots nobody holds, i.e. those left
+# behind by a crashed or killed process.
+#
+# Anything that reads pending usage in this process calls sync() first
+# (Bill.add, the service usage views, compute_total_billing). Other
+# processes see queued usage after the next flush.
+#
+#   python usage_journal.py --status    # pending events per journal
+#   python usage_journal.py --flush     # write out journals left behind
+
+WRITE_BEHIND = os.environ.get("HMS_USAGE_WRITE_BEHIND", "").lower() in ("1", "true", "yes", "on")
+JOURNAL_DIR = os.environ.get("HMS_USAGE_JOURNAL_DIR", "journal")
+# Seconds between group commits (the most a queued event waits)
+FLUSH_INTERVAL = float(os.environ.get("HMS_USAGE_FLUSH_INTERVAL", "1.0"))
+# Events per transaction; a full batch is flushed without waiting
+FLUSH_BATCH = 500
+MAX_SLOTS = 32
+# Applied ids are kept this long (pruned by the flusher when it starts); a
+# journal left unopened for longer could be written twice
+APPLIED_RETENTION_DAYS = 7
+
+
+def _try_lock(f):
+    # Non-blocking exclusive lock, released when the file is closed
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _fsync_dir(directory):
+    # Makes a rename durable (not possible, nor needed, on Windows)
+    if fcntl is None:
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _encode(event):
+    return (json.dumps(event, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def read_events(path):
+    # Events in a journal file, in order, without repeated ids. A line cut
+    # short by a crash mid-append was never acknowledged and is dropped.
+    events, seen = [], set()
+    try:
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if event.get("id") not in seen:
+                    seen.add(event["id"])
+                    events.append(event)
+    except FileNotFoundError:
+        pass
+    return events
+
+
+def _utc_now(days_ago=0):
+    now = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=days_ago)
+    return now.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def apply_events(events):
+    # Writes a batch of events in one transaction: the usage rows, their
+    # ids in usage_journal_applied and the pending totals. Events whose id
+    # is already there were committed before a crash and are skipped.
+    # Returns (written, skipped).
+    from db_config import connection, begin_write, ensure_schema
+    import patient_totals
+    ensure_schema()
+    patient_totals.prepare()
+    ids = [event["id"] for event in events]
+    with connection() as conn:
+        begin_write(conn)
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"SELECT event_id FROM usage_journal_applied WHERE event_id IN "
+                           f"({', '.join(['%s'] * len(ids))})", ids)
+            applied = {row[0] for row in cursor.fetchall()}
+            new = [event for event in events if event["id"] not in applied]
+            if new:
+                cursor.executemany(
+                    "INSERT INTO temp_service_usage (patient_id, service_id, service_name, cost) "
+                    "VALUES (%s, %s, %s, %s)",
+                    [(e["patient_id"], e["service_id"], e["service_name"], e["cost"]) for e in new])
+                now = _utc_now()
+                cursor.executemany("INSERT INTO usage_journal_applied (event_id, applied_at) VALUES (%s, %s)",
+                                   [(e["id"], now) for e in new])
+                pending = {}
+                for e in new:
+                    pending[e["patient_id"]] = pending.get(e["patient_id"], 0) + e["cost"]
+                for patient_id, amount in pending.items():
+                    patient_totals.adjust(cursor, patient_id, pending=round(amount, 2))
+            conn.commit()
+        finally:
+            cursor.close()
+    return len(new), len(events) - len(new)
+
+
+def prune_applied(days=APPLIED_RETENTION_DAYS):
+    # Drops ids applied more than days ago; by then no journal holds them
+    from db_config import connection, begin_write, ensure_schema
+    ensure_schema()
+    cutoff = _utc_now(days)
+    with connection() as conn:
+        begin_write(conn)
+        cursor = conn.cursor()
+        try:
+            cursor.execute("DELETE FROM usage_journal_applied WHERE applied_at < %s", (cutoff,))
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+
+class UsageJournal:
+    def __init__(self, directory=JOURNAL_DIR, flush_interval=FLUSH_INTERVAL, batch_size=FLUSH_BATCH):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.path = None
+        self.last_error = None      # of the last background flush, None once one succeeds
+        self.stats = {"recorded": 0, "recovered": 0, "adopted": 0, "written": 0, "skipped": 0, "flushes": 0}
+        self._pending = []          # events not yet committed, in journal order
+        self._lock_file = None
+        self._out = None
+        self._lock = threading.Lock()           # _pending and the journal file
+        self._flush_lock = threading.Lock()     # one flush at a time
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = None
+
+    # --- Opening and recovery ---
+    def open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        for slot in range(MAX_SLOTS):
+            f = open(os.path.join(self.directory, f"usage-{slot}.lock"), "a+b")
+            if _try_lock(f):
+                self._lock_file = f
+                self.path = os.path.join(self.directory, f"usage-{slot}.journal")
+                break
+            f.close()
+        else:
+            raise RuntimeError(f"All {MAX_SLOTS} journal slots in '{self.directory}' are in use.")
+        with self._lock:
+            # Events a previous owner of this slot did not get to flush
+            self._pending = read_events(self.path)
+            self.stats["recovered"] = len(self._pending)
+            self._rewrite()
+        self._adopt_orphans()
+        self._thread = threading.Thread(target=self._run, name="usage-journal-flusher", daemon=True)
+        self._thread.start()
+        if self._pending:
+            self._wake.set()
+        return self
+
+    def _adopt_orphans(self):
+        # Moves the events of journals nobody holds into this one. The
+        # orphan is deleted only after the copy is durable; a crash in
+        # between leaves duplicates, which the event ids absorb.
+        for slot in range(MAX_SLOTS):
+            path = os.path.join(self.directory, f"usage-{slot}.journal")
+            if path == self.path or not os.path.exists(path):
+                continue
+            f = open(os.path.join(self.directory, f"usage-{slot}.lock"), "a+b")
+            try:
+                if not _try_lock(f):
+                    continue                # a live process owns it
+                with self._lock:
+                    known = {event["id"] for event in self._pending}
+                    events = [event for event in read_events(path) if event["id"] not in known]
+                    if events:
+                        self._out.write(b"".join(map(_encode, events)))
+                        self._out.flush()
+                        os.fsync(self._out.fileno())
+                        self._pending.extend(events)
+                        self.stats["adopted"] += len(events)
+                os.remove(path)
+            finally:
+                f.close()
+
+    def _rewrite(self):
+        # Replaces the journal with the pending events (called with _lock held)
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(b"".join(map(_encode, self._pending)))
+            f.flush()
+            os.fsync(f.fileno())
+        if self._out is not None:
+            self._out.close()
+        os.replace(tmp, self.path)
+        _fsync_dir(self.directory)
+        self._out = open(self.path, "ab")
+
+    # --- Recording ---
+    def record(self, patient_id, service_id, service_name, cost):
+        # Durably queues one usage row; returns the event id
+        event = {"id": uuid.uuid4().hex, "patient_id": str(patient_id), "service_id": service_id,
+                 "service_name": service_name, "cost": float(cost)}
+        line = _encode(event)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The service usage journal is closed.")
+            self._out.write(line)
+            self._out.flush()
+            os.fsync(self._out.fileno())
+            self._pending.append(event)
+            self.stats["recorded"] += 1
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wake.set()
+        return event["id"]
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    # --- Flushing ---
+    def flush(self):
+        # Commits every event recorded so far, a batch per transaction;
+        # returns how many usage rows were written. Raises the database
+        # error if a batch fails (its events stay queued).
+        written = 0
+        with self._flush_lock:
+            with self._lock:
+                events = list(self._pending)
+            for start in range(0, len(events), self.batch_size):
+                batch = events[start:start + self.batch_size]
+                new, skipped = apply_events(batch)
+                done = {event["id"] for event in batch}
+                with self._lock:
+                    self._pending = [event for event in self._pending if event["id"] not in done]
+                    self._rewrite()
+                    self.stats["written"] += new
+                    self.stats["skipped"] += skipped
+                    self.stats["flushes"] += 1
+                written += new
+        return written
+
+    def _run(self):
+        try:
+            prune_applied()
+        except Exception:
+            pass                    # housekeeping only; retried at the next start
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if self._closed:
+                return
+            if not self.pending():
+                continue
+            try:
+                self.flush()
+                self.last_error = None
+            except Exception as e:
+                # Left queued; retried at the next interval
+                self.last_error = str(e)
+
+    def close(self, flush=True):
+        # Flushes (unless told not to), stops the flusher and releases the
+        # slot. Events that could not be written stay in the journal.
+        if self._closed:
+            return
+        try:
+            if flush:
+                self.flush()
+        finally:
+            with self._lock:
+                self._closed = True
+                if self._out is not None:
+                    self._out.close()
+            self._wake.set()
+            if self._thread is not None and self._thread is not threading.current_thread():
+                self._thread.join(self.flush_interval + 5)
+            if self._lock_file is not None:
+                self._lock_file.close()
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def enable(directory=JOURNAL_DIR, **options):
+    # Opens a journal for this process whatever HMS_USAGE_WRITE_BEHIND says
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            _journal = UsageJournal(directory, **options).open()
+            atexit.register(_close_at_exit)
+        return _journal
+
+
+def get():
+    # This process's journal when write-behind is on (opened on first
+    # use, which also recovers what a crashed run left); otherwise None
+    if _journal is None and WRITE_BEHIND:
+        enable()
+    return _journal
+
+
+def sync():
+    # Makes usage queued in this process visible in the database; call
+    # before reading temp_service_usage or pending totals
+    journal = _journal
+    if journal is None or not journal.pending():
+        return 0
+    return journal.flush()
+
+
+def _close_at_exit():
+    try:
+        _journal.close()
+    except Exception as e:
+        print(f"Service usage not yet written stays in {_journal.path} for the next start ({e}).")
+
+
+def status(directory=JOURNAL_DIR):
+    # [(journal path, pending events, held by a running process)]
+    result = []
+    for slot in range(MAX_SLOTS):
+        path = os.path.join(directory, f"usage-{slot}.journal")
+        if not os.path.exists(path):
+            continue
+        with open(os.path.join(directory, f"usage-{slot}.lock"), "a+b") as f:
+            held = not _try_lock(f)
+        result.append((path, len(read_events(path)), held))
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Inspect or write out service usage journals.")
+    parser.add_argument("--dir", default=JOURNAL_DIR, help="journal directory")
+    parser.add_argument("--status", action="store_true", help="list journals and their pending events (default)")
+    parser.add_argument("--flush", action="store_true", help="write out journals no running process holds")
+    args = parser.parse_args()
+    if args.flush:
+        journal = UsageJournal(args.dir).open()
+        queued = journal.pending()
+        journal.close()
+        print(f"Wrote {journal.stats['written']} of {queued} queued usage events "
+              f"({journal.stats['skipped']} were already in the database).")
+    else:
+        journals = status(args.dir)
+        for path, count, held in journals:
+            print(f"{path}: {count} pending{' (in use)' if held else ''}")
+        if not journals:
+            print(f"No journals in '{args.dir}'.")
@@ -0,0 +1,334 @@
+import datetime
+import math
+import re
+from abc import ABC, abstractmethod
+
+# Validation rules shared by the entity classes, operations, the bulk
+# loader and bulk_ops. Each entity has a Schema: an ordered list of Fields
+# whose checks (regexes, ranges, choices) are compiled once at import.
+#   - Schema.validate(row) returns FieldErrors for one record.
+#   - Schema.validate_columns(columns) checks whole columns of a batch at
+#     once. Clean columns take a single C-level pass (map/count/min/max)
+#     and only columns containing a bad value are checked value by value.
+# The validate_* functions return the first error message, or None if
+# valid.
+
+NAME_RE = re.compile(r'^[A-Za-z. ]+$')
+SERVICE_NAME_RE = re.compile(r'^[A-Za-z0-9\s\-_]+$')
+ALNUM_ID_RE = re.compile(r'^[A-Za-z0-9]+$')
+DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+GENDERS = ('M', 'F', 'Other')
+
+
+def format_doctor_name(name):
+    name = name.strip()
+    if not name.lower().startswith("dr."):
+        return "Dr. " + name
+    return name
+
+
+def _is_date(value):
+    # Calendar date in YYYY-MM-DD form
+    if not isinstance(value, str) or not DATE_RE.match(value):
+        return False
+    try:
+        datetime.date.fromisoformat(value)
+        return True
+    except ValueError:
+        return False
+
+
+class FieldError:
+    def __init__(self, field, message, row=None):
+        self.field = field
+        self.message = message
+        self.row = row          # index within the batch, for column checks
+
+    def to_dict(self):
+        result = {"field": self.field, "message": self.message}
+        if self.row is not None:
+            result["row"] = self.row
+        return result
+
+    def __repr__(self):
+        return f"FieldError({self.field!r}, {self.message!r}, row={self.row})"
+
+
+# --- Fields (check(value) -> (clean value, error message or None)) ---
+class Field(ABC):
+    def __init__(self, name, message):
+        self.name = name
+        self.message = message
+
+    @abstractmethod
+    def check(self, value):
+        pass
+
+    def _column_ok(self, values):
+        # Fast whole-column check; False means "look at each value"
+        return False
+
+    def check_column(self, values):
+        # {row index: error message} for the bad values of a column
+        if self._column_ok(values):
+            return {}
+        errors = {}
+        for i, value in enumerate(values):
+            error = self.check(value)[1]
+            if error:
+                errors[i] = error
+        return errors
+
+
+class Pattern(Field):
+    # A string matching regex in full; numbers are accepted as their text
+    # when coerce is set (IDs typed or sent as integers)
+    def __init__(self, name, regex, message, coerce=False):
+        super().__init__(name, message)
+        self._fullmatch = re.compile(regex.pattern if hasattr(regex, "pattern") else regex).fullmatch
+        self.coerce = coerce
+
+    def check(self, value):
+        if self.coerce and isinstance(value, int) and not isinstance(value, bool):
+            value = str(value)
+        if not isinstance(value, str) or not self._fullmatch(value):
+            return None, self.message
+        return value, None
+
+    def _column_ok(self, values):
+        try:
+            return list(map(self._fullmatch, values)).count(None) == 0
+        except TypeError:       # a non-string value
+            return False
+
+
+class Choice(Field):
+    def __init__(self, name, choices, message):
+        super().__init__(name, message)
+        self.choices = frozenset(choices)
+
+    def check(self, value):
+        try:
+            return (value, None) if value in self.choices else (None, self.message)
+        except TypeError:       # unhashable
+            return None, self.message
+
+    def _column_ok(self, values):
+        try:
+            return set(values) <= self.choices
+        except TypeError:
+            return False
+
+
+class Integer(Field):
+    def __init__(self, name, low, high, message, range_message):
+        super().__init__(name, message)
+        self.low = low
+        self.high = high
+        self.range_message = range_message
+
+    def check(self, value):
+        try:
+            number = int(value)
+        except (TypeError, ValueError):
+            return None, self.message
+        if number < self.low or number > self.high:
+            return None, self.range_message
+        return number, None
+
+    def _column_ok(self, values):
+        try:
+            numbers = list(map(int, values))
+        except (TypeError, ValueError):
+            return False
+        return not numbers or (min(numbers) >= self.low and max(numbers) <= self.high)
+
+
+class Number(Field):
+    # high=None for no upper bound; NaN and infinities are rejected
+    def __init__(self, name, low, high, message, range_message):
+        super().__init__(name, message)
+        self.low = low
+        self.high = high
+        self.range_message = range_message
+
+    def check(self, value):
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            return None, self.message
+        if not math.isfinite(number):
+            return None, self.message
+        if number < self.low or (self.high is not None and number > self.high):
+            return None, self.range_message
+        return number, None
+
+    def _column_ok(self, values):
+        try:
+            numbers = list(map(float, values))
+        except (TypeError, ValueError):
+            return False
+        if not numbers:
+            return True
+        if not all(map(math.isfinite, numbers)):
+            return False
+        return min(numbers) >= self.low and (self.high is None or max(numbers) <= self.high)
+
+
+class Date(Field):
+    # YYYY-MM-DD that is a real calendar date; returns the string
+    def check(self, value):
+        return (value, None) if _is_date(value) else (None, self.message)
+
+    def _column_ok(self, values):
+        try:
+            if list(map(DATE_RE.match, values)).count(None):
+                return False
+            list(map(datetime.date.fromisoformat, values))
+            return True
+        except (TypeError, ValueError):
+            return False
+
+
+class Schema:
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = list(fields)
+        self._by_name = {field.name: field for field in self.fields}
+
+    def __getitem__(self, name):
+        return self._by_name[name]
+
+    def extend(self, name, fields):
+        # A schema with more fields checked after these ones
+        return Schema(name, self.fields + list(fields))
+
+    def first_error(self, values):
+        # values in field order; the message of the first failing field
+        for field, value in zip(self.fields, values):
+            error = field.check(value)[1]
+            if error:
+                return error
+        return None
+
+    def validate(self, row, only=None):
+        # row: {field: value}; every failing field, in field order (only the
+        # named fields when only is given)
+        errors = []
+        for field in self.fields:
+            if only is not None and field.name not in only:
+                continue
+            error = field.check(row.get(field.name))[1]
+            if error:
+                errors.append(FieldError(field.name, error))
+        return errors
+
+    def clean(self, row):
+        # Returns ({field: converted value}, [FieldError])
+        values, errors = {}, []
+        for field in self.fields:
+            value, error = field.check(row.get(field.name))
+            if error:
+                errors.append(FieldError(field.name, error))
+            else:
+                values[field.name] = value
+        return values, errors
+
+    def validate_columns(self, columns, count=None):
+        # columns: {field: list of values}, all the same length (a missing
+        # column counts as all None). Returns {row index: [FieldError]} for
+        # the rows with errors, each row's errors in field order.
+        if count is None:
+            count = len(next(iter(columns.values()))) if columns else 0
+        errors = {}
+        for field in self.fields:
+            values = columns.get(field.name)
+            if values is None:
+                values = [None] * count
+            for row, message in field.check_column(values).items():
+                errors.setdefault(row, []).append(FieldError(field.name, message, row))
+        return errors
+
+    def validate_rows(self, rows):
+        # rows: list of dicts (e.g. csv.DictReader rows); see validate_columns
+        columns = {field.name: [row.get(field.name) for row in rows] for field in self.fields}
+        return self.validate_columns(columns, len(rows))
+
+
+# --- Entity schemas ---
+_CONTACT_RE = r'\d{10,}'
+_SPECIALIZATION_RE = r'(?:[^\W\d_]|\s)+'
+_ANY_TEXT_RE = r'(?s).+'
+
+PATIENT = Schema("patient", [
+    Pattern("name", NAME_RE, "Invalid Name. Only letters, spaces, and periods allowed."),
+    Integer("age", 0, 120, "Invalid Age. Must be a number.", "Invalid Age. Must be between 0 and 120."),
+    Choice("gender", GENDERS, "Invalid Gender. Choose from M, F, Other."),
+    Date("admission_date", "Invalid Admission Date. Use YYYY-MM-DD format."),
+    Pattern("contact_no", _CONTACT_RE, "Invalid Contact Number. Must be at least 10 digits.", coerce=True),
+])
+
+DOCTOR = Schema("doctor", [
+    Pattern("name", NAME_RE, "Invalid Name. Only letters, spaces, and periods allowed."),
+    Pattern("specialization", _SPECIALIZATION_RE, "Invalid Specialization. Only letters and spaces allowed."),
+    Pattern("contact_no", _CONTACT_RE, "Invalid Contact Number. Only digits allowed, minimum 10 digits.",
+            coerce=True),
+])
+
+SERVICE = Schema("service", [
+    Pattern("service_name", SERVICE_NAME_RE,
+            "Invalid Service Name. Only letters, numbers, spaces, hyphens, and underscores allowed."),
+    Number("cost", 0, 5000, "Invalid Cost. Enter a valid number.", "Cost must be between 0 and 5000."),
+])
+
+APPOINTMENT = Schema("appointment", [
+    Pattern("patient_id", r'\d+', "Invalid Patient ID.", coerce=True),
+    Pattern("doctor_id", _ANY_TEXT_RE, "Invalid Doctor ID."),
+    Date("date", "Invalid Date. Use YYYY-MM-DD format."),
+    Pattern("diagnosis", _ANY_TEXT_RE, "Invalid Diagnosis."),
+])
+
+BILL = Schema("bill", [
+    Pattern("bill_id", ALNUM_ID_RE, "Invalid Bill ID. It must be alphanumeric (no spaces or special characters)."),
+    Pattern("patient_id", ALNUM_ID_RE,
+            "Invalid Patient ID. It must be alphanumeric (no spaces or special characters)."),
+    Date("billing_date", "Invalid Billing Date. Use YYYY-MM-DD format."),
+])
+
+# A service recorded against a patient (temp_service_usage)
+SERVICE_USAGE = Schema("service_usage", [
+    Pattern("patient_id", ALNUM_ID_RE, "Invalid Patient ID.", coerce=True),
+    Pattern("service_id", ALNUM_ID_RE, "Invalid Service ID."),
+    Pattern("service_name", SERVICE_NAME_RE, "Invalid Service Name."),
+    Number("cost", 0, 5000, "Invalid Cost.", "Invalid Cost."),
+])
+
+CONSULTING_CHARGE = Number("consulting_charge", 0, None, "Invalid Consulting Charge. Enter a valid number.",
+                           "Invalid Consulting Charge. Must not be negative.")
+TOTAL_AMOUNT = Number("total_amount", 0, None, "Invalid Total Amount. Enter a valid number.",
+                      "Invalid Total Amount. Must not be negative.")
+
+
+def validate_patient(name, age, gender, admission_date, contact_no):
+    return PATIENT.first_error((name, age, gender, admission_date, contact_no))
+
+
+def validate_doctor(name, specialization, contact_no):
+    return DOCTOR.first_error((name, specialization, contact_no))
+
+
+def validate_service(service_name, cost):
+    return SERVICE.first_error((service_name, cost))
+
+
+def validate_appointment(patient_id, doctor_id, date, diagnosis):
+    return APPOINTMENT.first_error((patient_id, doctor_id, date, diagnosis))
+
+
+def validate_bill(bill_id, patient_id, billing_date):
+    return BILL.first_error((bill_id, patient_id, billing_date))
+
+
+def validate_amount(value, label="Amount"):
+    return Number(label, 0, None, f"Invalid {label}. Enter a valid number.",
+                  f"Invalid {label}. Must not be negative.").check(value)[1]